@@ -1,5 +1,9 @@
+import cv2
+import numpy as np
 import pytest
 
+from zebrazoom.code import paths
+
 
 def pytest_addoption(parser):
   parser.addoption('--long', action='store_true', help="enable long running tests")
@@ -12,3 +16,29 @@ def pytest_configure(config):
 def pytest_runtest_setup(item):
   if item.get_closest_marker('long', None) is not None and not item.config.getoption('--long'):
     pytest.skip()
+
+
+@pytest.fixture(autouse=True)
+def resultsCatalogInTemporaryFolder(tmp_path_factory, monkeypatch):
+  # the results created by the tests must not be recorded in the catalog of the package folder
+  catalogPath = str(tmp_path_factory.mktemp('resultsCatalog') / 'resultsCatalog.sqlite')
+  monkeypatch.setattr(paths, 'getResultsCatalogPath', lambda: catalogPath)
+
+
+def _drawMovingDisk(frame, frameNumber):
+  cv2.circle(frame, (5 + frameNumber, 24), 4, (0, 0, 0), -1)
+
+
+@pytest.fixture
+def createVideo():
+  '''Returns a function writing an MJPG video in which drawFrame(frame, frameNumber) draws each frame on a uniform background.
+  By default, a black disk moves from left to right by one pixel per frame.'''
+  def createVideo(path, nbFrames=30, size=(64, 48), background=200, drawFrame=_drawMovingDisk):
+    width, height = size
+    writer = cv2.VideoWriter(str(path), cv2.VideoWriter_fourcc(*'MJPG'), 10, size)
+    for frameNumber in range(nbFrames):
+      frame = np.full((height, width, 3), background, np.uint8)
+      drawFrame(frame, frameNumber)
+      writer.write(frame)
+    writer.release()
+  return createVideo
@@ -0,0 +1,52 @@
+import json
+import multiprocessing
+import os
+
+import pytest
+
+from zebrazoom.code import batchScheduler
+from zebrazoom.code.syntheticZebrafishVideo import createSyntheticZebrafishVideo
+
+
+def _recordJob(videoPath, configFile, hyperparameters, connection):
+  with open(os.path.join(os.path.dirname(videoPath), 'trackedVideos.txt'), 'a') as f:
+    f.write(os.path.basename(videoPath) + '\n')
+  if 'broken' in videoPath:
+    connection.send('Tracking failed')
+    raise SystemExit(1)
+
+
+@pytest.mark.skipif(multiprocessing.get_start_method() != 'fork', reason='the tracking is replaced in the scheduler process only')
+def test_batch_scheduler(tmp_path, monkeypatch):
+  monkeypatch.setattr(batchScheduler, '_runJob', _recordJob)
+  for name, nbFrames in (('short', 10), ('long', 30), ('broken', 20)):
+    createSyntheticZebrafishVideo(str(tmp_path / f'{name}.avi'), nbFrames=nbFrames, nbRowsOfWells=1, nbWellsPerRow=1)
+  with open(tmp_path / 'config.json', 'w') as f:
+    json.dump({'nbWells': 1, 'noWellDetection': 1}, f)
+  queuePath = str(tmp_path / 'queue.sqlite')
+  videoPaths = [str(tmp_path / f'{name}.avi') for name in ('short', 'long', 'broken')]
+  assert batchScheduler.addJobs(videoPaths, str(tmp_path / 'config.json'), ['outputFolder', str(tmp_path)], queuePath=queuePath) == 3
+  assert batchScheduler.addJobs(videoPaths[:1], str(tmp_path / 'config.json'), ['outputFolder', str(tmp_path)], queuePath=queuePath) == 0
+
+  batchScheduler.runJobs(cpus=1, maxAttempts=2, queuePath=queuePath)
+  with open(tmp_path / 'trackedVideos.txt') as f:
+    assert f.read().split() == ['long.avi', 'broken.avi', 'broken.avi', 'short.avi']
+  assert [(job['status'], job['attempts'], job['error']) for job in batchScheduler.getJobs(queuePath)] == \
+      [('done', 1, None), ('done', 1, None), ('failed', 2, 'Tracking failed')]
+
+  # a job interrupted by a crash of the scheduler is run again, the completed ones are not
+  with batchScheduler._openQueue(queuePath) as queue:
+    queue.execute("UPDATE jobs SET status = 'running' WHERE id = 1")
+  assert batchScheduler.retryFailedJobs(queuePath) == 1
+  os.remove(tmp_path / 'trackedVideos.txt')
+  batchScheduler.runJobs(cpus=1, maxAttempts=1, queuePath=queuePath)
+  with open(tmp_path / 'trackedVideos.txt') as f:
+    assert f.read().split() == ['broken.avi', 'short.avi']
+
+
+def test_jobs_fit_in_cpus_and_memory():
+  jobs = [{'nbProcesses': 4, 'estimatedMemory': 10}, {'nbProcesses': 1, 'estimatedMemory': 10}, {'nbProcesses': 1, 'estimatedMemory': 1}]
+  assert batchScheduler._selectJob(jobs, [], 2, 5) is jobs[0]  # a job is always run when none are running
+  assert batchScheduler._selectJob(jobs[1:], jobs[:1], 6, 15) is jobs[2]
+  assert batchScheduler._selectJob(jobs[1:], jobs[:1], 4, 15) is None
+  assert batchScheduler._selectJob(jobs[1:], jobs[:1], 6, None) is jobs[1]
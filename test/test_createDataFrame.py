@@ -0,0 +1,52 @@
+import os
+import shutil
+
+import pandas as pd
+
+from zebrazoom.code import paths
+from zebrazoom.dataAnalysis.datasetcreation import createDataFrame as createDataFrameModule
+
+
+def _createDataFrame(tmp_path, **options):
+  dataframeOptions = {'pathToExcelFile': '', 'fileExtension': '.xls', 'resFolder': str(tmp_path / 'data'), 'nameOfFile': 'example', 'smoothingFactorDynaParam': 0,
+                      'nbFramesTakenIntoAccount': 0, 'numberOfBendsIncludedForMaxDetect': -1, 'minNbBendForBoutDetect': 3, 'keepSpeedDistDurWhenLowNbBends': 1,
+                      'defaultZZoutputFolderPath': str(tmp_path / 'ZZoutput'), 'computeTailAngleParamForCluster': False, 'computeMassCenterParamForCluster': False,
+                      'tailAngleKinematicParameterCalculation': 0, 'frameStepForDistanceCalculation': '4'}
+  dataframeOptions.update(options)
+  excelFile = pd.read_excel(os.path.join(paths.getDataAnalysisFolder(), 'experimentOrganizationExcel', 'example.xls'))
+  createDataFrameModule.createDataFrame(dataframeOptions, excelFile, 0, [])
+  return pd.read_pickle(tmp_path / 'data' / 'example.pkl')
+
+
+def test_parameters_of_unchanged_videos_are_reloaded(tmp_path, monkeypatch):
+  for folder in ('example1', 'example2', 'example3'):
+    shutil.copytree(os.path.join(paths.getDefaultZZoutputFolder(), folder), tmp_path / 'ZZoutput' / folder, ignore=shutil.ignore_patterns('*.avi'))
+  (tmp_path / 'data').mkdir()
+  dfParam = _createDataFrame(tmp_path)
+
+  calculatedVideos = []
+  createDataFrameForVideo = createDataFrameModule._createDataFrameForVideo
+  def recordCalculatedVideos(videoInfo, *args):
+    calculatedVideos.append(videoInfo['trial_id'])
+    return createDataFrameForVideo(videoInfo, *args)
+  monkeypatch.setattr(createDataFrameModule, '_createDataFrameForVideo', recordCalculatedVideos)
+  assert _createDataFrame(tmp_path).equals(dfParam)
+  assert not calculatedVideos
+
+  with open(tmp_path / 'ZZoutput' / 'example2' / 'results_example2.txt', 'a') as f:
+    f.write(' ')
+  assert _createDataFrame(tmp_path).equals(dfParam)
+  assert calculatedVideos == ['example2']
+  _createDataFrame(tmp_path, frameStepForDistanceCalculation='2')
+  assert calculatedVideos == ['example2', 'example1', 'example2', 'example3']
+  # only the last cache file of each video is kept
+  assert len([fname for fname in os.listdir(tmp_path / 'data' / '.dataframeCache') if fname.endswith('.pkl')]) == 3
+
+
+def test_parameters_calculated_in_parallel(tmp_path):
+  for folder in ('example1', 'example2', 'example3'):
+    shutil.copytree(os.path.join(paths.getDefaultZZoutputFolder(), folder), tmp_path / 'ZZoutput' / folder, ignore=shutil.ignore_patterns('*.avi'))
+  (tmp_path / 'data').mkdir()
+  dfParam = _createDataFrame(tmp_path)
+  shutil.rmtree(tmp_path / 'data' / '.dataframeCache')
+  assert _createDataFrame(tmp_path, nbProcesses=3).equals(dfParam)
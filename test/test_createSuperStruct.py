@@ -0,0 +1,96 @@
+import copy
+import json
+import os
+
+import numpy as np
+import pandas as pd
+from scipy.interpolate import UnivariateSpline
+from scipy.signal import find_peaks
+
+from zebrazoom.code.createSuperStruct import createSuperStruct, _rollingMedianOfBouts, _smoothTailAngle
+from zebrazoom.code.getHyperparameters import getHyperparameters
+
+
+def _rollingMedian(angleRaw, rollingWindow):
+  angleMedian = np.roll(np.array(pd.Series(angleRaw).rolling(rollingWindow).median()), int(-rollingWindow / 2))
+  angleMedian[:rollingWindow] = angleRaw[:rollingWindow]
+  angleMedian[len(angleMedian)-rollingWindow:] = angleRaw[len(angleMedian)-rollingWindow:]
+  return angleMedian
+
+
+def _getBendTiming(tailAngleSmoothed, hyperparameters):
+  # frame by frame detection of the bends
+  prominence = hyperparameters["minProminenceForBendsDetect"]
+  maxpeaks, _ = find_peaks(tailAngleSmoothed, prominence=prominence, width=hyperparameters["windowForLocalBendMinMaxFind"])
+  minpeaks, _ = find_peaks(-tailAngleSmoothed, prominence=prominence, width=hyperparameters["windowForLocalBendMinMaxFind"])
+  if len(minpeaks) + len(maxpeaks) < hyperparameters["minNbPeaksForBoutDetect"]:
+    return []
+  bendTiming = []
+  lastTailValue = 100000
+  for frame in range(len(tailAngleSmoothed)):
+    if (frame in maxpeaks or frame in minpeaks) and abs(lastTailValue - tailAngleSmoothed[frame]) > hyperparameters["minDiffBetweenSubsequentBendAmp"]:
+      bendTiming.append(frame + 1)
+      lastTailValue = tailAngleSmoothed[frame]
+    if len(bendTiming) == 1 and abs(lastTailValue) < hyperparameters["minFirstBendValue"]:
+      bendTiming = []
+  return bendTiming
+
+
+def _generateBouts(rng, nbBouts):
+  bouts = []
+  boutStart = 0
+  for _ in range(nbBouts):
+    nbFrames = int(rng.choice([5, 12, 30, 60, 150]))
+    frames = np.arange(nbFrames)
+    tailAngle = rng.uniform(0.2, 1) * np.sin(frames * rng.uniform(0.2, 0.8)) * np.exp(-frames / rng.uniform(10, 80)) + rng.normal(0, 0.03, nbFrames)
+    bouts.append({'AnimalNumber': 0, 'BoutStart': boutStart, 'BoutEnd': boutStart + nbFrames - 1, 'TailAngle_Raw': tailAngle.tolist()})
+    boutStart += nbFrames + 5
+  return bouts
+
+
+def test_rolling_median_of_bouts():
+  rng = np.random.default_rng(0)
+  anglesRaw = [rng.normal(0, 1, nbFrames) for nbFrames in rng.integers(1, 60, 50)]
+  for rollingWindow in (2, 3, 4, 7):
+    for angleRaw, angleMedian in zip(anglesRaw, _rollingMedianOfBouts(anglesRaw, rollingWindow)):
+      if len(angleRaw) >= rollingWindow:
+        assert np.array_equal(angleMedian, _rollingMedian(angleRaw, rollingWindow))
+
+
+def test_bouts_smoothing_and_bends_detection():
+  hyperparameters, _ = getHyperparameters({"nbWells": 1, "doubleCheckBendMinMaxStatus": 0, "removeFirstSmallBend": 0}, 'video.avi', 'video.avi', [])
+  bouts = _generateBouts(np.random.default_rng(0), 100)
+  superStruct = createSuperStruct({0: copy.deepcopy(bouts)}, [], hyperparameters)
+  for bout, item in zip(bouts, superStruct['wellPoissMouv'][0][0]):
+    angleRaw = np.array(bout['TailAngle_Raw'])
+    if len(angleRaw) > 10:
+      x = np.linspace(0, 1, len(angleRaw))
+      tailAngleSmoothed = UnivariateSpline(x, _rollingMedian(angleRaw, hyperparameters["tailAngleMedianFilter"]), s=hyperparameters["tailAngleSmoothingFactor"])(x)
+    else:
+      tailAngleSmoothed = angleRaw
+    assert item['TailAngle_smoothed'] == tailAngleSmoothed.tolist()
+    assert item['Bend_Timing'] == _getBendTiming(tailAngleSmoothed, hyperparameters)
+
+
+def test_long_bouts_are_smoothed_by_segments():
+  rng = np.random.default_rng(0)
+  frames = np.arange(3000)
+  tailAngle = np.sin(frames / 20) + rng.normal(0, 0.05, len(frames))
+  smoothed = _smoothTailAngle(tailAngle, 5, 1000)
+  assert smoothed.shape == tailAngle.shape
+  assert np.abs(smoothed - np.sin(frames / 20)).mean() < 0.05
+
+
+def test_superStruct_matches_results_of_the_bout_by_bout_implementation():
+  # tail angles of the first four wells of zebrazoom/ZZoutput/example1, with the superStruct created by the former implementation
+  with open(os.path.join(os.path.dirname(__file__), 'expected_results', 'createSuperStruct_example1.json')) as f:
+    expected = json.load(f)
+  hyperparameters, _ = getHyperparameters({"nbWells": 4, "wellsAreRectangles": 1, "videoFPS": 100, "videoPixelSize": 0.1}, 'video.avi', 'video.avi', [])
+  hyperparameters["firstFrame"] = 1
+  hyperparameters["lastFrame"] = 1000
+  superStruct = createSuperStruct({int(wellNumber): bouts for wellNumber, bouts in expected['dataPerWell'].items()}, [], hyperparameters)
+  for wellNumber, expectedBouts in expected['expectedBouts'].items():
+    bouts = superStruct['wellPoissMouv'][int(wellNumber)][0]
+    assert len(bouts) == len(expectedBouts)
+    for bout, expectedBout in zip(bouts, expectedBouts):
+      assert {key: bout[key] for key in expectedBout} == expectedBout
@@ -0,0 +1,66 @@
+import h5py
+import numpy as np
+
+from zebrazoom.code.dataPerFrameH5 import writeDataPerFrameColumns
+from zebrazoom.code.GUI.GUI_InitialClasses import _getTailAngleForAllBoutsCombined
+from zebrazoom.dataAPI._createSuperStructFromH5 import createSuperStructFromH5
+
+
+def _createResults(path, nbFrames=100):
+  rng = np.random.default_rng(0)
+  with h5py.File(path, 'w') as results:
+    results.attrs['firstFrame'] = 1
+    results.attrs['lastFrame'] = nbFrames
+    for wellIdx in range(2):
+      results.create_group(f'wellPositions/well{wellIdx}').attrs.update({'topLeftX': 100 * wellIdx, 'topLeftY': 0, 'lengthX': 100, 'lengthY': 100})
+      for animalIdx in range(2):
+        animalGroup = results.create_group(f'dataForWell{wellIdx}/dataForAnimal{animalIdx}')
+        dataGroup = animalGroup.create_group('dataPerFrame')
+        writeDataPerFrameColumns(dataGroup, 'HeadPos', list(rng.uniform(0, 100, (2, nbFrames))), {}, ('X', 'Y'))
+        writeDataPerFrameColumns(dataGroup, 'TailPosX', list(rng.uniform(0, 100, (3, nbFrames))), {}, ('Pos1', 'Pos2', 'Pos3'))
+        writeDataPerFrameColumns(dataGroup, 'TailPosY', list(rng.uniform(0, 100, (3, nbFrames))), {}, ('Pos1', 'Pos2', 'Pos3'))
+        writeDataPerFrameColumns(dataGroup, 'TailAngle', rng.normal(0, 1, nbFrames), {})
+        writeDataPerFrameColumns(dataGroup, 'Heading', rng.uniform(0, 6, nbFrames), {})
+        boutsGroup = animalGroup.create_group('listOfBouts')
+        boutsGroup.attrs['numberOfBouts'] = 3
+        for boutIdx, boutStart in enumerate((5, 40, 80)):
+          boutGroup = boutsGroup.create_group(f'bout{boutIdx}')
+          boutGroup.attrs.update({'BoutStart': boutStart, 'BoutEnd': boutStart + 10})
+          boutGroup.create_dataset('Bend_Timing', data=np.array([2, 5, 8]))
+          boutGroup.create_dataset('TailAngle_smoothed', data=rng.normal(0, 1, 11))
+          if boutIdx == 1:
+            boutGroup.attrs['flag'] = 1
+
+
+def test_lazy_super_struct_matches_super_struct(tmp_path):
+  path = tmp_path / 'results.h5'
+  _createResults(path)
+  with h5py.File(path, 'r') as results:
+    superStruct = createSuperStructFromH5(results)
+    lazySuperStruct = createSuperStructFromH5(results, lazy=True)
+    firstBout = lazySuperStruct['wellPoissMouv'][0][0][0]
+  assert lazySuperStruct['wellPositions'] == superStruct['wellPositions']
+  assert isinstance(firstBout['HeadX'], np.ndarray)
+  # bouts of the other animals are read after the results file was closed
+  assert len(lazySuperStruct['wellPoissMouv']) == len(superStruct['wellPoissMouv'])
+  for wellData, lazyWellData in zip(superStruct['wellPoissMouv'], lazySuperStruct['wellPoissMouv']):
+    assert len(lazyWellData) == len(wellData)
+    for animalData, lazyAnimalData in zip(wellData, lazyWellData):
+      assert len(lazyAnimalData) == len(animalData)
+      for boutData, lazyBoutData in zip(animalData, lazyAnimalData):
+        assert lazyBoutData.keys() == boutData.keys()
+        assert all(np.array_equal(lazyBoutData[key], value) for key, value in boutData.items())
+
+
+def test_all_bouts_combined_graph_with_lazy_super_struct(tmp_path):
+  path = tmp_path / 'results.h5'
+  _createResults(path)
+  with h5py.File(path, 'r') as results:
+    superStruct = createSuperStructFromH5(results)
+    lazySuperStruct = createSuperStructFromH5(results, lazy=True)
+    for visualization in (0, 1):
+      xaxis, tailAngle = _getTailAngleForAllBoutsCombined(1, 1, superStruct, visualization)
+      lazyXaxis, lazyTailAngle = _getTailAngleForAllBoutsCombined(1, 1, lazySuperStruct, visualization)
+      assert len(xaxis) == len(tailAngle)
+      assert lazyXaxis == xaxis
+      assert lazyTailAngle == tailAngle
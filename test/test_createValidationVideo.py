@@ -0,0 +1,27 @@
+import filecmp
+
+import pytest
+
+from zebrazoom.code.createValidationVideo import _openVideoWriterForEncodedFrames, createValidationVideo
+from zebrazoom.code.getHyperparameters import getHyperparameters
+from zebrazoom.code.syntheticZebrafishVideo import createSyntheticZebrafishVideo
+
+
+def test_validation_video_rendered_in_segments(tmp_path):
+  videoPath = str(tmp_path / 'video.avi')
+  groundTruth = createSyntheticZebrafishVideo(videoPath, nbFrames=60, nbRowsOfWells=1, nbWellsPerRow=2)
+  if _openVideoWriterForEncodedFrames(str(tmp_path / 'test.avi'), 30, (400, 200)) is None:
+    pytest.skip("the installed version of OpenCV can't write encoded frames")
+  wellPoissMouv = [[[{'BoutStart': start, 'BoutEnd': end, 'HeadX': list(groundTruth['headPositions'][wellIdx, start:end + 1, 0]),
+                      'HeadY': list(groundTruth['headPositions'][wellIdx, start:end + 1, 1]),
+                      'Heading': list(groundTruth['heading'][wellIdx, start:end + 1]),
+                      'TailX_VideoReferential': groundTruth['tailPositions'][wellIdx, start:end + 1, :, 0].tolist(),
+                      'TailY_VideoReferential': groundTruth['tailPositions'][wellIdx, start:end + 1, :, 1].tolist()}
+                     for start, end in bouts]] for wellIdx, bouts in enumerate(groundTruth['bouts'])]
+  superStruct = {'wellPositions': groundTruth['wellPositions'], 'wellPoissMouv': wellPoissMouv}
+  for contrastImprovement in (0, 1):
+    hyperparameters, _ = getHyperparameters({"outputValidationVideoContrastImprovement": contrastImprovement}, 'video.avi', videoPath, [])
+    infoFrame = createValidationVideo(videoPath, superStruct, hyperparameters, str(tmp_path / 'sequential.avi'))
+    hyperparameters["createValidationVideoNbProcesses"] = 3
+    assert createValidationVideo(videoPath, superStruct, hyperparameters, str(tmp_path / 'segments.avi')) == infoFrame
+    assert filecmp.cmp(tmp_path / 'sequential.avi', tmp_path / 'segments.avi', shallow=False)
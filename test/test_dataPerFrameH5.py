@@ -0,0 +1,55 @@
+import multiprocessing
+
+import h5py
+import numpy as np
+import pytest
+
+from zebrazoom.code.dataPerFrameH5 import openResultsFileForAppending, writeDataPerFrameColumns
+
+
+def test_write_data_per_frame_columns(tmp_path):
+  x = np.arange(25000, dtype=np.int64)
+  y = np.linspace(0, 1, 25000)
+  for hyperparameters, expectedChunks, expectedCompression in (({}, None, None),
+                                                               ({'storeH5ChunkNbFrames': 1000}, (1000,), None),
+                                                               ({'storeH5Compression': 4}, (10000,), 'gzip')):
+    with h5py.File(tmp_path / 'results.h5', 'w') as results:
+      group = results.create_group('dataForWell0/dataForAnimal0/dataPerFrame')
+      writeDataPerFrameColumns(group, 'HeadPos', [x, y], hyperparameters, ('X', 'Y'))
+      writeDataPerFrameColumns(group, 'Heading', y, hyperparameters)
+    with h5py.File(tmp_path / 'results.h5', 'r') as results:
+      group = results['dataForWell0/dataForAnimal0/dataPerFrame']
+      assert group['HeadPos'].chunks == expectedChunks
+      assert group['HeadPos'].compression == expectedCompression
+      assert tuple(group['HeadPos'].attrs['columns']) == ('X', 'Y')
+      assert group['HeadPos'].dtype == np.dtype([('X', np.int64), ('Y', float)])
+      assert np.array_equal(group['HeadPos']['X'], x)
+      assert np.array_equal(group['HeadPos']['Y'], y)
+      assert 'columns' not in group['Heading'].attrs
+      assert np.array_equal(group['Heading'][()], y)
+
+
+def _lockResultsFile(filename, locked, release):
+  with h5py.File(filename, 'a'):
+    locked.set()
+    release.wait(10)
+
+
+def test_open_locked_results_file(tmp_path, capsys):
+  filename = str(tmp_path / 'results.h5')
+  h5py.File(filename, 'w').close()
+  locked = multiprocessing.Event()
+  release = multiprocessing.Event()
+  process = multiprocessing.Process(target=_lockResultsFile, args=(filename, locked, release))
+  process.start()
+  try:
+    assert locked.wait(10)
+    with pytest.raises(TimeoutError, match='results.h5'):
+      with openResultsFileForAppending(filename, timeout=0.2):
+        pass
+    assert filename in capsys.readouterr().out
+  finally:
+    release.set()
+    process.join()
+  with openResultsFileForAppending(filename, timeout=0.2) as results:
+    results.create_group('dataForWell0')
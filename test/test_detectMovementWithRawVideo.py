@@ -0,0 +1,34 @@
+import cv2
+import numpy as np
+
+from zebrazoom.code.detectMovementWithRawVideo import detectMovementWithRawVideo, detectMovementWithRawVideoForWells
+from zebrazoom.code.getHyperparameters import getHyperparameters
+
+
+def _createVideo(createVideo, path, nbFrames=40):
+  # two wells side by side, the animal of the first one only moves between frames 10 and 20
+  heads = np.zeros((2, nbFrames, 2))
+  for frameNumber in range(nbFrames):
+    heads[0, frameNumber] = (20 + 2 * min(max(frameNumber - 10, 0), 10), 30)
+    heads[1, frameNumber] = (30, 30)
+
+  def drawFrame(frame, frameNumber):
+    for wellNumber, (x, y) in enumerate(heads[:, frameNumber]):
+      cv2.circle(frame, (int(60 * wellNumber + x), int(y)), 5, (30, 30, 30), -1)
+  createVideo(path, nbFrames=nbFrames, size=(120, 60), background=220, drawFrame=drawFrame)
+  return heads
+
+
+def test_movements_are_detected_in_all_wells_at_once(tmp_path, createVideo):
+  videoPath = str(tmp_path / 'video.avi')
+  heads = _createVideo(createVideo, videoPath)
+  wellPositions = [{'topLeftX': 60 * wellNumber, 'topLeftY': 0, 'lengthX': 60, 'lengthY': 60} for wellNumber in range(2)]
+  hyperparameters, _ = getHyperparameters({"nbWells": 2, "thresForDetectMovementWithRawVideo": 18, "minNbPixelForDetectMovementWithRawVideo": 5,
+                                           "frameGapComparision": 2, "halfDiameterRoiBoutDetect": 20}, 'video.avi', videoPath, [])
+  hyperparameters["firstFrame"] = 0
+  hyperparameters["lastFrame"] = 39
+  mouvements = detectMovementWithRawVideoForWells(hyperparameters, videoPath, wellPositions, [(wellNumber, heads[wellNumber], 0, 0) for wellNumber in range(2)])
+  # expected values computed with the former implementation, which compared the frames read by two captures
+  expectedMouvements = [[0] * 9 + [1] * 11 + [0] * 20, [0] * 40]
+  assert mouvements == expectedMouvements
+  assert detectMovementWithRawVideo(hyperparameters, videoPath, None, 0, wellPositions, heads[0], 0, 0) == expectedMouvements[0]
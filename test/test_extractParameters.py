@@ -0,0 +1,26 @@
+import numpy as np
+
+from zebrazoom.code.extractParameters import calculateAngle, calculateTailAngle, _calculateAngles, _calculateTailAngles, _fillGaps, _findBoutCandidates
+
+
+def test_vectorized_angles_match_scalar_functions():
+  rng = np.random.default_rng(0)
+  vectStart = rng.integers(-2, 3, (500, 2)).astype(float)
+  vectEnd = rng.integers(-2, 3, (500, 2)).astype(float)
+  vectEnd[:5] = np.nan
+  angles = _calculateAngles(vectStart, vectEnd)
+  heading = rng.random(500) * 2 * np.pi
+  tailAngles = _calculateTailAngles(angles, heading)
+  for i in range(500):
+    expected = calculateAngle(vectStart[i], vectEnd[i])
+    assert angles[i] == expected or (np.isnan(angles[i]) and np.isnan(expected))
+    expected = calculateTailAngle(expected, heading[i])
+    assert tailAngles[i] == expected or (np.isnan(tailAngles[i]) and np.isnan(expected))
+
+
+def test_fill_gaps_and_bout_candidates():
+  auDessus = np.array([0, 0, 1, 0, 0, 1, 1, 0, 0, 0, 0, 0, 0, 1, 0, 0, 0, 0, 0, 1, 1]).reshape((-1, 1))
+  auDessus2 = _fillGaps(auDessus, 2)
+  assert auDessus2.shape == auDessus.shape
+  assert auDessus2[:, 0].tolist() == [0, 1, 1, 1, 1, 1, 1, 1, 1, 0, 0, 0, 0, 1, 0, 0, 1, 1, 1, 1, 1]
+  assert _findBoutCandidates(auDessus2) == [(1, 8), (13, 13), (16, 19)]
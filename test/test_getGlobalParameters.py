@@ -0,0 +1,212 @@
+import copy
+import math
+
+import numpy as np
+
+from zebrazoom.dataAnalysis.datasetcreation.getDeltaHead import getDeltaHead
+from zebrazoom.dataAnalysis.datasetcreation.getGlobalParameters import _GLOBAL_PARAMETERS, getGlobalParameters, getGlobalParametersForBouts
+
+
+def _createBout(rng, boutStart, nbFrames):
+  bendTiming = sorted(rng.choice(np.arange(1, nbFrames + 1), min(5, nbFrames), replace=False).tolist())
+  return {'BoutStart': boutStart, 'BoutEnd': boutStart + nbFrames - 1, 'HeadX': rng.uniform(0, 100, nbFrames).tolist(), 'HeadY': rng.uniform(0, 100, nbFrames).tolist(),
+          'Heading': rng.uniform(0, 2 * np.pi, nbFrames).tolist(), 'Bend_Timing': bendTiming, 'Bend_Amplitude': rng.normal(0, 1, len(bendTiming)).tolist(),
+          'TailAngle_smoothed': rng.normal(0, 0.5, nbFrames).tolist(), 'TailX_VideoReferential': rng.uniform(0, 100, (nbFrames, 10)).tolist(),
+          'TailY_VideoReferential': rng.uniform(0, 100, (nbFrames, 10)).tolist()}
+
+
+def _sampledPositions(values, frameStepForDistanceCalculation):
+  rangeUsedForDistanceCalculation = [frameStepForDistanceCalculation*i for i in range(0, int(len(values)/frameStepForDistanceCalculation))]
+  if len(rangeUsedForDistanceCalculation) == 0:
+    rangeUsedForDistanceCalculation = [0, len(values) - 1]
+  else:
+    rangeUsedForDistanceCalculation = rangeUsedForDistanceCalculation + [len(values) - 1]
+  return [values[i] for i in rangeUsedForDistanceCalculation]
+
+
+def _getGlobalParameters(curbout, fps, pixelSize, frameStepForDistanceCalculation, previousBoutEnd, firstFrame, lastFrame, minimumFrameToFrameDistanceToBeConsideredAsMoving):
+  # bout by bout implementation of all the global parameters, calculated in the order in which they are registered
+  parameters = {}
+  hasBends = "Bend_Timing" in curbout and type(curbout["Bend_Timing"]) == list and len(curbout["Bend_Timing"])
+  hasAmplitudes = "Bend_Amplitude" in curbout and type(curbout["Bend_Amplitude"]) == list and len(curbout["Bend_Amplitude"])
+  if "TailAngle_smoothed" in curbout and len(curbout["TailAngle_smoothed"]):
+    tailAngle = curbout["TailAngle_smoothed"]
+  else:
+    tailAngle = curbout["TailAngle_Raw"] if "TailAngle_Raw" in curbout and len(curbout["TailAngle_Raw"]) else []
+  instantaneousTBF = fps / (2 * np.diff([0] + curbout['Bend_Timing'])) if hasBends else None
+
+  parameters['Bout Duration (s)'] = (curbout["BoutEnd"] - curbout["BoutStart"] + 1) / fps
+
+  posX = curbout["HeadX"]
+  posY = curbout["HeadY"]
+  for i in range(frameStepForDistanceCalculation, len(posX)):
+    if np.isnan(posX[i]) or np.isnan(posY[i]):
+      for j in range(i - frameStepForDistanceCalculation, i):
+        posX[j] = float('nan')
+        posY[j] = float('nan')
+  posX = _sampledPositions(posX, frameStepForDistanceCalculation)
+  posY = _sampledPositions(posY, frameStepForDistanceCalculation)
+  TotalDistance = 0
+  countNotTakingIntoAccount = 0
+  for j in range(0, len(posX)-1):
+    if not(np.isnan(posX[j+1])) and not(np.isnan(posX[j])) and not(np.isnan(posY[j+1])) and not(np.isnan(posY[j])):
+      TotalDistance = TotalDistance + math.sqrt((posX[j+1] - posX[j])**2 + (posY[j+1] - posY[j])**2)
+    else:
+      countNotTakingIntoAccount = countNotTakingIntoAccount + 1
+  TotalDistance = TotalDistance * pixelSize
+  if countNotTakingIntoAccount != 0:
+    TotalDistance = TotalDistance * ((len(posX) - 1) / (len(posX) - 1 - countNotTakingIntoAccount))
+  parameters['Bout Distance (mm)'] = TotalDistance
+
+  if ("Heading" in curbout) and (len(curbout["Heading"]) > 1):
+    heading = curbout["Heading"]
+    for i in range(frameStepForDistanceCalculation, len(heading)):
+      if np.isnan(heading[i]) or np.isnan(curbout["HeadX"][i]) or np.isnan(curbout["HeadY"][i]):
+        for j in range(i - frameStepForDistanceCalculation, i + 1):
+          heading[j] = float('nan')
+    heading = _sampledPositions(heading, frameStepForDistanceCalculation)
+    angularDifferential = []
+    for j in range(0, len(heading)-1):
+      if not(np.isnan(heading[j+1])) and not(np.isnan(heading[j])):
+        angularDifferential.append((min(abs((heading[j+1] - heading[j]) * (180 / np.pi)) % 180, abs((heading[j+1] - heading[j] + 2 * np.pi) * (180 / np.pi)) % 180, abs((heading[j+1] - heading[j] - 2 * np.pi) * (180 / np.pi)) % 180)) / (frameStepForDistanceCalculation / fps))
+    parameters['Angular Velocity (deg/s)'] = np.mean(angularDifferential)
+  else:
+    parameters['Angular Velocity (deg/s)'] = 0
+
+  posX = curbout["HeadX"]
+  posY = curbout["HeadY"]
+  distance = [math.sqrt((posX[j+1] - posX[j])**2 + (posY[j+1] - posY[j])**2) * pixelSize for j in range(0, len(posX)-1)]
+  instantaneousSpeed = [math.sqrt((posX[j+1] - posX[j])**2 + (posY[j+1] - posY[j])**2) * pixelSize * fps for j in range(0, len(posX)-1)]
+  parameters['maxInstantaneousSpeed'] = np.max(instantaneousSpeed) if len(instantaneousSpeed) else 0
+  parameters['percentOfMovingFramesBasedOnDistance'] = (int(np.sum(np.array(distance) > minimumFrameToFrameDistanceToBeConsideredAsMoving)) / (lastFrame - firstFrame + 1)) * 100
+
+  parameters['Bout Speed (mm/s)'] = TotalDistance * fps / (curbout["BoutEnd"] - curbout["BoutStart"])
+  parameters['Number of Oscillations'] = len(curbout["Bend_Timing"]) / 2 if "Bend_Timing" in curbout and type(curbout["Bend_Timing"]) == list else float('NaN')
+  parameters['meanTBF'] = parameters['Number of Oscillations'] / parameters['Bout Duration (s)']
+  parameters['Max TBF (Hz)'] = np.max(instantaneousTBF) if hasBends else float('NaN')
+  parameters['Mean TBF (Hz)'] = np.mean(instantaneousTBF) if hasBends else float('NaN')
+  parameters['medianOfInstantaneousTBF'] = np.median(instantaneousTBF) if hasBends else float('NaN')
+  parameters['Mean TBF (Hz) (based on first 4 bends)'] = np.mean(fps / (2 * np.diff([0] + curbout['Bend_Timing'][:4]))) if hasBends else float('NaN')
+  parameters['Mean TBF (Hz) (based on first 6 bends)'] = np.mean(fps / (2 * np.diff([0] + curbout['Bend_Timing'][:6]))) if hasBends else float('NaN')
+
+  parameters['Max absolute TBA (deg.)'] = max(list(map(abs, curbout["Bend_Amplitude"]))) * (180 / math.pi) if hasAmplitudes else float('NaN')
+  parameters['maxBendAmplitudeSigned'] = curbout["Bend_Amplitude"][np.argmax(abs(np.array(curbout["Bend_Amplitude"])))] * (180 / math.pi) if hasAmplitudes else float('NaN')
+  parameters['Median absolute TBA (deg.)'] = np.median(list(map(abs, curbout["Bend_Amplitude"]))) * (180 / math.pi) if hasAmplitudes else float('NaN')
+  parameters['medianBendAmplitudeSigned'] = np.median(curbout["Bend_Amplitude"]) * (180 / math.pi) if hasAmplitudes else float('NaN')
+  parameters['Mean absolute TBA (deg.)'] = np.mean(list(map(abs, curbout["Bend_Amplitude"]))) * (180 / math.pi) if hasAmplitudes else float('NaN')
+
+  parameters['maxTailAngleAmplitude'] = max([abs(ta) for ta in tailAngle]) * (180 / math.pi) if len(tailAngle) else float('NaN')
+  parameters['binaryClass25degMaxTailAngle'] = 0 if parameters['maxTailAngleAmplitude'] <= 25 else 1
+
+  parameters['Absolute Yaw (deg)'] = abs(getDeltaHead(curbout))
+  parameters['Signed Yaw (deg)'] = getDeltaHead(curbout)
+  parameters['xstart'] = curbout["HeadY"][0] * pixelSize if len(curbout["HeadY"]) >= 1 else 0
+  parameters['xend'] = curbout["HeadX"][len(curbout["HeadX"])-1] * pixelSize if len(curbout["HeadX"]) >= 1 else 0
+  parameters['xmean'] = np.mean(curbout["HeadX"]) * pixelSize if len(curbout["HeadX"]) >= 1 else 0
+  parameters['ymean'] = np.mean(curbout["HeadY"]) * pixelSize if len(curbout["HeadY"]) >= 1 else 0
+
+  parameters['TBA#1 timing (s)'] = curbout["Bend_Timing"][0] / fps if hasBends else float('NaN')
+  parameters['TBA#1 Amplitude (deg)'] = abs(curbout["Bend_Amplitude"][0]) * (180 / math.pi) if hasAmplitudes else float('NaN')
+  parameters['firstBendAmplitudeSigned'] = curbout["Bend_Amplitude"][0] * (180 / math.pi) if hasAmplitudes else float('NaN')
+  parameters['IBI (s)'] = (curbout["BoutStart"] - previousBoutEnd) / fps
+  parameters['BoutFrameNumberStart'] = curbout["BoutStart"]
+
+  maxTailAngle = max(tailAngle) if len(tailAngle) else 0
+  minTailAngle = min(tailAngle) if len(tailAngle) else 0
+  if abs(maxTailAngle) < abs(minTailAngle):
+    maxTailAngle, minTailAngle = max([-elem for elem in tailAngle]), min([-elem for elem in tailAngle])
+  parameters['tailAngleSymmetry'] = - minTailAngle / maxTailAngle if maxTailAngle > 0 else 1
+
+  if hasAmplitudes and len(curbout["Bend_Amplitude"]) >= 2 and curbout["Bend_Amplitude"][0]:
+    parameters['secondBendAmpDividedByFirst'] = curbout["Bend_Amplitude"][1] / curbout["Bend_Amplitude"][0]
+  else:
+    parameters['secondBendAmpDividedByFirst'] = float('NaN')
+  parameters['tailAngleIntegral'] = np.sum([abs(ta) for ta in tailAngle]) * (180 / math.pi) if len(tailAngle) else float('NaN')
+  parameters['tailAngleIntegralSigned'] = np.sum([ta for ta in tailAngle]) * (180 / math.pi) if len(tailAngle) else float('NaN')
+  return parameters
+
+
+def test_parameters_of_all_bouts_match_parameters_of_each_bout():
+  rng = np.random.default_rng(0)
+  bouts = [_createBout(rng, boutStart, nbFrames) for boutStart, nbFrames in ((10, 1), (20, 7), (40, 30), (80, 4))]
+  bouts[2]['HeadX'][20] = float('nan')
+  del bouts[3]['Heading']
+  bouts[3]['Bend_Timing'] = 3
+  previousBoutEnds = [0] + [bout['BoutEnd'] for bout in bouts[:-1]]
+  parameters = list(_GLOBAL_PARAMETERS)
+  expectedValues = [getGlobalParameters(bout, 160, 0.1, 4, previousBoutEnd, parameters, 1, 1000) for bout, previousBoutEnd in zip(copy.deepcopy(bouts), previousBoutEnds)]
+  values = getGlobalParametersForBouts(bouts, 160, 0.1, 4, previousBoutEnds, parameters, 1, 1000)
+  assert len(values) == len(parameters)
+  for boutIdx, boutValues in enumerate(expectedValues):
+    assert np.array_equal(boutValues, [parameterValues[boutIdx] for parameterValues in values], equal_nan=True)
+
+
+def test_parameters_match_the_bout_by_bout_implementation():
+  for seed in range(100):
+    rng = np.random.default_rng(seed)
+    bouts = []
+    boutStart = int(rng.integers(0, 10))
+    for _ in range(int(rng.integers(1, 6))):
+      nbFrames = int(rng.integers(2, 60))
+      bout = _createBout(rng, boutStart, nbFrames)
+      for key in ('HeadX', 'HeadY', 'TailX_VideoReferential', 'TailY_VideoReferential'):
+        bout[key] = (np.array(bout[key]) * 10).tolist()
+      if nbFrames >= 20 and rng.uniform() < 0.3:  # the bout by bout implementation raises ZeroDivisionError when all the distances are discarded
+        bout['HeadX'][int(rng.integers(0, nbFrames))] = float('nan')
+      if rng.uniform() < 0.2:
+        del bout['Heading']
+      if rng.uniform() < 0.2:
+        bout['TailAngle_Raw'] = bout.pop('TailAngle_smoothed')
+      bouts.append(bout)
+      boutStart += nbFrames + int(rng.integers(1, 20))
+    previousBoutEnds = [0] + [bout['BoutEnd'] for bout in bouts[:-1]]
+    fps, pixelSize, frameStepForDistanceCalculation = float(rng.choice([25, 160, 300])), rng.uniform(0.01, 1), int(rng.integers(1, 6))
+    expectedValues = [_getGlobalParameters(bout, fps, pixelSize, frameStepForDistanceCalculation, previousBoutEnd, 1, 1000, 1) for bout, previousBoutEnd in zip(copy.deepcopy(bouts), previousBoutEnds)]
+    parameters = list(_GLOBAL_PARAMETERS)
+    values = getGlobalParametersForBouts(bouts, fps, pixelSize, frameStepForDistanceCalculation, previousBoutEnds, parameters, 1, 1000, 1)
+    assert len(values) == len(parameters)
+    for parameter, parameterValues in zip(parameters, values):
+      assert np.array_equal(parameterValues, [boutValues[parameter] for boutValues in expectedValues], equal_nan=True), parameter
+
+  # squaring the distances with numpy's ** 2 instead of Python's gives values one ULP away for this bout
+  bout = {'BoutStart': 0, 'BoutEnd': 1, 'HeadX': [0., 572.731], 'HeadY': [0., 335.967], 'TailX_VideoReferential': [[0.] * 10] * 2, 'TailY_VideoReferential': [[0.] * 10] * 2}
+  parameters = ['Bout Distance (mm)', 'maxInstantaneousSpeed']
+  expectedValues = _getGlobalParameters(copy.deepcopy(bout), 160, 0.1, 4, 0, 1, 1000, 1)
+  assert getGlobalParameters(bout, 160, 0.1, 4, 0, parameters, 1, 1000, 1) == [expectedValues[parameter] for parameter in parameters]
+
+
+def test_parameters_match_values_of_the_bout_by_bout_implementation():
+  def createBout(boutStart, nbFrames, bendTiming, bendAmplitude):
+    frames = np.arange(nbFrames)
+    return {'BoutStart': boutStart, 'BoutEnd': boutStart + nbFrames - 1, 'HeadX': (10 + 1.5 * frames).tolist(), 'HeadY': (20 + np.sin(frames)).tolist(),
+            'Heading': (0.1 * frames).tolist(), 'Bend_Timing': bendTiming, 'Bend_Amplitude': bendAmplitude, 'TailAngle_smoothed': (0.3 * np.sin(frames)).tolist()}
+  bouts = [createBout(10, 2, [1], [0.2]), createBout(20, 7, [1, 3, 6], [0.5, -0.8, 0.4]), createBout(40, 12, [2, 4, 7, 9, 11], [-0.3, 0.9, -1.2, 0.7, -0.1])]
+  bouts[2]['HeadX'][5] = float('nan')
+  parameters = ['Bout Duration (s)', 'Bout Distance (mm)', 'Bout Speed (mm/s)', 'Number of Oscillations', 'meanTBF', 'Max TBF (Hz)', 'Mean TBF (Hz)',
+                'Max absolute TBA (deg.)', 'maxBendAmplitudeSigned', 'IBI (s)']
+  values = getGlobalParametersForBouts(bouts, 160, 0.1, 4, [0, 11, 26], parameters, 1, 1000)
+  # expected values computed with the former implementation, which calculated the parameters bout by bout
+  expectedValues = [[0.0125, 0.17199050608314312, 27.5184809733029, 0.5, 40.0, 80.0, 80.0, 11.459155902616466, 11.459155902616466, 0.0625],
+                    [0.04375, 0.9004336345374586, 24.011563587665563, 1.5, 34.285714285714285, 80.0, 48.888888888888886, 45.836623610465864, -45.836623610465864, 0.05625],
+                    [0.075, 1.4760337577891474, 21.469581931478505, 2.5, 33.333333333333336, 40.0, 37.333333333333336, 68.75493541569878, -68.75493541569878, 0.0875]]
+  assert np.allclose(np.transpose(values), expectedValues, rtol=1e-12, atol=0)
+
+
+def test_bout_distance_with_missing_positions():
+  bout = {'BoutStart': 0, 'BoutEnd': 6, 'HeadX': [0., 3., 6., 9., 12., float('nan'), 18.], 'HeadY': [0.] * 7}
+  # the position 5 is missing, so the positions 3 and 4 are discarded and only the distance between the frames 0 and 2 is taken into account
+  distance, speed = getGlobalParameters(bout, 10, 2, 2, 0, ['Bout Distance (mm)', 'Bout Speed (mm/s)'], 0, 100)
+  assert distance == 6 * 2 * 3
+  assert speed == distance * 10 / 6
+  assert np.array_equal(bout['HeadX'], [0., 3., 6., float('nan'), float('nan'), float('nan'), 18.], equal_nan=True)
+  assert math.isnan(getGlobalParameters(bout, 10, 2, 2, 0, ['Number of Oscillations'], 0, 100)[0])
+
+
+def test_parameters_of_bouts_without_distance():
+  # the bout by bout implementation raised ZeroDivisionError for these bouts
+  bouts = [{'BoutStart': 10, 'BoutEnd': 10, 'HeadX': [5.], 'HeadY': [5.]}, {'BoutStart': 20, 'BoutEnd': 22, 'HeadX': [0., 1., float('nan')], 'HeadY': [0.] * 3}]
+  distance, speed = getGlobalParametersForBouts(bouts, 10, 1, 2, [0, 10], ['Bout Distance (mm)', 'Bout Speed (mm/s)'], 0, 100)
+  assert distance[0] == 0
+  assert math.isnan(speed[0])
+  assert math.isnan(distance[1])
+  assert math.isnan(speed[1])
@@ -0,0 +1,20 @@
+import json
+
+from zebrazoom.code.profiling import measure, saveProfilingReport
+
+
+def test_profiling_report(tmp_path):
+  measurements = []
+  with measure(measurements, 'tracking', wellNumber=2):
+    sum(range(100000))
+  assert len(measurements) == 1
+  measurement = measurements[0]
+  assert measurement['stage'] == 'tracking' and measurement['wellNumber'] == 2
+  assert measurement['wallTime'] > 0 and measurement['cpuTime'] >= 0
+  path = tmp_path / 'report' / 'profiling.json'
+  saveProfilingReport(str(path), measurements, videoName='video')
+  with open(path) as f:
+    report = json.load(f)
+  assert report['videoName'] == 'video'
+  assert report['stages'] == measurements
+  assert report['cpuCount'] > 0
@@ -0,0 +1,55 @@
+import os
+
+import h5py
+
+from zebrazoom.code import paths
+from zebrazoom.code import resultsCatalog
+from zebrazoom.dataAPI._openResultsFile import _findResultsFile
+
+
+def _createResults(path, firstFrame=0):
+  with h5py.File(path, 'w') as results:
+    results.attrs['firstFrame'] = firstFrame
+    results.attrs['lastFrame'] = 100
+    results.attrs['videoFPS'] = 30.
+    results.require_group('configurationFileUsed').attrs.update({'nbWells': 2, 'trackTail': 1})
+    for wellIdx in range(2):
+      results.require_group(f'wellPositions/well{wellIdx}')
+
+
+def _makeOld(folder):
+  os.utime(folder, (0, 0))
+
+
+def test_results_catalog(tmp_path, monkeypatch):
+  monkeypatch.setattr(paths, 'getRootDataFolder', lambda: str(tmp_path / 'ZebraZoom'))
+  ZZoutput = tmp_path / 'ZZoutput'
+  ZZoutput.mkdir()
+  _createResults(ZZoutput / 'video_2023_01_01-10_00_00.h5')
+  _createResults(ZZoutput / 'video_2023_01_02-10_00_00.h5', firstFrame=1)
+  _createResults(ZZoutput / 'otherVideo_2023_01_03-10_00_00.h5')
+  _makeOld(ZZoutput)
+  assert _findResultsFile(str(ZZoutput / 'video')) == str(ZZoutput / 'video_2023_01_02-10_00_00.h5')
+
+  # unmodified folders are not listed again
+  listdir = os.listdir
+  monkeypatch.setattr(os, 'listdir', lambda path: [][0])
+  assert _findResultsFile(str(ZZoutput / 'otherVideo')) == str(ZZoutput / 'otherVideo_2023_01_03-10_00_00.h5')
+  monkeypatch.setattr(os, 'listdir', listdir)
+
+  # new and removed results are taken into account
+  _createResults(ZZoutput / 'video_2023_01_04-10_00_00.h5')
+  assert _findResultsFile(str(ZZoutput / 'video')) == str(ZZoutput / 'video_2023_01_04-10_00_00.h5')
+  os.remove(ZZoutput / 'video_2023_01_04-10_00_00.h5')
+  os.remove(ZZoutput / 'otherVideo_2023_01_03-10_00_00.h5')
+  _makeOld(ZZoutput)
+  assert _findResultsFile(str(ZZoutput / 'video')) == str(ZZoutput / 'video_2023_01_02-10_00_00.h5')
+  assert resultsCatalog.findResultsFile(str(ZZoutput), 'otherVideo') is None
+
+  resultsCatalog.recordResults(str(ZZoutput / 'video_2023_01_01-10_00_00.h5'))
+  entries = resultsCatalog.listResults(str(ZZoutput), 'video')
+  assert [entry['timestamp'] for entry in entries] == ['2023_01_01-10_00_00', '2023_01_02-10_00_00']
+  assert [entry['firstFrame'] for entry in entries] == [0, 1]
+  assert entries[1] == {'path': str(ZZoutput / 'video_2023_01_02-10_00_00.h5'), 'videoName': 'video', 'timestamp': '2023_01_02-10_00_00',
+                        'firstFrame': 1, 'lastFrame': 100, 'videoFPS': 30., 'videoPixelSize': None, 'nbWells': 2, 'pathToOriginalVideo': None,
+                        'configuration': {'nbWells': 2, 'trackTail': 1}}
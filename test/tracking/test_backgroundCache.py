@@ -0,0 +1,32 @@
+import numpy as np
+
+from zebrazoom.code.getHyperparameters import CONFIG_DEFAULT
+from zebrazoom.code.tracking._getBackground import GetBackgroundMixin
+
+
+def _createBackgroundExtractor(videoPath, outputFolder, **hyperparameters):
+  obj = GetBackgroundMixin()
+  obj._videoPath = videoPath
+  obj._hyperparameters = dict(CONFIG_DEFAULT, outputFolder=outputFolder, firstFrame=0, lastFrame=29, cacheBackground=1)
+  obj._hyperparameters.update(hyperparameters)
+  return obj
+
+
+def test_background_cache(tmp_path, createVideo, monkeypatch):
+  videoPath = str(tmp_path / 'video.avi')
+  createVideo(videoPath)
+  background = _createBackgroundExtractor(videoPath, str(tmp_path))._getCachedBackground()
+  assert len(list(tmp_path.glob('.ZebraZoomVideoInputs/video/backgroundCache/*.npy'))) == 1
+
+  def failingGetBackground(self):
+    raise AssertionError('the background should have been reloaded from the cache')
+  monkeypatch.setattr(GetBackgroundMixin, '_getBackground', failingGetBackground)
+  assert np.array_equal(_createBackgroundExtractor(videoPath, str(tmp_path))._getCachedBackground(), background)
+  monkeypatch.undo()
+
+  # changing a hyperparameter used for the background extraction or the video invalidates the cache
+  _createBackgroundExtractor(videoPath, str(tmp_path), extractBackWhiteBackground=0)._getCachedBackground()
+  createVideo(videoPath, nbFrames=20)
+  _createBackgroundExtractor(videoPath, str(tmp_path), lastFrame=19)._getCachedBackground()
+  _createBackgroundExtractor(videoPath, str(tmp_path), lastFrame=19, trackTail=0)._getCachedBackground()
+  assert len(list(tmp_path.glob('.ZebraZoomVideoInputs/video/backgroundCache/*.npy'))) == 3
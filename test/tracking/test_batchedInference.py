@@ -0,0 +1,38 @@
+import numpy as np
+import pytest
+
+from zebrazoom.code.deepLearningFunctions.batchedInference import normalizeFramesWithQuantiles, predictMasks
+
+
+def _normalizeFrameWithQuantiles(frame, quartileChose):
+  frame = frame.copy()
+  lowVal  = int(np.quantile(frame, quartileChose))
+  highVal = int(np.quantile(frame, 1 - quartileChose))
+  frame[frame < lowVal]  = lowVal
+  frame[frame > highVal] = highVal
+  frame = frame - lowVal
+  mult  = np.max(frame)
+  frame = frame * (255/mult)
+  return frame.astype('uint8')
+
+
+def test_normalize_frames_with_quantiles():
+  rng = np.random.default_rng(0)
+  frames = rng.integers(20, 230, (5, 40, 30), dtype=np.uint8)
+  for quantile in (0.03, 0.01):
+    normalizedFrames = normalizeFramesWithQuantiles(frames, quantile)
+    for frame, normalizedFrame in zip(frames, normalizedFrames):
+      assert np.array_equal(normalizedFrame, _normalizeFrameWithQuantiles(frame, quantile))
+
+
+def test_batched_unet_predictions():
+  torch = pytest.importorskip("torch")
+  from zebrazoom.code.deepLearningFunctions.unetModel.unet_model import UNet
+  torch.manual_seed(0)
+  dlModel = UNet(n_channels=1, n_classes=2, bilinear=1).eval()
+  frames = np.random.default_rng(0).integers(0, 256, (4, 48, 64), dtype=np.uint8)
+  masks = predictMasks(dlModel, frames, torch.device('cpu'), True)
+  assert len(masks) == 4
+  for frame, mask in zip(frames, masks):
+    assert mask.dtype == np.uint8 and mask.shape == frame.shape[::-1]
+    assert np.mean(mask != predictMasks(dlModel, frame[None], torch.device('cpu'), True)[0]) < 0.01
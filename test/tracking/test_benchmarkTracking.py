@@ -0,0 +1,27 @@
+import json
+
+from zebrazoom.code.benchmarkTracking import benchmarkTracking
+
+
+def test_benchmark_default_tracking(tmp_path):
+  report = benchmarkTracking(str(tmp_path), nbFrames=80, nbRowsOfWells=1, nbWellsPerRow=2, methods=['tracking'])
+  result = report['tracking']
+  assert 'error' not in result, result.get('error')
+  assert result['framesPerSecond'] > 0
+  assert result['medianHeadError'] < 5
+  assert result['boutRecall'] >= 0.5
+  with open(tmp_path / 'benchmarkTracking.json') as f:
+    assert json.load(f) == report
+
+
+def test_benchmark_does_not_report_what_is_not_tracked(tmp_path):
+  report = benchmarkTracking(str(tmp_path), nbFrames=80, nbRowsOfWells=1, nbWellsPerRow=2, methods=['fasterMultiprocessing', 'fastFishTracking.tracking'])
+  for result in report.values():
+    assert 'error' not in result, result.get('error')
+    assert result['medianHeadError'] < 5
+  # the tail isn't tracked with fasterMultiprocessing set to 1 and the bouts aren't detected by fastFishTracking in the benchmark
+  assert report['fasterMultiprocessing']['medianTailTipError'] is None
+  assert report['fasterMultiprocessing']['boutRecall'] >= 0.5
+  assert report['fastFishTracking.tracking']['medianTailTipError'] is not None
+  assert report['fastFishTracking.tracking']['boutRecall'] is None and report['fastFishTracking.tracking']['boutPrecision'] is None
+  assert report['fastFishTracking.tracking']['medianBoutBoundaryError'] is None
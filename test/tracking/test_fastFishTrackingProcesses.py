@@ -0,0 +1,76 @@
+import contextlib
+import io
+import multiprocessing
+
+import numpy as np
+import pytest
+
+import zebrazoom.code.tracking
+import zebrazoom.code.tracking.customTrackingImplementations
+from zebrazoom.code.benchmarkTracking import _CONFIG, _TRACKING_METHODS_CONFIG
+from zebrazoom.code.getHyperparameters import getHyperparameters
+from zebrazoom.code.syntheticZebrafishVideo import createSyntheticZebrafishVideo
+from zebrazoom.code.tracking import _sharedFrameBroadcast
+
+
+def _failToTrackFrames(cap, resizeFrameFactor, times):
+  raise ValueError("Could not track the frames")
+
+
+def _getTrackingMethod(videoPath, groundTruth, outputFolder, nbProcesses):
+  config = dict(_CONFIG, **_TRACKING_METHODS_CONFIG['fastFishTracking.tracking'], nbWells=len(groundTruth['wellPositions']), outputFolder=outputFolder,
+                fastFishTrackingNbProcesses=nbProcesses)
+  hyperparameters, _ = getHyperparameters(config, 'video.avi', videoPath, [])
+  hyperparameters['videoNameWithTimestamp'] = 'video_fastFishTracking_%d' % nbProcesses
+  return zebrazoom.code.tracking.get_tracking_method('fastFishTracking.tracking')(videoPath, groundTruth['wellPositions'], hyperparameters)
+
+
+def _track(videoPath, groundTruth, outputFolder, nbProcesses):
+  trackingMethod = _getTrackingMethod(videoPath, groundTruth, outputFolder, nbProcesses)
+  with contextlib.redirect_stdout(io.StringIO()):
+    results = trackingMethod.run()
+  return results, trackingMethod
+
+
+def test_wells_tracked_in_processes_match_serial_tracking(tmp_path):
+  videoPath = str(tmp_path / 'video.avi')
+  groundTruth = createSyntheticZebrafishVideo(videoPath, nbFrames=60, nbRowsOfWells=2, nbWellsPerRow=3)
+  expectedResults, expectedTracking = _track(videoPath, groundTruth, str(tmp_path), 0)
+  results, processesTracking = _track(videoPath, groundTruth, str(tmp_path), 4)
+
+  assert processesTracking._getNbProcesses() == 4
+  for trackingData, expectedTrackingData in zip(processesTracking._trackingDataPerWell, expectedTracking._trackingDataPerWell):
+    assert np.array_equal(trackingData, expectedTrackingData)
+  assert results.keys() == expectedResults.keys()
+  for wellNumber, bouts in expectedResults.items():
+    assert len(results[wellNumber]) == len(bouts)
+    for bout, expectedBout in zip(results[wellNumber], bouts):
+      for key, value in expectedBout.items():
+        assert np.array_equal(bout[key], value), key
+
+
+def test_processes_are_not_used_without_multiprocessing(tmp_path, monkeypatch):
+  from zebrazoom.code.tracking.customTrackingImplementations.fastFishTracking import tracking
+
+  videoPath = str(tmp_path / 'video.avi')
+  groundTruth = createSyntheticZebrafishVideo(videoPath, nbFrames=10, nbRowsOfWells=1, nbWellsPerRow=2)
+  config = dict(_CONFIG, **_TRACKING_METHODS_CONFIG['fastFishTracking.tracking'], nbWells=2, outputFolder=str(tmp_path), fastFishTrackingNbProcesses=2)
+  hyperparameters, _ = getHyperparameters(config, 'video.avi', videoPath, [])
+  trackingMethod = zebrazoom.code.tracking.get_tracking_method('fastFishTracking.tracking')(videoPath, groundTruth['wellPositions'], hyperparameters)
+  assert trackingMethod._getNbProcesses() == 2
+  monkeypatch.setitem(tracking.globalVariables, 'noMultiprocessing', 1)
+  assert trackingMethod._getNbProcesses() == 1
+
+
+def test_failure_of_a_process_is_reported(tmp_path, monkeypatch):
+  videoPath = str(tmp_path / 'video.avi')
+  groundTruth = createSyntheticZebrafishVideo(videoPath, nbFrames=30, nbRowsOfWells=1, nbWellsPerRow=2)
+  trackingMethod = _getTrackingMethod(videoPath, groundTruth, str(tmp_path), 2)
+  trackingMethod._trackFrames = _failToTrackFrames
+  closedBroadcasters = []
+  close = _sharedFrameBroadcast.SharedFrameBroadcaster.close
+  monkeypatch.setattr(_sharedFrameBroadcast.SharedFrameBroadcaster, 'close', lambda broadcaster: closedBroadcasters.append(close(broadcaster)))
+  with pytest.raises(RuntimeError, match='Could not track the frames'), contextlib.redirect_stdout(io.StringIO()):
+    trackingMethod.run()
+  assert len(closedBroadcasters) == 1
+  assert not multiprocessing.active_children()
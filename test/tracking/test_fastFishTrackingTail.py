@@ -0,0 +1,32 @@
+import math
+
+import numpy as np
+
+from zebrazoom.code.tracking.customTrackingImplementations.fastFishTracking.utilities import distBetweenThetas, assignValueIfBetweenRange, assignValueIfBetweenRangeForDualDirection, findDarkestCandidatePoint
+
+
+def _findDarkestCandidatePoint(frame, x, y, angle, thetaDiffAccept, nbList, steps, lenX, lenY, excludePointsOutsideFrame):
+  assignValue = assignValueIfBetweenRangeForDualDirection if excludePointsOutsideFrame else assignValueIfBetweenRange
+  pixTotMax = 1000000
+  darkestPoint = None
+  l = [i*(math.pi/nbList) for i in range(0,2*nbList) if distBetweenThetas(i*(math.pi/nbList), angle) < thetaDiffAccept]
+  for step in steps:
+    for theta in l:
+      xNew = assignValue(int(x + step * (math.cos(theta))), 0, lenX)
+      yNew = assignValue(int(y + step * (math.sin(theta))), 0, lenY)
+      pixTot = frame[yNew][xNew]
+      if xNew != -1 and yNew != -1 and (pixTot < pixTotMax):
+        pixTotMax = pixTot
+        darkestPoint = (xNew, yNew, pixTot)
+  return darkestPoint
+
+
+def test_find_darkest_candidate_point():
+  rng = np.random.default_rng(0)
+  for _ in range(500):
+    height, width = rng.integers(10, 80, 2)
+    frame = rng.integers(0, 256, (height, width)).astype(np.uint8)
+    args = (frame, int(rng.integers(0, width)), int(rng.integers(0, height)), float(rng.uniform(0, 2 * math.pi)), float(rng.choice([0.6, 1.6, 3.6])),
+            int(rng.choice([10, 20, 25])), [[8, 12, 16], [3], []][rng.integers(0, 3)], width - 1, height - 1)
+    for excludePointsOutsideFrame in (False, True):
+      assert findDarkestCandidatePoint(*args, excludePointsOutsideFrame) == _findDarkestCandidatePoint(*args, excludePointsOutsideFrame)
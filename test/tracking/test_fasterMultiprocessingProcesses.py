@@ -0,0 +1,81 @@
+import contextlib
+import io
+import multiprocessing
+import os
+
+import numpy as np
+import pytest
+
+import zebrazoom.code.tracking
+from zebrazoom.code.benchmarkTracking import _CONFIG, _TRACKING_METHODS_CONFIG
+from zebrazoom.code.getHyperparameters import getHyperparameters
+from zebrazoom.code.syntheticZebrafishVideo import createSyntheticZebrafishVideo
+from zebrazoom.code.tracking import _fasterMultiprocessingBase
+
+
+def _failToTrackWell0(i, frame, grey, backgroundSubtracted, wellNumbers):
+  if 0 in wellNumbers:
+    raise ValueError("Could not track well 0")
+
+
+def _crashWhenTrackingWell0(i, frame, grey, backgroundSubtracted, wellNumbers):
+  if 0 in wellNumbers:
+    os._exit(3)
+
+
+def _getTrackingMethod(trackingMethodName, videoPath, groundTruth, outputFolder, nbProcesses, onlyTrackThisOneWell=-1):
+  config = dict(_CONFIG, **_TRACKING_METHODS_CONFIG[trackingMethodName], nbWells=len(groundTruth['wellPositions']), outputFolder=outputFolder,
+                fasterMultiprocessingNbProcesses=nbProcesses, onlyTrackThisOneWell=onlyTrackThisOneWell)
+  hyperparameters, _ = getHyperparameters(config, 'video.avi', videoPath, [])
+  hyperparameters['videoNameWithTimestamp'] = 'video_%s_%d' % (trackingMethodName, nbProcesses)
+  return zebrazoom.code.tracking.get_tracking_method(trackingMethodName)(videoPath, groundTruth['wellPositions'], hyperparameters)
+
+
+def _track(trackingMethodName, videoPath, groundTruth, outputFolder, nbProcesses, onlyTrackThisOneWell=-1):
+  trackingMethod = _getTrackingMethod(trackingMethodName, videoPath, groundTruth, outputFolder, nbProcesses, onlyTrackThisOneWell=onlyTrackThisOneWell)
+  with contextlib.redirect_stdout(io.StringIO()):
+    results = trackingMethod.run()
+  return results, trackingMethod
+
+
+@pytest.mark.parametrize('trackingMethodName', ['fasterMultiprocessing', 'fasterMultiprocessing2'])
+def test_wells_tracked_in_processes_match_serial_tracking(tmp_path, trackingMethodName):
+  videoPath = str(tmp_path / 'video.avi')
+  groundTruth = createSyntheticZebrafishVideo(videoPath, nbFrames=60, nbRowsOfWells=2, nbWellsPerRow=3)
+  expectedResults, expectedTracking = _track(trackingMethodName, videoPath, groundTruth, str(tmp_path), 0)
+  results, processesTracking = _track(trackingMethodName, videoPath, groundTruth, str(tmp_path), 4)
+
+  assert processesTracking._getNbProcesses() == 4
+  for name in expectedTracking._getTrackingArraysPerWell():
+    for array, expectedArray in zip(getattr(processesTracking, name), getattr(expectedTracking, name)):
+      assert np.array_equal(array, expectedArray), name
+  assert results.keys() == expectedResults.keys()
+  for wellNumber, bouts in expectedResults.items():
+    assert len(results[wellNumber]) == len(bouts)
+    for bout, expectedBout in zip(results[wellNumber], bouts):
+      for key, value in expectedBout.items():
+        assert np.array_equal(bout[key], value), key
+
+
+def test_headings_do_not_depend_on_the_other_wells(tmp_path):
+  videoPath = str(tmp_path / 'video.avi')
+  groundTruth = createSyntheticZebrafishVideo(videoPath, nbFrames=30, nbRowsOfWells=1, nbWellsPerRow=3)
+  _, allWellsTracking = _track('fasterMultiprocessing2', videoPath, groundTruth, str(tmp_path), 0)
+  _, oneWellTracking = _track('fasterMultiprocessing2', videoPath, groundTruth, str(tmp_path), 0, onlyTrackThisOneWell=2)
+  assert np.array_equal(oneWellTracking._trackingHeadingAllAnimalsList[2], allWellsTracking._trackingHeadingAllAnimalsList[2])
+  assert "iterationsForErodeImageForHeadingCalculation" not in allWellsTracking._hyperparameters
+
+
+@pytest.mark.parametrize('trackWells, error', [(_failToTrackWell0, 'Could not track well 0'), (_crashWhenTrackingWell0, 'exited with code 3')])
+def test_failure_of_a_process_is_reported(tmp_path, monkeypatch, trackWells, error):
+  videoPath = str(tmp_path / 'video.avi')
+  groundTruth = createSyntheticZebrafishVideo(videoPath, nbFrames=30, nbRowsOfWells=1, nbWellsPerRow=2)
+  trackingMethod = _getTrackingMethod('fasterMultiprocessing', videoPath, groundTruth, str(tmp_path), 2)
+  trackingMethod._trackWells = trackWells
+  closedBroadcasters = []
+  close = _fasterMultiprocessingBase.SharedFrameBroadcaster.close
+  monkeypatch.setattr(_fasterMultiprocessingBase.SharedFrameBroadcaster, 'close', lambda broadcaster: closedBroadcasters.append(close(broadcaster)))
+  with pytest.raises(RuntimeError, match=error), contextlib.redirect_stdout(io.StringIO()):
+    trackingMethod.run()
+  assert len(closedBroadcasters) == 1
+  assert not multiprocessing.active_children()
@@ -0,0 +1,105 @@
+import math
+
+import cv2
+import numpy as np
+
+from zebrazoom.code.tracking.fasterMultiprocessing2 import FasterMultiprocessing2
+
+
+def _computeHeading(initialContour, lenX, lenY, headPosition, iterationsForErodeImageForHeadingCalculation):
+  # implementation of _computeHeading in which each line is drawn on its own copy of the image
+  xmin, ymin = lenX, lenY
+  xmax, ymax = 0, 0
+  for pt in initialContour:
+    xmin = min(xmin, pt[0][0])
+    ymin = min(ymin, pt[0][1])
+    xmax = max(xmax, pt[0][0])
+    ymax = max(ymax, pt[0][1])
+  for pt in initialContour:
+    pt[0][0] = pt[0][0] - xmin
+    pt[0][1] = pt[0][1] - ymin
+  headPosition = [headPosition[0] - xmin, headPosition[1] - ymin]
+
+  image = np.zeros((ymax - ymin, xmax - xmin))
+  image[:, :] = 255
+  image = image.astype(np.uint8)
+  cv2.fillPoly(image, pts=[initialContour], color=(0))
+  image[:, 0] = 255
+  image[0, :] = 255
+  image[:, len(image[0])-1] = 255
+  image[len(image)-1, :] = 255
+  originalShape = 255 - image
+
+  minWhitePixel = 1000000000
+  bestAngle = 0
+  nTries = 50
+  startPoint = (int(headPosition[0]), int(headPosition[1]))
+  for i in range(0, nTries):
+    angleOption = i * ((2 * math.pi) / nTries)
+    endPoint = (int(headPosition[0] + 100000 * math.cos(angleOption)), int(headPosition[1] + 100000 * math.sin(angleOption)))
+    testImage = cv2.line(originalShape.copy(), startPoint, endPoint, (0), 1)
+    nbWhitePixels = cv2.countNonZero(testImage)
+    if nbWhitePixels < minWhitePixel:
+      minWhitePixel = nbWhitePixels
+      bestAngle = angleOption
+  bestAngleAfterFirstStep = bestAngle
+
+  countTries = 0
+  nbIterations2nbWhitePixels = {}
+  kernel = np.ones((3, 3), np.uint8)
+  nbWhitePixelsMax = 0.3 * cv2.contourArea(initialContour)
+  while (iterationsForErodeImageForHeadingCalculation > 0) and (countTries < 50) and not(iterationsForErodeImageForHeadingCalculation in nbIterations2nbWhitePixels):
+    nbWhitePixels = cv2.countNonZero(cv2.erode(testImage, kernel, iterations=iterationsForErodeImageForHeadingCalculation))
+    nbIterations2nbWhitePixels[iterationsForErodeImageForHeadingCalculation] = nbWhitePixels
+    if nbWhitePixels < nbWhitePixelsMax:
+      iterationsForErodeImageForHeadingCalculation = iterationsForErodeImageForHeadingCalculation - 1
+    if nbWhitePixels >= nbWhitePixelsMax:
+      iterationsForErodeImageForHeadingCalculation = iterationsForErodeImageForHeadingCalculation + 1
+    countTries = countTries + 1
+  best_iterations = 0
+  minDist = 10000000000000
+  for iterations, nbWhitePixels in nbIterations2nbWhitePixels.items():
+    dist = abs(nbWhitePixels - nbWhitePixelsMax)
+    if dist < minDist:
+      minDist = dist
+      best_iterations = iterations
+
+  testImage2 = cv2.erode(originalShape.copy(), kernel, iterations=best_iterations)
+  for i in range(0, nTries):
+    angleOption = bestAngleAfterFirstStep - (math.pi / 5) + i * ((2 * (math.pi / 5)) / nTries)
+    endPoint = (int(headPosition[0] + 100000 * math.cos(angleOption)), int(headPosition[1] + 100000 * math.sin(angleOption)))
+    nbWhitePixels = cv2.countNonZero(cv2.line(testImage2.copy(), startPoint, endPoint, (0), 1))
+    if nbWhitePixels < minWhitePixel:
+      minWhitePixel = nbWhitePixels
+      bestAngle = angleOption
+
+  return bestAngle + math.pi, best_iterations
+
+
+def _larvaContour(x, y, angle):
+  '''Contour of a larva whose head is at (x, y) and whose tail goes in the direction angle'''
+  image = np.zeros((200, 200), np.uint8)
+  cv2.circle(image, (x, y), 5, 255, -1)
+  tail = [(x + r * math.cos(angle) + side * width * math.cos(angle + math.pi / 2), y + r * math.sin(angle) + side * width * math.sin(angle + math.pi / 2))
+          for r, width, side in [(0, 4, 1), (30, 1, 1), (30, 1, -1), (0, 4, -1)]]
+  cv2.fillPoly(image, [np.array(tail, dtype=np.int32)], 255)
+  contours, _ = cv2.findContours(image, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_NONE)
+  return contours[0]
+
+
+def test_compute_heading():
+  tracking = FasterMultiprocessing2.__new__(FasterMultiprocessing2)
+  tracking._hyperparameters = {"debugHeadingCalculation": 0}
+  tracking._iterationsForErodeImageForHeadingCalculation = {}
+  iterationsForErodeImageForHeadingCalculation = 4
+  nbHeadings = 12
+  for k in range(nbHeadings):
+    tailAngle = k * 2 * math.pi / nbHeadings + 0.1
+    x, y = 60 + 7 * k, 140 - 5 * k
+    heading = tracking._computeHeading(_larvaContour(x, y, tailAngle), 200, 200, (x, y), 0)
+    expectedHeading, iterationsForErodeImageForHeadingCalculation = _computeHeading(_larvaContour(x, y, tailAngle), 200, 200, (x, y), iterationsForErodeImageForHeadingCalculation)
+    assert heading == expectedHeading
+    assert tracking._iterationsForErodeImageForHeadingCalculation == {0: iterationsForErodeImageForHeadingCalculation}
+    # the heading is opposite to the tail
+    headingError = (heading - tailAngle - math.pi) % (2 * math.pi)
+    assert min(headingError, 2 * math.pi - headingError) < 0.1
@@ -0,0 +1,68 @@
+import itertools
+
+import numpy as np
+
+from zebrazoom.code.tracking._identityAssignment import assignIdentities, predictPositions
+from zebrazoom.code.tracking.fasterMultiprocessing2 import FasterMultiprocessing2
+
+
+def test_assignment_is_optimal_and_gated():
+  rng = np.random.default_rng(0)
+  for _ in range(50):
+    previousPositions = rng.uniform(0, 100, (5, 2))
+    currentPositions = rng.uniform(0, 100, (5, 2))
+    assignment = assignIdentities(previousPositions, currentPositions)
+    bestCost = min(sum(np.linalg.norm(previousPositions[k] - currentPositions[permutation[k]]) for k in range(5)) for permutation in itertools.permutations(range(5)))
+    assert sorted(assignment) == list(range(5))
+    assert np.isclose(sum(np.linalg.norm(previousPositions[k] - currentPositions[assignment[k]]) for k in range(5)), bestCost)
+  assert list(assignIdentities([[0, 0], [50, 50]], [[1, 1]], maxDistance=10)) == [0, -1]
+  assert list(assignIdentities([[0, 0], [50, 50]], [[100, 100]], maxDistance=10)) == [-1, -1]
+  assert list(assignIdentities([[0, 0]], [])) == [-1]
+
+
+def _countIdentitySwaps(motionPrediction):
+  # Two larvae swimming towards each other on close parallel lines, the detections being given in a random order on each frame
+  rng = np.random.default_rng(0)
+  trajectories = np.array([[[5 + 10 * t, 50], [95 - 10 * t, 53]] for t in range(10)], dtype=float)
+  trackedPositions = [trajectories[0], trajectories[1]]
+  nbSwaps = 0
+  for positions in trajectories[2:]:
+    order = rng.permutation(2)
+    previousPositions = predictPositions(trackedPositions[-1], trackedPositions[-2]) if motionPrediction else trackedPositions[-1]
+    assignment = assignIdentities(previousPositions, positions[order])
+    trackedPositions.append(positions[order][assignment])
+    nbSwaps += not np.array_equal(trackedPositions[-1], positions)
+  return nbSwaps
+
+
+def test_motion_prediction_prevents_identity_swaps_on_crossings():
+  assert _countIdentitySwaps(motionPrediction=False) > 0
+  assert _countIdentitySwaps(motionPrediction=True) == 0
+
+
+def test_positions_not_detected_are_not_extrapolated():
+  previousPositions = [[10, 20], [0, 30], [15, 25]]
+  positionsBefore = [[8, 18], [5, 28], [0, 0]]
+  assert np.array_equal(predictPositions(previousPositions, positionsBefore), [[12, 22], [0, 30], [15, 25]])
+
+
+def _switchIdentitiesFasterMultiprocessing2(previousPositions, currentPositions, maxDistance):
+  tracking = FasterMultiprocessing2.__new__(FasterMultiprocessing2)
+  tracking._firstFrame = 0
+  tracking._hyperparameters = {"identityAssignmentMotionPrediction": 0, "identityAssignmentMaxDistance": maxDistance}
+  tracking._trackingHeadTailAllAnimalsList = [np.array([previousPositions, currentPositions], dtype=float).transpose(1, 0, 2)[:, :, None, :]]
+  tracking._trackingHeadingAllAnimalsList = [np.arange(2 * len(currentPositions), dtype=float).reshape(2, -1).T]
+  tracking._switchIdentities(tracking._findOptimalIdCorrespondance(0, 1), 0, 1)
+  return tracking._trackingHeadTailAllAnimalsList[0][:, 1, 0], tracking._trackingHeadingAllAnimalsList[0][:, 1]
+
+
+def test_faster_multiprocessing2_identity_assignment():
+  positions, heading = _switchIdentitiesFasterMultiprocessing2([[10, 10], [50, 50], [90, 90]], [[52, 52], [11, 11], [0, 0]], 10)
+  assert np.array_equal(positions, [[11, 11], [52, 52], [0, 0]])
+  assert np.array_equal(heading, [4, 3, 5])
+  # an animal which is not detected is not assigned to a detection further than identityAssignmentMaxDistance, the animals are then kept in place
+  positions, heading = _switchIdentitiesFasterMultiprocessing2([[10, 10], [0, 0]], [[0, 0], [100, 100]], 10)
+  assert np.array_equal(positions, [[0, 0], [100, 100]])
+  assert np.array_equal(heading, [2, 3])
+  positions, _ = _switchIdentitiesFasterMultiprocessing2([[10, 10], [0, 0]], [[0, 0], [100, 100]], 0)
+  assert np.array_equal(positions, [[100, 100], [0, 0]])
@@ -0,0 +1,64 @@
+import math
+
+import numpy as np
+
+from zebrazoom.code.tracking._baseZebraZoom import BaseZebraZoomTrackingMethod
+
+
+_HYPERPARAMETERS = {"postProcessRemoveLowProbabilityDetection": 0, "postProcessRemovePointsOnBordersMargin": 0, "postProcessRemovePointsAwayFromMainTrajectory": 0,
+                    "postProcessRemovePointsAwayFromMainTrajectoryThreshold": 2.5}
+
+
+def _getTrackingMethod(**hyperparameters):
+  trackingMethod = object.__new__(BaseZebraZoomTrackingMethod)
+  trackingMethod._hyperparameters = dict(_HYPERPARAMETERS, **hyperparameters)
+  trackingMethod._wellPositions = [{"lengthX": 100, "lengthY": 100}] * 3
+  return trackingMethod
+
+
+def _fillMissingPositions(trackingHeadTailAllAnimals, maxDistanceAuthorized, maxDisapearanceFrames):
+  # frame by frame implementation of the filling of missing positions
+  currentlyZero = False
+  zeroFrameStart = 0
+  for positions in trackingHeadTailAllAnimals[:, :, 0]:
+    for frameNumber, (xHead, yHead) in enumerate(positions):
+      xHeadPrev, yHeadPrev = positions[max(frameNumber - 1, 0)]
+      if ((xHead == 0 and yHead == 0) or math.sqrt((xHead - xHeadPrev)**2 + (yHead - yHeadPrev)**2) > maxDistanceAuthorized) and frameNumber != len(positions) - 1:
+        if not currentlyZero:
+          zeroFrameStart = frameNumber
+        currentlyZero = True
+      elif currentlyZero:
+        xHeadStart, yHeadStart = positions[zeroFrameStart - 1] if zeroFrameStart >= 1 else positions[frameNumber]
+        distance = math.sqrt((xHead - xHeadStart)**2 + (yHead - yHeadStart)**2)
+        if distance < maxDistanceAuthorized or frameNumber - zeroFrameStart > maxDisapearanceFrames:
+          currentlyZero = False
+          for frameAtZeroToChange in range(zeroFrameStart, frameNumber):
+            if distance < maxDistanceAuthorized and not (xHead == 0 and yHead == 0):
+              positions[frameAtZeroToChange] = (xHeadStart + (xHead - xHeadStart) / (frameNumber - zeroFrameStart) * (frameAtZeroToChange - zeroFrameStart),
+                                                yHeadStart + (yHead - yHeadStart) / (frameNumber - zeroFrameStart) * (frameAtZeroToChange - zeroFrameStart))
+            else:
+              positions[frameAtZeroToChange] = (xHeadStart, yHeadStart)
+
+
+def test_missing_positions_are_filled_as_frame_by_frame():
+  rng = np.random.default_rng(0)
+  for _ in range(300):
+    trackingHeadTailAllAnimals = np.cumsum(rng.normal(0, 5, (3, rng.integers(1, 50), 2, 2)), axis=1) + 50
+    trackingHeadTailAllAnimals[rng.random(trackingHeadTailAllAnimals.shape[:2]) < rng.uniform(0, 0.6), 0] = 0
+    maxDistanceAuthorized = float(rng.choice([10, 30, 1e44]))
+    maxDisapearanceFrames = int(rng.integers(0, 10))
+    expected = trackingHeadTailAllAnimals.copy()
+    _fillMissingPositions(expected, maxDistanceAuthorized, maxDisapearanceFrames)
+    _getTrackingMethod(postProcessMaxDistanceAuthorized=maxDistanceAuthorized, postProcessMaxDisapearanceFrames=maxDisapearanceFrames)._postProcessMultipleTrajectories(trackingHeadTailAllAnimals, None)
+    assert np.array_equal(trackingHeadTailAllAnimals, expected)
+
+
+def test_points_away_from_main_trajectory_are_removed():
+  rng = np.random.default_rng(0)
+  trackingHeadTailAllAnimals = np.zeros((1, 1000, 1, 2))
+  trackingHeadTailAllAnimals[0, :, 0] = np.round(100 + np.cumsum(rng.normal(0, 1, (1000, 2)), axis=0))
+  outliers = np.arange(20, 1000, 50)
+  trackingHeadTailAllAnimals[0, outliers, 0] += 40
+  _getTrackingMethod(postProcessRemovePointsAwayFromMainTrajectory=1, postProcessMaxDistanceAuthorized=1e44, postProcessMaxDisapearanceFrames=0)._postProcessMultipleTrajectories(trackingHeadTailAllAnimals, None)
+  # the outliers removed are replaced by the position of the previous frame
+  assert np.array_equal(trackingHeadTailAllAnimals[0, outliers, 0], trackingHeadTailAllAnimals[0, outliers - 1, 0])
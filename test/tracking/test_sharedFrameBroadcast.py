@@ -0,0 +1,50 @@
+import numpy as np
+
+import zebrazoom.videoFormatConversion.zzVideoReading as zzVideoReading
+from zebrazoom.code.tracking._sharedFrameBroadcast import SharedFrameBroadcaster
+
+
+def _readAll(cap, firstFrame, lastFrame):
+  cap.set(1, firstFrame)
+  return [cap.read()[1] for _ in range(firstFrame, lastFrame + 1)]
+
+
+def test_readers_get_the_same_frames_as_video_capture(tmp_path, createVideo):
+  videoPath = str(tmp_path / 'video.avi')
+  createVideo(videoPath)
+  expected = _readAll(zzVideoReading.VideoCapture(videoPath), 3, 25)
+
+  broadcaster = SharedFrameBroadcaster(videoPath, 3, 25, 2, 4)
+  readers = [broadcaster.getReader(readerId) for readerId in range(2)]
+  broadcaster.start()
+  for frameNumber, expectedFrame in enumerate(expected, start=3):
+    for reader in readers:
+      assert reader.get(1) == frameNumber
+      ret, frame = reader.read()
+      assert ret
+      assert np.array_equal(frame, expectedFrame)
+  for reader in readers:
+    reader.release()
+  broadcaster.close()
+
+
+def test_reader_falls_back_to_decoding_when_seeking(tmp_path, createVideo):
+  videoPath = str(tmp_path / 'video.avi')
+  createVideo(videoPath)
+  cap = zzVideoReading.VideoCapture(videoPath)
+  cap.set(1, 10)
+  expected = cap.read()[1]
+
+  broadcaster = SharedFrameBroadcaster(videoPath, 0, 29, 2, 2)
+  reader = broadcaster.getReader(0)
+  otherReader = broadcaster.getReader(1)
+  broadcaster.start()
+  reader.read()
+  reader.set(1, 10)
+  ret, frame = reader.read()
+  assert ret
+  assert np.array_equal(frame, expected)
+  assert len(_readAll(otherReader, 0, 29)) == 30  # detached reader must not block the others
+  reader.release()
+  otherReader.release()
+  broadcaster.close()
@@ -0,0 +1,44 @@
+import contextlib
+import io
+
+import numpy as np
+
+import zebrazoom.code.tracking
+from zebrazoom.code.benchmarkTracking import _CONFIG
+from zebrazoom.code.getHyperparameters import getHyperparameters
+from zebrazoom.code.syntheticZebrafishVideo import createSyntheticZebrafishVideo
+from zebrazoom.code.tracking import tracking
+
+
+def _track(videoPath, wellPositions, outputFolder, nbTimeChunksPerWell):
+  config = dict(_CONFIG, nbWells=1, nbAnimalsPerWell=2, outputFolder=outputFolder, nbTimeChunksPerWell=nbTimeChunksPerWell, timeChunksOverlapNbFrames=5)
+  hyperparameters, _ = getHyperparameters(config, 'video.avi', videoPath, [])
+  hyperparameters['videoNameWithTimestamp'] = 'video_nbTimeChunksPerWell%d' % nbTimeChunksPerWell
+  trackingMethod = zebrazoom.code.tracking.get_tracking_method('tracking')(videoPath, wellPositions, hyperparameters)
+  trackingMethod.useGUI = False
+  with contextlib.redirect_stdout(io.StringIO()):
+    results = trackingMethod.run()
+  return results, trackingMethod
+
+
+def test_time_chunks_match_sequential_tracking(tmp_path, monkeypatch):
+  videoPath = str(tmp_path / 'video.avi')
+  groundTruth = createSyntheticZebrafishVideo(videoPath, nbFrames=150, nbRowsOfWells=1, nbWellsPerRow=2)
+  # a single arena containing the two larvae, so that their identities have to be matched between the chunks
+  wellPositions = [{'topLeftX': 0, 'topLeftY': 0, 'lengthX': sum(well['lengthX'] for well in groundTruth['wellPositions']),
+                    'lengthY': groundTruth['wellPositions'][0]['lengthY']}]
+  monkeypatch.setitem(tracking.globalVariables, 'noMultiprocessing', 1)
+  expectedResults, expectedTracking = _track(videoPath, wellPositions, str(tmp_path), 0)
+  monkeypatch.setitem(tracking.globalVariables, 'noMultiprocessing', 0)
+  results, chunksTracking = _track(videoPath, wellPositions, str(tmp_path), 3)
+
+  assert chunksTracking._getTimeChunks() == [(1, 50), (51, 100), (101, 150)]
+  arrays = chunksTracking._getTrackingArrays()
+  expectedArrays = expectedTracking._getTrackingArrays()
+  assert arrays.keys() == expectedArrays.keys()
+  for name, array in expectedArrays.items():
+    assert np.array_equal(arrays[name], array), name
+  assert len(results[0]) == len(expectedResults[0])
+  for bout, expectedBout in zip(results[0], expectedResults[0]):
+    for key, value in expectedBout.items():
+      assert np.array_equal(bout[key], value), key
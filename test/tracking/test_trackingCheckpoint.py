@@ -0,0 +1,69 @@
+import contextlib
+import io
+import os
+
+import h5py
+import numpy as np
+import pytest
+
+import zebrazoom.code.tracking
+from zebrazoom.code.benchmarkTracking import _CONFIG
+from zebrazoom.code.getHyperparameters import getHyperparameters
+from zebrazoom.code.syntheticZebrafishVideo import createSyntheticZebrafishVideo
+from zebrazoom.code.tracking import tracking
+from zebrazoom.code.trackingCheckpoint import getCheckpointFolder
+
+
+def _track(videoPath, groundTruth, outputFolder, checkpointInterval, runName):
+  config = dict(_CONFIG, nbWells=len(groundTruth['wellPositions']), outputFolder=outputFolder, checkpointInterval=checkpointInterval, storeH5=1)
+  hyperparameters, _ = getHyperparameters(config, os.path.basename(videoPath), videoPath, [])
+  hyperparameters['videoNameWithTimestamp'] = runName
+  hyperparameters['H5filename'] = os.path.join(outputFolder, '%s.h5' % runName)
+  trackingMethod = zebrazoom.code.tracking.get_tracking_method('tracking')(videoPath, groundTruth['wellPositions'], hyperparameters)
+  trackingMethod.useGUI = False
+  output = io.StringIO()
+  with contextlib.redirect_stdout(output):
+    return trackingMethod.run(), hyperparameters, output.getvalue()
+
+
+def test_resumed_tracking_is_identical(tmp_path, monkeypatch):
+  monkeypatch.setitem(tracking.globalVariables, 'noMultiprocessing', 1)
+  videoPath = str(tmp_path / 'video.avi')
+  groundTruth = createSyntheticZebrafishVideo(videoPath, nbFrames=60, nbRowsOfWells=1, nbWellsPerRow=2)
+  expectedResults, expectedHyperparameters, _ = _track(videoPath, groundTruth, str(tmp_path), 0, 'uninterrupted')
+
+  # the tracking crashes in the middle of the second well
+  originalGetImages = tracking.Tracking._getImages
+  def crashingGetImages(self, cap, i, wellNumber, *args):
+    if wellNumber == 1 and i == 45:
+      raise KeyboardInterrupt
+    return originalGetImages(self, cap, i, wellNumber, *args)
+  monkeypatch.setattr(tracking.Tracking, '_getImages', crashingGetImages)
+  with pytest.raises(KeyboardInterrupt):
+    _track(videoPath, groundTruth, str(tmp_path), 20, 'interrupted')
+  monkeypatch.undo()
+  monkeypatch.setitem(tracking.globalVariables, 'noMultiprocessing', 1)
+
+  results, hyperparameters, output = _track(videoPath, groundTruth, str(tmp_path), 20, 'resumed')
+  assert 'Background reloaded from cache' in output and 'Tracking of well 0 reloaded from the checkpoint' in output and 'Resuming the tracking of well 1 at frame %d' % (hyperparameters['firstFrame'] + 40) in output
+  assert sorted(os.listdir(getCheckpointFolder(hyperparameters))) == ['key.txt', 'well0.pkl', 'well0_0_60.npz', 'well1.pkl', 'well1_0_60.npz']
+  assert results.keys() == expectedResults.keys()
+  for wellNumber, bouts in expectedResults.items():
+    assert len(results[wellNumber]) == len(bouts)
+    for bout, expectedBout in zip(results[wellNumber], bouts):
+      assert bout.keys() == expectedBout.keys()
+      for key, value in expectedBout.items():
+        assert np.array_equal(bout[key], value), key
+
+  # the per frame results of the wells reloaded from the checkpoint are also stored
+  def readDatasets(filename):
+    datasets = {}
+    with h5py.File(filename, 'r') as results:
+      results.visititems(lambda name, obj: datasets.__setitem__(name, obj[()]) if isinstance(obj, h5py.Dataset) else None)
+    return datasets
+  expectedDatasets = readDatasets(expectedHyperparameters['H5filename'])
+  datasets = readDatasets(hyperparameters['H5filename'])
+  assert 'dataForWell0/dataForAnimal0/dataPerFrame/HeadPos' in expectedDatasets
+  assert datasets.keys() == expectedDatasets.keys()
+  for name, value in expectedDatasets.items():
+    assert np.array_equal(datasets[name], value), name
@@ -0,0 +1,63 @@
+import os
+import struct
+
+import cv2
+import numpy as np
+
+import zebrazoom.videoFormatConversion.zzVideoReading as zzVideoReading
+
+
+def _createHirisVideo(folder, nbFrames=25, width=40, height=30, framesPerBinFile=10):
+  with open(os.path.join(folder, 'video.seq'), 'w') as f:
+    f.write('[Sequence Settings]\nWidth=%d\nHeight=%d\nBytesPerPixel=1\nNumber of files=%d\nBin File=video\n' % (width, height, nbFrames))
+  frames = np.random.default_rng(0).integers(0, 255, (nbFrames, height, width), dtype=np.uint8)
+  with open(os.path.join(folder, 'video.sqb'), 'wb') as sqb:
+    for frameNumber in range(nbFrames):
+      binFileNumber, positionInBinFile = divmod(frameNumber, framesPerBinFile)
+      sqb.write(struct.pack('<IIdiI', positionInBinFile * width * height, 0, frameNumber / 100, binFileNumber, 0))
+  for binFileNumber in range(0, nbFrames, framesPerBinFile):
+    with open(os.path.join(folder, 'video%0.5d.bin' % (binFileNumber // framesPerBinFile)), 'wb') as binFile:
+      binFile.write(frames[binFileNumber:binFileNumber + framesPerBinFile].tobytes())
+  return frames
+
+
+def test_hiris_reading_and_seeking(tmp_path):
+  frames = _createHirisVideo(str(tmp_path))
+  cap = zzVideoReading.VideoCapture(str(tmp_path / 'video.seq'))
+  assert (cap.get(3), cap.get(4), cap.get(7)) == (40, 30, 25)
+  for frameNumber in (0, 1, 2, 17, 18, 3, 24):
+    if frameNumber not in (1, 2, 18):
+      cap.set(1, frameNumber)
+    ret, frame = cap.read()
+    assert ret and cap.get(1) == frameNumber + 1
+    assert np.array_equal(frame, cv2.cvtColor(frames[frameNumber], cv2.COLOR_GRAY2RGB))
+  assert not cap.read()[0]
+  assert os.path.exists(tmp_path / 'video_frameIndex.npy')
+
+
+def test_hiris_grayscale_reading_uses_saved_index(tmp_path):
+  frames = _createHirisVideo(str(tmp_path))
+  zzVideoReading.ZzVideoReading(str(tmp_path / 'video.seq'))
+  with open(tmp_path / 'video.sqb', 'r+b') as sqb:
+    sqb.write(b'\xff' * 24)  # the frame index saved next to the recording must be used instead
+  os.utime(tmp_path / 'video.sqb', (0, 0))
+  cap = zzVideoReading.ZzVideoReading(str(tmp_path / 'video.seq'), grayscale=True)
+  for frameNumber in range(len(frames)):
+    ret, frame = cap.read()
+    assert ret and np.array_equal(frame, frames[frameNumber])
+
+
+def test_background_of_hiris_video_read_in_grayscale(tmp_path, monkeypatch):
+  from zebrazoom.code.getHyperparameters import getHyperparameters
+  from zebrazoom.code.tracking._getBackground import getBackground
+
+  _createHirisVideo(str(tmp_path))
+  videoPath = str(tmp_path / 'video.seq')
+  hyperparameters, _ = getHyperparameters({"nbWells": 1, "backCalculationStep": 3, "checkThatMovementOccurInVideo": 1}, 'video.seq', videoPath, [])
+  cap = zzVideoReading.VideoCapture(videoPath, hyperparameters, grayscale=True)
+  assert cap.read()[1].ndim == 2
+  background = getBackground(videoPath, hyperparameters)
+  videoCapture = zzVideoReading.VideoCapture
+  monkeypatch.setattr(zzVideoReading, 'VideoCapture', lambda videoPath, hyperparameters=0, grayscale=False: videoCapture(videoPath, hyperparameters))
+  assert np.array_equal(background, getBackground(videoPath, hyperparameters))
+  assert background.flags.writeable
@@ -0,0 +1,44 @@
+import numpy as np
+
+import zebrazoom.videoFormatConversion.zzVideoReading as zzVideoReading
+
+
+def _readUntilTheEnd(cap):
+  frames = []
+  ret, frame = cap.read()
+  while ret:
+    frames.append((cap.get(1), frame))
+    ret, frame = cap.read()
+  return frames
+
+
+def test_prefetching_returns_the_same_frames(tmp_path, createVideo):
+  videoPath = str(tmp_path / 'video.avi')
+  createVideo(videoPath)
+  expected = _readUntilTheEnd(zzVideoReading.VideoCapture(videoPath))
+  cap = zzVideoReading.VideoCapture(videoPath, {"prefetchFramesQueueSize": 4})
+  assert isinstance(cap, zzVideoReading.PrefetchingVideoCapture)
+  assert cap.get(7) == 30
+  frames = _readUntilTheEnd(cap)
+  assert len(frames) == len(expected)
+  for (position, frame), (expectedPosition, expectedFrame) in zip(frames, expected):
+    assert position == expectedPosition
+    assert np.array_equal(frame, expectedFrame)
+  assert not cap.read()[0]
+  cap.release()
+
+
+def test_prefetching_seek(tmp_path, createVideo):
+  videoPath = str(tmp_path / 'video.avi')
+  createVideo(videoPath)
+  reference = zzVideoReading.VideoCapture(videoPath)
+  cap = zzVideoReading.VideoCapture(videoPath, {"prefetchFramesQueueSize": 4})
+  for firstFrame in (0, 20, 5):
+    cap.set(1, firstFrame)
+    reference.set(1, firstFrame)
+    for _ in range(4):
+      assert np.array_equal(cap.read()[1], reference.read()[1])
+  assert cap.get(1) == 9
+  cap.set(1, 9)
+  assert np.array_equal(cap.read()[1], reference.read()[1])
+  cap.release()
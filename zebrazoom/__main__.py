@@ -80,6 +80,53 @@ def _createParser():
   subparser.add_argument('lastFrame', help='Help for lastFrame', type=int, nargs='?', default=-1)
   subparser.add_argument('hyperparameters', nargs=argparse.REMAINDER, help='Help for hyperparameters')
 
+  subparser = subparsers.add_parser('benchmarkPrefetching', help='Help for benchmarkPrefetching')
+  subparser.add_argument('videoPath', help='Help for videoPath, a synthetic video is created at this path if it does not exist')
+  subparser.add_argument('queueSize', help='Help for queueSize', type=int, nargs='?', default=16)
+  subparser.add_argument('simulatedProcessingTime', help='Help for simulatedProcessingTime, in seconds per frame', type=float, nargs='?', default=0.005)
+
+  subparser = subparsers.add_parser('benchmarkDLinference', help='Help for benchmarkDLinference')
+  subparser.add_argument('pathToSavedModel', help='Help for pathToSavedModel, a randomly initialized UNet is used if it does not exist')
+  subparser.add_argument('unet', help='Help for unet', type=int, nargs='?', default=1)
+  subparser.add_argument('width', help='Help for width', type=int, nargs='?', default=200)
+  subparser.add_argument('height', help='Help for height', type=int, nargs='?', default=200)
+  subparser.add_argument('nbFrames', help='Help for nbFrames', type=int, nargs='?', default=64)
+  subparser.add_argument('nbThreads', help='Help for nbThreads, 0 to use the PyTorch default', type=int, nargs='?', default=0)
+
+  subparser = subparsers.add_parser('benchmarkTracking', help='Help for benchmarkTracking')
+  subparser.add_argument('outputFolder', help='Help for outputFolder, in which the synthetic video and the results are saved')
+  subparser.add_argument('nbFrames', help='Help for nbFrames', type=int, nargs='?', default=300)
+  subparser.add_argument('nbRowsOfWells', help='Help for nbRowsOfWells', type=int, nargs='?', default=2)
+  subparser.add_argument('nbWellsPerRow', help='Help for nbWellsPerRow', type=int, nargs='?', default=2)
+
+  subparser = subparsers.add_parser('benchmarkTrackingProcesses', help='Help for benchmarkTrackingProcesses')
+  subparser.add_argument('outputFolder', help='Help for outputFolder, in which the synthetic video and the results are saved')
+  subparser.add_argument('nbFrames', help='Help for nbFrames', type=int, nargs='?', default=300)
+  subparser.add_argument('nbRowsOfWells', help='Help for nbRowsOfWells', type=int, nargs='?', default=8)
+  subparser.add_argument('nbWellsPerRow', help='Help for nbWellsPerRow', type=int, nargs='?', default=12)
+  subparser.add_argument('method', help='Help for method', nargs='?', default='fastFishTracking.tracking')
+  subparser.add_argument('--nbProcesses', help='Help for nbProcesses, by default 1, 2, 4... up to the number of CPUs', type=int, nargs='*', default=[])
+
+  subparser = subparsers.add_parser('batchScheduler', help='Help for batchScheduler, which tracks a queue of videos without the GUI and can be resumed if it is stopped')
+  batchSchedulerSubparsers = subparser.add_subparsers(dest='batchAction', required=True, help='Help message for batchScheduler action')
+
+  subparser = batchSchedulerSubparsers.add_parser('add', help='Help for add, videos already in the queue with the same configuration and hyperparameters are not added again')
+  subparser.add_argument('configFile', help='Help for configFile')
+  subparser.add_argument('videoPaths', nargs='+', help='Help for videoPaths')
+  subparser.add_argument('--hyperparameters', nargs='*', default=[], help='Help for hyperparameters, given as name value pairs')
+
+  subparser = batchSchedulerSubparsers.add_parser('run', help='Help for run, which tracks the pending videos of the queue, the most expensive first')
+  subparser.add_argument('--cpus', type=int, help='Help for cpus, the maximum total number of processes used by the videos tracked at the same time (by default the number of CPUs)')
+  subparser.add_argument('--memory', type=float, help='Help for memory, the maximum total estimated memory of the videos tracked at the same time, in GB (by default 80%% of the physical memory)')
+  subparser.add_argument('--maxAttempts', type=int, default=2, help='Help for maxAttempts, the number of times a video is tracked before it is marked as failed')
+
+  batchSchedulerSubparsers.add_parser('status', help='Help for status')
+
+  batchSchedulerSubparsers.add_parser('retry', help='Help for retry, which puts the failed videos back in the queue')
+
+  for subparser in batchSchedulerSubparsers.choices.values():
+    subparser.add_argument('--queue', help='Help for queue, the path of the queue (by default batchQueue.sqlite in the ZebraZoom folder)')
+
   subparser = subparsers.add_parser('DL_createMask', help='Help for DL_createMask')
   subparser.add_argument('pathToImgFolder', help='Help for pathToImgFolder')
 
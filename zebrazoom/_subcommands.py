@@ -45,6 +45,38 @@ def convertSeqToAviThenLaunchTracking(args):
   __spec__ = "ModuleSpec(name='builtins', loader=<class '_frozen_importlib.BuiltinImporter'>)"
   ZebraZoomVideoAnalysis(path2, args.videoName, 'avi', args.configFile, args.hyperparameters, useGUI=False).run()
 
+def benchmarkPrefetching(args):
+  from zebrazoom.videoFormatConversion.benchmarkPrefetching import benchmarkPrefetching, createSyntheticVideo
+  if not os.path.exists(args.videoPath):
+    createSyntheticVideo(args.videoPath)
+  benchmarkPrefetching(args.videoPath, args.queueSize, args.simulatedProcessingTime)
+
+def benchmarkDLinference(args):
+  from zebrazoom.code.deepLearningFunctions.benchmarkDLinference import benchmarkDLinference
+  benchmarkDLinference(args.pathToSavedModel, args.unet, args.width, args.height, args.nbFrames, nbThreads=args.nbThreads)
+
+def benchmarkTracking(args):
+  from zebrazoom.code.benchmarkTracking import benchmarkTracking
+  benchmarkTracking(args.outputFolder, args.nbFrames, args.nbRowsOfWells, args.nbWellsPerRow)
+
+def benchmarkTrackingProcesses(args):
+  from zebrazoom.code.benchmarkTracking import benchmarkTrackingProcesses
+  benchmarkTrackingProcesses(args.outputFolder, args.nbFrames, args.nbRowsOfWells, args.nbWellsPerRow, args.method, args.nbProcesses or None)
+
+def batchScheduler(args):
+  import zebrazoom.code.batchScheduler as batchScheduler
+  if args.batchAction == 'add':
+    nbJobs = batchScheduler.addJobs(args.videoPaths, args.configFile, args.hyperparameters, queuePath=args.queue)
+    print("%d videos added to the queue" % nbJobs)
+  elif args.batchAction == 'run':
+    __spec__ = "ModuleSpec(name='builtins', loader=<class '_frozen_importlib.BuiltinImporter'>)"
+    memory = None if args.memory is None else args.memory * 1024 ** 3
+    batchScheduler.runJobs(cpus=args.cpus, memory=memory, maxAttempts=args.maxAttempts, queuePath=args.queue)
+  elif args.batchAction == 'retry':
+    print("%d failed videos put back in the queue" % batchScheduler.retryFailedJobs(queuePath=args.queue))
+  for job in batchScheduler.getJobs(queuePath=args.queue):
+    print("%-8s %s (attempts: %d)%s" % (job['status'], job['videoPath'], job['attempts'], '' if job['resultsPath'] is None else ' -> ' + job['resultsPath']))
+
 def DL_createMask(args):
   from zebrazoom.code.deepLearningFunctions.labellingFunctions import createMask
   pathToImgFolder = args.pathToImgFolder
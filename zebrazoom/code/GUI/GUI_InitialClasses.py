@@ -641,6 +641,40 @@ def _findResultsFile(path):
   return os.path.join(path, resultsFile)
 
 
+def _getTailAngleForAllBoutsCombined(numWell, numPoiss, dataRef, visualization):
+  tailAngleFinal = []
+  xaxisFinal = []
+  if "firstFrame" in dataRef and "lastFrame" in dataRef:
+    begMove = 0
+    endMove = dataRef["wellPoissMouv"][numWell][numPoiss][0]["BoutStart"]
+    xaxis     = [i for i in range(begMove, endMove)]
+    tailAngle = [0 for i in range(begMove, endMove)]
+    tailAngleFinal = tailAngleFinal + tailAngle
+    xaxisFinal = xaxisFinal + xaxis
+  for numMouv in range(0, len(dataRef["wellPoissMouv"][numWell][numPoiss])):
+    if (visualization == 0):
+      tailAngle = list(dataRef["wellPoissMouv"][numWell][numPoiss][numMouv]["TailAngle_smoothed"])
+    else:
+      tailAngle = list(dataRef["wellPoissMouv"][numWell][numPoiss][numMouv]["TailAngle_Raw"])
+    for ind,val in enumerate(tailAngle):
+      tailAngle[ind]=tailAngle[ind]*(180/(math.pi))
+    begMove = dataRef["wellPoissMouv"][numWell][numPoiss][numMouv]["BoutStart"]
+    endMove = begMove + len(tailAngle)
+    xaxis = [i for i in range(begMove-1,endMove+1)]
+    tailAngle.append(0)
+    tailAngle.insert(0, 0)
+    tailAngleFinal = tailAngleFinal + tailAngle
+    xaxisFinal = xaxisFinal + xaxis
+  if "firstFrame" in dataRef and "lastFrame" in dataRef:
+    begMove = endMove
+    endMove = dataRef["lastFrame"] - 1
+    xaxis     = [i for i in range(begMove, endMove)]
+    tailAngle = [0 for i in range(begMove, endMove)]
+    tailAngleFinal = tailAngleFinal + tailAngle
+    xaxisFinal = xaxisFinal + xaxis
+  return xaxisFinal, tailAngleFinal
+
+
 class _VisualizationTreeItem:
   def childCount(self):
     return 0
@@ -1343,7 +1377,7 @@ class ViewParameters(util.CollapsibleSplitter):
           try:
             from zebrazoom.dataAPI._createSuperStructFromH5 import createSuperStructFromH5
             with h5py.File(fullPath, 'r') as results:
-              self.dataRef = createSuperStructFromH5(results)
+              self.dataRef = createSuperStructFromH5(results, lazy=True)
               import numpy as np
               self._config = {key: value.item() if isinstance(value, np.number) else value if not isinstance(value, np.ndarray) else value.tolist() for key, value in results['configurationFileUsed'].attrs.items()}
           except:
@@ -1411,7 +1445,7 @@ class ViewParameters(util.CollapsibleSplitter):
 
             if self.visualization == 0:
 
-              tailAngleSmoothed = self.dataRef["wellPoissMouv"][self.numWell()][self.numPoiss()][self.numMouv()]["TailAngle_smoothed"].copy()
+              tailAngleSmoothed = list(self.dataRef["wellPoissMouv"][self.numWell()][self.numPoiss()][self.numMouv()]["TailAngle_smoothed"])
 
               for ind,val in enumerate(tailAngleSmoothed):
                 tailAngleSmoothed[ind]=tailAngleSmoothed[ind]*(180/(math.pi))
@@ -1426,8 +1460,8 @@ class ViewParameters(util.CollapsibleSplitter):
                 freqY = freqY * (180/(math.pi))
               else:
                 if "Bend_Timing" in self.dataRef["wellPoissMouv"][self.numWell()][self.numPoiss()][self.numMouv()]:
-                  freqX = self.dataRef["wellPoissMouv"][self.numWell()][self.numPoiss()][self.numMouv()]["Bend_Timing"].copy()
-                  freqY = self.dataRef["wellPoissMouv"][self.numWell()][self.numPoiss()][self.numMouv()]["Bend_Amplitude"].copy()
+                  freqX = list(self.dataRef["wellPoissMouv"][self.numWell()][self.numPoiss()][self.numMouv()]["Bend_Timing"])
+                  freqY = list(self.dataRef["wellPoissMouv"][self.numWell()][self.numPoiss()][self.numMouv()]["Bend_Amplitude"])
                 else:
                   freqX = []
                   freqY = []
@@ -1457,7 +1491,7 @@ class ViewParameters(util.CollapsibleSplitter):
                 self.a.legend([tailAngle, bend], ['Tail angle', 'Bend'])
             elif self.visualization == 1:
 
-              tailAngleSmoothed = self.dataRef["wellPoissMouv"][self.numWell()][self.numPoiss()][self.numMouv()]["TailAngle_Raw"].copy()
+              tailAngleSmoothed = list(self.dataRef["wellPoissMouv"][self.numWell()][self.numPoiss()][self.numMouv()]["TailAngle_Raw"])
               for ind,val in enumerate(tailAngleSmoothed):
                 tailAngleSmoothed[ind]=tailAngleSmoothed[ind]*(180/(math.pi))
 
@@ -1504,8 +1538,8 @@ class ViewParameters(util.CollapsibleSplitter):
                     self.a.plot([i for i in range(bStart, bEnd + 1)], [t*(180/math.pi) for t in tailAngle])
 
             else:
-              headX = self.dataRef["wellPoissMouv"][self.numWell()][self.numPoiss()][self.numMouv()]["HeadX"].copy()
-              headY = self.dataRef["wellPoissMouv"][self.numWell()][self.numPoiss()][self.numMouv()]["HeadY"].copy()
+              headX = list(self.dataRef["wellPoissMouv"][self.numWell()][self.numPoiss()][self.numMouv()]["HeadX"])
+              headY = list(self.dataRef["wellPoissMouv"][self.numWell()][self.numPoiss()][self.numMouv()]["HeadY"])
 
 
               if not(self.graphScaling):
@@ -1608,36 +1642,7 @@ class ViewParameters(util.CollapsibleSplitter):
       with plt.ion():
         if (visualization == 0) or (visualization == 1):
 
-          tailAngleFinal = []
-          xaxisFinal = []
-          if "firstFrame" in dataRef and "lastFrame" in dataRef:
-            begMove = 0
-            endMove = dataRef["wellPoissMouv"][numWell][numPoiss][0]["BoutStart"]
-            xaxis     = [i for i in range(begMove, endMove)]
-            tailAngle = [0 for i in range(begMove, endMove)]
-            tailAngleFinal = tailAngleFinal + tailAngle
-            xaxisFinal = xaxisFinal + xaxis
-          for numMouv in range(0, len(dataRef["wellPoissMouv"][numWell][numPoiss])):
-            if (visualization == 0):
-              tailAngle = dataRef["wellPoissMouv"][numWell][numPoiss][numMouv]["TailAngle_smoothed"].copy()
-            else:
-              tailAngle = dataRef["wellPoissMouv"][numWell][numPoiss][numMouv]["TailAngle_Raw"].copy()
-            for ind,val in enumerate(tailAngle):
-              tailAngle[ind]=tailAngle[ind]*(180/(math.pi))
-            begMove = dataRef["wellPoissMouv"][numWell][numPoiss][numMouv]["BoutStart"]
-            endMove = begMove + len(tailAngle)
-            xaxis = [i for i in range(begMove-1,endMove+1)]
-            tailAngle.append(0)
-            tailAngle.insert(0, 0)
-            tailAngleFinal = tailAngleFinal + tailAngle
-            xaxisFinal = xaxisFinal + xaxis
-          if "firstFrame" in dataRef and "lastFrame" in dataRef:
-            begMove = endMove
-            endMove = dataRef["lastFrame"] - 1
-            xaxis     = [i for i in range(begMove, endMove)]
-            tailAngle = [0 for i in range(begMove, endMove)]
-            tailAngleFinal = tailAngleFinal + tailAngle
-            xaxisFinal = xaxisFinal + xaxis
+          xaxisFinal, tailAngleFinal = _getTailAngleForAllBoutsCombined(numWell, numPoiss, dataRef, visualization)
           if "fps" in dataRef:
             plt.plot([xaxisFinalVal / dataRef["fps"] for xaxisFinalVal in xaxisFinal], tailAngleFinal)
           else:
@@ -0,0 +1,235 @@
+import contextlib
+import json
+import multiprocessing
+import multiprocessing.connection
+import os
+import sqlite3
+import sys
+import time
+import traceback
+
+from zebrazoom.code import paths
+
+
+_BASE_MEMORY = 500 * 1024 ** 2  # memory used by each tracking process independently of the size of the video (Python, OpenCV, results...)
+_NB_FRAMES_IN_MEMORY = 10  # frames held at once by each tracking process, besides those used for the background calculation and the prefetching queue
+_DEFAULT_MEMORY_FRACTION = 0.8  # fraction of the physical memory used by default
+_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS jobs (id INTEGER PRIMARY KEY AUTOINCREMENT, videoPath TEXT NOT NULL, configFile TEXT NOT NULL, hyperparameters TEXT NOT NULL,
+                                 status TEXT NOT NULL DEFAULT 'pending', attempts INTEGER NOT NULL DEFAULT 0, estimatedCost REAL, nbProcesses INTEGER, estimatedMemory REAL,
+                                 outputFolder TEXT, resultsPath TEXT, error TEXT, added REAL, started REAL, finished REAL,
+                                 UNIQUE (videoPath, configFile, hyperparameters));
+CREATE INDEX IF NOT EXISTS jobsByStatus ON jobs (status, estimatedCost);
+'''
+
+
+def _getQueuePath(queuePath):
+  path = queuePath or paths.getBatchQueuePath()
+  folder = os.path.dirname(path)
+  if folder and not os.path.exists(folder):
+    os.makedirs(folder)
+  return path
+
+
+@contextlib.contextmanager
+def _openQueue(queuePath=None):
+  with contextlib.closing(sqlite3.connect(_getQueuePath(queuePath), timeout=30)) as queue:
+    queue.row_factory = sqlite3.Row
+    queue.executescript(_SCHEMA)
+    with queue:
+      yield queue
+
+
+@contextlib.contextmanager
+def _lockQueue(queuePath=None):
+  '''Prevents two schedulers from running the jobs of the same queue. The lock is released by the OS if the scheduler crashes.'''
+  with open(_getQueuePath(queuePath) + '.lock', 'a') as lockFile:
+    try:
+      if sys.platform.startswith('win'):
+        import msvcrt
+        msvcrt.locking(lockFile.fileno(), msvcrt.LK_NBLCK, 1)
+      else:
+        import fcntl
+        fcntl.flock(lockFile, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+      raise RuntimeError('Another scheduler is already running the jobs of this queue') from None
+    yield
+
+
+def _estimateResources(videoPath, configFile, hyperparameters):
+  '''
+  Returns the number of pixels to process (used to run the most expensive videos first), the number of processes used by the tracking,
+  the estimated memory (in bytes) and the output folder.
+  '''
+  from zebrazoom.code.getHyperparameters import getHyperparameters
+
+  with contextlib.redirect_stdout(None):
+    hyperparameters = getHyperparameters(configFile, os.path.basename(videoPath), videoPath, hyperparameters)[0]
+  frameSize = hyperparameters['videoWidth'] * hyperparameters['videoHeight']
+  nbFrames = max(hyperparameters['lastFrame'] - hyperparameters['firstFrame'], 1)
+  # the default tracking tracks each well in its own process
+  nbProcesses = max(hyperparameters['nbWells'], 1) if hyperparameters.get('trackingImplementation', 'tracking') == 'tracking' and not hyperparameters['fasterMultiprocessing'] \
+      and not hyperparameters['headEmbeded'] and hyperparameters['onlyTrackThisOneWell'] == -1 else 1
+  # the implementations tracking all the wells from a single reading of the video can split them between processes
+  nbProcessesHyperparameter = 'fastFishTrackingNbProcesses' if hyperparameters.get('trackingImplementation') == 'fastFishTracking.tracking' else \
+      'fasterMultiprocessingNbProcesses' if hyperparameters['fasterMultiprocessing'] else None
+  if nbProcessesHyperparameter is not None and hyperparameters['onlyTrackThisOneWell'] == -1:
+    nbProcesses = min(max(int(hyperparameters[nbProcessesHyperparameter]), 1), max(hyperparameters['nbWells'], 1))
+  nbFramesInMemory = _NB_FRAMES_IN_MEMORY * nbProcesses + hyperparameters['nbImagesForBackgroundCalculation'] + hyperparameters['prefetchFramesQueueSize']
+  return nbFrames * frameSize, nbProcesses, _BASE_MEMORY * nbProcesses + 3 * frameSize * nbFramesInMemory, hyperparameters['outputFolder']
+
+
+def getTotalMemory():
+  '''Returns the physical memory of the computer (in bytes), or None if it cannot be determined.'''
+  try:
+    return os.sysconf('SC_PAGE_SIZE') * os.sysconf('SC_PHYS_PAGES')
+  except (AttributeError, ValueError, OSError):
+    pass
+  if sys.platform.startswith('win'):
+    import ctypes
+
+    class MEMORYSTATUSEX(ctypes.Structure):
+      _fields_ = [('dwLength', ctypes.c_ulong), ('dwMemoryLoad', ctypes.c_ulong), ('ullTotalPhys', ctypes.c_ulonglong), ('ullAvailPhys', ctypes.c_ulonglong),
+                  ('ullTotalPageFile', ctypes.c_ulonglong), ('ullAvailPageFile', ctypes.c_ulonglong), ('ullTotalVirtual', ctypes.c_ulonglong),
+                  ('ullAvailVirtual', ctypes.c_ulonglong), ('ullAvailExtendedVirtual', ctypes.c_ulonglong)]
+    status = MEMORYSTATUSEX(dwLength=ctypes.sizeof(MEMORYSTATUSEX))
+    if ctypes.windll.kernel32.GlobalMemoryStatusEx(ctypes.byref(status)):
+      return status.ullTotalPhys
+  return None
+
+
+def addJobs(videoPaths, configFile, hyperparameters=(), queuePath=None):
+  '''
+  Adds the tracking of the videos with the configuration file and the hyperparameters ([name, value, name, value...]) to the queue.
+  Videos already in the queue with the same configuration and hyperparameters are not added again. Returns the number of added jobs.
+  '''
+  configFile = os.path.abspath(configFile)
+  hyperparameters = [str(value) for value in hyperparameters]
+  jobs = []
+  for videoPath in map(os.path.abspath, videoPaths):
+    if not os.path.exists(videoPath):
+      print('Video %s does not exist, it was not added to the queue' % videoPath)
+      continue
+    jobs.append((videoPath, configFile, json.dumps(hyperparameters), *_estimateResources(videoPath, configFile, hyperparameters), time.time()))
+  with _openQueue(queuePath) as queue:
+    nbJobs = queue.total_changes
+    queue.executemany('INSERT OR IGNORE INTO jobs (videoPath, configFile, hyperparameters, estimatedCost, nbProcesses, estimatedMemory, outputFolder, added) '
+                      'VALUES (?, ?, ?, ?, ?, ?, ?, ?)', jobs)
+    return queue.total_changes - nbJobs
+
+
+def getJobs(queuePath=None):
+  '''Returns the jobs of the queue, in the order in which they were added.'''
+  with _openQueue(queuePath) as queue:
+    jobs = [dict(row) for row in queue.execute('SELECT * FROM jobs ORDER BY id')]
+  for job in jobs:
+    job['hyperparameters'] = json.loads(job['hyperparameters'])
+  return jobs
+
+
+def retryFailedJobs(queuePath=None):
+  '''Puts the failed jobs back in the queue. Returns the number of jobs put back.'''
+  with _openQueue(queuePath) as queue:
+    return queue.execute("UPDATE jobs SET status = 'pending', attempts = 0, error = NULL WHERE status = 'failed'").rowcount
+
+
+def _runJob(videoPath, configFile, hyperparameters, connection):
+  from zebrazoom.zebraZoomVideoAnalysis import ZebraZoomVideoAnalysis
+
+  try:
+    videoName, videoExt = os.path.splitext(os.path.basename(videoPath))
+    ZebraZoomVideoAnalysis(os.path.dirname(videoPath), videoName, videoExt[1:], configFile, hyperparameters, useGUI=False).run()
+  except BaseException:
+    connection.send(traceback.format_exc())
+    raise
+
+
+def _startJob(job):
+  receiver, sender = multiprocessing.Pipe(duplex=False)
+  process = multiprocessing.Process(target=_runJob, args=(job['videoPath'], job['configFile'], json.loads(job['hyperparameters']), sender))
+  process.start()
+  sender.close()
+  return process, receiver
+
+
+def _selectJob(pendingJobs, runningJobs, cpus, memory):
+  '''
+  Returns the most expensive pending job which fits in the CPUs and the memory left by the running jobs.
+  A job is always returned if none are running, even if it does not fit.
+  '''
+  if not pendingJobs:
+    return None
+  if not runningJobs:
+    return pendingJobs[0]
+  availableCpus = cpus - sum(job['nbProcesses'] for job in runningJobs)
+  availableMemory = None if memory is None else memory - sum(job['estimatedMemory'] for job in runningJobs)
+  for job in pendingJobs:
+    if job['nbProcesses'] <= availableCpus and (availableMemory is None or job['estimatedMemory'] <= availableMemory):
+      return job
+  return None
+
+
+def runJobs(cpus=None, memory=None, maxAttempts=2, queuePath=None):
+  '''
+  Runs the pending jobs of the queue, the most expensive first, until there are none left.
+  The videos tracked at the same time use at most cpus processes in total (by default the number of CPUs) and their total estimated memory is kept
+  below memory (in bytes, by default 80% of the physical memory). Failed jobs are retried up to maxAttempts times in total. The state of the jobs
+  is stored in the queue, so if the scheduler is stopped or crashes, calling this function again resumes the jobs which were not completed.
+  '''
+  from zebrazoom.code.resultsCatalog import findResultsFile
+
+  if cpus is None:
+    cpus = os.cpu_count() or 1
+  if memory is None:
+    totalMemory = getTotalMemory()
+    memory = None if totalMemory is None else totalMemory * _DEFAULT_MEMORY_FRACTION
+  with _lockQueue(queuePath):
+    with _openQueue(queuePath) as queue:
+      resumedJobs = queue.execute("UPDATE jobs SET status = 'pending', started = NULL WHERE status = 'running'").rowcount
+    if resumedJobs:
+      print('Resuming %d interrupted jobs' % resumedJobs)
+    runningJobs = {}
+    try:
+      while True:
+        with _openQueue(queuePath) as queue:
+          pendingJobs = [dict(row) for row in queue.execute("SELECT * FROM jobs WHERE status = 'pending' ORDER BY estimatedCost DESC, id")]
+          while True:
+            job = _selectJob(pendingJobs, [job for job, _, _ in runningJobs.values()], cpus, memory)
+            if job is None:
+              break
+            pendingJobs.remove(job)
+            queue.execute("UPDATE jobs SET status = 'running', attempts = attempts + 1, started = ? WHERE id = ?", (time.time(), job['id']))
+            queue.commit()
+            print('Starting the tracking of %s' % job['videoPath'])
+            runningJobs[job['id']] = (job, *_startJob(job))
+        if not runningJobs:
+          break
+        multiprocessing.connection.wait([process.sentinel for _, process, _ in runningJobs.values()])
+        for jobId, (job, process, receiver) in list(runningJobs.items()):
+          if process.is_alive():
+            continue
+          process.join()
+          del runningJobs[jobId]
+          try:
+            error = receiver.recv()
+          except EOFError:  # the tracking succeeded, or the process was killed before it could send the error
+            error = None
+          receiver.close()
+          if process.exitcode and error is None:
+            error = 'The tracking process exited with code %d' % process.exitcode
+          with _openQueue(queuePath) as queue:
+            if error is None:
+              resultsPath = findResultsFile(job['outputFolder'], os.path.splitext(os.path.basename(job['videoPath']))[0])
+              queue.execute("UPDATE jobs SET status = 'done', resultsPath = ?, error = NULL, finished = ? WHERE id = ?", (resultsPath, time.time(), jobId))
+              print('Tracking of %s done' % job['videoPath'])
+            else:
+              status = 'pending' if job['attempts'] + 1 < maxAttempts else 'failed'
+              queue.execute('UPDATE jobs SET status = ?, error = ?, finished = ? WHERE id = ?', (status, error, time.time(), jobId))
+              print('Tracking of %s failed%s:\n%s' % (job['videoPath'], ', it will be retried' if status == 'pending' else '', error))
+    finally:
+      if runningJobs:
+        for _, process, _ in runningJobs.values():
+          process.terminate()
+          process.join()
+        with _openQueue(queuePath) as queue:
+          queue.executemany("UPDATE jobs SET status = 'pending', attempts = attempts - 1, started = NULL WHERE id = ?", ((jobId,) for jobId in runningJobs))
@@ -0,0 +1,182 @@
+import contextlib
+import io
+import json
+import math
+import os
+import traceback
+
+import numpy as np
+
+import zebrazoom.code.tracking
+import zebrazoom.code.tracking.customTrackingImplementations
+from zebrazoom.code.getHyperparameters import getHyperparameters
+from zebrazoom.code.profiling import measure
+from zebrazoom.code.syntheticZebrafishVideo import createSyntheticZebrafishVideo
+
+
+_CONFIG = {"nbAnimalsPerWell": 1, "minPixelDiffForBackExtract": 20, "thresholdForBlobImg": 200, "headSize": 8, "minArea": 30, "maxArea": 400,
+           "minAreaBody": 50, "maxAreaBody": 800, "thresForDetectMovementWithRawVideo": 18, "minNbPixelForDetectMovementWithRawVideo": 5,
+           "frameGapComparision": 1, "halfDiameterRoiBoutDetect": 50, "nbImagesForBackgroundCalculation": 20,
+           "noChecksForBoutSelectionInExtractParams": 1, "createValidationVideo": 0, "nbTailPoints": 10}
+
+_TRACKING_METHODS_CONFIG = {
+  'tracking': {},
+  'fasterMultiprocessing': {"fasterMultiprocessing": 1, "trackTail": 0},  # the tail tracking of this implementation is currently broken
+  'fasterMultiprocessing2': {"fasterMultiprocessing": 2},
+  'fastFishTracking.tracking': {"trackingImplementation": "fastFishTracking.tracking", "backgroundExtractionWithOnlyTwoFrames": 1,
+                                "authorizedRelativeLengthTailEnd": 0.6, "thetaDiffAcceptAfterAuthorizedRelativeLengthTailEnd": 1.6, "nbList": 20,
+                                "nbListAfterAuthorizedRelativeLengthTailEnd": 25, "thetaDiffAccept": 1.6, "authorizedRelativeLengthTailEnd2": 0.8,
+                                "thetaDiffAcceptAfterAuthorizedRelativeLengthTailEnd2": 0.6, "nbListAfterAuthorizedRelativeLengthTailEnd2": 25,
+                                "maximumMedianValueOfAllPointsAlongTheTail": 250, "headEmbededParamTailDescentPixThreshStop": 250,
+                                "minimumHeadPixelValue": 240, "backgroundSubtractionOnWholeImage": 0, "backgroundSubtractionOnROIhalfDiameter": 90,
+                                "chooseWellsToRunTrackingOnWithFirstAndLastFrame": 0, "maxDepth": 30, "steps": [8, 12, 16], "paramGaussianBlur": 13,
+                                "detectBouts": 0},
+}
+
+# hyperparameter setting the number of processes among which the wells are split, for the methods tracking all the wells from a single reading of the video
+_NB_PROCESSES_HYPERPARAMETERS = {'fasterMultiprocessing': 'fasterMultiprocessingNbProcesses', 'fasterMultiprocessing2': 'fasterMultiprocessingNbProcesses',
+                                 'fastFishTracking.tracking': 'fastFishTrackingNbProcesses'}
+
+
+def _matchBouts(trueBouts, detectedBouts):
+  '''Matches each true bout with the detected bout overlapping it the most (if they overlap over at least half of their union)'''
+  matches = []
+  for trueStart, trueEnd in trueBouts:
+    bestMatch = None
+    bestOverlap = 0.5
+    for detectedStart, detectedEnd in detectedBouts:
+      intersection = min(trueEnd, detectedEnd) - max(trueStart, detectedStart) + 1
+      union = max(trueEnd, detectedEnd) - min(trueStart, detectedStart) + 1
+      if intersection / union >= bestOverlap:
+        bestMatch = (detectedStart, detectedEnd)
+        bestOverlap = intersection / union
+    if bestMatch is not None:
+      matches.append(((trueStart, trueEnd), bestMatch))
+  return matches
+
+
+def _median(values):
+  return float(np.median(values)) if len(values) else None
+
+
+def evaluateTrackingAccuracy(results, groundTruth, firstFrame, lastFrame, tailTracked=True, boutsDetected=True):
+  '''
+  Compares the output of a tracking method (dict mapping well numbers to lists of bouts) with the ground truth returned
+  by createSyntheticZebrafishVideo. Positions are compared on all the frames of the bouts detected.
+  The errors on the tail and on the bouts are None when the tail wasn't tracked or the bouts weren't detected.
+  '''
+  headErrors = []
+  tailTipErrors = []
+  headingErrors = []
+  nbTrueBouts = nbDetectedBouts = nbMatchedBouts = 0
+  boundaryErrors = []
+  for wellNumber, wellBouts in results.items():
+    for bout in wellBouts:
+      if len(bout.get('HeadX', ())) != bout['BoutEnd'] - bout['BoutStart'] + 1:
+        continue
+      frames = np.arange(bout['BoutStart'], bout['BoutEnd'] + 1)
+      headErrors.extend(np.linalg.norm(np.column_stack((bout['HeadX'], bout['HeadY'])) - groundTruth['headPositions'][wellNumber, frames], axis=1))
+      if tailTracked and 'TailX_VideoReferential' in bout:
+        tailTips = np.array([(tailX[-1], tailY[-1]) for tailX, tailY in zip(bout['TailX_VideoReferential'], bout['TailY_VideoReferential'])])
+        if tailTips.shape == (len(frames), 2):
+          tailTipErrors.extend(np.linalg.norm(tailTips - groundTruth['tailPositions'][wellNumber, frames, -1], axis=1))
+      if 'Heading' in bout:
+        headingDiffs = (np.array(bout['Heading']) - groundTruth['heading'][wellNumber, frames]) % (2 * math.pi)
+        headingErrors.extend(np.minimum(headingDiffs, 2 * math.pi - headingDiffs))
+    if not boutsDetected:
+      continue
+    trueBouts = [(start, end) for start, end in groundTruth['bouts'][wellNumber] if start >= firstFrame and end <= lastFrame]
+    detectedBouts = [(bout['BoutStart'], bout['BoutEnd']) for bout in wellBouts]
+    matches = _matchBouts(trueBouts, detectedBouts)
+    nbTrueBouts += len(trueBouts)
+    nbDetectedBouts += len(detectedBouts)
+    nbMatchedBouts += len(matches)
+    boundaryErrors.extend(abs(trueStart - detectedStart) + abs(trueEnd - detectedEnd) for (trueStart, trueEnd), (detectedStart, detectedEnd) in matches)
+  return {'medianHeadError': _median(headErrors), 'medianTailTipError': _median(tailTipErrors), 'medianHeadingError': _median(headingErrors),
+          'boutRecall': nbMatchedBouts / nbTrueBouts if nbTrueBouts else None,
+          'boutPrecision': nbMatchedBouts / nbDetectedBouts if nbDetectedBouts else None,
+          'medianBoutBoundaryError': _median(boundaryErrors)}
+
+
+def _runTrackingMethod(method, videoPath, groundTruth, outputFolder, nbProcesses=0):
+  config = dict(_CONFIG, nbWells=len(groundTruth['wellPositions']), outputFolder=outputFolder, **_TRACKING_METHODS_CONFIG.get(method, {}))
+  if nbProcesses:
+    config[_NB_PROCESSES_HYPERPARAMETERS[method]] = nbProcesses
+  hyperparameters, _ = getHyperparameters(config, os.path.basename(videoPath), videoPath, [])
+  hyperparameters['videoNameWithTimestamp'] = f'benchmark_{method}'
+  tracking = zebrazoom.code.tracking.get_tracking_method(method)(videoPath, groundTruth['wellPositions'], hyperparameters)
+  if hasattr(tracking, 'useGUI'):
+    tracking.useGUI = False
+  measurements = []
+  with contextlib.redirect_stdout(io.StringIO()):
+    with measure(measurements, method):
+      results = tracking.run()
+  nbFrames = hyperparameters['lastFrame'] - hyperparameters['firstFrame'] + 1
+  # time spent tracking the frames only (without the background extraction and the extraction of parameters), for the methods which measure it
+  trackingFramesWallTime = next((stage['wallTime'] for stage in getattr(tracking, 'profiling', []) if stage['stage'] == 'trackingFrames'), None)
+  return dict(measurements[0], nbFrames=nbFrames, framesPerSecond=nbFrames / measurements[0]['wallTime'],
+              trackingFramesPerSecond=None if not trackingFramesWallTime else nbFrames / trackingFramesWallTime,
+              **evaluateTrackingAccuracy(results, groundTruth, hyperparameters['firstFrame'], hyperparameters['lastFrame'], tailTracked=hyperparameters['trackTail'],
+                                         boutsDetected=hyperparameters.get('detectBouts', 1) and not hyperparameters['noBoutsDetection']))
+
+
+def benchmarkTracking(outputFolder, nbFrames=300, nbRowsOfWells=2, nbWellsPerRow=2, methods=tuple(_TRACKING_METHODS_CONFIG)):
+  '''
+  Creates a synthetic video in outputFolder and runs each tracking method (including the extraction of parameters) on it.
+  Prints and saves in outputFolder/benchmarkTracking.json the speed of each method and the accuracy of its results.
+  '''
+  if not os.path.exists(outputFolder):
+    os.makedirs(outputFolder)
+  videoPath = os.path.join(outputFolder, 'syntheticZebrafishVideo.avi')
+  groundTruth = createSyntheticZebrafishVideo(videoPath, nbFrames=nbFrames, nbRowsOfWells=nbRowsOfWells, nbWellsPerRow=nbWellsPerRow)
+  report = {}
+  for method in methods:
+    try:
+      report[method] = _runTrackingMethod(method, videoPath, groundTruth, outputFolder)
+    except Exception:
+      report[method] = {'error': traceback.format_exc()}
+  with open(os.path.join(outputFolder, 'benchmarkTracking.json'), 'w') as f:
+    json.dump(report, f, indent=2)
+  for method, result in report.items():
+    if 'error' in result:
+      print("%s: failed:\n%s" % (method, result['error']))
+    else:
+      print("%s: %.1f frames per second ; median head error: %s px ; median tail tip error: %s px ; median heading error: %s rad ; bout recall: %s ; bout precision: %s"
+            % (method, result['framesPerSecond'], *(None if result[key] is None else round(result[key], 3) for key in ('medianHeadError', 'medianTailTipError', 'medianHeadingError', 'boutRecall', 'boutPrecision'))))
+  return report
+
+
+def benchmarkTrackingProcesses(outputFolder, nbFrames=300, nbRowsOfWells=8, nbWellsPerRow=12, method='fastFishTracking.tracking', nbProcessesList=None):
+  '''
+  Creates a synthetic video with many wells (one larva per well) in outputFolder and runs the tracking method on it with the wells split between
+  each number of processes of nbProcessesList (by default 1, 2, 4... up to the number of CPUs). Prints and saves in outputFolder/benchmarkTrackingProcesses.json
+  the speed of each run, its measured speedup compared to the first number of processes (for the whole run and, when the method measures it, for the tracking
+  of the frames only) and the accuracy of its results (which should not depend on the number of processes).
+  As the wells are split between the processes (the animals of a well always being tracked by the same process), the video must contain several wells.
+  '''
+  if method not in _NB_PROCESSES_HYPERPARAMETERS:
+    raise ValueError('The wells of %s cannot be split between processes, the method should be one of: %s' % (method, ', '.join(_NB_PROCESSES_HYPERPARAMETERS)))
+  if nbRowsOfWells * nbWellsPerRow < 2:
+    raise ValueError('The animals of a well are always tracked by the same process, the video must contain several wells to be tracked by several processes')
+  if nbProcessesList is None:
+    nbProcessesList = [2 ** power for power in range(int(math.log2(os.cpu_count() or 1)) + 1)]
+    if nbProcessesList[-1] != (os.cpu_count() or 1):
+      nbProcessesList.append(os.cpu_count())
+  if not os.path.exists(outputFolder):
+    os.makedirs(outputFolder)
+  videoPath = os.path.join(outputFolder, 'syntheticZebrafishVideoManyWells.avi')
+  groundTruth = createSyntheticZebrafishVideo(videoPath, nbFrames=nbFrames, nbRowsOfWells=nbRowsOfWells, nbWellsPerRow=nbWellsPerRow)
+  report = {nbProcesses: _runTrackingMethod(method, videoPath, groundTruth, outputFolder, nbProcesses=nbProcesses) for nbProcesses in nbProcessesList}
+  for result in report.values():
+    result['speedup'] = result['framesPerSecond'] / report[nbProcessesList[0]]['framesPerSecond']
+    result['trackingFramesSpeedup'] = None if result['trackingFramesPerSecond'] is None else result['trackingFramesPerSecond'] / report[nbProcessesList[0]]['trackingFramesPerSecond']
+  with open(os.path.join(outputFolder, 'benchmarkTrackingProcesses.json'), 'w') as f:
+    json.dump({'method': method, 'nbWells': len(groundTruth['wellPositions']), 'cpuCount': os.cpu_count(), 'nbProcesses': report}, f, indent=2)
+  for nbProcesses, result in report.items():
+    print("%s with %d processes: %.1f frames per second (speedup: %.2f%s) ; median head error: %s px ; median tail tip error: %s px"
+          % (method, nbProcesses, result['framesPerSecond'], result['speedup'],
+             '' if result['trackingFramesSpeedup'] is None else ' ; tracking of the frames only: %.1f frames per second, speedup: %.2f' % (result['trackingFramesPerSecond'], result['trackingFramesSpeedup']),
+             *(None if result[key] is None else round(result[key], 3) for key in ('medianHeadError', 'medianTailTipError'))))
+  if max(nbProcessesList) > (os.cpu_count() or 1):
+    print("Warning: this computer only has %d CPUs, the speedups measured with more processes than CPUs are not representative" % (os.cpu_count() or 1))
+  return report
@@ -6,22 +6,9 @@ from scipy.interpolate import UnivariateSpline
 import scipy.interpolate as interp
 import numpy as np
 from scipy.signal import find_peaks
-import pandas as pd
 import math
 
 
-def IsMinOrMax(maxpeaks, minpeaks, val ):
-  is_minOrMax = 0
-  r = len(maxpeaks)
-  for i in range(0,r):
-    if maxpeaks[i] == val:
-      is_minOrMax=1
-  r = len(minpeaks)
-  for i in range(0,r):
-    if minpeaks[i] == val:
-      is_minOrMax=1
-  return is_minOrMax
-
 # def calculateAllTailAngles(curbout, tailAngleSmoothingFactor, hyperparameters):
   # nbFramesTakenIntoAccount = len(curbout["TailAngle_Raw"])
   # fin = curbout["BoutEnd"] - curbout["BoutStart"] + 1
@@ -73,6 +60,45 @@ def IsMinOrMax(maxpeaks, minpeaks, val ):
   # return [tailangles_arr, tailangles_arr_smoothed]
 
 
+def _rollingMedianOfBouts(anglesRaw, rollingWindow):
+  '''
+  Centered rolling median of the tail angle of each bout, the first and last rollingWindow values of each bout being left unchanged.
+  The medians of all the bouts are calculated at once, on the concatenation of their tail angles.
+  '''
+  anglesMedian = [np.array(angleRaw, dtype=float) for angleRaw in anglesRaw]
+  if rollingWindow <= 0 or sum(len(angleMedian) for angleMedian in anglesMedian) < rollingWindow:
+    return anglesMedian
+  shift = rollingWindow // 2
+  medians = np.median(np.lib.stride_tricks.sliding_window_view(np.concatenate(anglesMedian), rollingWindow), axis=1)
+  offset = 0
+  for angleMedian in anglesMedian:
+    nbFrames = len(angleMedian)
+    if nbFrames > 2 * rollingWindow:
+      angleMedian[rollingWindow:nbFrames-rollingWindow] = medians[offset+shift+1:offset+nbFrames-2*rollingWindow+shift+1]
+    offset += nbFrames
+  return anglesMedian
+
+
+def _smoothTailAngle(angleMedian, tailAngleSmoothingFactor, maxNbFrames):
+  '''
+  Smoothing spline of the tail angle of a bout. The time taken by the spline fit can grow much faster than the number of frames,
+  so bouts longer than maxNbFrames (if not 0) are smoothed by overlapping segments of maxNbFrames frames blended linearly.
+  '''
+  nbFrames = len(angleMedian)
+  x = np.linspace(0, 1, nbFrames)
+  if not maxNbFrames or nbFrames <= maxNbFrames:
+    return UnivariateSpline(x, angleMedian, s=tailAngleSmoothingFactor)(x)
+  overlap = maxNbFrames // 4
+  segmentWeights = np.minimum(1, np.minimum(np.arange(1, maxNbFrames + 1), np.arange(maxNbFrames, 0, -1)) / (overlap + 1))
+  smoothed = np.zeros(nbFrames)
+  weights  = np.zeros(nbFrames)
+  for start in list(range(0, nbFrames - maxNbFrames, maxNbFrames - overlap)) + [nbFrames - maxNbFrames]:
+    end = start + maxNbFrames
+    smoothed[start:end] += segmentWeights * UnivariateSpline(x[start:end], angleMedian[start:end], s=tailAngleSmoothingFactor * maxNbFrames / nbFrames)(x[start:end])
+    weights[start:end]  += segmentWeights
+  return smoothed / weights
+
+
 def createSuperStruct(dataPerWell, wellPositions, hyperparameters, pathToOriginalVideo=''):
 
   if (hyperparameters["freqAlgoPosFollow"] != 0):
@@ -96,6 +122,10 @@ def createSuperStruct(dataPerWell, wellPositions, hyperparameters, pathToOrigina
     
     tab  = [[] for idAnimal in range(0, hyperparameters["nbAnimalsPerWell"])]
     
+    # Rolling median of the tail angle of all the bouts of the well which need to be smoothed
+    boutsToSmooth = [i for i in range(0, nbMouv) if hyperparameters["trackTail"] and ("TailAngle_Raw" in j[i]) and len(j[i]["TailAngle_Raw"]) > 10 and len(j[i]["TailAngle_Raw"]) < 10000 and hyperparameters["noBoutsDetection"] == 0]
+    anglesMedian  = dict(zip(boutsToSmooth, _rollingMedianOfBouts([j[i]["TailAngle_Raw"] for i in boutsToSmooth], hyperparameters["tailAngleMedianFilter"])))
+    
     for i in range(0, nbMouv):
       
       item = j[i]
@@ -104,25 +134,9 @@ def createSuperStruct(dataPerWell, wellPositions, hyperparameters, pathToOrigina
         
         angle_raw = item["TailAngle_Raw"]
         
-        if len(angle_raw) > 10 and len(angle_raw) < 10000 and hyperparameters["noBoutsDetection"] == 0:
+        if i in anglesMedian:
           
-          rolling_window = hyperparameters["tailAngleMedianFilter"]
-          if rolling_window > 0:
-            shift = int(-rolling_window / 2)
-            angle_median = np.array(pd.Series(angle_raw).rolling(rolling_window).median())
-            angle_median = np.roll(angle_median, shift)
-            for ii in range(0, rolling_window):
-              angle_median[ii] = angle_raw[ii]
-            for ii in range(len(angle_median)-rolling_window,len(angle_median)):
-              angle_median[ii] = angle_raw[ii]
-          else:
-            angle_median = angle_raw
-        
-          x = np.linspace(0, 1, len(angle_median))
-          
-          # if True: # Original method
-          s = UnivariateSpline(x, angle_median, s=tailAngleSmoothingFactor) # This might be non-terminating sometimes, need to investigate this in the future
-          TailAngle_smoothed = s(x) 
+          TailAngle_smoothed = _smoothTailAngle(anglesMedian[i], tailAngleSmoothingFactor, hyperparameters["tailAngleSmoothingMaxNbFrames"])
           
           item['TailAngle_smoothed'] = TailAngle_smoothed.tolist()
         else:
@@ -137,8 +151,8 @@ def createSuperStruct(dataPerWell, wellPositions, hyperparameters, pathToOrigina
         if hyperparameters['extractAdvanceZebraParameters']:
         
           maxDiffPeakToPeak = 0
-          maxAngle = max([TailAngle_smoothed[l] for l in range(0, len(TailAngle_smoothed))])
-          minAngle = min([TailAngle_smoothed[l] for l in range(0, len(TailAngle_smoothed))])
+          maxAngle = max(TailAngle_smoothed)
+          minAngle = min(TailAngle_smoothed)
           maxDiffPeakToPeak = maxAngle - minAngle
           
           minProminenceForBendsDetect = hyperparameters["minProminenceForBendsDetect"]
@@ -156,14 +170,12 @@ def createSuperStruct(dataPerWell, wellPositions, hyperparameters, pathToOrigina
             Bend_Timing = []
             lastTailValue = 100000
 
-            for i in range(item['BoutStart'],item['BoutEnd']+1):
-            
-              minOrMax = IsMinOrMax(maxpeaks, minpeaks, i - item['BoutStart'] )
+            peaks = np.sort(np.concatenate((maxpeaks, minpeaks)))
+            for peak in peaks[peaks <= item['BoutEnd'] - item['BoutStart']].tolist():
               
-              if minOrMax:
-                if (abs(lastTailValue - TailAngle_smoothed[i - item['BoutStart'] ]) > minDiffBetweenSubsequentBendAmp):
-                  Bend_Timing.append(i - item['BoutStart'] + 1) 
-                  lastTailValue = TailAngle_smoothed[i- item['BoutStart'] ]
+              if (abs(lastTailValue - TailAngle_smoothed[peak]) > minDiffBetweenSubsequentBendAmp):
+                Bend_Timing.append(peak + 1)
+                lastTailValue = TailAngle_smoothed[peak]
               
               if (len(Bend_Timing) == 1) and (abs(lastTailValue) < hyperparameters["minFirstBendValue"]):
                 Bend_Timing = []
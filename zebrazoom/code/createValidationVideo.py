@@ -6,6 +6,8 @@ import math
 import json
 import random
 import os
+import tempfile
+from multiprocessing import Pool
 
 
 def improveContrast(frame, hyperparameters):
@@ -200,6 +202,90 @@ def drawInfoFrame(frame, infoFrame, colorModifTab, hyperparameters):
         cv2.putText(frame, str(numAnimal), (int(x + 10), int(y + 10)), cv2.FONT_HERSHEY_SIMPLEX, 1, (red, green, blue), 2)
 
 
+_NB_WARM_UP_FRAMES = 5
+
+
+def _renderValidationVideoFrames(videoPath, hyperparameters, infoFrame, colorModifTab, firstFrame, lastFrame, out, frame_width, frame_height):
+  '''Draws the tracking points on the frames firstFrame to lastFrame - 1 of the video and writes them to out (infoFrame starts at firstFrame)'''
+  nbFramesWritten = 0
+  cap = zzVideoReading.VideoCapture(videoPath, hyperparameters)
+  cap.set(1, firstFrame)
+
+  for l in range(firstFrame, lastFrame):
+
+    if (hyperparameters["freqAlgoPosFollow"] != 0) and (l % hyperparameters["freqAlgoPosFollow"] == 0):
+      print("Validation video creation: frame:", l)
+
+    ret, frame = cap.read()
+
+    if hyperparameters["imagePreProcessMethod"]:
+      frame = preprocessImage(frame, hyperparameters)
+
+    if ret:
+      if hyperparameters["reduceImageResolutionPercentage"]:
+        frame = cv2.resize(frame, (int(frame_width * hyperparameters["reduceImageResolutionPercentage"]), int(frame_height * hyperparameters["reduceImageResolutionPercentage"])), interpolation = cv2.INTER_AREA)
+      if hyperparameters["outputValidationVideoContrastImprovement"]:
+        frame = improveContrast(frame, hyperparameters)
+
+      drawInfoFrame(frame, infoFrame[l - firstFrame], colorModifTab, hyperparameters)
+
+      out.write(frame)
+      nbFramesWritten += 1
+
+  cap.release()
+  return nbFramesWritten
+
+
+def _renderValidationVideoSegment(videoPath, hyperparameters, infoFrame, colorModifTab, warmUpFirstFrame, firstFrame, lastFrame, frame_width, frame_height, outputName, outputFps, outputSize):
+  '''Renders the frames warmUpFirstFrame to lastFrame - 1 in outputName and returns the number of frames written before firstFrame'''
+  out = cv2.VideoWriter(outputName, cv2.VideoWriter_fourcc('M','J','P','G'), outputFps, outputSize)
+  nbWarmUpFrames = _renderValidationVideoFrames(videoPath, hyperparameters, infoFrame, colorModifTab, warmUpFirstFrame, firstFrame, out, frame_width, frame_height)
+  _renderValidationVideoFrames(videoPath, hyperparameters, infoFrame[firstFrame - warmUpFirstFrame:], colorModifTab, firstFrame, lastFrame, out, frame_width, frame_height)
+  out.release()
+  return nbWarmUpFrames
+
+
+def _openVideoWriterForEncodedFrames(outputName, outputFps, outputSize):
+  '''Returns a writer to which already encoded MJPG frames can be written, or None if the installed version of OpenCV doesn't allow it'''
+  if not hasattr(cv2, 'VIDEOWRITER_PROP_RAW_VIDEO'):
+    return None
+  try:
+    out = cv2.VideoWriter(outputName, cv2.CAP_FFMPEG, cv2.VideoWriter_fourcc('M','J','P','G'), outputFps, outputSize, [cv2.VIDEOWRITER_PROP_RAW_VIDEO, 1])
+  except cv2.error:
+    return None
+  return out if out.isOpened() else None
+
+
+def _createValidationVideoInSegments(videoPath, hyperparameters, infoFrame, colorModifTab, firstFrame, lastFrame, frame_width, frame_height, out, outputName, outputFps, outputSize, nbProcesses):
+  '''
+  Renders consecutive segments of the validation video in parallel, each in a temporary video, and then copies the encoded frames
+  of these videos one after the other to out, so that the validation video is identical to the one rendered by a single process.
+  As the encoder compresses the first frames it receives differently, each segment (except the first) starts with a few frames
+  which are also in the previous segment and which are left out when copying the encoded frames.
+  '''
+  segmentBoundaries = np.linspace(firstFrame, lastFrame, nbProcesses + 1).astype(int)
+  with tempfile.TemporaryDirectory(dir=os.path.dirname(os.path.abspath(outputName))) as segmentsFolder:
+    segments = []
+    for idx, (start, end) in enumerate(zip(segmentBoundaries[:-1], segmentBoundaries[1:])):
+      if start < end:
+        warmUpStart = max(firstFrame, start - _NB_WARM_UP_FRAMES)
+        segments.append((videoPath, hyperparameters, infoFrame[warmUpStart:end], colorModifTab, warmUpStart, start, end, frame_width, frame_height,
+                         os.path.join(segmentsFolder, 'segment%d.avi' % idx), outputFps, outputSize))
+    with Pool(len(segments)) as pool:
+      nbWarmUpFrames = pool.starmap(_renderValidationVideoSegment, segments)
+    for segment, nbFramesToSkip in zip(segments, nbWarmUpFrames):
+      cap = cv2.VideoCapture(segment[-3], cv2.CAP_FFMPEG)
+      cap.set(cv2.CAP_PROP_FORMAT, -1)  # read the encoded frames without decoding them
+      ret, encodedFrame = cap.read()
+      while ret:
+        if nbFramesToSkip:
+          nbFramesToSkip -= 1
+        else:
+          out.write(encodedFrame)
+        ret, encodedFrame = cap.read()
+      cap.release()
+
+
 def createValidationVideo(videoPath, superStruct, hyperparameters, outputName=None):
 
   if (hyperparameters["freqAlgoPosFollow"] != 0):
@@ -216,6 +302,7 @@ def createValidationVideo(videoPath, superStruct, hyperparameters, outputName=No
   frame_height = int(cap.get(4))
   nbFrames     = int(cap.get(7))
   inputFps     = int(cap.get(5))
+  cap.release()
 
   colorModifTab = [{"red": random.randrange(255), "green": random.randrange(255), "blue": random.randrange(255)} for i in range(1, hyperparameters["nbAnimalsPerWell"])]
   colorModifTab.insert(0, {"red": 0, "green": 0, "blue": 0})
@@ -225,35 +312,19 @@ def createValidationVideo(videoPath, superStruct, hyperparameters, outputName=No
   outputFps = inputFps
   if hyperparameters["outputValidationVideoFps"] > 0:
     outputFps = int(hyperparameters["outputValidationVideoFps"])
-  
-  out = cv2.VideoWriter(outputName,cv2.VideoWriter_fourcc('M','J','P','G'), outputFps, (int(frame_width * hyperparameters["reduceImageResolutionPercentage"]), int(frame_height * hyperparameters["reduceImageResolutionPercentage"])))
+  outputSize = (int(frame_width * hyperparameters["reduceImageResolutionPercentage"]), int(frame_height * hyperparameters["reduceImageResolutionPercentage"]))
   
   if int(hyperparameters["onlyDoTheTrackingForThisNumberOfFrames"]) != 0:
     lastFrame = min(lastFrame, firstFrame + int(hyperparameters["onlyDoTheTrackingForThisNumberOfFrames"]))
+  lastFrame = max(firstFrame, min(lastFrame, nbFrames))
   
-  cap.set(1, firstFrame)
-  
-  for l in range(firstFrame, lastFrame):
-  
-    if l < nbFrames:
-    
-      if (hyperparameters["freqAlgoPosFollow"] != 0) and (l % hyperparameters["freqAlgoPosFollow"] == 0):
-        print("Validation video creation: frame:", l)
-    
-      ret, frame = cap.read()
-      
-      if hyperparameters["imagePreProcessMethod"]:
-        frame = preprocessImage(frame, hyperparameters)
-      
-      if ret:
-        if hyperparameters["reduceImageResolutionPercentage"]:
-          frame = cv2.resize(frame, (int(frame_width * hyperparameters["reduceImageResolutionPercentage"]), int(frame_height * hyperparameters["reduceImageResolutionPercentage"])), interpolation = cv2.INTER_AREA)
-        if hyperparameters["outputValidationVideoContrastImprovement"]:
-          frame = improveContrast(frame, hyperparameters)
-        
-        drawInfoFrame(frame, infoFrame[l], colorModifTab, hyperparameters)
-          
-        out.write(frame)
+  nbProcesses = min(int(hyperparameters["createValidationVideoNbProcesses"]), lastFrame - firstFrame)
+  out = _openVideoWriterForEncodedFrames(outputName, outputFps, outputSize) if nbProcesses > 1 else None
+  if out is not None:
+    _createValidationVideoInSegments(videoPath, hyperparameters, infoFrame, colorModifTab, firstFrame, lastFrame, frame_width, frame_height, out, outputName, outputFps, outputSize, nbProcesses)
+  else:
+    out = cv2.VideoWriter(outputName,cv2.VideoWriter_fourcc('M','J','P','G'), outputFps, outputSize)
+    _renderValidationVideoFrames(videoPath, hyperparameters, infoFrame[firstFrame:lastFrame], colorModifTab, firstFrame, lastFrame, out, frame_width, frame_height)
   
   out.release()
   
@@ -0,0 +1,65 @@
+import contextlib
+import time
+
+import h5py
+import numpy as np
+
+
+_DEFAULT_CHUNK_NB_FRAMES = 10000
+
+
+def _getDatasetOptions(hyperparameters, nbFrames):
+  '''Chunking and compression options of the datasets containing one row per frame.'''
+  compression = int(hyperparameters.get("storeH5Compression", 0))
+  chunkNbFrames = int(hyperparameters.get("storeH5ChunkNbFrames", 0))
+  if not compression and not chunkNbFrames or not nbFrames:
+    return {}
+  options = {'chunks': (min(chunkNbFrames or _DEFAULT_CHUNK_NB_FRAMES, nbFrames),)}
+  if compression:
+    options.update(compression='gzip', compression_opts=compression, shuffle=True)
+  return options
+
+
+@contextlib.contextmanager
+def openResultsFileForAppending(filename, timeout=600):
+  '''Opens the results file in append mode, waiting for the processes tracking the other wells to release it (for at most timeout seconds).'''
+  start = None
+  while True:
+    try:
+      results = h5py.File(filename, 'a')
+      break
+    except BlockingIOError:
+      if start is None:
+        print("The results file", filename, "is locked by another process, waiting for it to be released")
+        start = time.time()
+      elif time.time() - start > timeout:
+        raise TimeoutError("The results file %s is still locked by another process after %s seconds" % (filename, timeout))
+      time.sleep(0.05)
+  with results:
+    yield results
+
+
+def writeDataPerFrameColumns(group, name, columns, hyperparameters, h5Names=None):
+  '''
+  Writes a dataset containing one row per frame from a single column (1d dataset) or from a list of columns (compound dataset
+  with the fields h5Names). Rows are written by blocks of frames, so that the whole dataset never has to be copied in memory.
+  '''
+  if h5Names is None:
+    dtype = columns.dtype
+  else:
+    dtype = np.dtype(list(zip(h5Names, (column.dtype for column in columns))))
+  nbFrames = len(columns) if h5Names is None else len(columns[0])
+  dataset = group.create_dataset(name, shape=(nbFrames,), dtype=dtype, **_getDatasetOptions(hyperparameters, nbFrames))
+  if h5Names is not None:
+    dataset.attrs['columns'] = dtype.names
+  blockNbFrames = dataset.chunks[0] if dataset.chunks else _DEFAULT_CHUNK_NB_FRAMES
+  for start in range(0, nbFrames, blockNbFrames):
+    end = min(start + blockNbFrames, nbFrames)
+    if h5Names is None:
+      dataset[start:end] = columns[start:end]
+    else:
+      block = np.empty(end - start, dtype=dtype)
+      for h5Name, column in zip(h5Names, columns):
+        block[h5Name] = column[start:end]
+      dataset[start:end] = block
+  return dataset
@@ -27,7 +27,7 @@ def calculateSleepVsMovingPeriods(pathToZZoutput, vidName, speedThresholdForMovi
 
     try:
       with openResultsFile(os.path.join(pathToZZoutput, videoName), 'r') as results:
-        dataRef = createSuperStructFromH5(results)
+        dataRef = createSuperStructFromH5(results, lazy=True)
     except ValueError:  # h5 results not found, assume a results folder exists
       pathToVideo = os.path.join(pathToZZoutput, videoName, "results_" + videoName + ".txt")
       with open(pathToVideo) as ff:
@@ -2,6 +2,7 @@ import cv2
 import zebrazoom.videoFormatConversion.zzVideoReading as zzVideoReading
 from zebrazoom.code.extractParameters import calculateAngle
 from zebrazoom.code.extractParameters import calculateTailAngle
+from zebrazoom.code.dataPerFrameH5 import writeDataPerFrameColumns
 import h5py
 import os
 import shutil
@@ -318,10 +319,7 @@ def perBoutOutput(superStruct, hyperparameters, videoNameWithTimestamp):
           TailX_VideoReferential = np.column_stack([dataGroup['HeadPos']['X']] + [dataGroup['TailPosX'][col] for col in dataGroup['TailPosX'].attrs['columns']])
           TailY_VideoReferential = np.column_stack([dataGroup['HeadPos']['Y']] + [dataGroup['TailPosY'][col] for col in dataGroup['TailPosY'].attrs['columns']])
           curvature = list(np.flip(np.transpose(calculateCurvature(TailX_VideoReferential, TailY_VideoReferential, hyperparameters)), 0))
-          data = np.empty(len(curvature[0]), dtype=[(f'Pos{idx}', float) for idx in range(1, len(curvature) + 1)])
-          for idx, curvatureData in enumerate(curvature):
-            data[f'Pos{idx + 1}'] = curvatureData
-          dataset = dataGroup.create_dataset('curvature', data=data)
-          dataset.attrs['columns'] = data.dtype.names
+          writeDataPerFrameColumns(dataGroup, 'curvature', [np.asarray(curvatureData, dtype=float) for curvatureData in curvature], hyperparameters,
+                                   [f'Pos{idx}' for idx in range(1, len(curvature) + 1)])
 
   return superStruct
@@ -10,6 +10,9 @@ import pandas as pd
 import pickle
 import scipy as sp
 
+from zebrazoom.code.dataPerFrameH5 import writeDataPerFrameColumns
+
+
 def tailAnglesHeatMap(superStruct, hyperparameters, videoNameWithTimestamp):
   
   # Creation of the sub-folder "anglesHeatMap" 
@@ -107,8 +110,6 @@ def tailAnglesHeatMap(superStruct, hyperparameters, videoNameWithTimestamp):
           df.convert_dtypes().to_csv(f)
       if hyperparameters['storeH5'] and angleCount:
         with h5py.File(hyperparameters['H5filename'], 'a') as results:
-          arr = np.empty(nbFrames, dtype=[(f'Pos{idx}', float) for idx in range(1, angleCount + 1)])
-          for idx, data in enumerate(tailAngleHeatmapData):
-            arr[f'Pos{idx + 1}'] = data
-          dataset = results.create_dataset(f"dataForWell{i}/dataForAnimal{j}/dataPerFrame/tailAngleHeatmap", data=arr)
-          dataset.attrs['columns'] = arr.dtype.names
+          writeDataPerFrameColumns(results.require_group(f"dataForWell{i}/dataForAnimal{j}/dataPerFrame"), 'tailAngleHeatmap',
+                                   [np.asarray(data, dtype=float) for data in tailAngleHeatmapData], hyperparameters,
+                                   [f'Pos{idx}' for idx in range(1, angleCount + 1)])
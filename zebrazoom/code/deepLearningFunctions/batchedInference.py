@@ -0,0 +1,34 @@
+import numpy as np
+
+
+def normalizeFramesWithQuantiles(frames, quantile):
+  '''
+  Clips the pixels of each frame to its [quantile, 1 - quantile] quantiles and stretches the result to [0, 255].
+  frames is an uint8 array of shape (nbFrames, height, width).
+  '''
+  quantiles = np.quantile(frames.reshape(len(frames), -1), [quantile, 1 - quantile], axis=1)
+  lowVals, highVals = (np.floor(values).astype(np.uint8)[:, None, None] for values in quantiles)
+  frames = np.clip(frames, lowVals, highVals) - lowVals
+  return (frames * (255 / np.max(frames, axis=(1, 2), keepdims=True))).astype('uint8')
+
+
+def predictMasks(dlModel, curFrames, device, isUnet):
+  '''
+  Runs the model once on a batch of grayscale frames of shape (nbFrames, height, width).
+  Returns the predicted mask of each frame as an uint8 image, or None if Mask R-CNN did not detect anything on the frame.
+  '''
+  import torch
+  with torch.no_grad():
+    imgTorch = torch.from_numpy(curFrames / 255).to(device=device, dtype=torch.float32)
+    if isUnet:
+      import torch.nn.functional as F
+      output = dlModel(imgTorch.unsqueeze(1)).cpu()
+      output = F.interpolate(output, (curFrames.shape[2], curFrames.shape[1]), mode='bilinear')
+      if dlModel.n_classes > 1:
+        masks = output.argmax(dim=1)
+      else:
+        masks = torch.sigmoid(output[:, 0]) > 0.5
+      return [(mask.long().squeeze().numpy() * 255).astype('uint8') for mask in masks]
+    else:  # mask rcnn
+      predictions = dlModel([img.expand(3, -1, -1) for img in imgTorch])
+      return [prediction['masks'][0, 0].mul(255).byte().cpu().numpy() if len(prediction['masks']) else None for prediction in predictions]
@@ -0,0 +1,39 @@
+import os
+import time
+
+import numpy as np
+
+from zebrazoom.code.deepLearningFunctions.batchedInference import predictMasks
+
+
+def _timeInference(dlModel, frames, device, isUnet, batchSize):
+  start = time.perf_counter()
+  for firstFrame in range(0, len(frames), batchSize):
+    predictMasks(dlModel, frames[firstFrame:firstFrame+batchSize], device, isUnet)
+  return time.perf_counter() - start
+
+
+def benchmarkDLinference(pathToSavedModel, isUnet=True, width=200, height=200, nbFrames=64, batchSizes=(1, 2, 4, 8, 16), nbThreads=0):
+  '''
+  Measures the CPU throughput of the model used for tracking with DL on nbFrames random frames of size width x height,
+  for each of the batch sizes given (trackingDLbatchSize parameter). A randomly initialized UNet is used if pathToSavedModel doesn't exist.
+  '''
+  import torch
+  if nbThreads:
+    torch.set_num_threads(nbThreads)
+  device = torch.device('cpu')
+  if os.path.exists(pathToSavedModel):
+    from zebrazoom.code.deepLearningFunctions.loadDLmodel import loadDLmodel
+    dlModel = loadDLmodel(pathToSavedModel, isUnet).to(device)
+  else:
+    from zebrazoom.code.deepLearningFunctions.unetModel.unet_model import UNet
+    dlModel = UNet(n_channels=1, n_classes=2, bilinear=1).to(device).eval()
+    isUnet = True
+  frames = np.random.default_rng(0).integers(0, 256, (nbFrames, height, width), dtype=np.uint8)
+  _timeInference(dlModel, frames[:1], device, isUnet, 1)  # warm up
+  print("Threads used:", torch.get_num_threads())
+  durations = {}
+  for batchSize in batchSizes:
+    durations[batchSize] = _timeInference(dlModel, frames, device, isUnet, batchSize)
+    print("Batch size %d: %.1f frames per second" % (batchSize, nbFrames / durations[batchSize]))
+  return durations
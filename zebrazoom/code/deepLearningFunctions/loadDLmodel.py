@@ -1,3 +1,4 @@
+import functools
 import os
 import numpy as np
 import torch
@@ -47,3 +48,7 @@ def loadDLmodel(pathToSavedModel, isUnet):
   
   return model
 
+
+@functools.lru_cache(maxsize=1)
+def loadDLmodelOncePerProcess(pathToSavedModel, isUnet):
+  return loadDLmodel(pathToSavedModel, isUnet)
@@ -1,3 +1,5 @@
+from collections import deque
+
 import numpy as np
 import cv2
 import zebrazoom.videoFormatConversion.zzVideoReading as zzVideoReading
@@ -15,9 +17,7 @@ def putTabIntoBoundaries(img, tab):
     tab[1] = len(img) - 1
   return tab
 
-def getImagesAndTotDiff(head, rayon, cap1, cap2, videoPath, l, frameGapComparision, wellNumber, wellPositions, hyperparameters, firstFrame, lenX, lenY, thresForDetectMovementWithRawVideo, headPosition, tailTip):
-  from zebrazoom.code.tracking import get_default_tracking_method
-
+def getImagesAndTotDiff(head, rayon, img, imgFuture, l, hyperparameters, firstFrame, lenX, lenY, thresForDetectMovementWithRawVideo, headPosition, tailTip):
   headX = head[l-firstFrame][0]
   headY = head[l-firstFrame][1]
   xmin = headX - rayon
@@ -48,21 +48,8 @@ def getImagesAndTotDiff(head, rayon, cap1, cap2, videoPath, l, frameGapComparisi
     ymin = 0
     ymax = 0 + lenY - 1
   
-  if hyperparameters["adjustDetectMovWithRawVideo"]:
-    img       = cap1[l - firstFrame]
-    if l + frameGapComparision - firstFrame < len(cap1):
-      imgFuture = cap1[int(l + frameGapComparision - firstFrame)]
-    else:
-      imgFuture = cap1[len(cap1) - 1]
-  else:
-    tracking = get_default_tracking_method()(videoPath, wellPositions, hyperparameters)
-    img = tracking.getImageSequential(cap1, l, wellNumber)
-    imgFuture = tracking.getImageSequential(cap2, l+frameGapComparision, wellNumber)
-  
-  img2 = img.copy()
-  imgFuture2 = imgFuture.copy()
-  
-  res = img.copy()
+  img2 = img
+  imgFuture2 = imgFuture
   
   # cvSetImageROI(img2, cvRect(xmin,ymin,xmax-xmin,ymax-ymin))
   # cvSetImageROI(imgFuture2, cvRect(xmin,ymin,xmax-xmin,ymax-ymin))
@@ -84,6 +71,8 @@ def getImagesAndTotDiff(head, rayon, cap1, cap2, videoPath, l, frameGapComparisi
   
   blackCircleHalfDiam = hyperparameters["addBlackCircleOfHalfDiamOnHeadForBoutDetect"]
   if not(hyperparameters["noPreProcessingOfImageForBoutDetection"]) and blackCircleHalfDiam:
+    img22       = img22.copy()
+    imgFuture22 = imgFuture22.copy()
     cv2.circle(img22, (int(headX), int(headY)), int(blackCircleHalfDiam), (0, 0, 0), -1)
     cv2.circle(imgFuture22, (int(headX), int(headY)), int(blackCircleHalfDiam), (0, 0, 0), -1)
     # cv2.imshow("img22", img22)
@@ -120,17 +109,81 @@ def getImagesAndTotDiff(head, rayon, cap1, cap2, videoPath, l, frameGapComparisi
   
   totDiff = cv2.countNonZero(res)
   
-  return [img[ymin:ymax, xmin:xmax], res, totDiff, cap1, cap2]
+  return [img[ymin:ymax, xmin:xmax], res, totDiff]
 
   
+def _getWellFrame(grey, wellPosition):
+  return grey[wellPosition['topLeftY']:wellPosition['topLeftY']+wellPosition['lengthY'], wellPosition['topLeftX']:wellPosition['topLeftX']+wellPosition['lengthX']]
+
+
+def detectMovementWithRawVideoForWells(hyperparameters, videoPath, wellPositions, wellsHeads):
+  '''
+  Detects the movements of several animals (possibly in different wells) by comparing, around the head of each animal, each frame
+  with the frame frameGapComparision frames later. wellsHeads is a list of (wellNumber, head, headPositionFirstFrame, tailTipFirstFrame).
+  Each frame is only decoded once: the frames still needed are kept in a history buffer. Returns the list of the movements of each animal.
+  '''
+  from zebrazoom.code.tracking import get_default_tracking_method
+
+  firstFrame = hyperparameters["firstFrame"]
+  lastFrame  = hyperparameters["lastFrame"]
+  frameGapComparision = int(hyperparameters["frameGapComparision"])
+  mouvements = [[0] * (lastFrame-firstFrame+1) for _ in wellsHeads]
+  endFrame = min([lastFrame] + [firstFrame + len(head) for _, head, _, _ in wellsHeads])
+  if endFrame <= firstFrame:
+    return mouvements
+
+  tracking = get_default_tracking_method()(videoPath, wellPositions, hyperparameters)
+  # the preprocessing of the images may need the colors
+  cap = zzVideoReading.VideoCapture(videoPath, hyperparameters, grayscale=not hyperparameters["imagePreProcessMethod"])
+  cap.set(1, firstFrame)
+  history = deque(maxlen=frameGapComparision+1)
+  grey = None
+  for frameNumber in range(firstFrame, endFrame + frameGapComparision):
+    ret, frame = cap.read()
+    if ret:
+      grey = tracking.getGreyFrame(frame)
+    else:
+      print("WARNING: was not able to extract the frame", str(frameNumber),"in 'detectMovementWithRawVideo'")
+      if grey is None:
+        break
+    history.append(grey)
+    l = frameNumber - frameGapComparision
+    if l < firstFrame:
+      continue
+
+    if (hyperparameters["freqAlgoPosFollow"] != 0) and (l % hyperparameters["freqAlgoPosFollow"] == 0):
+      print("Detect movement with raw video: frame:", l)
+
+    for mouvement, (wellNumber, head, headPositionFirstFrame, tailTipFirstFrame) in zip(mouvements, wellsHeads):
+      lenX = int(wellPositions[wellNumber]["lengthX"])
+      lenY = int(wellPositions[wellNumber]["lengthY"])
+      img = _getWellFrame(history[0], wellPositions[wellNumber])
+      imgFuture = _getWellFrame(history[-1], wellPositions[wellNumber])
+      [img, res, totDiff] = getImagesAndTotDiff(head, hyperparameters["halfDiameterRoiBoutDetect"], img, imgFuture, l, hyperparameters, firstFrame, lenX, lenY, hyperparameters["thresForDetectMovementWithRawVideo"], headPositionFirstFrame, tailTipFirstFrame)
+
+      if hyperparameters["debugDetectMovWithRawVideo"]:
+        print("well:", wellNumber, " ; frame:",l," ; number of different pixel in subsequent frames:",totDiff," ; bout detection threshold:",hyperparameters["minNbPixelForDetectMovementWithRawVideo"])
+        if hyperparameters["debugDetectMovWithRawVideoShowVid"]:
+          import zebrazoom.code.util as util
+          util.showFrame(res, title="debugDetectMovWithRawVideo")
+
+      if totDiff > hyperparameters["minNbPixelForDetectMovementWithRawVideo"]:
+        mouvement[l-firstFrame] = 1
+  cap.release()
+
+  return mouvements
+
+
 def detectMovementWithRawVideo(hyperparameters, videoPath, background, wellNumber, wellPositions, head, headPositionFirstFrame, tailTipFirstFrame):
   from zebrazoom.code.tracking import get_default_tracking_method
 
-  if hyperparameters["adjustDetectMovWithRawVideo"]:
-    widgets = None
-  
   if hyperparameters["debugDetectMovWithRawVideo"]:
     print("detectMovementWithRawVideo")
+
+  if not hyperparameters["adjustDetectMovWithRawVideo"]:
+    return detectMovementWithRawVideoForWells(hyperparameters, videoPath, wellPositions, [(wellNumber, head, headPositionFirstFrame, tailTipFirstFrame)])[0]
+
+  widgets = None
   
   # if hyperparameters["wellsAreRectangles"]:
   lenX = int(wellPositions[wellNumber]["lengthX"])
@@ -148,21 +201,14 @@ def detectMovementWithRawVideo(hyperparameters, videoPath, background, wellNumbe
   
   mouvement = [0] * (max_l-debut_l+1)
   
-  if hyperparameters["adjustDetectMovWithRawVideo"]:
-    cap1 = []
-    cap2 = 0
-    cap = zzVideoReading.VideoCapture(videoPath, hyperparameters)
-    cap.set(1, debut_l)
-    for k in range(debut_l, max_l):
-      imgTemp = get_default_tracking_method()(videoPath, wellPositions, hyperparameters).getImageSequential(cap, k, wellNumber)
-      cap1.append(imgTemp)
-  else:
-    cap1 = zzVideoReading.VideoCapture(videoPath, hyperparameters)
-    cap1.set(1, debut_l)
-    cap2 = zzVideoReading.VideoCapture(videoPath, hyperparameters)
-    cap2.set(1, debut_l + hyperparameters["frameGapComparision"])
-  
-  while ((l < max_l) and (l-firstFrame < len(head))) or hyperparameters["adjustDetectMovWithRawVideo"]:
+  cap1 = []
+  cap = zzVideoReading.VideoCapture(videoPath, hyperparameters)
+  cap.set(1, debut_l)
+  tracking = get_default_tracking_method()(videoPath, wellPositions, hyperparameters)
+  for k in range(debut_l, max_l):
+    cap1.append(tracking.getImageSequential(cap, k, wellNumber))
+  
+  while True:
     if l >= debut_l:
       
       if (hyperparameters["freqAlgoPosFollow"] != 0) and (l % hyperparameters["freqAlgoPosFollow"] == 0):
@@ -174,7 +220,12 @@ def detectMovementWithRawVideo(hyperparameters, videoPath, background, wellNumbe
       if l > hyperparameters["lastFrame"]:
         l = hyperparameters["lastFrame"]
       
-      [img, res, totDiff, cap1, cap2] = getImagesAndTotDiff(head, hyperparameters["halfDiameterRoiBoutDetect"], cap1, cap2, videoPath, l, hyperparameters["frameGapComparision"], wellNumber, wellPositions, hyperparameters, firstFrame, lenX, lenY, hyperparameters["thresForDetectMovementWithRawVideo"], headPositionFirstFrame, tailTipFirstFrame)
+      img = cap1[l - firstFrame]
+      if l + hyperparameters["frameGapComparision"] - firstFrame < len(cap1):
+        imgFuture = cap1[int(l + hyperparameters["frameGapComparision"] - firstFrame)]
+      else:
+        imgFuture = cap1[len(cap1) - 1]
+      [img, res, totDiff] = getImagesAndTotDiff(head, hyperparameters["halfDiameterRoiBoutDetect"], img, imgFuture, l, hyperparameters, firstFrame, lenX, lenY, hyperparameters["thresForDetectMovementWithRawVideo"], headPositionFirstFrame, tailTipFirstFrame)
       
       if hyperparameters["debugDetectMovWithRawVideo"]:
         print("frame:",l," ; number of different pixel in subsequent frames:",totDiff," ; bout detection threshold:",hyperparameters["minNbPixelForDetectMovementWithRawVideo"])
@@ -187,16 +238,11 @@ def detectMovementWithRawVideo(hyperparameters, videoPath, background, wellNumbe
       else:
         mouvement[l-firstFrame] = 0
       
-      if hyperparameters["adjustDetectMovWithRawVideo"]:
-      
-        if l + hyperparameters["frameGapComparision"] > hyperparameters["lastFrame"]:
-          l = int(hyperparameters["lastFrame"] - hyperparameters["frameGapComparision"] - 3)
-        l, widgets = adjustDetectMouvRawVideosParams(img, res, l, totDiff, hyperparameters, widgets)
-        if l + hyperparameters["frameGapComparision"] > hyperparameters["lastFrame"]:
-          l = int(hyperparameters["lastFrame"] - hyperparameters["frameGapComparision"] - 3)
-          
-      else:
-        l = l + 1
+      if l + hyperparameters["frameGapComparision"] > hyperparameters["lastFrame"]:
+        l = int(hyperparameters["lastFrame"] - hyperparameters["frameGapComparision"] - 3)
+      l, widgets = adjustDetectMouvRawVideosParams(img, res, l, totDiff, hyperparameters, widgets)
+      if l + hyperparameters["frameGapComparision"] > hyperparameters["lastFrame"]:
+        l = int(hyperparameters["lastFrame"] - hyperparameters["frameGapComparision"] - 3)
       
     else:
       l = l + 1
@@ -1,4 +1,3 @@
-import h5py
 import numpy as np
 import math
 import os
@@ -10,7 +9,8 @@ import numpy as np
 # from filterpy.kalman import KalmanFilter
 # from filterpy.common import Q_discrete_white_noise
 
-from zebrazoom.code.detectMovementWithRawVideo import detectMovementWithRawVideo
+from zebrazoom.code.dataPerFrameH5 import openResultsFileForAppending, writeDataPerFrameColumns
+from zebrazoom.code.detectMovementWithRawVideo import detectMovementWithRawVideo, detectMovementWithRawVideoForWells
 
 
 def distBetweenThetas(theta1, theta2):
@@ -82,8 +82,117 @@ def smoothAllTailAngles(allAngles, hyperparameters, start, end):
     tailangles_arr_smoothed = np.append(tailangles_arr_smoothed, tailSmoothed2, axis=0)
   return [tailangles_arr, tailangles_arr_smoothed]
 
-def _calculateTailLength(tailX, tailY):
-  return np.sum([math.sqrt((tailX[x] - tailX[x+1]) ** 2 + (tailY[x] - tailY[x+1]) ** 2) for x in range(len(tailX) - 1)])
+def _calculateAngles(vectStart, vectEnd):
+  '''Same as calculateAngle, for arrays of points (the last dimension being x, y).'''
+  x = vectEnd[..., 0] - vectStart[..., 0]
+  y = vectEnd[..., 1] - vectStart[..., 1]
+  with np.errstate(divide='ignore', invalid='ignore'):
+    heading = np.arctan(np.abs(y / x))
+  return np.select([(x == 0) & (y > 0), x == 0, (x < 0) & (y > 0), (x < 0) & (y < 0), (x < 0) & (y == 0), (x > 0) & (y < 0)],
+                   [math.pi / 2, (3 * math.pi) / 2, math.pi - heading, heading + math.pi, math.pi, 2*math.pi - heading], heading)
+
+def _calculateTailAngles(angle1, angle2):
+  '''Same as calculateTailAngle, for arrays of angles.'''
+  output = angle1 - angle2
+  output = (output + 2 * 3.14159265) % (2 * 3.14159265)
+  return np.where(output > 3.14159265, output - 2*3.14159265, output)
+
+def _distBetweenThetas(theta1, theta2):
+  '''Same as distBetweenThetas, for arrays of angles.'''
+  diff = np.where(theta1 > theta2, theta1 - theta2, theta2 - theta1)
+  return np.where(diff > math.pi, (2 * math.pi) - diff, diff)
+
+def _calculateTailLengths(tailX, tailY):
+  return np.sum(np.sqrt((tailX[:, :-1] - tailX[:, 1:]) ** 2 + (tailY[:, :-1] - tailY[:, 1:]) ** 2), axis=1)
+
+def _calculateHeadings(hyperparameters, trackingHeading, head, tail_1, tail_2, tip2):
+  '''Returns the headings used to calculate the tail angles (the headings saved are these headings rotated by pi).'''
+  nbFrames = len(head)
+  if hyperparameters["headingCalculationMethod"] == "calculatedWithFirstTailPt":
+    heading = _calculateAngles(head, tail_1)
+  if hyperparameters["headingCalculationMethod"] == "calculatedWithTwoFirstTailPt":
+    heading = _calculateAngles(head, tail_2)
+  elif hyperparameters["headingCalculationMethod"] == "calculatedWithMedianTailTip":
+    heading = _calculateAngles(head, np.median(tip2, axis=0))
+  elif hyperparameters["headingCalculationMethod"] == "simplyFromPreviousCalculations":
+    heading = (trackingHeading + math.pi) % (2*math.pi)
+  elif hyperparameters["headingCalculationMethod"] == "fromPreviousCalculationsAndAdjustWithPreviousFrame":
+    # each heading depends on the previous one, this can't be vectorized
+    heading = (trackingHeading + math.pi) % (2*math.pi)
+    for i in range(1, nbFrames):
+      previousHeading = (heading[i-1] + math.pi) % (2*math.pi)
+      if distBetweenThetas(previousHeading, ((heading[i] + math.pi) % (2*math.pi))) > distBetweenThetas(previousHeading, heading[i]):
+        heading[i] = (heading[i] + math.pi) % (2*math.pi)
+  else: # calculatedWithHead : THIS IS THE DEFAULT
+    angleWithFirstTailPt = _calculateAngles(head, tail_1)
+    diff1 = _distBetweenThetas(trackingHeading,           angleWithFirstTailPt)
+    diff2 = _distBetweenThetas(trackingHeading + math.pi, angleWithFirstTailPt)
+    heading = np.where(np.isnan(trackingHeading), 0, np.where(diff2 < diff1, trackingHeading + math.pi, trackingHeading))
+  return heading.reshape((nbFrames, 1))
+
+def _calculateAngleVariation(angle_median, windowForBoutDetectWithAngle):
+  '''For each frame, difference between the max and min angles in the window centered on that frame, nan values being ignored.'''
+  halfWindow = int(windowForBoutDetectWithAngle/2)
+  nbFrames = len(angle_median)
+  if halfWindow <= 0:
+    return np.full(nbFrames, -20000.)
+  padded = np.concatenate((np.full(halfWindow, np.nan), angle_median, np.full(halfWindow, np.nan)))
+  windows = np.lib.stride_tricks.sliding_window_view(padded, 2 * halfWindow)[:nbFrames]
+  with np.errstate(invalid='ignore'):
+    return np.fmax(np.fmax.reduce(windows, axis=1), -10000) - np.fmin(np.fmin.reduce(windows, axis=1), 10000)
+
+def _fillGaps(auDessus, windowGap):
+  '''Sets to 1 the frames [i - windowGap, i + windowGap[ around the frames i not detected as moving but surrounded by movement.'''
+  auDessus2 = np.copy(auDessus)
+  nbFrames = len(auDessus2)
+  frames = np.arange(windowGap, nbFrames - windowGap)
+  if len(frames) == 0:
+    return auDessus2
+  values = np.asarray(auDessus, dtype=float).reshape(nbFrames)
+  # nextNonZero[j] is the index of the first non zero value at or after j (nbFrames if there is none)
+  nonZero = np.flatnonzero(values != 0)
+  nextNonZero = np.append(nonZero, nbFrames)[np.searchsorted(nonZero, np.arange(nbFrames + 1))]
+  firstNonZero = nextNonZero[frames - windowGap]
+  secondNonZero = np.minimum(nextNonZero[np.minimum(firstNonZero + 1, nbFrames)], frames + windowGap)
+  toFill = (values[frames] == 0) & (firstNonZero < frames + windowGap) & (values[np.minimum(secondNonZero, nbFrames - 1)] > 0)
+  filled = np.zeros(nbFrames + 1, dtype=int)
+  np.add.at(filled, frames[toFill] - windowGap, 1)
+  np.add.at(filled, frames[toFill] + windowGap, -1)
+  auDessus2[np.cumsum(filled[:nbFrames]) > 0] = 1
+  return auDessus2
+
+def _findBoutCandidates(auDessus2):
+  '''Returns the (start, end) of each sequence of frames starting with a 1 and ended by a 0 or by the last frame (excluded).'''
+  nbFrames = len(auDessus2)
+  values = np.asarray(auDessus2, dtype=float).reshape(nbFrames)
+  ones = np.flatnonzero(values == 1)
+  zeros = np.flatnonzero(values == 0)
+  candidates = []
+  position = 0
+  while True:
+    idx = np.searchsorted(ones, position)
+    if idx == len(ones):
+      break
+    boutStart = ones[idx]
+    idx = np.searchsorted(zeros, boutStart)
+    boutEnd = min(zeros[idx], nbFrames - 1) if idx < len(zeros) else nbFrames - 1
+    candidates.append((int(boutStart), int(boutEnd) - 1))
+    position = boutEnd + 1
+  return candidates
+
+def detectMovementWithRawVideoForAllWells(trackingDataPerWell, hyperparameters, videoPath, wellPositions):
+  '''
+  Returns, for each well of trackingDataPerWell (dict mapping well numbers to the trackingData passed to extractParameters), the movements
+  of each animal that extractParameters would detect with detectMovementWithRawVideo, decoding the video only once for all the wells.
+  Returns None if extractParameters doesn't detect the movements with the raw video.
+  '''
+  if hyperparameters["noBoutsDetection"] == 1 or hyperparameters["boutEdgesWhereZeros"] == 1 or hyperparameters["coordinatesOnlyBoutDetection"] or hyperparameters["thresForDetectMovementWithRawVideo"] == 0 or hyperparameters["adjustDetectMovWithRawVideo"]:
+    return None
+  wellsHeads = [(wellNumber, np.array(trackingTail[:, 0, :2], dtype=float), trackingData[3], trackingData[4])
+                for wellNumber, trackingData in trackingDataPerWell.items() for trackingTail in trackingData[0]]
+  mouvements = iter(detectMovementWithRawVideoForWells(hyperparameters, videoPath, wellPositions, wellsHeads))
+  return {wellNumber: [next(mouvements) for _ in trackingData[0]] for wellNumber, trackingData in trackingDataPerWell.items()}
+
 
 def extractParameters(trackingData, wellNumber, hyperparameters, videoPath, wellPositions, background, tailAngle = 0):
 
@@ -104,7 +213,7 @@ def extractParameters(trackingData, wellNumber, hyperparameters, videoPath, well
   for animalId in range(0, len(trackingHeadTailAllAnimals)):
     
     trackingTail    = trackingHeadTailAllAnimals[animalId]
-    trackingHeading = trackingHeadingAllAnimals[animalId]
+    trackingHeading = np.array(trackingHeadingAllAnimals[animalId], dtype=float).reshape(len(trackingTail))
     
     n = len(trackingTail[0])
     
@@ -113,78 +222,31 @@ def extractParameters(trackingData, wellNumber, hyperparameters, videoPath, well
     nbFrames = len(trackingTail)
     nbPoints = len(trackingTail[0])
 
-    tail_1    = np.zeros((nbFrames, 2))
-    tail_2    = np.zeros((nbFrames, 2))
-    tip       = np.zeros((nbFrames, 2))
-    head      = np.zeros((nbFrames, 2))
-    heading   = np.zeros((nbFrames, 1))
-    angle     = np.zeros((nbFrames, 1))
-    allAngles = np.zeros((nbFrames, n))
-    tailX     = np.zeros((nbFrames, n))
-    tailY     = np.zeros((nbFrames, n))
-    
-    if hyperparameters["headingCalculationMethod"] == "calculatedWithMedianTailTip":
-      tip2 = np.zeros((nbFrames, 2))
-      nbTailPoints = len(trackingTail[0]) - 1
-      for i in range(0,nbFrames):
-        tip2[i] = np.array([ trackingTail[i][nbTailPoints][0], trackingTail[i][nbTailPoints][1] ])
-      medianTip = np.median(tip2,axis=0)
-      
-    curvatureBef = 0
-    
-    for i in range(0,nbFrames):
-    
-      if (hyperparameters["freqAlgoPosFollow"] != 0) and (i % hyperparameters["freqAlgoPosFollow"] == 0):
-        print("Extract Param Begin: wellNumber:",wellNumber," ; frame:",i)
-      
-      tail_1[i]  = np.array([ trackingTail[i][1][0], trackingTail[i][1][1] ])
-      tail_2[i]  = np.array([ trackingTail[i][2][0], trackingTail[i][2][1] ])
-      
-      nbTailPoints = len(trackingTail[0]) - 1
-      tip[i]     = np.array([ trackingTail[i][nbTailPoints][0], trackingTail[i][nbTailPoints][1] ])
-      
-      head[i]    = np.array([ trackingTail[i][0][0], trackingTail[i][0][1] ])
-      
-      if hyperparameters["headingCalculationMethod"] == "calculatedWithFirstTailPt":
-        heading[i] = calculateAngle(head[i], tail_1[i])
-      if hyperparameters["headingCalculationMethod"] == "calculatedWithTwoFirstTailPt":
-        heading[i] = calculateAngle(head[i], tail_2[i])
-      elif hyperparameters["headingCalculationMethod"] == "calculatedWithMedianTailTip":
-        heading[i] = calculateAngle(head[i], medianTip)
-      elif hyperparameters["headingCalculationMethod"] == "simplyFromPreviousCalculations":
-        heading[i] = trackingHeading[i]
-        heading[i] = (heading[i] + math.pi) % (2*math.pi)
-      elif hyperparameters["headingCalculationMethod"] == "fromPreviousCalculationsAndAdjustWithPreviousFrame":
-        heading[i] = trackingHeading[i]
-        heading[i] = (heading[i] + math.pi) % (2*math.pi)
-        if i != 0 and distBetweenThetas(heading[i-1], ((heading[i] + math.pi) % (2*math.pi))) > distBetweenThetas(heading[i-1], heading[i]):
-          heading[i] = (heading[i] + math.pi) % (2*math.pi)
-      else: # calculatedWithHead : THIS IS THE DEFAULT
-        if not(math.isnan(trackingHeading[i])):
-          heading[i] = trackingHeading[i]
-          diff1 = distBetweenThetas(heading[i],           calculateAngle(head[i], tail_1[i]))
-          diff2 = distBetweenThetas(heading[i] + math.pi, calculateAngle(head[i], tail_1[i]))
-          if diff2 < diff1:
-            heading[i] = heading[i] + math.pi
-        else:
-          heading[i] = 0
-      
-      if type(tailAngle) == int:
-        angle[i] = calculateTailAngle(calculateAngle(head[i], tip[i]), heading[i])
-      else:
-        angle[i] = tailAngle[i]
-        
-      if hyperparameters["calculateAllTailAngles"]:
-        for j in range(0, n):
-          allAngles[i][j] = calculateTailAngle(calculateAngle(head[i], np.array([trackingTail[i][j][0], trackingTail[i][j][1]])), heading[i])
-      
-      heading[i] = (heading[i] + math.pi) % (2*math.pi)
-      
-      tailX[i]   = trackingTail[i,:,0]
-      tailY[i]   = trackingTail[i,:,1]
+    if (hyperparameters["freqAlgoPosFollow"] != 0):
+      print("Extract Param Begin: wellNumber:",wellNumber)
+
+    nbTailPoints = len(trackingTail[0]) - 1
+    tail_1    = np.array(trackingTail[:, 1, :2], dtype=float)
+    tail_2    = np.array(trackingTail[:, 2, :2], dtype=float)
+    tip       = np.array(trackingTail[:, nbTailPoints, :2], dtype=float)
+    head      = np.array(trackingTail[:, 0, :2], dtype=float)
+    tailX     = np.array(trackingTail[:, :, 0], dtype=float)
+    tailY     = np.array(trackingTail[:, :, 1], dtype=float)
+    heading   = _calculateHeadings(hyperparameters, trackingHeading, head, tail_1, tail_2, tip)
+
+    if type(tailAngle) == int:
+      angle = _calculateTailAngles(_calculateAngles(head, tip), heading[:, 0]).reshape((nbFrames, 1))
+    else:
+      angle = np.array([tailAngle[i] for i in range(0, nbFrames)], dtype=float).reshape((nbFrames, 1))
+
+    if hyperparameters["calculateAllTailAngles"]:
+      allAngles = _calculateTailAngles(_calculateAngles(head[:, np.newaxis, :], np.stack((tailX, tailY), axis=2)), heading)
+    else:
+      allAngles = np.zeros((nbFrames, n))
+
+    heading = (heading + math.pi) % (2*math.pi)
     
     if hyperparameters["saveAllDataEvenIfNotInBouts"] or hyperparameters["storeH5"]:
-      trackingFlatten = [trackingHeadTailAllAnimals[animalId][i].flatten().tolist() + [_calculateTailLength(tailX[i], tailY[i])] + heading[i].tolist() + angle[i].tolist() for i in range(0, len(heading))]
       trackingFlattenColumnsNames = ['HeadPosX', 'HeadPosY']
       for i in range(0, (len(trackingHeadTailAllAnimals[0][0].flatten().tolist()) - 2) // 2):
         trackingFlattenColumnsNames += ['TailPosX' + str(i + 1)]
@@ -192,24 +254,20 @@ def extractParameters(trackingData, wellNumber, hyperparameters, videoPath, well
       trackingFlattenColumnsNames.append('TailLength')
       trackingFlattenColumnsNames += ['Heading']
       trackingFlattenColumnsNames += ['tailAngle']
+      positions = np.asarray(trackingTail).reshape((nbFrames, -1))
+      positions = positions.astype(np.int64 if np.issubdtype(positions.dtype, np.integer) else float)
+      trackingFlatten = dict(zip(trackingFlattenColumnsNames, list(positions.T) + [_calculateTailLengths(tailX, tailY), heading[:, 0], angle[:, 0]]))
     
     if hyperparameters["noBoutsDetection"] == 1:
-      auDessus        = np.zeros((nbFrames, 1))
-      for i in range(0,nbFrames):
-        auDessus[i] = 1
+      auDessus        = np.ones((nbFrames, 1))
     elif hyperparameters["boutEdgesWhereZeros"] == 1:
-      auDessus        = np.zeros((nbFrames, 1))
-      for i in range(0,nbFrames):
-        if ((head[i][0] == 0) and (head[i][1] == 0)):
-          auDessus[i] = 0
-        else:
-          auDessus[i] = 1
+      auDessus        = ((head[:, 0] != 0) | (head[:, 1] != 0)).astype(float).reshape((nbFrames, 1))
     elif type(auDessusPerAnimal) != int:
 
       auDessus = auDessusPerAnimal[animalId]
     elif hyperparameters["coordinatesOnlyBoutDetection"]:
       frameDistance = hyperparameters["frameGapComparision"]
-      auDessus = [int(math.sqrt(sum((head[i+frameDistance] - coords) ** 2)) >= hyperparameters["coordinatesOnlyBoutDetectionMinDist"]) for i, coords in enumerate(head[:-frameDistance])]
+      auDessus = (np.sqrt(np.sum((head[frameDistance:] - head[:nbFrames-frameDistance]) ** 2, axis=1)) >= hyperparameters["coordinatesOnlyBoutDetectionMinDist"]).astype(int).tolist()
       auDessus.extend([0] * frameDistance)
     elif hyperparameters["thresForDetectMovementWithRawVideo"] == 0:
 
@@ -228,78 +286,39 @@ def extractParameters(trackingData, wellNumber, hyperparameters, videoPath, well
       else:
         angle_median = angle2
       # Calculating angle variation to detect movement
-      angleVariation  = np.zeros((nbFrames, 1))
-      auDessus        = np.zeros((nbFrames, 1))
-      for i in range(0,nbFrames):
-        if (hyperparameters["freqAlgoPosFollow"] != 0) and (i % (hyperparameters["freqAlgoPosFollow"]) == 0):
-          print("Extract Param Middle: wellNumber:",wellNumber," ; frame:",i)
-        min = 10000
-        max = -10000
-        # for j in range(i-hyperparameters["windowForBoutDetectWithAngle"], i+1):
-        for j in range(i-int(hyperparameters["windowForBoutDetectWithAngle"]/2), i+int(hyperparameters["windowForBoutDetectWithAngle"]/2)):
-          if (j >= 0) and (j<nbFrames):
-            if angle_median[j] > max:
-              max = angle_median[j]
-            if angle_median[j] < min:
-              min = angle_median[j]
-        angleVariation[i] = max - min
-        if debug:
-          print(i,angleVariation[i])
-        if angleVariation[i] > thresAngleBoutDetect:
-          auDessus[i] = 1
+      angleVariation  = _calculateAngleVariation(angle_median, hyperparameters["windowForBoutDetectWithAngle"]).reshape((nbFrames, 1))
+      if debug:
+        print(angleVariation)
+      auDessus        = (angleVariation > thresAngleBoutDetect).astype(float)
 
     else:
       auDessus = detectMovementWithRawVideo(hyperparameters, videoPath, background, wellNumber, wellPositions, head, headPositionFirstFrame, tailTipFirstFrame)
     
     if (hyperparameters["freqAlgoPosFollow"] != 0):
-      print("Extract Param Middle: wellNumber:",wellNumber," ; frame:",i)
+      print("Extract Param Middle: wellNumber:",wellNumber)
     
     auDessus2 = np.copy(auDessus)
     if hyperparameters["boutEdgesWhereZeros"] == 0 and hyperparameters["noBoutsDetection"] == 0:
       windowGap = hyperparameters["fillGapFrameNb"]
       if windowGap:
-        for i in range(windowGap,nbFrames-windowGap):
-          if auDessus[i] == 0:
-            j = i - windowGap
-            while (auDessus[j] == 0) and (j < i + windowGap):
-              j = j + 1
-            if j < i + windowGap:
-              j = j + 1;
-              while (auDessus[j] == 0) and (j < i + windowGap):
-                j = j + 1;
-              if auDessus[j] > 0:
-                for k in range(i - windowGap, i + windowGap):
-                  auDessus2[k] = 1
+        auDessus2 = _fillGaps(auDessus, windowGap)
     
-    bouts   = np.zeros((0, 3))
-    curBout = np.zeros((1, 3))
-    position = 0
-    
-    for i in range(0, nbFrames):
-    
-      if (hyperparameters["freqAlgoPosFollow"] != 0) and (i % (hyperparameters["freqAlgoPosFollow"]*10) == 0):
-        print("Extract Param End1 Freq*10 : wellNumber:",wellNumber," ; frame:",i)
+    bouts = []
     
-      if (position==0) and (auDessus2[i]==1):
-        curBout[0][0] = wellNumber
-        curBout[0][1] = i
-        position = 1
-        retire = 1
-      if (position == 1) and ((auDessus2[i] == 0) or (i == nbFrames-1)):
-        curBout[0][2] = i-1
-        position = 0
-        if curBout[0][2] - curBout[0][1] >= hyperparameters["detectBoutMinNbFrames"] or (hyperparameters["noChecksForBoutSelectionInExtractParams"] and curBout[0][2] - curBout[0][1] >= hyperparameters["boutsMinNbFrames"]):
-          debMouv = int(curBout[0][1])
-          endMouv = int(curBout[0][2])
-          dist = math.sqrt( (head[debMouv,0]-head[endMouv,0])**2 + (head[debMouv,1]-head[endMouv,1])**2 )
-          if ((dist >= hyperparameters["detectBoutMinDist"]) and (np.max(angle[debMouv:endMouv])-np.min(angle[debMouv:endMouv]) >= hyperparameters["detectBoutMinAngleDiff"])) or hyperparameters["noChecksForBoutSelectionInExtractParams"]:
-            bouts = np.append(bouts, curBout, axis=0)
-          else:
-            if debugExtractParams:
-              print("Bout starting at", debMouv, " has a dist or angle diff too big. Dist:", dist," minimum was:", hyperparameters["detectBoutMinDist"],". DetectBoutMinAngleDiff:",np.max(angle[debMouv:endMouv])-np.min(angle[debMouv:endMouv]),", minimmum was:",hyperparameters["detectBoutMinAngleDiff"])
+    for boutStart, boutEnd in _findBoutCandidates(auDessus2):
+      if boutEnd - boutStart >= hyperparameters["detectBoutMinNbFrames"] or (hyperparameters["noChecksForBoutSelectionInExtractParams"] and boutEnd - boutStart >= hyperparameters["boutsMinNbFrames"]):
+        debMouv = boutStart
+        endMouv = boutEnd
+        dist = math.sqrt( (head[debMouv,0]-head[endMouv,0])**2 + (head[debMouv,1]-head[endMouv,1])**2 )
+        if ((dist >= hyperparameters["detectBoutMinDist"]) and (np.max(angle[debMouv:endMouv])-np.min(angle[debMouv:endMouv]) >= hyperparameters["detectBoutMinAngleDiff"])) or hyperparameters["noChecksForBoutSelectionInExtractParams"]:
+          bouts.append([wellNumber, boutStart, boutEnd])
         else:
           if debugExtractParams:
-            print("Bout starting at", int(curBout[0][1]), "was too small. Length:", curBout[0][2] - curBout[0][1],". Minimum was:", hyperparameters["detectBoutMinNbFrames"])
+            print("Bout starting at", debMouv, " has a dist or angle diff too big. Dist:", dist," minimum was:", hyperparameters["detectBoutMinDist"],". DetectBoutMinAngleDiff:",np.max(angle[debMouv:endMouv])-np.min(angle[debMouv:endMouv]),", minimmum was:",hyperparameters["detectBoutMinAngleDiff"])
+      else:
+        if debugExtractParams:
+          print("Bout starting at", boutStart, "was too small. Length:", boutEnd - boutStart,". Minimum was:", hyperparameters["detectBoutMinNbFrames"])
+    bouts = np.array(bouts, dtype=float).reshape((-1, 3))
     
     # Refining beginning and end of bout detection to remove the artefacts from the fill gap procedure
     for numBout in range(0,len(bouts)):
@@ -320,8 +339,7 @@ def extractParameters(trackingData, wellNumber, hyperparameters, videoPath, well
           bouts[numBout][2] = bouts[numBout][2] + 1
 
     if hyperparameters["saveAllDataEvenIfNotInBouts"] and not hyperparameters['noBoutsDetection']:
-      for frameData in trackingFlatten:
-        frameData.append(float('nan'))
+      trackingFlatten['BoutNumber'] = np.full(nbFrames, float('nan'))
       trackingFlattenColumnsNames.append('BoutNumber')
 
     for i in range(0,len(bouts)):
@@ -338,8 +356,7 @@ def extractParameters(trackingData, wellNumber, hyperparameters, videoPath, well
       item["TailAngle_Raw"] = angle[start:end+1,0].tolist()
 
       if hyperparameters["saveAllDataEvenIfNotInBouts"] and not hyperparameters['noBoutsDetection']:
-        for frameData in trackingFlatten[start:end+1]:
-            frameData[-1] = i
+        trackingFlatten['BoutNumber'][start:end+1] = i
 
       if hyperparameters["eyeTracking"]:
         item["leftEyeX"]      = trackingEyesAllAnimals[animalId, start:end+1, 0].tolist()
@@ -367,10 +384,8 @@ def extractParameters(trackingData, wellNumber, hyperparameters, videoPath, well
         item["TailY_VideoReferential"] = tailY[start:end+1].tolist()
       data.append(item)
 
-    if hyperparameters["saveAllDataEvenIfNotInBouts"] or hyperparameters["storeH5"]:
-      trackingFlattenPandas = pd.DataFrame(trackingFlatten, columns=trackingFlattenColumnsNames)
     if hyperparameters['storeH5']:
-      with h5py.File(hyperparameters['H5filename'], 'a') as results:
+      with openResultsFileForAppending(hyperparameters['H5filename']) as results:
         group = results.create_group(f"dataForWell{wellNumber}/dataForAnimal{animalId}/dataPerFrame")
         datasets = {'HeadPos': (('HeadPosX', 'HeadPosY'), ('X', 'Y')),
                     'Heading': 'Heading',
@@ -380,16 +395,13 @@ def extractParameters(trackingData, wellNumber, hyperparameters, videoPath, well
                     'TailLength': 'TailLength'}
         for name, columns in datasets.items():
           if isinstance(columns, str):  # 1d array
-            group.create_dataset(name, data=trackingFlattenPandas[columns].values)
+            writeDataPerFrameColumns(group, name, trackingFlatten[columns], hyperparameters)
           else:
             assert isinstance(columns, tuple)  # 2d array
             pandasNames, h5Names = columns
-            headPosData = np.empty(len(trackingFlattenPandas.index), dtype=list(zip(h5Names, (trackingFlattenPandas[name].dtype for name in pandasNames))))
-            for h5Name, pandasName in zip(h5Names, pandasNames):
-              headPosData[h5Name] = trackingFlattenPandas[pandasName].values
-            headPos = group.create_dataset(name, data=headPosData)
-            headPos.attrs['columns'] = headPosData.dtype.names
+            writeDataPerFrameColumns(group, name, [trackingFlatten[pandasName] for pandasName in pandasNames], hyperparameters, h5Names)
     if hyperparameters["saveAllDataEvenIfNotInBouts"]:
+      trackingFlattenPandas = pd.DataFrame(trackingFlatten, columns=trackingFlattenColumnsNames)
       trackingFlattenPandas['tailAngle'] = np.rad2deg(trackingFlattenPandas['tailAngle'])
       outputFolder = os.path.join(hyperparameters["outputFolder"], hyperparameters["videoNameWithTimestamp"])
       if not os.path.exists(outputFolder):
@@ -41,6 +41,7 @@ CONFIG_DEFAULT = \
   "debugEyeTrackingAdvanced" : 0,
   "onlyDoTheTrackingForThisNumberOfFrames": 0,
   "createValidationVideo" : 1,
+  "createValidationVideoNbProcesses" : 0,
   "copyOriginalVideoToOutputFolderForValidation" : 0,
   "calculateAllTailAngles" : 0,
   "freqAlgoPosFollow" : 0,
@@ -49,6 +50,7 @@ CONFIG_DEFAULT = \
   "reloadWellPositions" : 0,
   "reloadWellPositionsFromFileInZZoutputIfItExistSaveInItOtherwise" : 0,
   "reloadBackground" : 0,
+  "cacheBackground" : 0,
   "saveWellPositionsToBeReloadedNoMatterWhat" : 0,
   "backgroundExtractionForceUseAllVideoFrames" : 0,
   "updateBackgroundAtInterval" : 0,
@@ -56,6 +58,13 @@ CONFIG_DEFAULT = \
   "exitAfterBackgroundExtraction" : 0,
   "exitAfterWellsDetection" : 0,
   "fasterMultiprocessing" : 0,
+  "fasterMultiprocessingNbProcesses" : 0,
+  "fastFishTrackingNbProcesses" : 0,
+  "decodeFramesOnceForAllWells" : 0,
+  "decodeFramesOnceRingBufferSize" : 16,
+  "nbTimeChunksPerWell" : 0,
+  "timeChunksOverlapNbFrames" : 50,
+  "prefetchFramesQueueSize" : 0,
   "trackOnlyOnROI_halfDiameter" : 0,
   "tryCreatingFolderUntilSuccess" : 1,
   "searchPreviousFramesIfCurrentFrameIsCorrupted" : 1,
@@ -140,6 +149,9 @@ CONFIG_DEFAULT = \
   "dilateIter" : 2,
   "thresholdForBlobImg" : 200,
   "multipleHeadTrackingIterativelyRelaxAreaCriteria" : 0,
+  "multipleAnimalsOptimalIdentityAssignment" : 0,
+  "identityAssignmentMaxDistance" : 0,
+  "identityAssignmentMotionPrediction" : 0,
   "minArea" : -1,
   "maxArea" : -1,
   "minAreaBody" : -1,
@@ -239,6 +251,7 @@ CONFIG_DEFAULT = \
 
   "tailAngleSmoothingFactor" : 0.001,
   "tailAngleMedianFilter" : 3,
+  "tailAngleSmoothingMaxNbFrames" : 1000,
 
   "minFirstBendValue" : -1,
   "minDiffBetweenSubsequentBendAmp" : 0.02,
@@ -300,6 +313,8 @@ CONFIG_DEFAULT = \
   "applySimpleThresholdOnPredictedMask": 0,
   "simpleThresholdCheckMinForMaxCountour": 0,
   "applyQuantileInDLalgo": 0,
+  "trackingDLbatchSize": 0,
+  "trackingDLnbThreadsPerWell": 0,
 
   "fishTailTrackingDifficultBackground": 0,
 
@@ -309,6 +324,10 @@ CONFIG_DEFAULT = \
   "videoHeight": 0,
 
   "storeH5": 0,
+  "storeH5Compression": 0,
+  "storeH5ChunkNbFrames": 0,
+  "saveProfilingReport": 0,
+  "checkpointInterval": 0,
 }
 
 
@@ -26,3 +26,11 @@ def getRolloverDetectionConfigurationFolder():
 
 def getDataAnalysisFolder():
   return os.path.join(getRootDataFolder(), 'dataAnalysis')
+
+
+def getResultsCatalogPath():
+  return os.path.join(getRootDataFolder(), 'resultsCatalog.sqlite')
+
+
+def getBatchQueuePath():
+  return os.path.join(getRootDataFolder(), 'batchQueue.sqlite')
@@ -0,0 +1,52 @@
+import contextlib
+import json
+import os
+import platform
+import sys
+import time
+
+try:
+  import resource
+except ImportError:  # not available on Windows
+  resource = None
+
+
+def _getCpuTime():
+  times = os.times()
+  return times.user + times.system + times.children_user + times.children_system
+
+
+def _getPeakMemory(children=False):
+  '''Peak resident memory (in bytes) reached so far by the process (or by its terminated children), None if it can't be measured'''
+  if resource is None:
+    return None
+  maxrss = resource.getrusage(resource.RUSAGE_CHILDREN if children else resource.RUSAGE_SELF).ru_maxrss
+  return maxrss if sys.platform == 'darwin' else maxrss * 1024
+
+
+@contextlib.contextmanager
+def measure(measurements, stage, **info):
+  '''
+  Appends to measurements the wall time and CPU time (including the one of the child processes that were joined) spent
+  inside the with block, along with the peak memory of the process and of its children at the end of the block.
+  '''
+  startWallTime = time.perf_counter()
+  startCpuTime = _getCpuTime()
+  try:
+    yield
+  finally:
+    measurements.append(dict(stage=stage, **info, wallTime=time.perf_counter() - startWallTime, cpuTime=_getCpuTime() - startCpuTime,
+                             peakMemory=_getPeakMemory(), peakMemoryChildren=_getPeakMemory(children=True), pid=os.getpid()))
+
+
+def saveProfilingReport(path, measurements, **info):
+  '''Saves the measurements along with a description of the machine in a json file'''
+  import zebrazoom
+  report = dict(info, zebrazoomVersion=zebrazoom.__version__, platform=platform.platform(), pythonVersion=platform.python_version(),
+                cpuCount=os.cpu_count(), stages=measurements)
+  folder = os.path.dirname(path)
+  if folder and not os.path.exists(folder):
+    os.makedirs(folder)
+  with open(path, 'w') as f:
+    json.dump(report, f, indent=2)
+  return report
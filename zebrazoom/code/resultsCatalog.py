@@ -0,0 +1,137 @@
+import contextlib
+import json
+import os
+import sqlite3
+import time
+
+import numpy as np
+
+from zebrazoom.code import paths
+
+
+_TIMESTAMP_LENGTH = 20  # '_%Y_%m_%d-%H_%M_%S' suffix added to the video name
+_MIN_FOLDER_AGE = 2  # folders modified more recently than this (in seconds) are listed again on the next lookup, to be robust to coarse mtime resolutions
+_METADATA_COLUMNS = ('firstFrame', 'lastFrame', 'videoFPS', 'videoPixelSize', 'nbWells', 'pathToOriginalVideo', 'configuration')
+_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS folders (folder TEXT PRIMARY KEY, mtime INTEGER);
+CREATE TABLE IF NOT EXISTS results (folder TEXT NOT NULL, name TEXT NOT NULL, videoName TEXT NOT NULL, timestamp TEXT NOT NULL,
+                                    firstFrame INTEGER, lastFrame INTEGER, videoFPS REAL, videoPixelSize REAL, nbWells INTEGER,
+                                    pathToOriginalVideo TEXT, configuration TEXT, PRIMARY KEY (folder, name));
+CREATE INDEX IF NOT EXISTS resultsByVideoName ON results (folder, videoName, name);
+'''
+
+
+@contextlib.contextmanager
+def _openCatalog():
+  path = paths.getResultsCatalogPath()
+  folder = os.path.dirname(path)
+  if folder and not os.path.exists(folder):
+    os.makedirs(folder)
+  with contextlib.closing(sqlite3.connect(path, timeout=30)) as catalog:
+    catalog.row_factory = sqlite3.Row
+    catalog.executescript(_SCHEMA)
+    with catalog:
+      yield catalog
+
+
+def _splitName(name):
+  stem = os.path.splitext(name)[0]
+  return stem[:-_TIMESTAMP_LENGTH], stem[-_TIMESTAMP_LENGTH + 1:]
+
+
+def _synchronizeFolder(catalog, folder):
+  '''Updates the entries of the folder if it was modified since it was last listed. Otherwise, the folder is not listed.'''
+  mtime = os.stat(folder).st_mtime_ns
+  row = catalog.execute('SELECT mtime FROM folders WHERE folder = ?', (folder,)).fetchone()
+  if row is not None and row['mtime'] == mtime:
+    return
+  names = set(os.listdir(folder))
+  knownNames = {name for name, in catalog.execute('SELECT name FROM results WHERE folder = ?', (folder,))}
+  catalog.executemany('INSERT OR IGNORE INTO results (folder, name, videoName, timestamp) VALUES (?, ?, ?, ?)',
+                      ((folder, name, *_splitName(name)) for name in names - knownNames))
+  catalog.executemany('DELETE FROM results WHERE folder = ? AND name = ?', ((folder, name) for name in knownNames - names))
+  if time.time() - mtime / 1e9 < _MIN_FOLDER_AGE:
+    mtime = None
+  catalog.execute('INSERT OR REPLACE INTO folders (folder, mtime) VALUES (?, ?)', (folder, mtime))
+
+
+def _toBuiltin(value):
+  return value.item() if isinstance(value, np.generic) else value.tolist() if isinstance(value, np.ndarray) else value
+
+
+def _readMetadata(path):
+  import h5py
+
+  with h5py.File(path, 'r') as results:
+    metadata = {key: _toBuiltin(results.attrs[key]) for key in ('firstFrame', 'lastFrame', 'videoFPS', 'videoPixelSize', 'pathToOriginalVideo') if key in results.attrs}
+    if 'wellPositions' in results:
+      metadata['nbWells'] = len(results['wellPositions'])
+    if 'configurationFileUsed' in results:
+      metadata['configuration'] = json.dumps({key: _toBuiltin(value) for key, value in results['configurationFileUsed'].attrs.items()}, default=str)
+  return metadata
+
+
+def _storeMetadata(catalog, folder, name, metadata):
+  catalog.execute('INSERT OR IGNORE INTO results (folder, name, videoName, timestamp) VALUES (?, ?, ?, ?)', (folder, name, *_splitName(name)))
+  catalog.execute(f'UPDATE results SET {", ".join(f"{column} = ?" for column in _METADATA_COLUMNS)} WHERE folder = ? AND name = ?',
+                  (*(metadata.get(column) for column in _METADATA_COLUMNS), folder, name))
+
+
+def _scanFolder(folder, videoName):
+  return next(reversed(sorted(name for name in os.listdir(folder) if os.path.splitext(name)[0][:-_TIMESTAMP_LENGTH] == videoName)), None)
+
+
+def findResultsFile(folder, videoName):
+  '''
+  Returns the path of the most recent results of the video in the folder, or None if there are none.
+  The folder is only listed if it was modified since the last lookup.
+  '''
+  folder = os.path.abspath(folder)
+  try:
+    with _openCatalog() as catalog:
+      _synchronizeFolder(catalog, folder)
+      row = catalog.execute('SELECT name FROM results WHERE folder = ? AND videoName = ? ORDER BY name DESC LIMIT 1', (folder, videoName)).fetchone()
+    name = None if row is None else row['name']
+  except sqlite3.Error as e:
+    print('Results catalog unavailable (%s), listing %s' % (e, folder))
+    name = _scanFolder(folder, videoName)
+  return None if name is None else os.path.join(folder, name)
+
+
+def recordResults(path):
+  '''Adds the results file (or updates its entry) with the metadata of the results.'''
+  folder, name = os.path.split(os.path.abspath(path))
+  try:
+    with _openCatalog() as catalog:
+      _storeMetadata(catalog, folder, name, _readMetadata(path))
+  except (sqlite3.Error, OSError) as e:
+    print('Results could not be added to the results catalog:', e)
+
+
+def listResults(folder, videoName=None):
+  '''
+  Returns the entries of the results files of the folder (optionally only those of videoName), sorted by video name and timestamp.
+  The metadata of results files which were not added by recordResults (e.g. created on another computer) are read once and stored.
+  '''
+  folder = os.path.abspath(folder)
+  with _openCatalog() as catalog:
+    _synchronizeFolder(catalog, folder)
+    query = 'SELECT * FROM results WHERE folder = ?' + ('' if videoName is None else ' AND videoName = ?') + ' ORDER BY videoName, name'
+    rows = catalog.execute(query, (folder,) if videoName is None else (folder, videoName)).fetchall()
+    entries = []
+    for row in rows:
+      if os.path.splitext(row['name'])[1] != '.h5':
+        continue
+      entry = dict(row)
+      if entry['firstFrame'] is None:
+        try:
+          entry.update(_readMetadata(os.path.join(folder, entry['name'])))
+        except OSError:
+          continue
+        _storeMetadata(catalog, folder, entry['name'], entry)
+      entries.append(entry)
+  for entry in entries:
+    entry['path'] = os.path.join(folder, entry.pop('name'))
+    del entry['folder']
+    entry['configuration'] = None if entry['configuration'] is None else json.loads(entry['configuration'])
+  return entries
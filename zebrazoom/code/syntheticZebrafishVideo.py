@@ -0,0 +1,63 @@
+import math
+
+import cv2
+import numpy as np
+
+
+def createSyntheticZebrafishVideo(videoPath, nbFrames=300, nbRowsOfWells=2, nbWellsPerRow=2, wellSize=200, boutDuration=20, nbTailPoints=10, tailLength=35, fps=30, seed=0):
+  '''
+  Creates a video with one dark zebrafish larva per well on a light background. Each larva alternates between boutDuration
+  frames at rest and boutDuration frames of swimming forward while beating its tail (the wells start out of phase).
+  Returns the ground truth of the video, with all coordinates in the referential of each well:
+   - wellPositions: the wells, in the format expected by the tracking methods
+   - headPositions: array of shape (nbWells, nbFrames, 2)
+   - tailPositions: array of shape (nbWells, nbFrames, nbTailPoints, 2), from the head to the tip of the tail
+   - heading: array of shape (nbWells, nbFrames), direction in which the larva is swimming, in radians
+   - bouts: for each well, list of (first frame, last frame) of the bouts
+  '''
+  rng = np.random.default_rng(seed)
+  nbWells = nbRowsOfWells * nbWellsPerRow
+  wellPositions = [{'topLeftX': column * wellSize, 'topLeftY': row * wellSize, 'lengthX': wellSize, 'lengthY': wellSize}
+                   for row in range(nbRowsOfWells) for column in range(nbWellsPerRow)]
+  margin = tailLength + 15
+  position = wellSize / 2 + rng.uniform(-30, 30, (nbWells, 2))
+  heading = rng.uniform(0, 2 * math.pi, nbWells)
+  segmentLength = tailLength / (nbTailPoints - 1)
+
+  headPositions = np.empty((nbWells, nbFrames, 2))
+  tailPositions = np.empty((nbWells, nbFrames, nbTailPoints, 2))
+  headings = np.empty((nbWells, nbFrames))
+  bouts = [[] for _ in range(nbWells)]
+
+  writer = cv2.VideoWriter(videoPath, cv2.VideoWriter_fourcc(*'MJPG'), fps, (nbWellsPerRow * wellSize, nbRowsOfWells * wellSize))
+  for frameNumber in range(nbFrames):
+    frame = np.full((nbRowsOfWells * wellSize, nbWellsPerRow * wellSize, 3), 220, np.uint8)
+    for wellNumber, wellPosition in enumerate(wellPositions):
+      xOffset, yOffset = wellPosition['topLeftX'], wellPosition['topLeftY']
+      cv2.circle(frame, (xOffset + wellSize // 2, yOffset + wellSize // 2), wellSize // 2 - 3, (200, 200, 200), 2)
+      inBout = (frameNumber // boutDuration + wellNumber) % 2 == 1
+      if inBout:
+        if not bouts[wellNumber] or bouts[wellNumber][-1][1] != frameNumber - 1:
+          bouts[wellNumber].append([frameNumber, frameNumber])
+        else:
+          bouts[wellNumber][-1][1] = frameNumber
+        position[wellNumber] += 1.5 * np.array([math.cos(heading[wellNumber]), math.sin(heading[wellNumber])])
+        position[wellNumber] = np.clip(position[wellNumber], margin, wellSize - margin)
+        heading[wellNumber] += 0.03
+      amplitude = 0.5 * math.sin(frameNumber * 0.8) if inBout else 0
+      headPositions[wellNumber, frameNumber] = position[wellNumber]
+      headings[wellNumber, frameNumber] = heading[wellNumber] % (2 * math.pi)
+      tail = tailPositions[wellNumber, frameNumber]
+      tail[0] = position[wellNumber]
+      for pointNumber in range(1, nbTailPoints):
+        angle = heading[wellNumber] + math.pi + amplitude * (pointNumber - 1) / (nbTailPoints - 1)
+        tail[pointNumber] = tail[pointNumber - 1] + segmentLength * np.array([math.cos(angle), math.sin(angle)])
+      cv2.circle(frame, (int(xOffset + tail[0, 0]), int(yOffset + tail[0, 1])), 6, (30, 30, 30), -1)
+      for pointNumber in range(1, nbTailPoints):
+        cv2.line(frame, (int(xOffset + tail[pointNumber - 1, 0]), int(yOffset + tail[pointNumber - 1, 1])),
+                 (int(xOffset + tail[pointNumber, 0]), int(yOffset + tail[pointNumber, 1])), (50, 50, 50), max(1, 4 - (pointNumber - 1) // 3))
+    writer.write(frame)
+  writer.release()
+
+  return {'wellPositions': wellPositions, 'headPositions': headPositions, 'tailPositions': tailPositions, 'heading': headings,
+          'bouts': [[tuple(bout) for bout in wellBouts] for wellBouts in bouts]}
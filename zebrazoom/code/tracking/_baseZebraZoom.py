@@ -28,11 +28,54 @@ class BaseZebraZoomTrackingMethod(BaseTrackingMethod, GetBackgroundMixin, Update
 
   @staticmethod
   def __rollingMedianFilter(array, window):
-    array2 = np.convolve(array, np.ones(window), 'same') / window
+    array2 = array.astype(float)
+    if len(array) >= window:
+      array2[window//2:len(array)-window//2] = np.median(np.lib.stride_tricks.sliding_window_view(array, window), axis=1)
     array2[:window-1] = array[:window-1]
     array2[-window+1:] = array[-window+1:]
     return array2
 
+  @staticmethod
+  def __fillMissingPositions(headPositions, maxDistanceAuthorized, maxDisapearanceFrames, currentlyZero, zeroFrameStart):
+    '''
+    Replaces (in place) the head positions which are missing or too far from the previous one by a linear interpolation between
+    the positions surrounding them (or by the last position before them if the animal is not found again close enough).
+    Returns the state of the search (currentlyZero, zeroFrameStart) at the end of the trajectory.
+    '''
+    distanceFromPrevious = np.sqrt(np.sum(np.diff(headPositions, axis=0, prepend=headPositions[:1]) ** 2, axis=1))
+    missing = np.all(headPositions == 0, axis=1) | (distanceFromPrevious > maxDistanceAuthorized)
+    missing[-1] = False
+    missingFrames, foundFrames = np.flatnonzero(missing), np.flatnonzero(~missing)
+    frameNumber = 0
+    while frameNumber < len(headPositions):
+      if not currentlyZero:
+        idx = np.searchsorted(missingFrames, frameNumber)
+        if idx == len(missingFrames):
+          break
+        zeroFrameStart = missingFrames[idx]
+        frameNumber    = zeroFrameStart + 1
+        currentlyZero  = True
+      # The end of the missing positions is the first position found close enough to the one before them (or too late)
+      firstCandidate = np.searchsorted(foundFrames, frameNumber)
+      candidateEnds  = foundFrames[firstCandidate:max(firstCandidate, np.searchsorted(foundFrames, zeroFrameStart + maxDisapearanceFrames, 'right')) + 1]
+      headStarts     = headPositions[zeroFrameStart-1] if zeroFrameStart >= 1 else headPositions[candidateEnds]
+      closeEnough    = np.sqrt(np.sum((headPositions[candidateEnds] - headStarts) ** 2, axis=1)) < maxDistanceAuthorized
+      ends = np.flatnonzero(closeEnough | (candidateEnds - zeroFrameStart > maxDisapearanceFrames))
+      if not len(ends):
+        break
+      frameNumber   = candidateEnds[ends[0]]
+      currentlyZero = False
+      headStart     = headPositions[zeroFrameStart-1] if zeroFrameStart >= 1 else headPositions[frameNumber].copy()
+      headEnd       = headPositions[frameNumber]
+      if frameNumber > zeroFrameStart:
+        if closeEnough[ends[0]] and not np.all(headEnd == 0):
+          step = (headEnd - headStart) / (frameNumber - zeroFrameStart)
+          headPositions[zeroFrameStart:frameNumber] = headStart + step * np.arange(frameNumber - zeroFrameStart)[:, None]
+        else:
+          headPositions[zeroFrameStart:frameNumber] = headStart
+      frameNumber += 1
+    return currentlyZero, zeroFrameStart
+
   def _postProcessMultipleTrajectories(self, trackingHeadTailAllAnimals, trackingProbabilityOfGoodDetection):
     maxDistanceAuthorized = self._hyperparameters["postProcessMaxDistanceAuthorized"]
     maxDisapearanceFrames = self._hyperparameters["postProcessMaxDisapearanceFrames"]
@@ -53,12 +96,11 @@ class BaseZebraZoomTrackingMethod(BaseTrackingMethod, GetBackgroundMixin, Update
     if self._hyperparameters["postProcessRemovePointsOnBordersMargin"]:
       borderMargin = self._hyperparameters["postProcessRemovePointsOnBordersMargin"]
       for animalId in range(0, len(trackingHeadTailAllAnimals)):
-        for frameNumber in range(0, len(trackingHeadTailAllAnimals[animalId])):
-          xHead = trackingHeadTailAllAnimals[animalId][frameNumber][0][0]
-          yHead = trackingHeadTailAllAnimals[animalId][frameNumber][0][1]
-          if (xHead <= borderMargin) or (yHead <= borderMargin) or (xHead >= self._wellPositions[animalId]["lengthX"] - borderMargin - 1) or (yHead >= self._wellPositions[animalId]["lengthY"] - borderMargin - 1):
-            trackingHeadTailAllAnimals[animalId][frameNumber][0][0] = 0
-            trackingHeadTailAllAnimals[animalId][frameNumber][0][1] = 0
+        xHead = trackingHeadTailAllAnimals[animalId, :, 0, 0]
+        yHead = trackingHeadTailAllAnimals[animalId, :, 0, 1]
+        toRemove = (xHead <= borderMargin) | (yHead <= borderMargin) | (xHead >= self._wellPositions[animalId]["lengthX"] - borderMargin - 1) | (yHead >= self._wellPositions[animalId]["lengthY"] - borderMargin - 1)
+        trackingHeadTailAllAnimals[animalId, toRemove, 0, 0] = 0
+        trackingHeadTailAllAnimals[animalId, toRemove, 0, 1] = 0
 
     # Removing all points that are deviating too much from the main trajectory
     if self._hyperparameters["postProcessRemovePointsAwayFromMainTrajectory"]:
@@ -68,10 +110,9 @@ class BaseZebraZoomTrackingMethod(BaseTrackingMethod, GetBackgroundMixin, Update
         xHeadPositionsRollingMedian = self.__rollingMedianFilter(xHeadPositions, 11)
         yHeadPositionsRollingMedian = self.__rollingMedianFilter(yHeadPositions, 11)
         distance = np.sqrt((xHeadPositions - xHeadPositionsRollingMedian) ** 2 + (yHeadPositions - yHeadPositionsRollingMedian) ** 2)
-        distanceRollingMedian = self.__rollingMedianFilter(distance, 5)
-        normalizedDistance = np.array([1 for x in range(0,len(xHeadPositions))])
+        # the distances are compared to their local median, which is often 0 for animals at rest: it's counted as at least one pixel
+        distanceRollingMedian = np.maximum(self.__rollingMedianFilter(distance, 5), 1)
         normalizedDistance = distance / distanceRollingMedian
-        normalizedDistance = np.nan_to_num(normalizedDistance, nan=1)
         toRemove   = normalizedDistance - np.mean(normalizedDistance) > self._hyperparameters["postProcessRemovePointsAwayFromMainTrajectoryThreshold"] * np.std(normalizedDistance)
         trackingHeadTailAllAnimals[animalId, toRemove, 0, 0] = 0
         trackingHeadTailAllAnimals[animalId, toRemove, 0, 1] = 0
@@ -79,42 +120,7 @@ class BaseZebraZoomTrackingMethod(BaseTrackingMethod, GetBackgroundMixin, Update
     currentlyZero  = False
     zeroFrameStart = 0
     for animalId in range(0, len(trackingHeadTailAllAnimals)):
-      for frameNumber in range(0, len(trackingHeadTailAllAnimals[animalId])):
-        xHead = trackingHeadTailAllAnimals[animalId][frameNumber][0][0]
-        yHead = trackingHeadTailAllAnimals[animalId][frameNumber][0][1]
-        if frameNumber != 0:
-          xHeadPrev = trackingHeadTailAllAnimals[animalId][frameNumber-1][0][0]
-          yHeadPrev = trackingHeadTailAllAnimals[animalId][frameNumber-1][0][1]
-        else:
-          xHeadPrev = trackingHeadTailAllAnimals[animalId][frameNumber][0][0]
-          yHeadPrev = trackingHeadTailAllAnimals[animalId][frameNumber][0][1]
-        if ((xHead == 0 and yHead == 0) or (math.sqrt((xHead - xHeadPrev)**2 + (yHead - yHeadPrev)**2) > maxDistanceAuthorized)) and (frameNumber != len(trackingHeadTailAllAnimals[animalId]) - 1):
-          if not(currentlyZero):
-            zeroFrameStart = frameNumber
-          # print("currentlyZero at True: animalId:", animalId, "; frameNumber:", frameNumber)
-          currentlyZero = True
-        else:
-          if currentlyZero:
-            if zeroFrameStart >= 1:
-              xHeadStart = trackingHeadTailAllAnimals[animalId][zeroFrameStart-1][0][0]
-              yHeadStart = trackingHeadTailAllAnimals[animalId][zeroFrameStart-1][0][1]
-            else:
-              xHeadStart = trackingHeadTailAllAnimals[animalId][frameNumber][0][0]
-              yHeadStart = trackingHeadTailAllAnimals[animalId][frameNumber][0][1]
-            xHeadEnd = trackingHeadTailAllAnimals[animalId][frameNumber][0][0]
-            yHeadEnd = trackingHeadTailAllAnimals[animalId][frameNumber][0][1]
-            if (math.sqrt((xHeadEnd - xHeadStart)**2 + (yHeadEnd - yHeadStart)**2) < maxDistanceAuthorized) or (frameNumber - zeroFrameStart > maxDisapearanceFrames):
-              currentlyZero = False
-              if (math.sqrt((xHeadEnd - xHeadStart)**2 + (yHeadEnd - yHeadStart)**2) < maxDistanceAuthorized) and not((xHeadEnd == 0) and (yHeadEnd == 0)):
-                xStep = (xHeadEnd - xHeadStart) / (frameNumber - zeroFrameStart)
-                yStep = (yHeadEnd - yHeadStart) / (frameNumber - zeroFrameStart)
-                for frameAtZeroToChange in range(zeroFrameStart, frameNumber):
-                  trackingHeadTailAllAnimals[animalId][frameAtZeroToChange][0][0] = xHeadStart + xStep * (frameAtZeroToChange - zeroFrameStart)
-                  trackingHeadTailAllAnimals[animalId][frameAtZeroToChange][0][1] = yHeadStart + yStep * (frameAtZeroToChange - zeroFrameStart)
-              else:
-                for frameAtZeroToChange in range(zeroFrameStart, frameNumber):
-                  trackingHeadTailAllAnimals[animalId][frameAtZeroToChange][0][0] = xHeadStart
-                  trackingHeadTailAllAnimals[animalId][frameAtZeroToChange][0][1] = yHeadStart
+      currentlyZero, zeroFrameStart = self.__fillMissingPositions(trackingHeadTailAllAnimals[animalId, :, 0], maxDistanceAuthorized, maxDisapearanceFrames, currentlyZero, zeroFrameStart)
 
   @staticmethod
   def _calculateAngle(xStart, yStart, xEnd, yEnd):
@@ -164,7 +170,7 @@ class BaseZebraZoomTrackingMethod(BaseTrackingMethod, GetBackgroundMixin, Update
         with h5py.File(os.path.join(self._hyperparameters['outputFolder'], fname)) as results:
           background = results['background'][:]
       else:
-        background = self._getBackground()
+        background = self._getCachedBackground()
       if self._hyperparameters['storeH5']:
         with h5py.File(self._hyperparameters['H5filename'], 'a') as results:
           results.create_dataset('background', data=background)
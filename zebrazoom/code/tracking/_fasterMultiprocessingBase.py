@@ -1,9 +1,14 @@
 import cv2
+import multiprocessing
 import numpy as np
 import queue
 import os
 
 from ._baseZebraZoom import BaseZebraZoomTrackingMethod
+from ._sharedFrameBroadcast import SharedFrameBroadcaster, getResultsOfProcesses, putResultsInQueue, stopProcesses
+
+from zebrazoom.code.vars import getGlobalVariables
+globalVariables = getGlobalVariables()
 
 
 class BaseFasterMultiprocessing(BaseZebraZoomTrackingMethod):
@@ -25,6 +30,85 @@ class BaseFasterMultiprocessing(BaseZebraZoomTrackingMethod):
     self._trackingHeadingAllAnimalsList = [np.zeros((self._hyperparameters["nbAnimalsPerWell"], self._lastFrame-self._firstFrame+1))
                                            for _ in range(self._hyperparameters["nbWells"])]
 
+  def _getTrackingArraysPerWell(self):
+    '''Returns the names of the attributes containing the tracking arrays of each well'''
+    return ['_trackingHeadTailAllAnimalsList', '_trackingHeadingAllAnimalsList']
+
+  def _getGreyAndBackgroundSubtractedFrames(self, frame):
+    '''
+    Converts the frame to grayscale and subtracts the background, once for all the wells: pixels which are not darker than the background by more
+    than minPixelDiffForBackExtract are set to white. Everything is done in uint8, the background minus minPixelDiffForBackExtract saturating at 0.
+    '''
+    grey = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+    putToWhite = cv2.compare(grey, cv2.subtract(self._background, self._hyperparameters["minPixelDiffForBackExtract"]), cv2.CMP_GE)
+    return grey, cv2.max(grey, putToWhite)
+
+  def _preprocessFrame(self, frame):
+    '''Returns the frame, its grayscale version and the background subtracted one'''
+    return (frame, *self._getGreyAndBackgroundSubtractedFrames(frame))
+
+  def _packFrame(self, frame):
+    return np.concatenate([image.ravel() for image in self._preprocessFrame(frame)])
+
+  def _unpackFrame(self, packedFrame):
+    height, width = self._background.shape
+    nbChannels = packedFrame.size // (height * width) - 2
+    frameSize = height * width * nbChannels
+    return packedFrame[:frameSize].reshape(height, width, nbChannels), packedFrame[frameSize:frameSize + height * width].reshape(height, width), packedFrame[frameSize + height * width:].reshape(height, width)
+
+  def _getNbProcesses(self):
+    '''Returns the number of processes among which the wells are split, 1 if they are all tracked in this process'''
+    if self._hyperparameters["fasterMultiprocessingNbProcesses"] <= 1 or globalVariables["noMultiprocessing"] or multiprocessing.current_process().daemon or \
+        self._hyperparameters["debugTracking"] or self._hyperparameters["adjustFreelySwimTracking"] or self._hyperparameters["adjustFreelySwimTrackingAutomaticParameters"] or \
+        self._hyperparameters["detectMovementWithRawVideoInsideTracking"] or self._hyperparameters["updateBackgroundAtInterval"] or self._hyperparameters["backgroundSubtractorKNN"]:
+      return 1
+    return min(int(self._hyperparameters["fasterMultiprocessingNbProcesses"]), self._lastWell - self._firstWell + 1)
+
+  def _trackWellsOfProcess(self, reader, wellNumbers, printProgress):
+    try:
+      for i in range(self._firstFrame, self._lastFrame + 1):
+        if printProgress and (self._hyperparameters["freqAlgoPosFollow"] != 0) and (i % self._hyperparameters["freqAlgoPosFollow"] == 0):
+          print("Tracking: frame:",i)
+          if self._hyperparameters["popUpAlgoFollow"]:
+            from zebrazoom.code.popUpAlgoFollow import prepend
+
+            prepend("Tracking: frame:" + str(i))
+        ret, packedFrame = reader.read()
+        if ret:
+          self._trackWells(i, *self._unpackFrame(packedFrame), wellNumbers)
+    finally:
+      reader.release()
+    return {wellNumber: {name: getattr(self, name)[wellNumber] for name in self._getTrackingArraysPerWell()} for wellNumber in wellNumbers}
+
+  def _trackWellsInProcesses(self, nbProcesses):
+    '''
+    Splits the wells between nbProcesses processes. Each frame is still decoded, converted to grayscale and background subtracted only once
+    (in a thread of this process), then published in shared memory from which the processes read it. Returns False if the frames could not be shared,
+    raises a RuntimeError if one of the processes failed.
+    '''
+    try:
+      broadcaster = SharedFrameBroadcaster(self._videoPath, self._firstFrame, self._lastFrame, nbProcesses, self._hyperparameters["decodeFramesOnceRingBufferSize"],
+                                           hyperparameters=self._hyperparameters, preprocessFrame=self._packFrame)
+    except (ValueError, OSError) as e:
+      print("Could not share the frames between processes, all wells are tracked in this process:", e)
+      return False
+    wellNumbers = list(range(self._firstWell, self._lastWell + 1))
+    resultsQueue = multiprocessing.Queue()
+    processes = [multiprocessing.Process(target=putResultsInQueue, args=(resultsQueue, processIdx, self._trackWellsOfProcess, broadcaster.getReader(processIdx), wellNumbers[len(wellNumbers) * processIdx // nbProcesses:len(wellNumbers) * (processIdx + 1) // nbProcesses], processIdx == 0), daemon=True)
+                 for processIdx in range(nbProcesses)]
+    try:
+      for p in processes:
+        p.start()
+      broadcaster.start()
+      for results in getResultsOfProcesses(resultsQueue, processes):
+        for wellNumber, arrays in results.items():
+          for name, array in arrays.items():
+            getattr(self, name)[wellNumber] = array
+    finally:
+      broadcaster.close()
+      stopProcesses(processes)
+    return True
+
 
   def _detectMovementWithRawVideoInsideTracking(self, i, grey, previousFrames):
     if previousFrames is None:
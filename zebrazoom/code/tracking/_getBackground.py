@@ -1,3 +1,7 @@
+import hashlib
+import json
+import os
+
 import numpy as np
 import cv2
 
@@ -5,9 +9,69 @@ import zebrazoom.videoFormatConversion.zzVideoReading as zzVideoReading
 from zebrazoom.code.preprocessImage import preprocessBackgroundImage
 
 
+_BACKGROUND_CACHE_VERSION = 1
+_BACKGROUND_HYPERPARAMETERS = ("backCalculationStep", "firstFrameForBackExtract", "lastFrameForBackExtract", "firstFrame", "lastFrame",
+                               "backgroundExtractionForceUseAllVideoFrames", "nbImagesForBackgroundCalculation", "useFirstFrameAsBackground",
+                               "invertBlackWhiteOnImages", "lastFrameForInitialBackDetect", "extractBackWhiteBackground",
+                               "backgroundExtractionWithOnlyTwoFrames", "backgroundPreProcessMethod", "backgroundPreProcessParameters",
+                               "checkThatMovementOccurInVideo", "checkThatMovementOccurInVideoMedianFilterWindow", "imagePreProcessMethod",
+                               "imagePreProcessParameters", "oneWellManuallyChosenTopLeft", "oneWellManuallyChosenBottomRight",
+                               "minPixelDiffForBackExtract", "setBackgroundToImageMedian",
+                               "delta_t_toLoad", "nbPixelsAddAtEachFrame", "maxSumAllPixelToKeepImage") # used by the event based video reader
+
+
+def _getGreyFrame(frame):
+  '''Converts the frames read in color to grayscale, the single channel ones (which can be read-only views on the video file) are copied'''
+  return cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY) if frame.ndim == 3 else frame.copy()
+
+
+def _videoFingerprint(videoPath, nbSamples=16, sampleSize=65536):
+  '''Hash of the size of the video file(s) and of evenly spaced chunks of their content.'''
+  fingerprint = hashlib.sha1()
+  videoFiles = [videoPath]
+  if '.seq' in videoPath:
+    videoFiles.append(videoPath.replace('.seq', '.sqb'))
+  for videoFile in videoFiles:
+    size = os.path.getsize(videoFile)
+    fingerprint.update(str(size).encode())
+    with open(videoFile, 'rb') as f:
+      for sample in range(nbSamples):
+        f.seek(max(0, size - sampleSize) * sample // max(1, nbSamples - 1))
+        fingerprint.update(f.read(sampleSize))
+  return fingerprint.hexdigest()
+
+
 class GetBackgroundMixin:
+  def _getBackgroundCachePath(self):
+    backgroundHyperparameters = {name: self._hyperparameters.get(name) for name in _BACKGROUND_HYPERPARAMETERS}
+    key = hashlib.sha1(json.dumps([_BACKGROUND_CACHE_VERSION, _videoFingerprint(self._videoPath), backgroundHyperparameters], sort_keys=True, default=str).encode()).hexdigest()
+    videoName = os.path.splitext(os.path.basename(self._videoPath))[0]
+    return os.path.join(self._hyperparameters['outputFolder'], '.ZebraZoomVideoInputs', videoName, 'backgroundCache', key + '.npy')
+
+  def _getCachedBackground(self):
+    # the background is always cached when the tracking is checkpointed, so that it isn't recalculated when the tracking is resumed
+    if not (self._hyperparameters["cacheBackground"] or self._hyperparameters["checkpointInterval"]) or self._hyperparameters["debugExtractBack"]:
+      return self._getBackground()
+    cachePath = self._getBackgroundCachePath()
+    if os.path.exists(cachePath):
+      try:
+        background = np.load(cachePath)
+        print("Background reloaded from cache")
+        return background
+      except (OSError, ValueError):
+        print("Couldn't reload the background from the cache, recalculating it")
+    background = self._getBackground()
+    try:
+      os.makedirs(os.path.dirname(cachePath), exist_ok=True)
+      temporaryPath = cachePath[:-len('.npy')] + '_%d.tmp.npy' % os.getpid()
+      np.save(temporaryPath, background)
+      os.replace(temporaryPath, cachePath)
+    except OSError:
+      print("Couldn't save the background in the cache")
+    return background
+
   def _getBackground(self):
-    cap   = zzVideoReading.VideoCapture(self._videoPath, self._hyperparameters)
+    cap   = zzVideoReading.VideoCapture(self._videoPath, self._hyperparameters, grayscale=True)
     max_l = int(cap.get(7))
 
     backCalculationStep = self._hyperparameters["backCalculationStep"]
@@ -36,7 +100,7 @@ class GetBackgroundMixin:
     if self._hyperparameters["useFirstFrameAsBackground"]:
       if self._hyperparameters["invertBlackWhiteOnImages"]:
         back = 255 - back
-      back = cv2.cvtColor(back, cv2.COLOR_BGR2GRAY)
+      back = _getGreyFrame(back)
       if self._hyperparameters["backgroundPreProcessMethod"]:
         back = preprocessBackgroundImage(back, self._hyperparameters)
       if debugExtractBack:
@@ -52,14 +116,14 @@ class GetBackgroundMixin:
         cap.set(cv2.CAP_PROP_POS_FRAMES, self._hyperparameters["lastFrameForInitialBackDetect"])
       ret, frame = cap.read()
       back = cv2.max(frame, back)
-      back = cv2.cvtColor(back, cv2.COLOR_BGR2GRAY)
+      back = _getGreyFrame(back)
       cap.release()
       print("Background Extracted from first frame and frame " + str(self._hyperparameters["lastFrameForInitialBackDetect"]))
       return back
 
     if ret and self._hyperparameters["invertBlackWhiteOnImages"]:
       back = 255 - back
-    back = cv2.cvtColor(back, cv2.COLOR_BGR2GRAY)
+    back = _getGreyFrame(back)
     if self._hyperparameters["backgroundExtractionWithOnlyTwoFrames"] == 0:
       for k in range(firstFrame,lastFrame):
         if (k % backCalculationStep == 0):
@@ -70,7 +134,7 @@ class GetBackgroundMixin:
           if debugExtractBack:
             print(k)
           if ret:
-            frame = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+            frame = _getGreyFrame(frame)
             if self._hyperparameters["extractBackWhiteBackground"]:
               back = cv2.max(frame, back)
             else:
@@ -87,7 +151,7 @@ class GetBackgroundMixin:
           if ret:
             if self._hyperparameters["invertBlackWhiteOnImages"]:
               frame = 255 - frame
-            frame = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+            frame = _getGreyFrame(frame)
             diff  = np.sum(np.abs(frame - back))
             if diff > maxDiff:
               maxDiff    = diff
@@ -97,7 +161,7 @@ class GetBackgroundMixin:
       if ret:
         if self._hyperparameters["invertBlackWhiteOnImages"]:
           frame = 255 - frame
-        frame = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        frame = _getGreyFrame(frame)
         if self._hyperparameters["extractBackWhiteBackground"]:
           back = cv2.max(frame, back)
         else:
@@ -114,7 +178,7 @@ class GetBackgroundMixin:
       if ret:
         if self._hyperparameters["invertBlackWhiteOnImages"]:
           frame = 255 - frame
-        frame = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        frame = _getGreyFrame(frame)
         if self._hyperparameters["imagePreProcessMethod"]:
           frame = preprocessBackgroundImage(frame, self._hyperparameters)
         if type(frame[0][0]) == np.ndarray:
@@ -131,7 +195,7 @@ class GetBackgroundMixin:
           if ret:
             if self._hyperparameters["invertBlackWhiteOnImages"]:
               frame = 255 - frame
-            frame = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+            frame = _getGreyFrame(frame)
             if self._hyperparameters["imagePreProcessMethod"]:
               frame = preprocessBackgroundImage(frame, self._hyperparameters)
             if type(frame[0][0]) == np.ndarray:
@@ -295,6 +295,16 @@ class GetImagesMixin:
 
     return [curFrame, initialCurFrame, back]
 
+  def getGreyFrame(self, frame):
+    '''Applies to a frame of the video the inversion and the preprocessing chosen in the configuration file and converts it to grayscale (if it was read in color)'''
+    if self._hyperparameters["invertBlackWhiteOnImages"]:
+      frame = 255 - frame
+
+    if self._hyperparameters["imagePreProcessMethod"]:
+      frame = preprocessImage(frame, self._hyperparameters)
+
+    return cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY) if frame.ndim == 3 else frame
+
   def getImageSequential(self, cap, frameNumber, wellNumber):
     minPixelDiffForBackExtract = self._hyperparameters["minPixelDiffForBackExtract"]
     debug = 0
@@ -312,13 +322,7 @@ class GetImagesMixin:
       cap.set(1, frameNumber)
       ret, frame = cap.read()
 
-    if self._hyperparameters["invertBlackWhiteOnImages"]:
-      frame = 255 - frame
-
-    if self._hyperparameters["imagePreProcessMethod"]:
-      frame = preprocessImage(frame, self._hyperparameters)
-
-    grey = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+    grey = self.getGreyFrame(frame)
     curFrame = grey[ytop:ytop+lenY, xtop:xtop+lenX]
 
     if debug:
@@ -3,6 +3,8 @@ import math
 import cv2
 import numpy as np
 
+from ._identityAssignment import assignIdentities, isDetected, predictPositions
+
 
 class HeadTrackingHeadingCalculationMixin:
   def _calculateMinDistFromOtherAnimals(self, animal_Id, trackingHeadTailAllAnimals, i):
@@ -380,6 +382,18 @@ class HeadTrackingHeadingCalculationMixin:
         y = int(M['m01']/M['m00'])
     return [x, y]
 
+  def __assignIdentitiesOptimally(self, trackingHeadTailAllAnimals, headCoordinatesOptions, headCoordinatesOptionsAlreadyTakenAnimalId, i):
+    '''Assigns the head positions detected to the animals detected on the previous frame, minimizing the sum of the distances traveled'''
+    previousPositions = trackingHeadTailAllAnimals[:, i-self._firstFrame-1, 0]
+    animalsIds = np.nonzero(isDetected(previousPositions) & np.all(trackingHeadTailAllAnimals[:, i-self._firstFrame, 0] == 0, axis=1))[0]
+    if self._hyperparameters["identityAssignmentMotionPrediction"] and i - 1 > self._firstFrame:
+      previousPositions = predictPositions(previousPositions, trackingHeadTailAllAnimals[:, i-self._firstFrame-2, 0])
+    assignment = assignIdentities(previousPositions[animalsIds], headCoordinatesOptions, self._hyperparameters["identityAssignmentMaxDistance"])
+    for animal_Id, idxCoordinateOption in zip(animalsIds, assignment):
+      if idxCoordinateOption >= 0:
+        trackingHeadTailAllAnimals[animal_Id, i-self._firstFrame][0] = headCoordinatesOptions[idxCoordinateOption]
+        headCoordinatesOptionsAlreadyTakenAnimalId[idxCoordinateOption] = animal_Id
+
   def _multipleAnimalsHeadTracking(self, trackingHeadingAllAnimals, trackingHeadTailAllAnimals, gray, i, thresh1, xmin=0, ymin=0):
 
     headCoordinatesOptions      = []
@@ -459,7 +473,9 @@ class HeadTrackingHeadingCalculationMixin:
     headCoordinatesOptionsAlreadyTakenDist     = [-1 for k in headCoordinatesOptions]
     headCoordinatesOptionsAlreadyTakenAnimalId = [-1 for k in headCoordinatesOptions]
     animalNotPutOrEjectedBecausePositionAlreadyTaken = 1
-    if i > self._firstFrame:
+    if i > self._firstFrame and self._hyperparameters["multipleAnimalsOptimalIdentityAssignment"]:
+      self.__assignIdentitiesOptimally(trackingHeadTailAllAnimals, headCoordinatesOptions, headCoordinatesOptionsAlreadyTakenAnimalId, i)
+    elif i > self._firstFrame:
       while animalNotPutOrEjectedBecausePositionAlreadyTaken:
         animalNotPutOrEjectedBecausePositionAlreadyTaken = 0
         for animal_Id in range(0, self._hyperparameters["nbAnimalsPerWell"]):
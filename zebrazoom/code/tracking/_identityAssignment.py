@@ -0,0 +1,50 @@
+import numpy as np
+
+
+_GATED_COST = 1e12
+
+
+def isDetected(positions):
+  '''Tells, for each position, if it was detected: like the multiple animals head tracking, positions with a coordinate at 0 are considered as not detected'''
+  return np.all(np.asarray(positions) != 0, axis=-1)
+
+
+def predictPositions(previousPositions, positionsBefore):
+  '''
+  Constant velocity prediction of the current positions from the positions of the two previous frames.
+  Animals which were not detected (see isDetected) on one of the two previous frames are predicted at their previous position.
+  '''
+  previousPositions = np.asarray(previousPositions, dtype=float)
+  positionsBefore = np.asarray(positionsBefore, dtype=float)
+  detectedTwice = isDetected(previousPositions) & isDetected(positionsBefore)
+  return np.where(detectedTwice[:, None], 2 * previousPositions - positionsBefore, previousPositions)
+
+
+def getIdentityAssignmentCostMatrix(previousPositions, currentPositions, maxDistance=0):
+  '''
+  Euclidean distances between previous positions (rows) and current positions (columns).
+  If maxDistance is not 0, pairs further apart than maxDistance get a prohibitive cost.
+  '''
+  previousPositions = np.asarray(previousPositions, dtype=float).reshape(-1, 2)
+  currentPositions = np.asarray(currentPositions, dtype=float).reshape(-1, 2)
+  costMatrix = np.sqrt(((previousPositions[:, None, :] - currentPositions[None, :, :]) ** 2).sum(axis=2))
+  if maxDistance:
+    costMatrix[costMatrix > maxDistance] = _GATED_COST
+  return costMatrix
+
+
+def assignIdentities(previousPositions, currentPositions, maxDistance=0):
+  '''
+  Returns, for each previous position, the index of the current position assigned to it (-1 if none), such that the sum of the
+  distances between the positions assigned to each other is minimal. If maxDistance is not 0, positions further apart are never assigned.
+  '''
+  from scipy.optimize import linear_sum_assignment
+
+  assignment = np.full(len(previousPositions), -1)
+  if not len(previousPositions) or not len(currentPositions):
+    return assignment
+  costMatrix = getIdentityAssignmentCostMatrix(previousPositions, currentPositions, maxDistance)
+  rowInd, colInd = linear_sum_assignment(costMatrix)
+  kept = costMatrix[rowInd, colInd] < _GATED_COST
+  assignment[rowInd[kept]] = colInd[kept]
+  return assignment
@@ -0,0 +1,256 @@
+import multiprocessing
+import queue
+import threading
+import traceback
+from multiprocessing import shared_memory
+
+import numpy as np
+
+import zebrazoom.videoFormatConversion.zzVideoReading as zzVideoReading
+
+
+_DETACHED = 2 ** 62
+
+
+class SharedFrameBroadcaster:
+  '''
+  Decodes each frame of a video only once and publishes it in a shared memory ring buffer.
+
+  Every process tracking a well gets its own SharedFrameReader (see getReader) and reads the frames from the ring buffer
+  instead of decoding the whole video again. The decoding is done in a thread of the process that created the broadcaster,
+  a slot of the ring buffer is only overwritten once all readers are done with the frame it contains. If preprocessFrame is given,
+  it is applied to each decoded frame (only once, in the same thread) and its result is published instead of the frame.
+  '''
+
+  def __init__(self, videoPath, firstFrame, lastFrame, nbReaders, nbSlots, hyperparameters=0, preprocessFrame=None):
+    self._videoPath = videoPath
+    self._hyperparameters = hyperparameters
+    self._preprocessFrame = preprocessFrame
+    self._firstFrame = firstFrame
+    self._lastFrame = lastFrame
+    self._nbSlots = max(1, int(nbSlots))
+
+    cap = zzVideoReading.VideoCapture(videoPath, hyperparameters)
+    cap.set(1, firstFrame)
+    ret, frame = cap.read()
+    if not ret:
+      cap.release()
+      raise ValueError("Could not read frame %d of %s" % (firstFrame, videoPath))
+    if preprocessFrame is not None:
+      frame = preprocessFrame(frame)
+    self._frameShape = frame.shape
+    self._frameDtype = frame.dtype
+    self._videoProperties = {prop: cap.get(prop) for prop in (3, 4, 5, 7)}
+    cap.release()
+
+    self._sharedMemory = shared_memory.SharedMemory(create=True, size=self._nbSlots * frame.nbytes)
+    self._frames = np.ndarray((self._nbSlots,) + self._frameShape, dtype=self._frameDtype, buffer=self._sharedMemory.buf)
+    self._condition = multiprocessing.Condition()
+    self._readersNextFrame = multiprocessing.Array('q', [firstFrame] * nbReaders, lock=False)
+    self._retValues = multiprocessing.Array('b', self._nbSlots, lock=False)
+    self._nbFramesPublished = multiprocessing.Value('q', 0, lock=False)
+    self._producerDone = multiprocessing.Value('b', 0, lock=False)
+    self._thread = None
+
+  def getReader(self, readerId):
+    return SharedFrameReader(self._videoPath, self._sharedMemory.name, self._frameShape, self._frameDtype, self._nbSlots, self._firstFrame,
+                             self._lastFrame, self._videoProperties, self._condition, self._readersNextFrame, readerId,
+                             self._retValues, self._nbFramesPublished, self._producerDone, self._hyperparameters, self._preprocessFrame)
+
+  def _produce(self):
+    cap = zzVideoReading.VideoCapture(self._videoPath, self._hyperparameters)
+    try:
+      cap.set(1, self._firstFrame)
+      for frameNumber in range(self._firstFrame, self._lastFrame + 1):
+        with self._condition:
+          while min(self._readersNextFrame) <= frameNumber - self._nbSlots:
+            self._condition.wait()
+          if min(self._readersNextFrame) == _DETACHED:
+            break
+        slot = (frameNumber - self._firstFrame) % self._nbSlots
+        ret, frame = cap.read()
+        if ret and self._preprocessFrame is not None:
+          frame = self._preprocessFrame(frame)
+        ret = ret and frame.shape == self._frameShape and frame.dtype == self._frameDtype
+        if ret:
+          self._frames[slot] = frame
+        with self._condition:
+          self._retValues[slot] = ret
+          self._nbFramesPublished.value += 1
+          self._condition.notify_all()
+    finally:
+      cap.release()
+      with self._condition:
+        self._producerDone.value = 1
+        self._condition.notify_all()
+
+  def start(self):
+    self._thread = threading.Thread(target=self._produce, daemon=True)
+    self._thread.start()
+
+  def close(self):
+    with self._condition:
+      for readerId in range(len(self._readersNextFrame)):
+        self._readersNextFrame[readerId] = _DETACHED
+      self._condition.notify_all()
+    if self._thread is not None:
+      self._thread.join()
+    del self._frames
+    self._sharedMemory.close()
+    self._sharedMemory.unlink()
+
+
+class SharedFrameReader:
+  '''
+  cv2.VideoCapture-like object reading the frames published by a SharedFrameBroadcaster.
+
+  Frames are read sequentially from the ring buffer. As soon as the caller seeks to another frame than the next one (or a frame
+  could not be decoded by the broadcaster), the reader detaches from the ring buffer and falls back to decoding the video itself,
+  so that the frames returned are always the same as the ones returned by zzVideoReading.VideoCapture (preprocessed like the published ones).
+  '''
+
+  def __init__(self, videoPath, sharedMemoryName, frameShape, frameDtype, nbSlots, firstFrame, lastFrame, videoProperties,
+               condition, readersNextFrame, readerId, retValues, nbFramesPublished, producerDone, hyperparameters=0, preprocessFrame=None):
+    self._videoPath = videoPath
+    self._hyperparameters = hyperparameters
+    self._preprocessFrame = preprocessFrame
+    self._sharedMemoryName = sharedMemoryName
+    self._frameShape = frameShape
+    self._frameDtype = frameDtype
+    self._nbSlots = nbSlots
+    self._firstFrame = firstFrame
+    self._lastFrame = lastFrame
+    self._videoProperties = videoProperties
+    self._condition = condition
+    self._readersNextFrame = readersNextFrame
+    self._readerId = readerId
+    self._retValues = retValues
+    self._nbFramesPublished = nbFramesPublished
+    self._producerDone = producerDone
+    self._nextFrame = firstFrame
+    self._sharedMemory = None
+    self._frames = None
+    self._fallbackCap = None
+
+  def __getstate__(self):
+    state = self.__dict__.copy()
+    state['_sharedMemory'] = None
+    state['_frames'] = None
+    return state
+
+  def _detach(self, frameNumber):
+    with self._condition:
+      self._readersNextFrame[self._readerId] = _DETACHED
+      self._condition.notify_all()
+    self._closeSharedMemory()
+    self._fallbackCap = zzVideoReading.VideoCapture(self._videoPath, self._hyperparameters)
+    self._fallbackCap.set(1, frameNumber)
+
+  def _readFallback(self):
+    ret, frame = self._fallbackCap.read()
+    if ret and self._preprocessFrame is not None:
+      frame = self._preprocessFrame(frame)
+    return ret, frame
+
+  def _closeSharedMemory(self):
+    if self._sharedMemory is not None:
+      self._frames = None
+      self._sharedMemory.close()
+      self._sharedMemory = None
+
+  def read(self):
+    if self._fallbackCap is not None:
+      return self._readFallback()
+    frameNumber = self._nextFrame
+    if frameNumber > self._lastFrame:
+      self._detach(frameNumber)
+      return self._readFallback()
+    idx = frameNumber - self._firstFrame
+    with self._condition:
+      while self._nbFramesPublished.value <= idx and not self._producerDone.value:
+        self._condition.wait()
+      available = self._nbFramesPublished.value > idx and self._retValues[idx % self._nbSlots]
+    if not available:
+      self._detach(frameNumber)
+      return self._readFallback()
+    if self._sharedMemory is None:
+      self._sharedMemory = shared_memory.SharedMemory(name=self._sharedMemoryName)
+      self._frames = np.ndarray((self._nbSlots,) + self._frameShape, dtype=self._frameDtype, buffer=self._sharedMemory.buf)
+    frame = self._frames[idx % self._nbSlots].copy()
+    self._nextFrame = frameNumber + 1
+    with self._condition:
+      self._readersNextFrame[self._readerId] = self._nextFrame
+      self._condition.notify_all()
+    return True, frame
+
+  def set(self, propToChange, value):
+    if self._fallbackCap is not None:
+      return self._fallbackCap.set(propToChange, value)
+    if propToChange != 1:
+      return False
+    if int(value) != self._nextFrame:
+      self._detach(int(value))
+    return True
+
+  def get(self, idOfInfoRequested):
+    if self._fallbackCap is not None:
+      return self._fallbackCap.get(idOfInfoRequested)
+    if idOfInfoRequested == 1:
+      return self._nextFrame
+    return self._videoProperties.get(idOfInfoRequested, 0)
+
+  def isOpened(self):
+    return True
+
+  def release(self):
+    if self._fallbackCap is not None:
+      self._fallbackCap.release()
+      self._fallbackCap = None
+    else:
+      with self._condition:
+        self._readersNextFrame[self._readerId] = _DETACHED
+        self._condition.notify_all()
+      self._closeSharedMemory()
+
+
+def putResultsInQueue(resultsQueue, processIdx, function, *args):
+  '''Target of the processes whose results are gathered by getResultsOfProcesses: puts the results of function, or the traceback of the exception it raised, in resultsQueue.'''
+  try:
+    resultsQueue.put((processIdx, None, function(*args)))
+  except BaseException:
+    resultsQueue.put((processIdx, traceback.format_exc(), None))
+
+
+def getResultsOfProcesses(resultsQueue, processes, pollInterval=1):
+  '''
+  Returns the results put in resultsQueue (by putResultsInQueue) by each of the processes, in the order of the processes.
+  Raises a RuntimeError as soon as a process raised an exception or exited without putting its results in the queue, instead of waiting for them forever.
+  '''
+  results = {}
+  while len(results) < len(processes):
+    try:
+      processIdx, error, processResults = resultsQueue.get(timeout=pollInterval)
+    except queue.Empty:
+      exitedProcesses = [processIdx for processIdx, process in enumerate(processes) if processIdx not in results and process.exitcode is not None]
+      if not exitedProcesses:
+        continue
+      try:  # the results of a process which just exited may still be on their way
+        processIdx, error, processResults = resultsQueue.get(timeout=pollInterval)
+      except queue.Empty:
+        raise RuntimeError("The tracking process %d exited with code %d without sending its results" % (exitedProcesses[0], processes[exitedProcesses[0]].exitcode))
+    if error is not None:
+      raise RuntimeError("The tracking process %d failed:\n%s" % (processIdx, error))
+    results[processIdx] = processResults
+  return [results[processIdx] for processIdx in range(len(processes))]
+
+
+def stopProcesses(processes):
+  '''
+  Terminates the processes still running (if their results could not be gathered) and waits for all of them to exit.
+  The broadcaster must be closed before: a process terminated while waiting for a frame would prevent the others from being notified.
+  '''
+  for process in processes:
+    if process.is_alive():
+      process.terminate()
+    if process.pid is not None:
+      process.join()
@@ -1,4 +1,4 @@
-from zebrazoom.code.tracking.customTrackingImplementations.fastFishTracking.utilities import appendPoint, distBetweenThetas, assignValueIfBetweenRangeForDualDirection, calculateAngle
+from zebrazoom.code.tracking.customTrackingImplementations.fastFishTracking.utilities import appendPoint, calculateAngle, findDarkestCandidatePoint
 import zebrazoom.code.util as util
 import numpy as np
 import math
@@ -55,28 +55,16 @@ def dualDirectionTailDetection(headPosition, frame, points, angle, maxDepth, ste
       nbCols = len(points[0])
       xOld = points[0][nbCols - 1]
       yOld = points[1][nbCols - 1]
-    pixTotMax = 1000000
-    maxTheta  = angle
-    l = [i*(math.pi/nbList) for i in range(0,2*nbList) if distBetweenThetas(i*(math.pi/nbList), angle) < thetaDiffAccept]
-    if debug:
-      print("l normal:", l)
+    stepsUsed = [step for step in steps if (step < maxDepth - depth) or (step == steps[0])]
+    darkestPoint = findDarkestCandidatePoint(frame, xOld, yOld, angle, thetaDiffAccept, nbList, stepsUsed, lenX, lenY, True)
     
     xTot = -1
     yTot = -1
     pixSur = -1
-    for step in steps:
-      if (step < maxDepth - depth) or (step == steps[0]):
-        for theta in l:
-          xNew = assignValueIfBetweenRangeForDualDirection(int(xOld + step * (math.cos(theta))), 0, lenX)
-          yNew = assignValueIfBetweenRangeForDualDirection(int(yOld + step * (math.sin(theta))), 0, lenY)
-          pixTot = frame[yNew][xNew]
-          if xNew != -1 and yNew != -1 and (pixTot < pixTotMax):
-            pixTotMax = pixTot
-            maxTheta = theta
-            xTot = xNew
-            yTot = yNew
-            if debug:
-              print("regular dir: Choosing (x, y):", xTot, yTot, "; step:", step, "; theta:", theta, "; pixTot:", pixTot)
+    if darkestPoint is not None:
+      xTot, yTot, pixTotMax = darkestPoint
+      if debug:
+        print("regular dir: Choosing (x, y):", xTot, yTot, "; pixTot:", pixTotMax)
     if xTot != -1 and yTot != -1:
       pixTotList.append(pixTotMax)
       pixSur = frame[yTot, xTot]
@@ -88,27 +76,14 @@ def dualDirectionTailDetection(headPosition, frame, points, angle, maxDepth, ste
     else:
       xOld = points[0][0]
       yOld = points[1][0]
-    pixTotMax = 1000000 # remove this line?
-    maxTheta  = angleOpp
-    l = [i*(math.pi/nbList) for i in range(0,2*nbList) if distBetweenThetas(i*(math.pi/nbList), angleOpp) < thetaDiffAccept]
+    darkestPoint = findDarkestCandidatePoint(frame, xOld, yOld, angleOpp, thetaDiffAccept, nbList, stepsUsed, lenX, lenY, True)
     xTotOpp = -1
     yTotOpp = -1
     pixSurOpp = -1
-    if debug:
-      print("l opposite:", l)
-    for step in steps:
-      if (step < maxDepth - depth) or (step == steps[0]):
-        for theta in l:
-          xNew = assignValueIfBetweenRangeForDualDirection(int(xOld + step * (math.cos(theta))), 0, lenX)
-          yNew = assignValueIfBetweenRangeForDualDirection(int(yOld + step * (math.sin(theta))), 0, lenY)
-          pixTot = frame[yNew][xNew]
-          if xNew != -1 and yNew != -1 and (pixTot < pixTotMax):
-            pixTotMax = pixTot
-            maxTheta = theta
-            xTotOpp = xNew
-            yTotOpp = yNew
-            if debug:
-              print("opposite dir: Choosing (x, y):", xTotOpp, yTotOpp, "; step:", step, "; theta:", theta, "; pixTot:", pixTot)
+    if darkestPoint is not None:
+      xTotOpp, yTotOpp, pixTotMax = darkestPoint
+      if debug:
+        print("opposite dir: Choosing (x, y):", xTotOpp, yTotOpp, "; pixTot:", pixTotMax)
     if xTotOpp != -1 and yTotOpp != -1:
       pixTotList.append(pixTotMax)
       pixSurOpp = frame[yTotOpp, xTotOpp]
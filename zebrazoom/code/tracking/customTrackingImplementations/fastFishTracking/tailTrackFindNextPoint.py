@@ -1,4 +1,4 @@
-from zebrazoom.code.tracking.customTrackingImplementations.fastFishTracking.utilities import appendPoint, distBetweenThetas, assignValueIfBetweenRange, calculateAngle
+from zebrazoom.code.tracking.customTrackingImplementations.fastFishTracking.utilities import appendPoint, calculateAngle, findDarkestCandidatePoint
 import zebrazoom.code.util as util
 import numpy as np
 import math
@@ -33,21 +33,9 @@ def tailTrackFindNextPoint(depth, headPosition, frame, points, angle, maxDepth,
           
 
     pixTotMax = 1000000
-    maxTheta  = angle
-
-    l = [i*(math.pi/nbList) for i in range(0,2*nbList) if distBetweenThetas(i*(math.pi/nbList), angle) < thetaDiffAccept]
-
-    for step in steps:
-      if (step < maxDepth - depth) or (step == steps[0]):
-        for theta in l:
-          xNew = assignValueIfBetweenRange(int(x + step * (math.cos(theta))), 0, lenX)
-          yNew = assignValueIfBetweenRange(int(y + step * (math.sin(theta))), 0, lenY)
-          pixTot = frame[yNew][xNew]
-          if (pixTot < pixTotMax):
-            pixTotMax = pixTot
-            maxTheta = theta
-            xTot = xNew
-            yTot = yNew
+    darkestPoint = findDarkestCandidatePoint(frame, x, y, angle, thetaDiffAccept, nbList, [step for step in steps if (step < maxDepth - depth) or (step == steps[0])], lenX, lenY)
+    if darkestPoint is not None:
+      xTot, yTot, pixTotMax = darkestPoint
     
     pixTotList.append(pixTotMax)
     
@@ -6,16 +6,23 @@ from zebrazoom.code.tracking.customTrackingImplementations.fastFishTracking.back
 from zebrazoom.code.tracking.customTrackingImplementations.fastFishTracking.backgroundSubtractionOnlyOnROIs import backgroundSubtractionOnlyOnROIs
 import zebrazoom.videoFormatConversion.zzVideoReading as zzVideoReading
 from zebrazoom.code.extractParameters import extractParameters
+from zebrazoom.code.profiling import measure
 import zebrazoom.code.util as util
 import zebrazoom.code.tracking
 import numpy as np
+import functools
+import multiprocessing
 import queue
 import math
 import time
 import cv2
 
+from ..._sharedFrameBroadcast import SharedFrameBroadcaster, getResultsOfProcesses, putResultsInQueue, stopProcesses
 from ..._updateBackgroundAtInterval import UpdateBackgroundAtIntervalMixin
 
+from zebrazoom.code.vars import getGlobalVariables
+globalVariables = getGlobalVariables()
+
 
 class Tracking(zebrazoom.code.tracking.BaseTrackingMethod, UpdateBackgroundAtIntervalMixin):
   
@@ -48,6 +55,112 @@ class Tracking(zebrazoom.code.tracking.BaseTrackingMethod, UpdateBackgroundAtInt
   def _adjustParameters(self, i, frame, widgets):
     return None
 
+  def __getstate__(self):
+    state = self.__dict__.copy()
+    state['cap'] = None
+    return state
+
+  def _trackFrames(self, cap, resizeFrameFactor, times):
+    '''Tracks the animals of the wells in self._listOfWellsOnWhichToRunTheTracking on each frame read from cap, returns the frame at which the tracking stopped'''
+    ret = True
+    widgets = None
+    k = self._firstFrame
+    while (ret and k <= self._lastFrame):
+      if self._hyperparameters["freqAlgoPosFollow"] and k % self._hyperparameters["freqAlgoPosFollow"] == 0:
+        print("Tracking at frame", k)
+      time1 = time.time()
+      if self._hyperparameters['adjustFreelySwimTracking']:
+        cap.set(1, k)
+      ret, frame = cap.read()
+      time2 = time.time()
+      if resizeFrameFactor:
+        frame = cv2.resize(frame, (int(len(frame[0])/resizeFrameFactor), int(len(frame)/resizeFrameFactor)))
+      if ret:
+        if self._hyperparameters["backgroundSubtractionOnWholeImage"] or k == self._firstFrame:
+          frameROI = backgroundSubtractionOnWholeImage(self, frame, k-self._firstFrame)
+        else:
+          backgroundSubtractionOnlyOnROIs(self, frame, k-self._firstFrame)
+        if self._hyperparameters["updateBackgroundAtInterval"]:
+          for wellNumber in range(0, len(self._wellPositions)):
+            self._updateBackgroundAtInterval(k, wellNumber, frame[self._wellPositions[wellNumber]["topLeftY"]:self._wellPositions[wellNumber]["topLeftY"]+self._wellPositions[wellNumber]["lengthY"], self._wellPositions[wellNumber]["topLeftX"]:self._wellPositions[wellNumber]["topLeftX"]+self._wellPositions[wellNumber]["lengthX"], 0], self._trackingDataPerWell[wellNumber], frame)
+    
+      time3 = time.time()
+      times[k-self._firstFrame, 0] = time2 - time1
+      times[k-self._firstFrame, 1] = time3 - time2
+      adjustParamsInfo = self._adjustParameters(k, frameROI, widgets)
+      if adjustParamsInfo is not None:
+        k, widgets = adjustParamsInfo
+        if self._nbTailPoints != self._hyperparameters["nbTailPoints"]:
+          self._nbTailPoints = self._hyperparameters["nbTailPoints"]
+          self._trackingDataPerWell = [np.zeros((self._hyperparameters["nbAnimalsPerWell"], self._lastFrame-self._firstFrame+1, self._nbTailPoints, 2)) for _ in range(len(self._wellPositions))]
+      else:
+        k += 1
+    return k
+
+  def _getNbProcesses(self):
+    '''Returns the number of processes among which the wells are split, 1 if they are all tracked in this process'''
+    if self._hyperparameters["fastFishTrackingNbProcesses"] <= 1 or globalVariables["noMultiprocessing"] or multiprocessing.current_process().daemon or self._hyperparameters['adjustFreelySwimTracking'] or \
+        self._hyperparameters["updateBackgroundAtInterval"] or self._hyperparameters["backgroundSubtractionOnWholeImage"] or self._hyperparameters["debugHeadEmbededFindNextPoints"]:
+      return 1
+    if len(self._listOfWellsOnWhichToRunTheTracking) < 2:
+      print("fastFishTrackingNbProcesses is ignored: the animals of a well are tracked by a single process and only one well is tracked")
+      return 1
+    return min(int(self._hyperparameters["fastFishTrackingNbProcesses"]), len(self._listOfWellsOnWhichToRunTheTracking))
+
+  def _preprocessFrame(self, frame, resizeFrameFactor):
+    if resizeFrameFactor:
+      frame = cv2.resize(frame, (int(len(frame[0])/resizeFrameFactor), int(len(frame)/resizeFrameFactor)))
+    return np.ascontiguousarray(frame[:,:,0]) if len(frame.shape) == 3 else frame
+
+  def _trackFramesOfProcess(self, reader, wellNumbers):
+    self._listOfWellsOnWhichToRunTheTracking = wellNumbers
+    times = np.zeros((self._lastFrame - self._firstFrame + 1, 2))
+    try:
+      k = self._trackFrames(reader, 0, times)
+    finally:
+      reader.release()
+    return {'k': k, 'times': times, 'times2': self._times2, 'trackingData': {wellNumber: self._trackingDataPerWell[wellNumber] for wellNumber in wellNumbers},
+            'auDessus': None if self._auDessusPerAnimalIdList is None else {wellNumber: self._auDessusPerAnimalIdList[wellNumber] for wellNumber in wellNumbers}}
+
+  def _trackFramesInProcesses(self, nbProcesses, resizeFrameFactor, times):
+    '''
+    Splits the wells between nbProcesses processes, the animals of a well being tracked by the same process. Each frame is decoded (and converted
+    to grayscale) only once, in a thread of this process, and shared with the processes through shared memory. Returns the frame at which the
+    tracking stopped, or None if the frames could not be shared. Raises a RuntimeError if one of the processes failed.
+    '''
+    try:
+      broadcaster = SharedFrameBroadcaster(self._videoPath, self._firstFrame, self._lastFrame, nbProcesses, self._hyperparameters["decodeFramesOnceRingBufferSize"],
+                                           hyperparameters=self._hyperparameters, preprocessFrame=functools.partial(self._preprocessFrame, resizeFrameFactor=resizeFrameFactor))
+    except (ValueError, OSError) as e:
+      print("Could not share the frames between processes, all wells are tracked in this process:", e)
+      return None
+    wellNumbers = self._listOfWellsOnWhichToRunTheTracking
+    resultsQueue = multiprocessing.Queue()
+    processes = [multiprocessing.Process(target=putResultsInQueue, args=(resultsQueue, processIdx, self._trackFramesOfProcess, broadcaster.getReader(processIdx), wellNumbers[len(wellNumbers) * processIdx // nbProcesses:len(wellNumbers) * (processIdx + 1) // nbProcesses]), daemon=True)
+                 for processIdx in range(nbProcesses)]
+    k = self._lastFrame + 1
+    try:
+      for p in processes:
+        p.start()
+      broadcaster.start()
+      for results in getResultsOfProcesses(resultsQueue, processes):
+        k = min(k, results['k'])
+        # the slowest process sets the pace of the tracking
+        np.maximum(times, results['times'], out=times)
+        np.maximum(self._times2, results['times2'], out=self._times2)
+        for wellNumber, trackingData in results['trackingData'].items():
+          self._trackingDataPerWell[wellNumber] = trackingData
+        if results['auDessus'] is not None:
+          if self._auDessusPerAnimalIdList is None:
+            self._auDessusPerAnimalIdList = [[np.zeros((self._lastFrame-self._firstFrame+1, 1)) for nbAnimalsPerWell in range(0, self._hyperparameters["nbAnimalsPerWell"])]
+                                             for wellNumber in range(len(self._wellPositions))]
+          for wellNumber, auDessus in results['auDessus'].items():
+            self._auDessusPerAnimalIdList[wellNumber] = auDessus
+    finally:
+      broadcaster.close()
+      stopProcesses(processes)
+    return k
+
   def run(self):
     
     ### Step 1 (out of 2): Tracking:
@@ -88,43 +201,15 @@ class Tracking(zebrazoom.code.tracking.BaseTrackingMethod, UpdateBackgroundAtInt
     
     # Initializing variables
     times  = np.zeros((self._lastFrame - self._firstFrame + 1, 2))
-    ret = True
     
     # Going through each frame of the video
-    widgets = None
-    startTime = time.time()
-    k = self._firstFrame
-    while (ret and k <= self._lastFrame):
-      if self._hyperparameters["freqAlgoPosFollow"] and k % self._hyperparameters["freqAlgoPosFollow"] == 0:
-        print("Tracking at frame", k)
-      time1 = time.time()
-      if self._hyperparameters['adjustFreelySwimTracking']:
-        cap.set(1, k)
-      ret, frame = cap.read()
-      time2 = time.time()
-      if resizeFrameFactor:
-        frame = cv2.resize(frame, (int(len(frame[0])/resizeFrameFactor), int(len(frame)/resizeFrameFactor)))
-      if ret:
-        if self._hyperparameters["backgroundSubtractionOnWholeImage"] or k == self._firstFrame:
-          frameROI = backgroundSubtractionOnWholeImage(self, frame, k-self._firstFrame)
-        else:
-          backgroundSubtractionOnlyOnROIs(self, frame, k-self._firstFrame)
-        if self._hyperparameters["updateBackgroundAtInterval"]:
-          for wellNumber in range(0, len(self._wellPositions)):
-            self._updateBackgroundAtInterval(k, wellNumber, frame[self._wellPositions[wellNumber]["topLeftY"]:self._wellPositions[wellNumber]["topLeftY"]+self._wellPositions[wellNumber]["lengthY"], self._wellPositions[wellNumber]["topLeftX"]:self._wellPositions[wellNumber]["topLeftX"]+self._wellPositions[wellNumber]["lengthX"], 0], self._trackingDataPerWell[wellNumber], frame)
-      
-      time3 = time.time()
-      times[k-self._firstFrame, 0] = time2 - time1
-      times[k-self._firstFrame, 1] = time3 - time2
-      adjustParamsInfo = self._adjustParameters(k, frameROI, widgets)
-      if adjustParamsInfo is not None:
-        k, widgets = adjustParamsInfo
-        if self._nbTailPoints != self._hyperparameters["nbTailPoints"]:
-          self._nbTailPoints = self._hyperparameters["nbTailPoints"]
-          self._trackingDataPerWell = [np.zeros((self._hyperparameters["nbAnimalsPerWell"], self._lastFrame-self._firstFrame+1, self._nbTailPoints, 2)) for _ in range(len(self._wellPositions))]
-      else:
-        k += 1
-    
+    self.profiling = []
+    with measure(self.profiling, 'trackingFrames'):
+      startTime = time.time()
+      nbProcesses = self._getNbProcesses()
+      k = self._trackFramesInProcesses(nbProcesses, resizeFrameFactor, times) if nbProcesses > 1 else None
+      if k is None:
+        k = self._trackFrames(cap, resizeFrameFactor, times)
     
     if resizeFrameFactor:
       self._trackingDataPerWell = [resizeFrameFactor * elem for elem in self._trackingDataPerWell]
@@ -141,6 +226,7 @@ class Tracking(zebrazoom.code.tracking.BaseTrackingMethod, UpdateBackgroundAtInt
     print("Gaussian blur:"           , np.median(self._times2[:,3]))
     print("Tracking on each well:"   , np.median(self._times2[:,4]))
     
+    self.profiling[-1].update(nbFrames=k - self._firstFrame, loadingImagesWallTime=float(np.sum(times[:,0])), processingImagesWallTime=float(np.sum(times[:,1])))
     loadingImagesTime       = np.median(times[:,0])
     processingImagesTime    = np.median(times[:,1])
     percentTimeSpentLoading = loadingImagesTime / (loadingImagesTime + processingImagesTime)
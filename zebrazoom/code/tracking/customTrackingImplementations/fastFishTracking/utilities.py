@@ -1,3 +1,5 @@
+import functools
+
 import numpy as np
 import math
 
@@ -48,4 +50,39 @@ def calculateAngle(xStart, yStart, xEnd, yEnd):
       lastFirstTheta = lastFirstTheta + math.pi
     elif (vx > 0) and (vy <= 0):
       lastFirstTheta = 2*math.pi - lastFirstTheta
-  return lastFirstTheta
\ No newline at end of file
+  return lastFirstTheta
+
+
+@functools.lru_cache(maxsize=None)
+def _getCandidateDirections(nbList):
+  thetas = [i*(math.pi/nbList) for i in range(0,2*nbList)]
+  return np.array(thetas), np.array([math.cos(theta) for theta in thetas]), np.array([math.sin(theta) for theta in thetas])
+
+def findDarkestCandidatePoint(frame, x, y, angle, thetaDiffAccept, nbList, steps, lenX, lenY, excludePointsOutsideFrame=False):
+  '''
+  Looks at the points located at each of the distances in steps from (x, y), in all the directions multiple of pi/nbList
+  closer than thetaDiffAccept to angle, and returns the (x, y) coordinates and the value of the darkest one (the first one
+  found when going through the steps and then the directions in order). Points outside the frame are either moved
+  back to its border or ignored (in which case None is returned if all the points are outside the frame).
+  '''
+  thetas, cosThetas, sinThetas = _getCandidateDirections(nbList)
+  diffs = np.abs(thetas - angle)
+  directions = np.minimum(diffs, (2 * math.pi) - diffs) < thetaDiffAccept
+  if not len(steps) or not directions.any():
+    return None
+  steps = np.array(steps)[:, None]
+  xNew = (x + steps * cosThetas[directions]).astype(int).ravel()
+  yNew = (y + steps * sinThetas[directions]).astype(int).ravel()
+  if excludePointsOutsideFrame:
+    inside = (xNew >= 0) & (xNew <= lenX) & (yNew >= 0) & (yNew <= lenY)
+    if not inside.any():
+      return None
+    xNew = xNew[inside]
+    yNew = yNew[inside]
+  else:
+    xNew = xNew.clip(0, lenX)
+    yNew = yNew.clip(0, lenY)
+  idx = frame[yNew, xNew].argmin()
+  xTot = int(xNew[idx])
+  yTot = int(yNew[idx])
+  return xTot, yTot, frame[yTot][xTot]
@@ -1,4 +1,4 @@
-from zebrazoom.code.extractParameters import extractParameters
+from zebrazoom.code.extractParameters import detectMovementWithRawVideoForAllWells, extractParameters
 
 import cv2
 import zebrazoom.videoFormatConversion.zzVideoReading as zzVideoReading
@@ -28,18 +28,82 @@ class FasterMultiprocessing(BaseFasterMultiprocessing, EyeTrackingMixin, GetImag
   def _adjustParameters(self, i, frame, widgets):
     return None
 
+  def _getTrackingArraysPerWell(self):
+    arrays = super()._getTrackingArraysPerWell()
+    if self._hyperparameters["eyeTracking"]:
+      arrays.append('_trackingEyesAllAnimalsList')
+    if self._trackingProbabilityOfGoodDetectionList != 0:
+      arrays.append('_trackingProbabilityOfGoodDetectionList')
+    return arrays
+
   def _formatOutput(self):
     if self._hyperparameters["postProcessMultipleTrajectories"]:
       for wellNumber in range(self._firstWell, self._lastWell + 1):
         self._postProcessMultipleTrajectories(self._trackingHeadTailAllAnimalsList[wellNumber], self._trackingProbabilityOfGoodDetectionList[wellNumber])
 
-    return {wellNumber: extractParameters([self._trackingHeadTailAllAnimalsList[wellNumber], self._trackingHeadingAllAnimalsList[wellNumber], [], 0, 0] + ([self._auDessusPerAnimalIdList[wellNumber]] if self._auDessusPerAnimalIdList is not None else []), wellNumber, self._hyperparameters, self._videoPath, self._wellPositions, self._background)
-            for wellNumber in range(self._firstWell, self._lastWell + 1)}
+    trackingDataPerWell = {wellNumber: [self._trackingHeadTailAllAnimalsList[wellNumber], self._trackingHeadingAllAnimalsList[wellNumber], [], 0, 0]
+                           for wellNumber in range(self._firstWell, self._lastWell + 1)}
+    if self._auDessusPerAnimalIdList is None:
+      self._auDessusPerAnimalIdList = detectMovementWithRawVideoForAllWells(trackingDataPerWell, self._hyperparameters, self._videoPath, self._wellPositions)
+    return {wellNumber: extractParameters(trackingData + ([self._auDessusPerAnimalIdList[wellNumber]] if self._auDessusPerAnimalIdList is not None else []), wellNumber, self._hyperparameters, self._videoPath, self._wellPositions, self._background)
+            for wellNumber, trackingData in trackingDataPerWell.items()}
+
+  def _trackWells(self, i, frame, grey, backgroundSubtracted, wellNumbers):
+    for wellNumber in wellNumbers:
+      if self._hyperparameters["nbAnimalsPerWell"] == 1 and not(self._hyperparameters["forceBlobMethodForHeadTracking"]):
+        xtop = self._wellPositions[wellNumber]['topLeftX']
+        ytop = self._wellPositions[wellNumber]['topLeftY']
+        lenX = self._wellPositions[wellNumber]['lengthX']
+        lenY = self._wellPositions[wellNumber]['lengthY']
+        if not(self._hyperparameters["backgroundSubtractorKNN"]):
+          curFrame = backgroundSubtracted[ytop:ytop+lenY, xtop:xtop+lenX].copy()
+          back = self._background[ytop:ytop+lenY, xtop:xtop+lenX]
+        else:
+          curFrame = grey[ytop:ytop+lenY, xtop:xtop+lenX].copy()
+          self._hyperparameters["paramGaussianBlur"] = int(math.sqrt(cv2.countNonZero(255 - curFrame) / self._hyperparameters["nbAnimalsPerWell"]) / 2) * 2 + 1
+        if self._hyperparameters["paramGaussianBlur"]:
+          blur = cv2.GaussianBlur(curFrame, (self._hyperparameters["paramGaussianBlur"], self._hyperparameters["paramGaussianBlur"]),0)
+        else:
+          blur = curFrame
+        thresh1 = 0
+        thresh2 = 0
+        gray    = 0
+      else:
+        [frame2, gray, thresh1, blur, thresh2, frame2, initialCurFrame, back, xHead, yHead] = self._getImages(0, i, wellNumber, frame)
+
+      headPositionFirstFrame = 0
+
+      # Head tracking and heading calculation
+      lastFirstTheta = self._headTrackingHeadingCalculation(i, blur, thresh1, thresh2, gray, self._hyperparameters["erodeSize"], frame.shape[1], frame.shape[0], self._trackingHeadingAllAnimalsList[wellNumber], self._trackingHeadTailAllAnimalsList[wellNumber], self._trackingProbabilityOfGoodDetectionList[wellNumber], headPositionFirstFrame, self._wellPositions[wellNumber]["lengthX"])
+
+      # Tail tracking for frame i
+      if self._hyperparameters["trackTail"] == 1 :
+        threshForBlackFrames = 0
+        thetaDiffAccept = 1.2
+        lastFirstTheta = 0
+        maxDepth = 0
+        tailTipFirstFrame = []
+        for animalId in range(0, self._hyperparameters["nbAnimalsPerWell"]):
+          self._tailTracking(animalId, i, frame, thresh1, threshForBlackFrames, thetaDiffAccept, self._trackingHeadTailAllAnimalsList[wellNumber], self._trackingHeadingAllAnimalsList[wellNumber], lastFirstTheta, maxDepth, tailTipFirstFrame, initialCurFrame.copy(), back)
+
+      # Eye tracking for frame i
+      if self._hyperparameters["eyeTracking"]:
+        self._eyeTracking(animalId, i, frame, thresh1, self._trackingHeadingAllAnimalsList[wellNumber], self._trackingHeadTailAllAnimalsList[wellNumber], self._trackingHeadingAllAnimalsList[wellNumber])
+
+      self._debugTracking(i, self._trackingHeadTailAllAnimalsList[wellNumber], self._trackingHeadingAllAnimalsList[wellNumber], curFrame)
+
+      if self._hyperparameters["freqAlgoPosFollow"]:
+        if i % self._hyperparameters["freqAlgoPosFollow"] == 0:
+          print("Tracking at frame", i)
 
   def run(self):
     self._background = self.getBackground()
 
-    cap = zzVideoReading.VideoCapture(self._videoPath)
+    nbProcesses = self._getNbProcesses()
+    if nbProcesses > 1 and self._trackWellsInProcesses(nbProcesses):
+      return self._formatOutput()
+
+    cap = zzVideoReading.VideoCapture(self._videoPath, self._hyperparameters)
     if (cap.isOpened()== False):
       print("Error opening video stream or file")
 
@@ -50,7 +114,7 @@ class FasterMultiprocessing(BaseFasterMultiprocessing, EyeTrackingMixin, GetImag
         ret, frame = cap.read()
         fgmask = fgbg.apply(frame)
       cap.release()
-      cap = zzVideoReading.VideoCapture(self._videoPath)
+      cap = zzVideoReading.VideoCapture(self._videoPath, self._hyperparameters)
 
     i = self._firstFrame
 
@@ -79,59 +143,13 @@ class FasterMultiprocessing(BaseFasterMultiprocessing, EyeTrackingMixin, GetImag
           frame = fgbg.apply(frame)
           frame = 255 - frame
 
-        for wellNumber in range(self._firstWell, self._lastWell + 1):
-          if self._hyperparameters["nbAnimalsPerWell"] == 1 and not(self._hyperparameters["forceBlobMethodForHeadTracking"]):
-            minPixelDiffForBackExtract = self._hyperparameters["minPixelDiffForBackExtract"]
-            xtop = self._wellPositions[wellNumber]['topLeftX']
-            ytop = self._wellPositions[wellNumber]['topLeftY']
-            lenX = self._wellPositions[wellNumber]['lengthX']
-            lenY = self._wellPositions[wellNumber]['lengthY']
-            if self._hyperparameters["backgroundSubtractorKNN"]:
-              grey = frame
-            else:
-              grey = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-
-            curFrame = grey[ytop:ytop+lenY, xtop:xtop+lenX].copy()
-            if not(self._hyperparameters["backgroundSubtractorKNN"]):
-              back = self._background[ytop:ytop+lenY, xtop:xtop+lenX]
-              putToWhite = ( curFrame.astype('int32') >= (back.astype('int32') - minPixelDiffForBackExtract) )
-              curFrame[putToWhite] = 255
-            else:
-              self._hyperparameters["paramGaussianBlur"] = int(math.sqrt(cv2.countNonZero(255 - curFrame) / self._hyperparameters["nbAnimalsPerWell"]) / 2) * 2 + 1
-            if self._hyperparameters["paramGaussianBlur"]:
-              blur = cv2.GaussianBlur(curFrame, (self._hyperparameters["paramGaussianBlur"], self._hyperparameters["paramGaussianBlur"]),0)
-            else:
-              blur = curFrame
-            thresh1 = 0
-            thresh2 = 0
-            gray    = 0
-          else:
-            [frame2, gray, thresh1, blur, thresh2, frame2, initialCurFrame, back, xHead, yHead] = self._getImages(0, i, wellNumber, frame)
-
-          headPositionFirstFrame = 0
-
-          # Head tracking and heading calculation
-          lastFirstTheta = self._headTrackingHeadingCalculation(i, blur, thresh1, thresh2, gray, self._hyperparameters["erodeSize"], int(cap.get(3)), int(cap.get(4)), self._trackingHeadingAllAnimalsList[wellNumber], self._trackingHeadTailAllAnimalsList[wellNumber], self._trackingProbabilityOfGoodDetectionList[wellNumber], headPositionFirstFrame, self._wellPositions[wellNumber]["lengthX"])
-
-          # Tail tracking for frame i
-          if self._hyperparameters["trackTail"] == 1 :
-            threshForBlackFrames = 0
-            thetaDiffAccept = 1.2
-            lastFirstTheta = 0
-            maxDepth = 0
-            tailTipFirstFrame = []
-            for animalId in range(0, self._hyperparameters["nbAnimalsPerWell"]):
-              self._tailTracking(animalId, i, frame, thresh1, threshForBlackFrames, thetaDiffAccept, self._trackingHeadTailAllAnimalsList[wellNumber], self._trackingHeadingAllAnimalsList[wellNumber], lastFirstTheta, maxDepth, tailTipFirstFrame, initialCurFrame.copy(), back)
-
-          # Eye tracking for frame i
-          if self._hyperparameters["eyeTracking"]:
-            self._eyeTracking(animalId, i, frame, thresh1, self._trackingHeadingAllAnimalsList[wellNumber], self._trackingHeadTailAllAnimalsList[wellNumber], self._trackingHeadingAllAnimalsList[wellNumber])
-
-          self._debugTracking(i, self._trackingHeadTailAllAnimalsList[wellNumber], self._trackingHeadingAllAnimalsList[wellNumber], curFrame)
-
-          if self._hyperparameters["freqAlgoPosFollow"]:
-            if i % self._hyperparameters["freqAlgoPosFollow"] == 0:
-              print("Tracking at frame", i)
+        if self._hyperparameters["backgroundSubtractorKNN"]:
+          grey = frame
+          backgroundSubtracted = None
+        else:
+          frame, grey, backgroundSubtracted = self._preprocessFrame(frame)
+
+        self._trackWells(i, frame, grey, backgroundSubtracted, range(self._firstWell, self._lastWell + 1))
 
         if self._hyperparameters["detectMovementWithRawVideoInsideTracking"]:
           previousFrames = self._detectMovementWithRawVideoInsideTracking(i, grey, previousFrames)
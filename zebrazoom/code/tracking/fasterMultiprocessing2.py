@@ -3,17 +3,37 @@ import numpy as np
 import math
 
 import zebrazoom.videoFormatConversion.zzVideoReading as zzVideoReading
-from zebrazoom.code.extractParameters import extractParameters
+from zebrazoom.code.extractParameters import detectMovementWithRawVideoForAllWells, extractParameters
 from zebrazoom.code.preprocessImage import preprocessImage
 
 from ._base import register_tracking_method
 from ._fasterMultiprocessingBase import BaseFasterMultiprocessing
+from ._identityAssignment import assignIdentities, isDetected, predictPositions
 from ._tailExtremityTracking import TailTrackingExtremityDetectMixin
 
 
+def _getLinesEndPoints(startPoint, angles):
+  '''Returns the (integer) end points of lines of length 100000 starting from startPoint in each of the directions'''
+  return list(zip((startPoint[0] + 100000 * np.array([math.cos(angle) for angle in angles])).astype(int).tolist(),
+                  (startPoint[1] + 100000 * np.array([math.sin(angle) for angle in angles])).astype(int).tolist()))
+
+
+def _countNonZeroOutsideLines(image, startPoint, endPoints):
+  '''Same as [cv2.countNonZero(cv2.line(image.copy(), startPoint, endPoint, (0), 1)) for endPoint in endPoints], drawing the lines on a single copy of the image'''
+  testImage = np.empty_like(image)
+  nbNonZero = []
+  for endPoint in endPoints:
+    np.copyto(testImage, image)
+    nbNonZero.append(cv2.countNonZero(cv2.line(testImage, startPoint, endPoint, (0), 1)))
+  return nbNonZero
+
+
 class FasterMultiprocessing2(BaseFasterMultiprocessing, TailTrackingExtremityDetectMixin):
   def __init__(self, videoPath, wellPositions, hyperparameters):
     super().__init__(videoPath, wellPositions, hyperparameters)
+    # the search of iterationsForErodeImageForHeadingCalculation starts from the last value found in the same well, so that the
+    # headings don't depend on the order in which the wells are tracked nor on how they are split between processes
+    self._iterationsForErodeImageForHeadingCalculation = {}
 
     # if self._hyperparameters["eyeTracking"]:
       # self._trackingEyesAllAnimalsList = []
@@ -66,24 +86,14 @@ class FasterMultiprocessing2(BaseFasterMultiprocessing, TailTrackingExtremityDet
 
     return indMin1, indMin2
 
-  def _computeHeading(self, initialContour, lenX, lenY, headPosition):
-    xmin = lenX
-    ymin = lenY
-    xmax = 0
-    ymax = 0
-    for pt in initialContour:
-      if pt[0][0] < xmin:
-        xmin = pt[0][0]
-      if pt[0][1] < ymin:
-        ymin = pt[0][1]
-      if pt[0][0] > xmax:
-        xmax = pt[0][0]
-      if pt[0][1] > ymax:
-        ymax = pt[0][1]
-
-    for pt in initialContour:
-      pt[0][0] = pt[0][0] - xmin
-      pt[0][1] = pt[0][1] - ymin
+  def _computeHeading(self, initialContour, lenX, lenY, headPosition, wellNumber):
+    xmin = min(lenX, initialContour[:, 0, 0].min())
+    ymin = min(lenY, initialContour[:, 0, 1].min())
+    xmax = max(0, initialContour[:, 0, 0].max())
+    ymax = max(0, initialContour[:, 0, 1].max())
+
+    initialContour[:, 0, 0] -= xmin
+    initialContour[:, 0, 1] -= ymin
 
     headPosition = [headPosition[0] - xmin, headPosition[1] - ymin]
 
@@ -101,27 +111,24 @@ class FasterMultiprocessing2(BaseFasterMultiprocessing, TailTrackingExtremityDet
     originalShape = 255 - image
 
     # Heading calculation: first approximation
-    minWhitePixel = 1000000000
-    bestAngle     = 0
     nTries        = 50
-    for i in range(0, nTries):
-      angleOption = i * ((2 * math.pi) / nTries)
-      startPoint = (int(headPosition[0]), int(headPosition[1]))
-      endPoint   = (int(headPosition[0] + 100000 * math.cos(angleOption)), int(headPosition[1] + 100000 * math.sin(angleOption)))
-      testImage  = originalShape.copy()
-      testImage  = cv2.line(testImage, startPoint, endPoint, (0), 1)
-      nbWhitePixels = cv2.countNonZero(testImage)
-
-      if nbWhitePixels < minWhitePixel:
-        minWhitePixel = nbWhitePixels
-        bestAngle     = angleOption
+    startPoint    = (int(headPosition[0]), int(headPosition[1]))
+    angleOptions  = [i * ((2 * math.pi) / nTries) for i in range(0, nTries)]
+    endPoints     = _getLinesEndPoints(headPosition, angleOptions)
+    nbWhitePixels = _countNonZeroOutsideLines(originalShape, startPoint, endPoints)
+    bestIdx       = int(np.argmin(nbWhitePixels))
+    minWhitePixel = nbWhitePixels[bestIdx]
+    bestAngle     = angleOptions[bestIdx]
     bestAngleAfterFirstStep = bestAngle
+    testImage     = cv2.line(originalShape.copy(), startPoint, endPoints[-1], (0), 1)
 
     # Heading calculation: second (and refined) approximation
     # Searching for the optimal value of iterationsForErodeImageForHeadingCalculation
     countTries = 0
     nbIterations2nbWhitePixels = {}
-    if "iterationsForErodeImageForHeadingCalculation" in self._hyperparameters:
+    if wellNumber in self._iterationsForErodeImageForHeadingCalculation:
+      iterationsForErodeImageForHeadingCalculation = self._iterationsForErodeImageForHeadingCalculation[wellNumber]
+    elif "iterationsForErodeImageForHeadingCalculation" in self._hyperparameters:
       iterationsForErodeImageForHeadingCalculation = self._hyperparameters["iterationsForErodeImageForHeadingCalculation"]
     else:
       iterationsForErodeImageForHeadingCalculation = 4
@@ -145,24 +152,16 @@ class FasterMultiprocessing2(BaseFasterMultiprocessing, TailTrackingExtremityDet
         minDist = dist
         best_iterations = iterations
     iterationsForErodeImageForHeadingCalculation = best_iterations
-    self._hyperparameters["iterationsForErodeImageForHeadingCalculation"] = iterationsForErodeImageForHeadingCalculation
+    self._iterationsForErodeImageForHeadingCalculation[wellNumber] = iterationsForErodeImageForHeadingCalculation
 
     testImage2 = cv2.erode(originalShape.copy(), kernel, iterations = iterationsForErodeImageForHeadingCalculation)
 
-    maxDist = -1
-    for i in range(0, nTries):
-      angleOption = bestAngleAfterFirstStep - (math.pi / 5) + i * ((2 * (math.pi / 5)) / nTries)
-
-      startPoint = (int(headPosition[0]), int(headPosition[1]))
-      endPoint   = (int(headPosition[0] + 100000 * math.cos(angleOption)), int(headPosition[1] + 100000 * math.sin(angleOption)))
-
-      testImage = testImage2.copy()
-
-      testImage  = cv2.line(testImage, startPoint, endPoint, (0), 1)
-      nbWhitePixels = cv2.countNonZero(testImage)
-      if nbWhitePixels < minWhitePixel:
-        minWhitePixel = nbWhitePixels
-        bestAngle     = angleOption
+    angleOptions  = [bestAngleAfterFirstStep - (math.pi / 5) + i * ((2 * (math.pi / 5)) / nTries) for i in range(0, nTries)]
+    nbWhitePixels = _countNonZeroOutsideLines(testImage2, startPoint, _getLinesEndPoints(headPosition, angleOptions))
+    bestIdx       = int(np.argmin(nbWhitePixels))
+    if nbWhitePixels[bestIdx] < minWhitePixel:
+      minWhitePixel = nbWhitePixels[bestIdx]
+      bestAngle     = angleOptions[bestIdx]
 
     theta = bestAngle
 
@@ -222,26 +221,30 @@ class FasterMultiprocessing2(BaseFasterMultiprocessing, TailTrackingExtremityDet
   # return theta
 
   def _findOptimalIdCorrespondance(self, wellNumber, i):
-    from scipy.optimize import linear_sum_assignment
-
+    nbAnimals = len(self._trackingHeadTailAllAnimalsList[wellNumber])
     if i > self._firstFrame:
 
-      costMatrix = np.zeros((len(self._trackingHeadTailAllAnimalsList[wellNumber]), len(self._trackingHeadTailAllAnimalsList[wellNumber])))
-
-      for animalIdPrev in range(0, len(self._trackingHeadTailAllAnimalsList[wellNumber])):
-        for animalIdCur in range(0, len(self._trackingHeadTailAllAnimalsList[wellNumber])):
-          coordPrevX = self._trackingHeadTailAllAnimalsList[wellNumber][animalIdPrev, i-self._firstFrame-1][0][0]
-          coordPrevY = self._trackingHeadTailAllAnimalsList[wellNumber][animalIdPrev, i-self._firstFrame-1][0][1]
-          coordCurX  = self._trackingHeadTailAllAnimalsList[wellNumber][animalIdCur,  i-self._firstFrame][0][0]
-          coordCurY  = self._trackingHeadTailAllAnimalsList[wellNumber][animalIdCur,  i-self._firstFrame][0][1]
-          # TO DO: add some very high cost for (0, 0) coordinates
-          costMatrix[animalIdPrev, animalIdCur] = math.sqrt((coordCurX - coordPrevX)**2 + (coordCurY - coordPrevY)**2)
-
-      row_ind, col_ind = linear_sum_assignment(costMatrix)
-
-      return col_ind
+      trackingHeadTailAllAnimals = self._trackingHeadTailAllAnimalsList[wellNumber]
+      previousPositions = trackingHeadTailAllAnimals[:, i-self._firstFrame-1, 0]
+      currentPositions = trackingHeadTailAllAnimals[:, i-self._firstFrame, 0]
+      previousIds = np.nonzero(isDetected(previousPositions))[0]
+      currentIds = np.nonzero(isDetected(currentPositions))[0]
+      if self._hyperparameters["identityAssignmentMotionPrediction"] and i - 1 > self._firstFrame:
+        previousPositions = predictPositions(previousPositions, trackingHeadTailAllAnimals[:, i-self._firstFrame-2, 0])
+      assignment = assignIdentities(previousPositions[previousIds], currentPositions[currentIds], self._hyperparameters["identityAssignmentMaxDistance"])
+
+      # the animals which are not assigned (not detected or too far away) keep their position when possible
+      correspondance = np.full(nbAnimals, -1)
+      correspondance[previousIds[assignment != -1]] = currentIds[assignment[assignment != -1]]
+      unassigned = set(range(nbAnimals)) - set(correspondance)
+      for animalId in np.nonzero(correspondance == -1)[0]:
+        if animalId in unassigned:
+          correspondance[animalId] = animalId
+          unassigned.remove(animalId)
+      unassigned = iter(sorted(unassigned))
+      return np.array([animalId if animalId != -1 else next(unassigned) for animalId in correspondance])
     else:
-      return np.array([k for k in range(0, len(self._trackingHeadTailAllAnimalsList[wellNumber]))])
+      return np.arange(nbAnimals)
 
   def _switchIdentities(self, correspondance, wellNumber, i):
     trackingHeadTailAllAnimalsListWellNumberOriginal = self._trackingHeadTailAllAnimalsList[wellNumber][:, i-self._firstFrame].copy()
@@ -257,23 +260,13 @@ class FasterMultiprocessing2(BaseFasterMultiprocessing, TailTrackingExtremityDet
     x = 0
     y = 0
 
-    xmin = lenX
-    ymin = lenY
-    xmax = 0
-    ymax = 0
-    for pt in initialContour:
-      if pt[0][0] < xmin:
-        xmin = pt[0][0]
-      if pt[0][1] < ymin:
-        ymin = pt[0][1]
-      if pt[0][0] > xmax:
-        xmax = pt[0][0]
-      if pt[0][1] > ymax:
-        ymax = pt[0][1]
-
-    for pt in initialContour:
-      pt[0][0] = pt[0][0] - xmin
-      pt[0][1] = pt[0][1] - ymin
+    xmin = min(lenX, initialContour[:, 0, 0].min())
+    ymin = min(lenY, initialContour[:, 0, 1].min())
+    xmax = max(0, initialContour[:, 0, 0].max())
+    ymax = max(0, initialContour[:, 0, 1].max())
+
+    initialContour[:, 0, 0] -= xmin
+    initialContour[:, 0, 1] -= ymin
 
     image = np.zeros((ymax - ymin, xmax - xmin))
     image[:, :] = 255
@@ -316,17 +309,124 @@ class FasterMultiprocessing2(BaseFasterMultiprocessing, TailTrackingExtremityDet
   def _formatOutput(self):
     # if self._hyperparameters["postProcessMultipleTrajectories"]:
       # self._postProcessMultipleTrajectories(self._trackingHeadTailAllAnimalsList[wellNumber], self._trackingProbabilityOfGoodDetectionList[wellNumber])
-    if self._auDessusPerAnimalIdList == None:
+    if self._auDessusPerAnimalIdList is None:
+      self._auDessusPerAnimalIdList = detectMovementWithRawVideoForAllWells({wellNumber: [self._trackingHeadTailAllAnimalsList[wellNumber], self._trackingHeadingAllAnimalsList[wellNumber], [], 0, 0]
+                                                                             for wellNumber in range(self._firstWell, self._lastWell + 1)}, self._hyperparameters, self._videoPath, self._wellPositions)
+    if self._auDessusPerAnimalIdList is None:
       return {wellNumber: extractParameters([self._trackingHeadTailAllAnimalsList[wellNumber], self._trackingHeadingAllAnimalsList[wellNumber], [], 0, 0, 0], wellNumber, self._hyperparameters, self._videoPath, self._wellPositions, self._background)
               for wellNumber in range(self._firstWell, self._lastWell + 1)}
     else:
       return {wellNumber: extractParameters([self._trackingHeadTailAllAnimalsList[wellNumber], self._trackingHeadingAllAnimalsList[wellNumber], [], 0, 0, self._auDessusPerAnimalIdList[wellNumber]], wellNumber, self._hyperparameters, self._videoPath, self._wellPositions, self._background)
               for wellNumber in range(self._firstWell, self._lastWell + 1)}
 
+  def _preprocessFrame(self, frame):
+    if self._hyperparameters["invertBlackWhiteOnImages"]:
+      frame = 255 - frame
+
+    if self._hyperparameters["imagePreProcessMethod"]:
+      frame = preprocessImage(frame, self._hyperparameters)
+
+    # if self._hyperparameters["backgroundSubtractorKNN"]:
+      # frame = fgbg.apply(frame)
+      # frame = 255 - frame
+
+    return super()._preprocessFrame(frame)
+
+  def _trackWells(self, i, frame, grey, backgroundSubtracted, wellNumbers):
+    for wellNumber in wellNumbers:
+      xtop = self._wellPositions[wellNumber]['topLeftX']
+      ytop = self._wellPositions[wellNumber]['topLeftY']
+      lenX = self._wellPositions[wellNumber]['lengthX']
+      lenY = self._wellPositions[wellNumber]['lengthY']
+      initialCurFrame = grey[ytop:ytop+lenY, xtop:xtop+lenX].copy()
+      back = self._background[ytop:ytop+lenY, xtop:xtop+lenX]
+      curFrame = backgroundSubtracted[ytop:ytop+lenY, xtop:xtop+lenX].copy()
+      # if self._hyperparameters["paramGaussianBlur"]:
+        # blur = cv2.GaussianBlur(curFrame, (self._hyperparameters["paramGaussianBlur"], self._hyperparameters["paramGaussianBlur"]),0)
+      # else:
+        # blur = curFrame
+      headPositionFirstFrame = 0
+
+      ret, thresh1 = cv2.threshold(curFrame.copy(), 254, 255, cv2.THRESH_BINARY)
+
+      contours, hierarchy = cv2.findContours(thresh1,cv2.RETR_TREE,cv2.CHAIN_APPROX_SIMPLE)
+      areas = np.array([cv2.contourArea(contour) for contour in contours])
+
+      maxIndexes = []
+      for numFish in range(0, self._hyperparameters["nbAnimalsPerWell"]):
+        maxArea = -1
+        maxInd  = -1
+        for idx, area in enumerate(areas):
+          if area > maxArea and area > 0.7 * self._hyperparameters["minAreaBody"] and area < 1.3 * self._hyperparameters["maxAreaBody"]:
+            maxArea = area
+            maxInd  = idx
+        areas[maxInd] = -1
+        if maxInd != -1:
+          maxIndexes.append(maxInd)
+
+      for animal_Id, idx in enumerate(maxIndexes):
+        bodyContour = contours[idx]
+        M = cv2.moments(bodyContour)
+        if M['m00']:
+          # x = int(M['m10']/M['m00'])
+          # y = int(M['m01']/M['m00'])
+          # headPosition = [x, y]
+          headPosition = self._findCenterByIterativelyDilating(bodyContour.copy(), len(curFrame[0]), len(curFrame))
+
+          self._trackingHeadTailAllAnimalsList[wellNumber][animal_Id, i-self._firstFrame][0][0] = headPosition[0]
+          self._trackingHeadTailAllAnimalsList[wellNumber][animal_Id, i-self._firstFrame][0][1] = headPosition[1]
+
+          heading = self._computeHeading(bodyContour.copy(), len(curFrame[0]), len(curFrame), headPosition, wellNumber)
+
+          self._trackingHeadingAllAnimalsList[wellNumber][animal_Id, i-self._firstFrame] = heading
+
+          if self._hyperparameters["trackTail"] == 1 :
+
+            res = self._findTheTwoSides(headPosition, bodyContour, curFrame, heading)
+
+            # Finding tail extremity
+            rotatedContour = bodyContour.copy()
+            rotatedContour = self._rotate(rotatedContour,int(headPosition[0]),int(headPosition[1]),heading)
+            debugAdv = False
+
+            [MostCurvyIndex, distance2] = self._findTailExtremete(rotatedContour, bodyContour, headPosition[0], int(res[0]), int(res[1]), debugAdv, curFrame, self._hyperparameters["tailExtremityMaxJugeDecreaseCoeff"])
+
+            # Getting Midline
+            if self._hyperparameters["detectMouthInsteadOfHeadTwoSides"] == 0:
+              tail = self._getMidline(int(res[0]), int(res[1]), int(MostCurvyIndex), bodyContour, curFrame, self._nbTailPoints-1, distance2, debugAdv)
+            else:
+              tail = self._getMidline(int(res[0]), int(res[1]), int(MostCurvyIndex), bodyContour, curFrame, self._nbTailPoints, distance2, debugAdv)
+              tail = np.array([tail[0][1:len(tail[0])]])
+            tail = np.insert(tail, 0, headPosition, axis=1)
+            self._trackingHeadTailAllAnimalsList[wellNumber][animal_Id, i-self._firstFrame] = tail
+
+      # Eye tracking for frame i
+      # if self._hyperparameters["eyeTracking"]:
+        # self._eyeTracking(animalId, i, frame, thresh1, self._trackingHeadingAllAnimalsList[wellNumber], self._trackingHeadTailAllAnimalsList[wellNumber], self._trackingHeadingAllAnimalsList[wellNumber])
+
+      correspondance = self._findOptimalIdCorrespondance(wellNumber,  i)
+
+      self._switchIdentities(correspondance, wellNumber, i)
+
+      self._debugTracking(i, self._trackingHeadTailAllAnimalsList[wellNumber], self._trackingHeadingAllAnimalsList[wellNumber], curFrame)
+
+      if self._hyperparameters["updateBackgroundAtInterval"]:
+        self._updateBackgroundAtInterval(i, wellNumber, initialCurFrame, self._trackingHeadTailAllAnimalsList[wellNumber], initialCurFrame)
+
+      if self._hyperparameters["freqAlgoPosFollow"]:
+        if i % self._hyperparameters["freqAlgoPosFollow"] == 0:
+          print("Tracking at frame", i)
+
+    return back, initialCurFrame
+
   def run(self):
     self._background = self.getBackground()
 
-    cap = zzVideoReading.VideoCapture(self._videoPath)
+    nbProcesses = self._getNbProcesses()
+    if nbProcesses > 1 and self._trackWellsInProcesses(nbProcesses):
+      return self._formatOutput()
+
+    cap = zzVideoReading.VideoCapture(self._videoPath, self._hyperparameters)
     if (cap.isOpened()== False):
       print("Error opening video stream or file")
 
@@ -361,112 +461,10 @@ class FasterMultiprocessing2(BaseFasterMultiprocessing, TailTrackingExtremityDet
       ret, frame = cap.read()
 
       if ret:
-        
-        if self._hyperparameters["invertBlackWhiteOnImages"]:
-          frame = 255 - frame
-        
-        if self._hyperparameters["imagePreProcessMethod"]:
-          frame = preprocessImage(frame, self._hyperparameters)
-        
-        # if self._hyperparameters["backgroundSubtractorKNN"]:
-          # frame = fgbg.apply(frame)
-          # frame = 255 - frame
-
-        for wellNumber in range(self._firstWell, self._lastWell + 1):
-
-          minPixelDiffForBackExtract = self._hyperparameters["minPixelDiffForBackExtract"]
-          xtop = self._wellPositions[wellNumber]['topLeftX']
-          ytop = self._wellPositions[wellNumber]['topLeftY']
-          lenX = self._wellPositions[wellNumber]['lengthX']
-          lenY = self._wellPositions[wellNumber]['lengthY']
-          # if self._hyperparameters["backgroundSubtractorKNN"]:
-            # grey = frame
-          # else:
-          grey = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-
-          curFrame = grey[ytop:ytop+lenY, xtop:xtop+lenX].copy()
-          initialCurFrame = curFrame.copy()
-          # if not(self._hyperparameters["backgroundSubtractorKNN"]):
-          back = self._background[ytop:ytop+lenY, xtop:xtop+lenX]
-          putToWhite = ( curFrame.astype('int32') >= (back.astype('int32') - minPixelDiffForBackExtract) )
-          curFrame[putToWhite] = 255
-          # else:
-            # self._hyperparameters["paramGaussianBlur"] = int(math.sqrt(cv2.countNonZero(255 - curFrame) / self._hyperparameters["nbAnimalsPerWell"]) / 2) * 2 + 1
-          # if self._hyperparameters["paramGaussianBlur"]:
-            # blur = cv2.GaussianBlur(curFrame, (self._hyperparameters["paramGaussianBlur"], self._hyperparameters["paramGaussianBlur"]),0)
-          # else:
-            # blur = curFrame
-          headPositionFirstFrame = 0
-
-          ret, thresh1 = cv2.threshold(curFrame.copy(), 254, 255, cv2.THRESH_BINARY)
-
-          contours, hierarchy = cv2.findContours(thresh1,cv2.RETR_TREE,cv2.CHAIN_APPROX_SIMPLE)
-          areas = np.array([cv2.contourArea(contour) for contour in contours])
-
-          maxIndexes = []
-          for numFish in range(0, self._hyperparameters["nbAnimalsPerWell"]):
-            maxArea = -1
-            maxInd  = -1
-            for idx, area in enumerate(areas):
-              if area > maxArea and area > 0.7 * self._hyperparameters["minAreaBody"] and area < 1.3 * self._hyperparameters["maxAreaBody"]:
-                maxArea = area
-                maxInd  = idx
-            areas[maxInd] = -1
-            if maxInd != -1:
-              maxIndexes.append(maxInd)
-
-          for animal_Id, idx in enumerate(maxIndexes):
-            bodyContour = contours[idx]
-            M = cv2.moments(bodyContour)
-            if M['m00']:
-              # x = int(M['m10']/M['m00'])
-              # y = int(M['m01']/M['m00'])
-              # headPosition = [x, y]
-              headPosition = self._findCenterByIterativelyDilating(bodyContour.copy(), len(curFrame[0]), len(curFrame))
-
-              self._trackingHeadTailAllAnimalsList[wellNumber][animal_Id, i-self._firstFrame][0][0] = headPosition[0]
-              self._trackingHeadTailAllAnimalsList[wellNumber][animal_Id, i-self._firstFrame][0][1] = headPosition[1]
-
-              heading = self._computeHeading(bodyContour.copy(), len(curFrame[0]), len(curFrame), headPosition)
-
-              self._trackingHeadingAllAnimalsList[wellNumber][animal_Id, i-self._firstFrame] = heading
-
-              if self._hyperparameters["trackTail"] == 1 :
-
-                res = self._findTheTwoSides(headPosition, bodyContour, curFrame, heading)
-
-                # Finding tail extremity
-                rotatedContour = bodyContour.copy()
-                rotatedContour = self._rotate(rotatedContour,int(headPosition[0]),int(headPosition[1]),heading)
-                debugAdv = False
-
-                [MostCurvyIndex, distance2] = self._findTailExtremete(rotatedContour, bodyContour, headPosition[0], int(res[0]), int(res[1]), debugAdv, curFrame, self._hyperparameters["tailExtremityMaxJugeDecreaseCoeff"])
-
-                # Getting Midline
-                if self._hyperparameters["detectMouthInsteadOfHeadTwoSides"] == 0:
-                  tail = self._getMidline(int(res[0]), int(res[1]), int(MostCurvyIndex), bodyContour, curFrame, self._nbTailPoints-1, distance2, debugAdv)
-                else:
-                  tail = self._getMidline(int(res[0]), int(res[1]), int(MostCurvyIndex), bodyContour, curFrame, self._nbTailPoints, distance2, debugAdv)
-                  tail = np.array([tail[0][1:len(tail[0])]])
-                tail = np.insert(tail, 0, headPosition, axis=1)
-                self._trackingHeadTailAllAnimalsList[wellNumber][animal_Id, i-self._firstFrame] = tail
-
-          # Eye tracking for frame i
-          # if self._hyperparameters["eyeTracking"]:
-            # self._eyeTracking(animalId, i, frame, thresh1, self._trackingHeadingAllAnimalsList[wellNumber], self._trackingHeadTailAllAnimalsList[wellNumber], self._trackingHeadingAllAnimalsList[wellNumber])
-
-          correspondance = self._findOptimalIdCorrespondance(wellNumber,  i)
-
-          self._switchIdentities(correspondance, wellNumber, i)
-
-          self._debugTracking(i, self._trackingHeadTailAllAnimalsList[wellNumber], self._trackingHeadingAllAnimalsList[wellNumber], curFrame)
-
-          if self._hyperparameters["updateBackgroundAtInterval"]:
-            self._updateBackgroundAtInterval(i, wellNumber, initialCurFrame, self._trackingHeadTailAllAnimalsList[wellNumber], initialCurFrame)
-
-          if self._hyperparameters["freqAlgoPosFollow"]:
-            if i % self._hyperparameters["freqAlgoPosFollow"] == 0:
-              print("Tracking at frame", i)
+
+        frame, grey, backgroundSubtracted = self._preprocessFrame(frame)
+
+        back, initialCurFrame = self._trackWells(i, frame, grey, backgroundSubtracted, range(self._firstWell, self._lastWell + 1))
 
         if self._hyperparameters["detectMovementWithRawVideoInsideTracking"]:
           previousFrames = self._detectMovementWithRawVideoInsideTracking(i, grey, previousFrames)
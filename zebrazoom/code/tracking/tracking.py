@@ -7,13 +7,20 @@ import os
 import pickle
 import sys
 import queue
+import collections
 
+from zebrazoom.code.deepLearningFunctions.batchedInference import normalizeFramesWithQuantiles, predictMasks
 from zebrazoom.code.extractParameters import extractParameters
+from zebrazoom.code.profiling import measure
+from zebrazoom.code.trackingCheckpoint import TrackingCheckpoint, getTrackingHyperparameters
 
 from ._base import register_tracking_method
 from ._baseZebraZoom import BaseZebraZoomTrackingMethod
 from ._eyeTracking import EyeTrackingMixin
+from ._getBackground import _videoFingerprint
 from ._getImages import GetImagesMixin
+from ._identityAssignment import assignIdentities
+from ._sharedFrameBroadcast import SharedFrameBroadcaster
 from ._tailTracking import TailTrackingMixin
 from ._tailTrackingDifficultBackground import TailTrackingDifficultBackgroundMixin
 
@@ -26,6 +33,8 @@ class Tracking(BaseZebraZoomTrackingMethod, TailTrackingDifficultBackgroundMixin
     self._videoPath = videoPath
     self._hyperparameters = hyperparameters
     self._background = None
+    self._checkpoint = None
+    self._timeChunk = None
     self._wellPositions = wellPositions
     self._videoName = os.path.splitext(os.path.basename(videoPath))[0]
     self._auDessusPerAnimalId = None
@@ -126,10 +135,59 @@ class Tracking(BaseZebraZoomTrackingMethod, TailTrackingDifficultBackgroundMixin
     previousFrames.put(initialCurFrame)
     previousXYCoords.put([xHead, yHead])
 
+  def _getTrackingArrays(self):
+    '''Arrays of the tracking results, with the frames along their second axis'''
+    arrays = {'trackingHeadTailAllAnimals': self._trackingHeadTailAllAnimals, 'trackingHeadingAllAnimals': self._trackingHeadingAllAnimals}
+    if isinstance(self._trackingEyesAllAnimals, np.ndarray):
+      arrays['trackingEyesAllAnimals'] = self._trackingEyesAllAnimals
+    if isinstance(self._trackingProbabilityOfGoodDetection, np.ndarray):
+      arrays['trackingProbabilityOfGoodDetection'] = self._trackingProbabilityOfGoodDetection
+    return arrays
+
+  def _getTrackingState(self):
+    '''State changing during the tracking (some hyperparameters are adapted on the fly and the background can be updated)'''
+    return {'hyperparameters': getTrackingHyperparameters(self._hyperparameters), 'headPositionFirstFrame': self._headPositionFirstFrame,
+            'tailTipFirstFrame': self._tailTipFirstFrame, 'background': self._background if self._hyperparameters["updateBackgroundAtInterval"] else None,
+            'auDessusPerAnimalId': self._auDessusPerAnimalId}
+
+  def _restoreTrackingState(self, state):
+    self._hyperparameters.update(state['hyperparameters'])
+    self._headPositionFirstFrame = state['headPositionFirstFrame']
+    self._tailTipFirstFrame = state['tailTipFirstFrame']
+    if state['background'] is not None:
+      self._background = state['background']
+    self._auDessusPerAnimalId = state['auDessusPerAnimalId']
+
+  def _restoreCheckpoint(self, wellNumber, savedTracking):
+    self._checkpoint.restoreArrays(wellNumber, savedTracking, self._getTrackingArrays())
+    self._restoreTrackingState(savedTracking['state'])
+
   def _loadDLModel(self):
-    # Reloading DL model for tracking with DL
-    from zebrazoom.code.deepLearningFunctions.loadDLmodel import loadDLmodel
-    return loadDLmodel(self._hyperparameters["trackingDL"], self._hyperparameters["unet"])
+    # Reloading DL model for tracking with DL (only once per process, even if several wells are tracked by the same process)
+    from zebrazoom.code.deepLearningFunctions.loadDLmodel import loadDLmodelOncePerProcess
+    return loadDLmodelOncePerProcess(self._hyperparameters["trackingDL"], self._hyperparameters["unet"])
+
+  def _readFramesDL(self, cap, nbFrames, applyQuantile):
+    '''Reads the next nbFrames frames and returns them as an array of grayscale frames'''
+    frames = []
+    quantiles = []
+    for _ in range(nbFrames):
+      ret, frame = cap.read()
+      quantiles.append(0.03)
+      if not(ret):
+        currentFrameNum = int(cap.get(1))
+        while not(ret):
+          currentFrameNum = currentFrameNum - 1
+          cap.set(1, currentFrameNum)
+          ret, frame = cap.read()
+        quantiles[-1] = 0.01
+      frames.append(cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY))
+    frames = np.array(frames)
+    if applyQuantile:
+      for quantile in set(quantiles):
+        selected = np.array(quantiles) == quantile
+        frames[selected] = normalizeFramesWithQuantiles(frames[selected], quantile)
+    return frames
 
   def _trackingDL(self, wellNumber, device, dlModel):
     import torch
@@ -148,8 +206,13 @@ class Tracking(BaseZebraZoomTrackingMethod, TailTrackingDifficultBackgroundMixin
     frame_width  = int(cap.get(3))
     frame_height = int(cap.get(4))
 
-    # Performing the tracking on each frame
+    if self._hyperparameters["trackingDLnbThreadsPerWell"] and device.type == 'cpu':
+      torch.set_num_threads(int(self._hyperparameters["trackingDLnbThreadsPerWell"]))
+
+    # Performing the tracking on each frame, the DL model is applied on batches of trackingDLbatchSize frames
     applyQuantile = self._hyperparameters["applyQuantileInDLalgo"]
+    batchSize = max(1, int(self._hyperparameters["trackingDLbatchSize"]))
+    batch = collections.deque()
     i = self._firstFrame
     cap.set(1, self._firstFrame)
     if int(self._hyperparameters["onlyDoTheTrackingForThisNumberOfFrames"]) != 0:
@@ -164,63 +227,14 @@ class Tracking(BaseZebraZoomTrackingMethod, TailTrackingDifficultBackgroundMixin
       if self._hyperparameters["debugTracking"]:
         print("frame:",i)
 
-      ret, frame = cap.read()
-      if applyQuantile:
-        frame = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-        quartileChose = 0.03
-        lowVal  = int(np.quantile(frame, quartileChose))
-        highVal = int(np.quantile(frame, 1 - quartileChose))
-        frame[frame < lowVal]  = lowVal
-        frame[frame > highVal] = highVal
-        frame = frame - lowVal
-        mult  = np.max(frame)
-        frame = frame * (255/mult)
-        frame = frame.astype('uint8')
-
-      if not(ret):
-        currentFrameNum = int(cap.get(1))
-        while not(ret):
-          currentFrameNum = currentFrameNum - 1
-          cap.set(1, currentFrameNum)
-          ret, frame = cap.read()
-          if applyQuantile:
-            frame = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-            quartileChose = 0.01
-            lowVal  = int(np.quantile(frame, quartileChose))
-            highVal = int(np.quantile(frame, 1 - quartileChose))
-            frame[frame < lowVal]  = lowVal
-            frame[frame > highVal] = highVal
-            frame = frame - lowVal
-            mult  = np.max(frame)
-            frame = frame * (255/mult)
-            frame = frame.astype('uint8')
-
-      if applyQuantile:
-        grey = frame
-      else:
-        grey = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-
-      curFrame = grey[ytop:ytop+lenY, xtop:xtop+lenX]
+      if not batch:
+        curFrames = self._readFramesDL(cap, min(batchSize, self._lastFrame + 1 - i), applyQuantile)[:, ytop:ytop+lenY, xtop:xtop+lenX]
+        batch.extend(zip(curFrames, predictMasks(dlModel, curFrames, device, self._hyperparameters["unet"])))
+      curFrame, thresh = batch.popleft()
 
       if self._hyperparameters["unet"]:
 
-        device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
-        imgTorch = torch.from_numpy(curFrame/255)
-        imgTorch = imgTorch.unsqueeze(0).unsqueeze(0)
-        imgTorch = imgTorch.to(device=device, dtype=torch.float32)
-
-        output = dlModel(imgTorch).cpu()
-
-        import torch.nn.functional as F
-        output = F.interpolate(output, (len(curFrame[1]), len(curFrame)), mode='bilinear')
-        if dlModel.n_classes > 1:
-            mask = output.argmax(dim=1)
-        else:
-            mask = torch.sigmoid(output) > out_threshold
-        thresh2 = mask[0].long().squeeze().numpy()
-        thresh2 = thresh2 * 255
-        thresh2 = thresh2.astype('uint8')
-
+        thresh2 = thresh
         thresh3 = thresh2.copy()
 
         if self._hyperparameters["debugTracking"]:
@@ -237,15 +251,7 @@ class Tracking(BaseZebraZoomTrackingMethod, TailTrackingDifficultBackgroundMixin
 
       else: # mask rcnn
 
-        oneChannel  = curFrame.tolist()
-        oneChannel2 = [[a/255 for a in list] for list in oneChannel]
-        imgTorch    = torch.tensor([oneChannel2, oneChannel2, oneChannel2])
-
-        with torch.no_grad():
-          prediction = dlModel([imgTorch.to(device)])
-
-        if len(prediction) and len(prediction[0]['masks']):
-          thresh = prediction[0]['masks'][0, 0].mul(255).byte().cpu().numpy()
+        if thresh is not None:
           if debugPlus:
             self._debugFrame(255 - thresh, title="thresh")
 
@@ -326,7 +332,7 @@ class Tracking(BaseZebraZoomTrackingMethod, TailTrackingDifficultBackgroundMixin
 
     return [self._trackingHeadTailAllAnimals, self._trackingHeadingAllAnimals, 0, 0, 0]
 
-  def runTracking(self, wellNumber, background=None):
+  def runTracking(self, wellNumber, background=None, cap=None):
     if background is not None:
       self._background = background
     if self._background is None:
@@ -345,7 +351,8 @@ class Tracking(BaseZebraZoomTrackingMethod, TailTrackingDifficultBackgroundMixin
     thetaDiffAccept = 1.2 # 0.5 for the head embedded maybe
     maxDepth = 0
 
-    cap = zzVideoReading.VideoCapture(self._videoPath)
+    if cap is None:
+      cap = zzVideoReading.VideoCapture(self._videoPath, self._hyperparameters)
     if (cap.isOpened()== False):
       print("Error opening video stream or file")
 
@@ -424,7 +431,26 @@ class Tracking(BaseZebraZoomTrackingMethod, TailTrackingDifficultBackgroundMixin
     i = self._firstFrame
     if int(self._hyperparameters["onlyDoTheTrackingForThisNumberOfFrames"]) != 0:
       self._lastFrame = min(self._lastFrame, self._firstFrame + int(self._hyperparameters["onlyDoTheTrackingForThisNumberOfFrames"]))
-    while (i < self._lastFrame+1):
+    lastFrameToTrack = self._lastFrame
+    if self._timeChunk is not None:
+      # only the frames of a time chunk are tracked (see _runTrackingInTimeChunks)
+      i, lastFrameToTrack = self._timeChunk
+      cap.set(1, i)
+    # The tracking can't be resumed when the parameters are adjusted through the GUI, as the frames are then not tracked in order
+    checkpoint = None
+    if self._checkpoint is not None and not (self._hyperparameters["adjustFreelySwimTracking"] or self._hyperparameters["adjustFreelySwimTrackingAutomaticParameters"] or
+                                             self._hyperparameters["adjustHeadEmbededTracking"] or self._hyperparameters["adjustHeadEmbeddedEyeTracking"]):
+      checkpoint = self._checkpoint
+      savedTracking = checkpoint.load(wellNumber)
+      if savedTracking is not None:
+        self._restoreCheckpoint(wellNumber, savedTracking)
+        i = self._firstFrame + savedTracking['frameIdx']
+        cap.set(1, i)
+        print("Resuming the tracking of well", wellNumber, "at frame", i)
+    while (i < lastFrameToTrack+1):
+
+      if checkpoint is not None and (i - self._firstFrame) % self._hyperparameters["checkpointInterval"] == 0:
+        checkpoint.save(wellNumber, i - self._firstFrame, self._getTrackingArrays(), self._getTrackingState())
 
       if (self._hyperparameters["freqAlgoPosFollow"] != 0) and (i % self._hyperparameters["freqAlgoPosFollow"] == 0):
         print("Tracking: wellNumber:",wellNumber," ; frame:",i)
@@ -481,6 +507,12 @@ class Tracking(BaseZebraZoomTrackingMethod, TailTrackingDifficultBackgroundMixin
       else:
         i = i + 1
 
+    cap.release()
+    if self._timeChunk is not None:
+      return None
+    return self._finishTracking(wellNumber)
+
+  def _finishTracking(self, wellNumber):
     if self._hyperparameters["postProcessMultipleTrajectories"]:
       self._postProcessMultipleTrajectories(self._trackingHeadTailAllAnimals, self._trackingProbabilityOfGoodDetection)
 
@@ -491,12 +523,16 @@ class Tracking(BaseZebraZoomTrackingMethod, TailTrackingDifficultBackgroundMixin
       from zebrazoom.code.popUpAlgoFollow import prepend
       prepend("Tracking done for well "+ str(wellNumber))
 
+    return self._getTrackingData()
+
+  def _getTrackingData(self):
+    '''Tracking results of the well, as expected by extractParameters'''
     if self._auDessusPerAnimalId is not None:
       return [self._trackingHeadTailAllAnimals, self._trackingHeadingAllAnimals, self._trackingEyesAllAnimals, self._headPositionFirstFrame, self._tailTipFirstFrame, self._auDessusPerAnimalId]
     else:
       return [self._trackingHeadTailAllAnimals, self._trackingHeadingAllAnimals, self._trackingEyesAllAnimals, self._headPositionFirstFrame, self._tailTipFirstFrame]
 
-  def _getParametersForWell(self, wellNumber):
+  def _getParametersForWell(self, wellNumber, cap=None):
     '''Does the tracking and then the extraction of parameters'''
     if self.useGUI:
       from PyQt5.QtWidgets import QApplication
@@ -504,15 +540,116 @@ class Tracking(BaseZebraZoomTrackingMethod, TailTrackingDifficultBackgroundMixin
       if QApplication.instance() is None:
         from zebrazoom.GUIAllPy import PlainApplication
         app = PlainApplication(sys.argv)
-    # Normal execution process
-    parameters = extractParameters(self.runTracking(wellNumber), wellNumber, self._hyperparameters, self._videoPath, self._wellPositions, self._background)
-    return wellNumber, parameters
+    profiling = []
+    savedTracking = self._checkpoint.load(wellNumber) if self._checkpoint is not None else None
+    if savedTracking is not None and savedTracking['parameters'] is not None:
+      # the parameters are extracted again, as the extraction also writes the per frame results (h5 file, csv files)
+      self._restoreCheckpoint(wellNumber, savedTracking)
+      print("Tracking of well", wellNumber, "reloaded from the checkpoint")
+      if cap is not None:
+        cap.release()
+      trackingData = self._getTrackingData()
+    else:
+      # Normal execution process
+      timeChunks = self._getTimeChunks()
+      with measure(profiling, 'runTracking', wellNumber=wellNumber):
+        if timeChunks is None:
+          trackingData = self.runTracking(wellNumber, cap=cap)
+        else:
+          if cap is not None:
+            cap.release()
+          trackingData = self._runTrackingInTimeChunks(wellNumber, timeChunks)
+    with measure(profiling, 'extractParameters', wellNumber=wellNumber):
+      parameters = extractParameters(trackingData, wellNumber, self._hyperparameters, self._videoPath, self._wellPositions, self._background)
+    if self._checkpoint is not None and (savedTracking is None or savedTracking['parameters'] is None):
+      self._checkpoint.save(wellNumber, self._trackingHeadingAllAnimals.shape[1], self._getTrackingArrays(), self._getTrackingState(), parameters=parameters)
+    return wellNumber, parameters, profiling
+
+  def _storeParametersInQueue(self, queue, wellNumber, cap=None):
+    queue.put(self._getParametersForWell(wellNumber, cap=cap))
+
+  def _getTimeChunks(self):
+    '''Returns the (first frame, last frame) of each time chunk in which the frames of the well are split, or None if the well is tracked at once'''
+    if self._hyperparameters["nbTimeChunksPerWell"] <= 1 or globalVariables["noMultiprocessing"] or self._hyperparameters["trackingDL"] or self._hyperparameters["fishTailTrackingDifficultBackground"] or \
+        self._hyperparameters["adjustFreelySwimTracking"] or self._hyperparameters["adjustFreelySwimTrackingAutomaticParameters"] or \
+        self._hyperparameters["adjustHeadEmbededTracking"] or self._hyperparameters["adjustHeadEmbeddedEyeTracking"]:
+      return None
+    # the tail tip can't be selected by the user from the processes tracking the chunks
+    if self._hyperparameters["headEmbeded"] and not os.path.exists(os.path.join(self._hyperparameters['outputFolder'], '.ZebraZoomVideoInputs', self._videoName, f'{self._videoName}.csv')):
+      return None
+    lastFrame = self._lastFrame
+    if int(self._hyperparameters["onlyDoTheTrackingForThisNumberOfFrames"]) != 0:
+      lastFrame = min(lastFrame, self._firstFrame + int(self._hyperparameters["onlyDoTheTrackingForThisNumberOfFrames"]))
+    nbFrames = lastFrame - self._firstFrame + 1
+    nbTimeChunks = min(int(self._hyperparameters["nbTimeChunksPerWell"]), nbFrames)
+    if nbTimeChunks <= 1:
+      return None
+    bounds = [self._firstFrame + nbFrames * chunkIdx // nbTimeChunks for chunkIdx in range(nbTimeChunks + 1)]
+    return [(bounds[chunkIdx], bounds[chunkIdx + 1] - 1) for chunkIdx in range(nbTimeChunks)]
+
+  def _storeTimeChunkInQueue(self, queue, wellNumber, chunkIdx, firstFrameToTrack, lastFrameToTrack):
+    self._checkpoint = None
+    self._timeChunk = (firstFrameToTrack, lastFrameToTrack)
+    self.runTracking(wellNumber)
+    frames = slice(firstFrameToTrack - self._firstFrame, lastFrameToTrack - self._firstFrame + 1)
+    queue.put((chunkIdx, {name: array[:, frames] for name, array in self._getTrackingArrays().items()}, self._getTrackingState(), self._auDessusPerAnimalId))
+
+  def _runTrackingInTimeChunks(self, wellNumber, timeChunks):
+    '''
+    Tracks the time chunks of the well in parallel and stitches their results together. The tracking of each chunk starts
+    timeChunksOverlapNbFrames frames before the chunk, so that the tracking has reached the same state as a tracking of the whole well
+    when the chunk starts. The animals of each chunk are matched with those of the previous chunk on the last frame tracked by both.
+    '''
+    if self._hyperparameters["trackingDL"]:
+      import torch.multiprocessing as mp
+    else:
+      import multiprocessing as mp
+    overlap = max(0, int(self._hyperparameters["timeChunksOverlapNbFrames"]))
+    firstFramesToTrack = [max(self._firstFrame, firstFrame - overlap) for firstFrame, _ in timeChunks]
+    queue = mp.Queue()
+    processes = [mp.Process(target=self._storeTimeChunkInQueue, args=(queue, wellNumber, chunkIdx, firstFrameToTrack, lastFrame), daemon=True)
+                 for chunkIdx, (firstFrameToTrack, (_, lastFrame)) in enumerate(zip(firstFramesToTrack, timeChunks))]
+    for p in processes:
+      p.start()
+    chunksResults = dict((chunkIdx, results) for chunkIdx, *results in (queue.get() for p in processes))
+    for p in processes:
+      p.join()
+
+    arrays = self._getTrackingArrays()
+    for chunkIdx, ((firstFrame, lastFrame), firstFrameToTrack) in enumerate(zip(timeChunks, firstFramesToTrack)):
+      chunkArrays, state, self._auDessusPerAnimalId = chunksResults[chunkIdx]
+      if chunkIdx and firstFrameToTrack < firstFrame and self._hyperparameters["nbAnimalsPerWell"] > 1:
+        previousHeadPositions = self._trackingHeadTailAllAnimals[:, firstFrame - 1 - self._firstFrame, 0]
+        assignment = assignIdentities(previousHeadPositions, chunkArrays['trackingHeadTailAllAnimals'][:, firstFrame - 1 - firstFrameToTrack, 0])
+        unassigned = iter(sorted(set(range(len(assignment))) - set(assignment)))
+        order = [animalIdx if animalIdx != -1 else next(unassigned) for animalIdx in assignment]
+        chunkArrays = {name: array[order] for name, array in chunkArrays.items()}
+      for name, array in arrays.items():
+        array[:, firstFrame - self._firstFrame:lastFrame - self._firstFrame + 1] = chunkArrays[name][:, firstFrame - firstFrameToTrack:]
+    self._restoreTrackingState(state)
+    if int(self._hyperparameters["onlyDoTheTrackingForThisNumberOfFrames"]) != 0:
+      self._lastFrame = min(self._lastFrame, self._firstFrame + int(self._hyperparameters["onlyDoTheTrackingForThisNumberOfFrames"]))
+    return self._finishTracking(wellNumber)
 
-  def _storeParametersInQueue(self, queue, wellNumber):
-    queue.put(self._getParametersForWell(wellNumber))
+  def _createSharedFrameBroadcaster(self):
+    '''Returns an object decoding each frame only once for all wells, or None if the frames should be decoded by each well'''
+    if not self._hyperparameters["decodeFramesOnceForAllWells"] or self._hyperparameters["trackingDL"] or self._hyperparameters["fishTailTrackingDifficultBackground"]:
+      return None
+    lastFrame = self._lastFrame
+    if int(self._hyperparameters["onlyDoTheTrackingForThisNumberOfFrames"]) != 0:
+      lastFrame = min(lastFrame, self._firstFrame + int(self._hyperparameters["onlyDoTheTrackingForThisNumberOfFrames"]))
+    try:
+      return SharedFrameBroadcaster(self._videoPath, self._firstFrame, lastFrame, self._hyperparameters["nbWells"], self._hyperparameters["decodeFramesOnceRingBufferSize"])
+    except (ValueError, OSError) as e:
+      print("Could not decode frames once for all wells, each well will decode the video:", e)
+      return None
 
   def run(self):
-    self._background = self.getBackground()
+    self.profiling = []
+    if self._hyperparameters["checkpointInterval"]:
+      self._checkpoint = TrackingCheckpoint(_videoFingerprint(self._videoPath), self._hyperparameters, self._wellPositions)
+    with measure(self.profiling, 'getBackground'):
+      self._background = self.getBackground()
 
     if self._hyperparameters["trackingDL"]:
       from torch.multiprocessing import Process
@@ -524,17 +661,26 @@ class Tracking(BaseZebraZoomTrackingMethod, TailTrackingDifficultBackgroundMixin
       mp.set_start_method('spawn', force=True)
 
     # Tracking and extraction of parameters
-    if globalVariables["noMultiprocessing"] == 0 and not self._hyperparameters['headEmbeded']:
+    if self._getTimeChunks() is not None:
+      # for all wells, one after the other, each well being split in time chunks tracked in parallel
+      wellNumbers = range(self._hyperparameters["nbWells"]) if self._hyperparameters["onlyTrackThisOneWell"] == -1 else [self._hyperparameters["onlyTrackThisOneWell"]]
+      parametersPerWell = [self._getParametersForWell(wellNumber) for wellNumber in wellNumbers]
+    elif globalVariables["noMultiprocessing"] == 0 and not self._hyperparameters['headEmbeded']:
       if self._hyperparameters["onlyTrackThisOneWell"] == -1:
         # for all wells, in parallel
         queue = mp.Queue()
-        processes = [Process(target=self._storeParametersInQueue, args=(queue, wellNumber), daemon=True)
+        broadcaster = self._createSharedFrameBroadcaster()
+        processes = [Process(target=self._storeParametersInQueue, args=(queue, wellNumber, None if broadcaster is None else broadcaster.getReader(wellNumber)), daemon=True)
                      for wellNumber in range(self._hyperparameters["nbWells"])]
         for p in processes:
           p.start()
+        if broadcaster is not None:
+          broadcaster.start()
         parametersPerWell = [queue.get() for p in processes]
         for p in processes:
           p.join()
+        if broadcaster is not None:
+          broadcaster.close()
       else:
         # for just one well
         parametersPerWell = [self._getParametersForWell(self._hyperparameters["onlyTrackThisOneWell"])]
@@ -545,6 +691,8 @@ class Tracking(BaseZebraZoomTrackingMethod, TailTrackingDifficultBackgroundMixin
         parametersPerWell = [self._getParametersForWell(self._hyperparameters["onlyTrackThisOneWell"])]
 
     # Sorting wells after the end of the parallelized calls end
-    return {wellNumber: parameters for wellNumber, parameters in parametersPerWell}
+    for _, _, profiling in parametersPerWell:
+      self.profiling.extend(profiling)
+    return {wellNumber: parameters for wellNumber, parameters, _ in parametersPerWell}
 
 register_tracking_method('tracking', Tracking)
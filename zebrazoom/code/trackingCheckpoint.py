@@ -0,0 +1,95 @@
+import hashlib
+import json
+import os
+import pickle
+import shutil
+
+import numpy as np
+
+
+_CHECKPOINT_VERSION = 2
+_RUN_SPECIFIC_HYPERPARAMETERS = {'videoNameWithTimestamp', 'H5filename', 'freqAlgoPosFollow', 'popUpAlgoFollow', 'additionalOutputFolder', 'checkpointInterval'}
+
+
+def getCheckpointFolder(hyperparameters):
+  return os.path.join(hyperparameters['outputFolder'], '.ZebraZoomVideoInputs', hyperparameters['videoName'], 'trackingCheckpoint')
+
+
+def removeCheckpoint(hyperparameters):
+  '''Removes the checkpoint of the video, once its results are stored.'''
+  shutil.rmtree(getCheckpointFolder(hyperparameters), ignore_errors=True)
+
+
+def getTrackingHyperparameters(hyperparameters):
+  '''Hyperparameters which influence the tracking (the others are specific to each run of the analysis).'''
+  return {name: value for name, value in hyperparameters.items() if name not in _RUN_SPECIFIC_HYPERPARAMETERS}
+
+
+def _atomicWrite(path, write):
+  temporaryPath = '%s_%d.tmp' % (path, os.getpid())
+  with open(temporaryPath, 'wb') as f:
+    write(f)
+  os.replace(temporaryPath, path)
+
+
+class TrackingCheckpoint:
+  '''
+  Periodically saved state of the tracking of the wells of a video, used to resume an interrupted tracking where it stopped.
+
+  For each well, the tracking arrays (with the frames along their second axis) are saved in chunks containing the frames tracked since the
+  previous save, along with the state which changes during the tracking (the next frame to track, the hyperparameters adapted on the fly, ...).
+  Once a well is done, its whole arrays and its parameters are saved. The checkpoint is discarded if the video, the wells or the hyperparameters changed.
+  '''
+
+  def __init__(self, videoFingerprint, hyperparameters, wellPositions):
+    self._folder = getCheckpointFolder(hyperparameters)
+    self._key = hashlib.sha1(json.dumps([_CHECKPOINT_VERSION, videoFingerprint, getTrackingHyperparameters(hyperparameters), wellPositions], sort_keys=True, default=str).encode()).hexdigest()
+    self._savedFrames = {}
+    keyPath = os.path.join(self._folder, 'key.txt')
+    if os.path.exists(keyPath):
+      with open(keyPath) as f:
+        if f.read() == self._key:
+          return
+      print("The video, the wells or the configuration changed since the tracking checkpoint was saved, the tracking is started from the beginning")
+      shutil.rmtree(self._folder, ignore_errors=True)
+    os.makedirs(self._folder, exist_ok=True)
+    _atomicWrite(keyPath, lambda f: f.write(self._key.encode()))
+
+  def _statePath(self, wellNumber):
+    return os.path.join(self._folder, 'well%d.pkl' % wellNumber)
+
+  def save(self, wellNumber, frameIdx, arrays, state, parameters=None):
+    '''
+    Saves the tracking of the well up to frameIdx (excluded, relative to the first frame tracked). When the parameters are given, the well is done
+    and its whole arrays are saved, as they may have been post-processed.
+    '''
+    savedFrameIdx, chunks = (0, []) if parameters is not None else self._savedFrames.get(wellNumber, (0, []))
+    if frameIdx == savedFrameIdx and parameters is None:
+      return
+    chunkName = 'well%d_%d_%d.npz' % (wellNumber, savedFrameIdx, frameIdx)
+    _atomicWrite(os.path.join(self._folder, chunkName), lambda f: np.savez(f, **{name: array[:, savedFrameIdx:frameIdx] for name, array in arrays.items()}))
+    chunks = chunks + [chunkName]
+    _atomicWrite(self._statePath(wellNumber), lambda f: pickle.dump({'frameIdx': frameIdx, 'chunks': chunks, 'state': state, 'parameters': parameters}, f))
+    self._savedFrames[wellNumber] = (frameIdx, chunks)
+    if parameters is not None:
+      for name in os.listdir(self._folder):
+        if name.startswith('well%d_' % wellNumber) and name != chunkName:
+          os.remove(os.path.join(self._folder, name))
+
+  def load(self, wellNumber):
+    '''Returns the last saved tracking of the well (see save), or None if it was never saved.'''
+    try:
+      with open(self._statePath(wellNumber), 'rb') as f:
+        return pickle.load(f)
+    except (OSError, EOFError, pickle.UnpicklingError):
+      return None
+
+  def restoreArrays(self, wellNumber, checkpoint, arrays):
+    '''Copies the saved frames in the arrays, the next saves of the well then only contain the frames tracked afterwards.'''
+    start = 0
+    for chunkName in checkpoint['chunks']:
+      with np.load(os.path.join(self._folder, chunkName)) as chunk:
+        for name, array in arrays.items():
+          array[:, start:start + chunk[name].shape[1]] = chunk[name]
+        start += chunk[name].shape[1]
+    self._savedFrames[wellNumber] = (checkpoint['frameIdx'], checkpoint['chunks'])
@@ -18,4 +18,5 @@ from .getConfigurationFileUsed import *
 from .getNbOscAndTBFPerBoutFromManualClassification import *
 from .plotManualVsAutomaticBendLocations import *
 from .plotKinematicParametersHist import *
-from .deleteAutomaticallyCalculatedKinematicParameters import *
\ No newline at end of file
+from .deleteAutomaticallyCalculatedKinematicParameters import *
+from .listResultsFiles import *
\ No newline at end of file
@@ -1,7 +1,75 @@
+import collections.abc
+
+import h5py
 import numpy as np
 
 
-def createSuperStructFromH5(results):
+def _readBouts(animalGroup, animalIdx, firstFrame, toList):
+  convert = (lambda array: array.tolist()) if toList else (lambda array: array)
+  dataGroup = animalGroup['dataPerFrame']
+  HeadPos = dataGroup['HeadPos'][:]
+  TailPosX = dataGroup['TailPosX'][:]
+  TailPosY = dataGroup['TailPosY'][:]
+  TailX_VideoReferential = np.column_stack([HeadPos['X']] + [TailPosX[col] for col in dataGroup['TailPosX'].attrs['columns']])
+  TailY_VideoReferential = np.column_stack([HeadPos['Y']] + [TailPosY[col] for col in dataGroup['TailPosY'].attrs['columns']])
+  TailAngle = dataGroup['TailAngle'][:]
+  Heading = dataGroup['Heading'][:]
+  curvature = None if 'curvature' not in dataGroup else dataGroup['curvature'][:]
+  animalData = []
+  for boutIdx in range(animalGroup['listOfBouts'].attrs['numberOfBouts']):
+    boutGroup = animalGroup[f'listOfBouts/bout{boutIdx}']
+    boutData = {'AnimalNumber': animalIdx, 'BoutStart': boutGroup.attrs['BoutStart'], 'BoutEnd': boutGroup.attrs['BoutEnd']}
+    if boutGroup.attrs.get('flag'):
+      boutData['flag'] = 1
+    animalData.append(boutData)
+    for data in boutGroup:
+      if data == 'additionalKinematicParametersPerBout':
+        continue
+      boutData[data] = convert(boutGroup[data][:])
+    start = boutGroup.attrs['BoutStart'] - firstFrame
+    end = boutGroup.attrs['BoutEnd'] - firstFrame + 1
+    boutData['TailX_VideoReferential'] = convert(TailX_VideoReferential[start:end])
+    boutData['TailY_VideoReferential'] = convert(TailY_VideoReferential[start:end])
+    boutData['TailAngle_Raw'] = convert(TailAngle[start:end])
+    boutData['Heading'] = convert(Heading[start:end])
+    boutData['HeadX'] = convert(HeadPos['X'][start:end])
+    boutData['HeadY'] = convert(HeadPos['Y'][start:end])
+    if curvature is not None:
+      boutData['curvature'] = convert(curvature[start:end])
+  return animalData
+
+
+class _LazyBouts(collections.abc.Sequence):
+  '''
+  Bouts of an animal, read from the results file the first time one of them is accessed.
+  The data of the bouts are NumPy arrays instead of lists. If the results file was closed in the meantime, it is reopened for reading.
+  '''
+  def __init__(self, results, animalIdx, animalGroup, firstFrame):
+    self._results = results
+    self._filename = results.filename
+    self._animalPath = animalGroup.name
+    self._animalIdx = animalIdx
+    self._firstFrame = firstFrame
+    self._numberOfBouts = int(animalGroup['listOfBouts'].attrs['numberOfBouts'])
+    self._bouts = None
+
+  def _getBouts(self):
+    if self._bouts is None:
+      if self._results:
+        self._bouts = _readBouts(self._results[self._animalPath], self._animalIdx, self._firstFrame, False)
+      else:
+        with h5py.File(self._filename, 'r') as results:
+          self._bouts = _readBouts(results[self._animalPath], self._animalIdx, self._firstFrame, False)
+    return self._bouts
+
+  def __getitem__(self, idx):
+    return self._getBouts()[idx]
+
+  def __len__(self):
+    return self._numberOfBouts
+
+
+def createSuperStructFromH5(results, lazy=False):
   superStruct = {}
   superStruct["firstFrame"] = results.attrs['firstFrame']
   superStruct['lastFrame'] = results.attrs['lastFrame']
@@ -19,35 +87,8 @@ def createSuperStructFromH5(results):
     wellGroup = results[f'dataForWell{wellIdx}']
     for animalIdx in range(len(wellGroup)):
       animalGroup = wellGroup[f'dataForAnimal{animalIdx}']
-      animalData = []
-      wellData.append(animalData)
-      dataGroup = animalGroup['dataPerFrame']
-      HeadPos = dataGroup['HeadPos'][:]
-      TailPosX = dataGroup['TailPosX'][:]
-      TailPosY = dataGroup['TailPosY'][:]
-      TailX_VideoReferential = np.column_stack([HeadPos['X']] + [TailPosX[col] for col in dataGroup['TailPosX'].attrs['columns']])
-      TailY_VideoReferential = np.column_stack([HeadPos['Y']] + [TailPosY[col] for col in dataGroup['TailPosY'].attrs['columns']])
-      TailAngle = dataGroup['TailAngle'][:]
-      Heading = dataGroup['Heading'][:]
-      curvature = None if 'curvature' not in dataGroup else dataGroup['curvature'][:]
-      for boutIdx in range(animalGroup['listOfBouts'].attrs['numberOfBouts']):
-        boutGroup = animalGroup[f'listOfBouts/bout{boutIdx}']
-        boutData = {'AnimalNumber': animalIdx, 'BoutStart': boutGroup.attrs['BoutStart'], 'BoutEnd': boutGroup.attrs['BoutEnd']}
-        if boutGroup.attrs.get('flag'):
-          boutData['flag'] = 1
-        animalData.append(boutData)
-        for data in boutGroup:
-          if data == 'additionalKinematicParametersPerBout':
-            continue
-          boutData[data] = boutGroup[data][:].tolist()
-        start = boutGroup.attrs['BoutStart'] - superStruct["firstFrame"]
-        end = boutGroup.attrs['BoutEnd'] - superStruct["firstFrame"] + 1
-        boutData['TailX_VideoReferential'] = TailX_VideoReferential[start:end].tolist()
-        boutData['TailY_VideoReferential'] = TailY_VideoReferential[start:end].tolist()
-        boutData['TailAngle_Raw'] = TailAngle[start:end].tolist()
-        boutData['Heading'] = Heading[start:end].tolist()
-        boutData['HeadX'] = HeadPos['X'][start:end].tolist()
-        boutData['HeadY'] = HeadPos['Y'][start:end].tolist()
-        if curvature is not None:
-          boutData['curvature'] = curvature[start:end].tolist()
+      if lazy:
+        wellData.append(_LazyBouts(results, animalIdx, animalGroup, superStruct["firstFrame"]))
+      else:
+        wellData.append(_readBouts(animalGroup, animalIdx, superStruct["firstFrame"], True))
   return superStruct
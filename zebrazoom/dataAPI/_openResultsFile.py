@@ -4,6 +4,7 @@ import os
 import h5py
 
 from zebrazoom.code.paths import getDefaultZZoutputFolder
+from zebrazoom.code.resultsCatalog import findResultsFile
 
 
 def _findResultsFile(videoName):
@@ -15,11 +16,10 @@ def _findResultsFile(videoName):
   resultsPath = os.path.join(ZZoutputPath, f'{videoName}.h5')
   if os.path.exists(resultsPath):  # exact match
     return resultsPath
-  path = next(reversed(sorted(name for name in os.listdir(ZZoutputPath)
-                              if os.path.splitext(name)[0][:-20] == videoName)), None)
+  path = findResultsFile(ZZoutputPath, videoName)
   if path is None:
     raise ValueError(f'video {videoName} not found in the ZZoutput folder ({ZZoutputPath})')
-  return os.path.join(ZZoutputPath, path)
+  return path
 
 
 @contextlib.contextmanager
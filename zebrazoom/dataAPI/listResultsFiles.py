@@ -0,0 +1,6 @@
+from zebrazoom.code.paths import getDefaultZZoutputFolder
+from zebrazoom.code.resultsCatalog import listResults
+
+
+def listResultsFiles(videoName: str=None, ZZoutputPath: str=None) -> list:
+  return listResults(ZZoutputPath if ZZoutputPath is not None else getDefaultZZoutputFolder(), videoName)
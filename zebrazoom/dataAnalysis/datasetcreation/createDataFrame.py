@@ -1,4 +1,5 @@
 import collections
+import hashlib
 import h5py
 import os
 import scipy
@@ -13,13 +14,322 @@ from zebrazoom.dataAnalysis.datasetcreation.getTailAngles import getTailAngles
 from zebrazoom.dataAnalysis.datasetcreation.getInstaSpeed import getInstaSpeed
 from zebrazoom.dataAnalysis.datasetcreation.getInstaHeadingDiff import getInstaHeadingDiff
 from zebrazoom.dataAnalysis.datasetcreation.getInstaHorizontalDisplacement import getInstaHorizontalDisplacement
-from zebrazoom.dataAnalysis.datasetcreation.getGlobalParameters import getGlobalParameters
+from zebrazoom.dataAnalysis.datasetcreation.getGlobalParameters import getGlobalParametersForBouts
 from zebrazoom.dataAnalysis.datasetcreation.getTailLength  import getTailLength
 from zebrazoom.dataAnalysis.datasetcreation.getTailLength2 import getTailLength2
 from zebrazoom.dataAnalysis.datasetcreation.getTailAngleRecalculated import getTailAngleRecalculated
 from zebrazoom.dataAnalysis.datasetcreation.getTailAngleRecalculated2 import getTailAngleRecalculated2
 from zebrazoom.dataAnalysis.datasetcreation.gatherInitialRawData import gatherInitialRawData
 import pickle
+from multiprocessing import Pool
+
+
+_DATAFRAME_CACHE_VERSION = 3
+_SETTINGS_NOT_IN_CACHE_KEY = ('H5filename', 'forcePandasDfRecreation', 'defaultZZoutputFolderPath')
+
+
+def _storeParametersUsedForCalculation(path, videoInfo, frameStepForDistanceCalculation):
+  with open(os.path.join(path, 'parametersUsedForCalculation.json'), 'w') as outfile:
+    print('frameStepForDistanceCalculation', frameStepForDistanceCalculation)
+    print('videoFPS', videoInfo['fq'])
+    print('videoPixelSize', videoInfo['pixelsize'])
+    json.dump({'frameStepForDistanceCalculation': int(frameStepForDistanceCalculation), 'videoFPS': float(videoInfo['fq']), 'videoPixelSize': float(videoInfo['pixelsize'])}, outfile)
+
+
+def _getVideoPath(videoInfo, defaultZZoutputFolderPath):
+  if videoInfo['path'] == "defaultZZoutputFolder":
+    return os.path.join(defaultZZoutputFolderPath, videoInfo['trial_id'])
+  return os.path.join(videoInfo['path'], videoInfo['trial_id'])
+
+
+def _getFileHash(path, fileHashes):
+  '''Hash of the content of the file, only recalculated if its size or modification time changed.'''
+  if not os.path.exists(path):
+    return None
+  path = os.path.abspath(path)
+  stat = os.stat(path)
+  if path not in fileHashes or fileHashes[path][:2] != [stat.st_size, stat.st_mtime_ns]:
+    fileHash = hashlib.sha1()
+    with open(path, 'rb') as f:
+      for block in iter(lambda: f.read(1 << 20), b''):
+        fileHash.update(block)
+    fileHashes[path] = [stat.st_size, stat.st_mtime_ns, fileHash.hexdigest()]
+  return fileHashes[path][2]
+
+
+def _getCachePath(cacheFolder, videoInfo, settings, fileHashes):
+  '''
+  The cache of the parameters of a video is keyed on the content of the results (and rollover) files and on all the options used.
+  The name of the cache file starts with a key of the video only, so that the previous cache files of the video can be found (see _removeStaleCacheFiles).
+  '''
+  import zebrazoom
+
+  path = _getVideoPath(videoInfo, settings['defaultZZoutputFolderPath'])
+  if os.path.splitext(path)[1] == '.h5':
+    inputFiles = [path]
+  else:
+    inputFiles = [os.path.join(path, 'results_' + videoInfo['trial_id'] + '.txt'), os.path.join(path, videoInfo['trial_id'] + '.pkl')]
+  if settings['calculateRolloverParameters']:
+    inputFiles.extend(os.path.join(path, fname) for fname in ('rolloverClassified.txt', 'rolloverPercentages.txt'))
+  key = json.dumps([_DATAFRAME_CACHE_VERSION, zebrazoom.__version__, [_getFileHash(fname, fileHashes) for fname in inputFiles], videoInfo,
+                    {name: value for name, value in settings.items() if name not in _SETTINGS_NOT_IN_CACHE_KEY}], sort_keys=True, default=str)
+  videoKey = hashlib.sha1(json.dumps(videoInfo, sort_keys=True, default=str).encode()).hexdigest()
+  return os.path.join(cacheFolder, '%s_%s.pkl' % (videoKey, hashlib.sha1(key.encode()).hexdigest()))
+
+
+def _removeStaleCacheFiles(cachePath):
+  '''Removes the other cache files of the same video, which were calculated from previous results or with other options.'''
+  cacheFolder, cacheFile = os.path.split(cachePath)
+  videoKey = cacheFile.split('_')[0]
+  for fname in os.listdir(cacheFolder):
+    if fname.startswith(videoKey + '_') and fname.endswith('.pkl') and fname != cacheFile:
+      try:
+        os.remove(os.path.join(cacheFolder, fname))
+      except FileNotFoundError:  # already removed by another analysis
+        pass
+
+
+def _createDataFrameForVideo(videoInfo, settings, supstructOverwrite):
+  '''Calculates the parameters of the bouts of one video, returns the dataframes created along with the conditions and genotypes found.'''
+  H5filename = settings['H5filename']
+  addToGlobalParameters = settings['addToGlobalParameters']
+  basicInformation = settings['basicInformation']
+  calculateRolloverParameters = settings['calculateRolloverParameters']
+  computeMassCenterParamForCluster = settings['computeMassCenterParamForCluster']
+  computeTailAngleParamForCluster = settings['computeTailAngleParamForCluster']
+  computetailAnglesRecalculatedParamsForCluster = settings['computetailAnglesRecalculatedParamsForCluster']
+  defaultZZoutputFolderPath = settings['defaultZZoutputFolderPath']
+  dfCols = settings['dfCols']
+  forcePandasDfRecreation = settings['forcePandasDfRecreation']
+  frameStepForDistanceCalculation = settings['frameStepForDistanceCalculation']
+  getTailAngleSignMultNormalized = settings['getTailAngleSignMultNormalized']
+  globParam = settings['globParam']
+  instaAmp = settings['instaAmp']
+  instaAsym = settings['instaAsym']
+  instaHeadingDiff = settings['instaHeadingDiff']
+  instaHorizDispl = settings['instaHorizDispl']
+  instaSpeed = settings['instaSpeed']
+  instaTBF = settings['instaTBF']
+  keepSpeedDistDurWhenLowNbBends = settings['keepSpeedDistDurWhenLowNbBends']
+  minNbBendForBoutDetect = settings['minNbBendForBoutDetect']
+  minimumFrameToFrameDistanceToBeConsideredAsMoving = settings['minimumFrameToFrameDistanceToBeConsideredAsMoving']
+  nbFramesTakenIntoAccount = settings['nbFramesTakenIntoAccount']
+  numberOfBendsIncludedForMaxDetect = settings['numberOfBendsIncludedForMaxDetect']
+  rawData = settings['rawData']
+  removeColumnsWhenAppropriate = settings['removeColumnsWhenAppropriate']
+  saveRawDataInAllBoutsSuperStructure = settings['saveRawDataInAllBoutsSuperStructure']
+  smoothingFactor = settings['smoothingFactor']
+  tailAngles = settings['tailAngles']
+  tailAnglesRecalculated = settings['tailAnglesRecalculated']
+  tailAnglesRecalculated2 = settings['tailAnglesRecalculated2']
+
+  videoDataFrames = []
+  conditions = []
+  genotypes = []
+  parametersStored = False
+
+  path      = _getVideoPath(videoInfo, defaultZZoutputFolderPath)
+  trial_id  = videoInfo['trial_id']
+  fq        = videoInfo['fq']
+  pixelsize = videoInfo['pixelsize']
+  condition = [val.strip('\'" ') for val in videoInfo['condition'][1:-1].split(',')]
+  genotype  = [val.strip('\'" ') for val in videoInfo['genotype'][1:-1].split(',')]
+  include   = [bool(int(val.strip())) for val in videoInfo['include'][1:-1].split(',')]
+
+  dfReloadedVid = None
+  if os.path.splitext(path)[1] == '.h5':
+    from zebrazoom.dataAPI._createSuperStructFromH5 import createSuperStructFromH5
+    with h5py.File(path, 'r') as results:
+      if forcePandasDfRecreation or not all(attr in results.attrs for attr in ('videoFPS', 'videoPixelSize', 'frameStepForDistanceCalculation')) or float(results.attrs['videoFPS']) != float(videoInfo['fq']) or float(results.attrs['videoPixelSize']) != float(videoInfo['pixelsize']) or int(results.attrs['frameStepForDistanceCalculation']) != int(frameStepForDistanceCalculation):
+        supstruct = createSuperStructFromH5(results)
+        firstFrame = supstruct["firstFrame"]
+        lastFrame = supstruct["lastFrame"]
+      else:
+        print("reloading previously calculated parameters")
+        dataframes = []
+        for wellIdx in range(len(results['wellPositions'])):
+          wellData = []
+          wellGroup = results[f'dataForWell{wellIdx}']
+          for animalIdx in range(len(wellGroup)):
+            animalGroup = wellGroup[f'dataForAnimal{animalIdx}']
+            if 'kinematicParametersPerBout' not in animalGroup:
+              continue
+            kinematicParametersPerBout = animalGroup['kinematicParametersPerBout'][:]
+            data = {col: kinematicParametersPerBout[col] for col in kinematicParametersPerBout.dtype.names}
+            data['Trial_ID'] = trial_id
+            data['Well_ID'] = wellIdx
+            data['Animal_ID'] = animalIdx
+            data['videoDuration'] = (results.attrs['lastFrame'] - results.attrs['firstFrame']) / results.attrs['videoFPS']
+            boutsGroup = animalGroup['listOfBouts']
+            numberOfBouts = boutsGroup.attrs['numberOfBouts']
+            data['NumBout'] = list(range(numberOfBouts))
+            additionalParams = collections.defaultdict(list)
+            for boutIdx in range(numberOfBouts):
+              boutGroup = boutsGroup[f'bout{boutIdx}']
+              additionalKinematicParametersPerBout = boutGroup['additionalKinematicParametersPerBout'][:]
+              frameCount = len(additionalKinematicParametersPerBout)
+              for col in additionalKinematicParametersPerBout.dtype.names:
+                for idx in range(frameCount):
+                  additionalParams[f'{col}{idx + 1}'].append(additionalKinematicParametersPerBout[col][idx])
+            data.update(additionalParams)
+            dataframes.append(pd.DataFrame(data))
+        dfReloadedVid = pd.concat(dataframes)
+
+  elif (not(os.path.exists(os.path.join(path, trial_id + '.pkl'))) or forcePandasDfRecreation):
+    if len(supstructOverwrite):
+      supstruct = supstructOverwrite
+    else:
+      with open(os.path.join(path, 'results_' + trial_id + '.txt')) as f:
+        supstruct = json.load(f)
+    firstFrame = supstruct["firstFrame"]
+    lastFrame  = supstruct["lastFrame"]
+    if not H5filename:
+      _storeParametersUsedForCalculation(path, videoInfo, frameStepForDistanceCalculation)
+      parametersStored = True
+  else:
+    print("reloading previously calculated parameters")
+    dfReloadedVid = pd.read_pickle(os.path.join(path, trial_id + '.pkl'))
+    if 'BoutDuration' in dfReloadedVid:  # pickle file contains old parameter names, recreate it
+      dfReloadedVid = None
+      if len(supstructOverwrite):
+        supstruct = supstructOverwrite
+      else:
+        with open(os.path.join(path, 'results_' + trial_id + '.txt')) as f:
+          supstruct = json.load(f)
+      firstFrame = supstruct["firstFrame"]
+      lastFrame  = supstruct["lastFrame"]
+      if not H5filename:
+        _storeParametersUsedForCalculation(path, videoInfo, frameStepForDistanceCalculation)
+        parametersStored = True
+
+  if dfReloadedVid is not None:
+    nbFramesTakenIntoAccountReloaded = max([np.sum(['instaTBF' in param for param in dfReloadedVid.columns.tolist()]), np.sum(['tailAnglesRecalculated' in param for param in dfReloadedVid.columns.tolist()]), np.sum(['instaSpeed' in param for param in dfReloadedVid.columns.tolist()])])
+    if nbFramesTakenIntoAccountReloaded < nbFramesTakenIntoAccount:
+      raise ValueError("nbFramesTakenIntoAccount was too low when pre-generating the pkl file of a video:" + str(np.sum(['instaTBF' in param for param in dfReloadedVid.columns.tolist()])) + " , " + str(np.sum(['tailAnglesRecalculated' in param for param in dfReloadedVid.columns.tolist()])) + " , " + str(np.sum(['instaSpeed' in param for param in dfReloadedVid.columns.tolist()])) + " ; nbFramesTakenIntoAccount :" + str(nbFramesTakenIntoAccount))
+    for idx, cond in enumerate(condition):
+      indForWellId = (dfReloadedVid['Well_ID'] == idx)
+      if include[idx]:
+        dfReloadedVid.loc[indForWellId, 'Condition'] = cond
+        dfReloadedVid.loc[indForWellId, 'Genotype']  = genotype[idx]
+        if minNbBendForBoutDetect > 0:
+          ind           = ~(dfReloadedVid['Number of Oscillations'] >= minNbBendForBoutDetect/2)
+          dfReloadedVid.loc[ind, removeColumnsWhenAppropriate] = float('NaN')
+        if not(genotype[idx] in genotypes):
+          genotypes.append(genotype[idx])
+        if not(condition[idx] in conditions):
+          conditions.append(condition[idx])
+      else:
+        dfReloadedVid = dfReloadedVid.drop([idx2 for idx2, belongsToWell in enumerate(indForWellId) if belongsToWell])
+        if 'level_0' in dfReloadedVid.columns:
+          dfReloadedVid = dfReloadedVid.drop(['level_0'], axis=1)
+        dfReloadedVid = dfReloadedVid.reset_index()
+
+    videoDataFrames.append(dfReloadedVid)
+
+  if calculateRolloverParameters:
+    classifiedData = np.loadtxt(os.path.join(path, 'rolloverClassified.txt'), dtype=bool)
+    percentagesData = np.loadtxt(os.path.join(path, 'rolloverPercentages.txt'), dtype=float)
+
+  # Going through each well of the video
+  for Well_ID, Cond in enumerate(condition):
+    # Not going through this loop if we've already reloaded parameters
+    if include[Well_ID] and dfReloadedVid is None:
+      print("trial_id:", trial_id, " ; Well_ID:", Well_ID)
+      rows = []
+      boutsWithBends = []
+      boutsWithFewBends = []
+      # Going through each animal present in the well
+      for fishId in range(0, len(supstruct["wellPoissMouv"][Well_ID])):
+        # Going through each bout performed by the animal
+        for NumBout, dataForBout in enumerate(supstruct["wellPoissMouv"][Well_ID][fishId]):
+          if not("flag" in dataForBout) or dataForBout["flag"] == 0:
+            row = {}
+            if calculateRolloverParameters:
+              row['numberOfRolloverFrames'], row['rolloverProbabilitiesSum'] = [data[Well_ID][dataForBout['BoutStart']:dataForBout['BoutEnd']+1].sum() for data in (classifiedData, percentagesData)]
+              frameCount = dataForBout['BoutEnd'] - dataForBout['BoutStart'] + 1
+              row['numberOfRolloverFramesNormalized'] = row['numberOfRolloverFrames'] / frameCount
+              row['rolloverProbabilitiesSumNormalized'] = row['rolloverProbabilitiesSum'] / frameCount
+            
+            # Initial basic information
+            
+            row.update(zip(basicInformation, [trial_id, Well_ID, fishId, NumBout, dataForBout['BoutStart'], dataForBout['BoutEnd'], condition[Well_ID], genotype[Well_ID], (lastFrame - firstFrame) / fq]))
+            rows.append(row)
+            
+            if not(genotype[Well_ID] in genotypes):
+              genotypes.append(genotype[Well_ID])
+            if not(condition[Well_ID] in conditions):
+              conditions.append(condition[Well_ID])
+            
+            previousBoutEnd = supstruct["wellPoissMouv"][Well_ID][fishId][NumBout-1]["BoutEnd"] if NumBout > 0 else 0
+            if "Bend_Timing" in dataForBout and ((type(dataForBout["Bend_Timing"]) == list and len(dataForBout["Bend_Timing"]) >= minNbBendForBoutDetect) or (type(dataForBout["Bend_Timing"]) == int and 1 >= minNbBendForBoutDetect)):
+              
+              if type(dataForBout["Bend_Timing"]) == int:
+                dataForBout["Bend_Timing"]    = [dataForBout["Bend_Timing"]]
+                dataForBout["Bend_TimingAbsolute"]    = [dataForBout["Bend_TimingAbsolute"]]
+                dataForBout["Bend_Amplitude"] = [dataForBout["Bend_Amplitude"]]
+              boutsWithBends.append((row, dataForBout, previousBoutEnd))
+            
+            elif keepSpeedDistDurWhenLowNbBends:
+              boutsWithFewBends.append((row, dataForBout, previousBoutEnd))
+      
+      # Calculates the global kinematic parameters (and more for bouts with few bends) of all the bouts of the well at once and stores them in the rows of the dataframe
+      
+      boutsAndParameters = [(boutsWithBends, globParam)]
+      if len(boutsWithFewBends):
+        boutsAndParameters.append((boutsWithFewBends, ['Bout Duration (s)', 'Bout Distance (mm)', 'Bout Speed (mm/s)', 'Angular Velocity (deg/s)', 'IBI (s)'] + addToGlobalParameters))
+      for boutsToCalculate, parametersToCalculate in boutsAndParameters:
+        if len(boutsToCalculate):
+          rowsToFill, dataForBouts, previousBoutEnds = zip(*boutsToCalculate)
+          listOfGlobalParameters = getGlobalParametersForBouts(dataForBouts, fq, pixelsize, frameStepForDistanceCalculation, previousBoutEnds, parametersToCalculate, firstFrame, lastFrame, minimumFrameToFrameDistanceToBeConsideredAsMoving)
+          for row, globalParameters in zip(rowsToFill, zip(*listOfGlobalParameters)):
+            row.update(zip(parametersToCalculate, globalParameters))
+      
+      for row, dataForBout, previousBoutEnd in boutsWithBends:
+        
+        # Raw data
+        
+        if saveRawDataInAllBoutsSuperStructure:
+          row.update(zip(rawData, gatherInitialRawData(dataForBout, rawData, fq)))
+        
+        # Tail angles
+        
+        if getTailAngleSignMultNormalized:
+          row.update(zip(tailAngles, getTailAngles(dataForBout, smoothingFactor, nbFramesTakenIntoAccount, numberOfBendsIncludedForMaxDetect)))
+        
+        # Calculate "dynamic" tail angle related parameters for clustering
+        
+        if computeTailAngleParamForCluster:
+          row.update(zip(instaTBF + instaAmp + instaAsym, getDynamicParameters(dataForBout, smoothingFactor, nbFramesTakenIntoAccount, numberOfBendsIncludedForMaxDetect)))
+        
+        # Calculate "dynamic" center of mass related parameters for clustering
+        
+        if computeMassCenterParamForCluster:
+          
+          instaSpeedVal       = getInstaSpeed(dataForBout, nbFramesTakenIntoAccount)
+          instaHeadingDiffVal = getInstaHeadingDiff(dataForBout, nbFramesTakenIntoAccount)
+          instaHorizDisplVal  = getInstaHorizontalDisplacement(dataForBout, nbFramesTakenIntoAccount)
+          
+          row.update(zip(instaSpeed + instaHeadingDiff + instaHorizDispl, instaSpeedVal + instaHeadingDiffVal + instaHorizDisplVal))
+        
+        # Recalculates tail angles and calculates 
+        
+        if computetailAnglesRecalculatedParamsForCluster:
+          
+          tailLength = getTailLength(dataForBout)
+          tailAnglesRecalculatedData  = getTailAngleRecalculated(dataForBout, nbFramesTakenIntoAccount, numberOfBendsIncludedForMaxDetect)
+          tailLengthFromRecalculatedAngles = getTailLength2(tailAnglesRecalculatedData)
+          tailAnglesRecalculatedData2 = getTailAngleRecalculated2(dataForBout, nbFramesTakenIntoAccount, numberOfBendsIncludedForMaxDetect)
+          
+          row.update(zip(['tailLength', 'tailLengthFromRecalculatedAngles'] + tailAnglesRecalculated + tailAnglesRecalculated2, [tailLength, tailLengthFromRecalculatedAngles] + tailAnglesRecalculatedData + tailAnglesRecalculatedData2.tolist()))
+      
+      # Adding dataframe created for the current well to the dataframes of the video, the parameters which are not part of dfCols are added after them and stored as floats
+      dfParamForWell = pd.DataFrame(rows, columns=list(dict.fromkeys(dfCols + [column for row in rows for column in row])), dtype=object)
+      otherColumns = dfParamForWell.columns[len(dfCols):]
+      dfParamForWell[otherColumns] = dfParamForWell[otherColumns].astype(float)
+      videoDataFrames.append(dfParamForWell)
+
+  return videoDataFrames, conditions, genotypes, parametersStored
+
 
 def createDataFrame(dataframeOptions, excelFileDataFrame="", forcePandasDfRecreation=0, addToGlobalParameters=0, minimumFrameToFrameDistanceToBeConsideredAsMoving=0, supstructOverwrite={}, H5filename=None):
 
@@ -72,6 +382,9 @@ def createDataFrame(dataframeOptions, excelFileDataFrame="", forcePandasDfRecrea
       calculateRolloverParameters = False
       break
 
+  # The rollover data is part of the key of the cache of the parameters of each video, so the cache is only ignored if recalculation is explicitly requested
+  forceCacheRecreation = forcePandasDfRecreation
+
   # If calculating rollover parameters is present, force recalculate since we cannot know whether rollover data was modified at some point. Additionally, we need to read the results anyway to obtain bout start and end times.
   if calculateRolloverParameters:
     forcePandasDfRecreation = True
@@ -92,7 +405,7 @@ def createDataFrame(dataframeOptions, excelFileDataFrame="", forcePandasDfRecrea
       if os.path.splitext(path)[1] == '.h5':
         from zebrazoom.dataAPI._createSuperStructFromH5 import createSuperStructFromH5
         with h5py.File(path, 'r') as results:
-          supstruct = createSuperStructFromH5(results)
+          supstruct = createSuperStructFromH5(results, lazy=True)
       else:
         with open(os.path.join(path, 'results_' + trial_id + '.txt')) as f:
           supstruct = json.load(f)
@@ -132,6 +445,8 @@ def createDataFrame(dataframeOptions, excelFileDataFrame="", forcePandasDfRecrea
       rawData = ['HeadX', 'HeadY', 'Heading', 'TailAngle_Raw', 'TailAngle_smoothed', 'Bend_Timing', 'Bend_TimingAbsolute', 'Bend_Amplitude', 'TailBeatFrequency', 'curvature']
     else:
       rawData = ['HeadX', 'HeadY', 'Heading']
+  else:
+    rawData = []
   # Tail angle related parameters for clustering
   instaTBF   = ['instaTBF'  + str(i) for i in range(1,nbFramesTakenIntoAccount+1)]
   instaAmp   = ['instaAmp'  + str(i) for i in range(1,nbFramesTakenIntoAccount+1)]
@@ -178,239 +493,67 @@ def createDataFrame(dataframeOptions, excelFileDataFrame="", forcePandasDfRecrea
   else:
     onlyKeepTheseColumns = basicInformation
   removeColumnsWhenAppropriate = [col for col in dfCols if not(col in onlyKeepTheseColumns)]
-  # Going through each video listed in the excel file
-  for videoId in range(0, len(excelFile)):
-    
-    if excelFile.loc[videoId, 'path'] == "defaultZZoutputFolder":
-      path    = os.path.join(defaultZZoutputFolderPath, excelFile.loc[videoId, 'trial_id'])
-    else:
-      path    = os.path.join(excelFile.loc[videoId, 'path'], excelFile.loc[videoId, 'trial_id'])
-    trial_id  = excelFile.loc[videoId, 'trial_id']
-    fq        = excelFile.loc[videoId, 'fq']
-    pixelsize = excelFile.loc[videoId, 'pixelsize']
-    condition = [val.strip('\'" ') for val in excelFile.loc[videoId, 'condition'][1:-1].split(',')]
-    genotype  = [val.strip('\'" ') for val in excelFile.loc[videoId, 'genotype'][1:-1].split(',')]
-    include   = [bool(int(val.strip())) for val in excelFile.loc[videoId, 'include'][1:-1].split(',')]
+  # Going through each video listed in the excel file: the parameters of each video are reloaded from the cache if they were already
+  # calculated from the same results with the same options, the other videos are processed in parallel if nbProcesses is greater than 1
+  settings = {'H5filename': H5filename, 'addToGlobalParameters': addToGlobalParameters, 'basicInformation': basicInformation,
+              'calculateRolloverParameters': calculateRolloverParameters, 'computeMassCenterParamForCluster': computeMassCenterParamForCluster,
+              'computeTailAngleParamForCluster': computeTailAngleParamForCluster, 'computetailAnglesRecalculatedParamsForCluster': computetailAnglesRecalculatedParamsForCluster,
+              'defaultZZoutputFolderPath': defaultZZoutputFolderPath, 'dfCols': dfCols, 'forcePandasDfRecreation': forcePandasDfRecreation,
+              'frameStepForDistanceCalculation': frameStepForDistanceCalculation, 'getTailAngleSignMultNormalized': getTailAngleSignMultNormalized,
+              'globParam': globParam, 'instaAmp': instaAmp, 'instaAsym': instaAsym, 'instaHeadingDiff': instaHeadingDiff, 'instaHorizDispl': instaHorizDispl,
+              'instaSpeed': instaSpeed, 'instaTBF': instaTBF, 'keepSpeedDistDurWhenLowNbBends': keepSpeedDistDurWhenLowNbBends,
+              'minNbBendForBoutDetect': minNbBendForBoutDetect, 'minimumFrameToFrameDistanceToBeConsideredAsMoving': minimumFrameToFrameDistanceToBeConsideredAsMoving,
+              'nbFramesTakenIntoAccount': nbFramesTakenIntoAccount, 'numberOfBendsIncludedForMaxDetect': numberOfBendsIncludedForMaxDetect, 'rawData': rawData,
+              'removeColumnsWhenAppropriate': removeColumnsWhenAppropriate, 'saveRawDataInAllBoutsSuperStructure': saveRawDataInAllBoutsSuperStructure,
+              'smoothingFactor': smoothingFactor, 'tailAngles': tailAngles, 'tailAnglesRecalculated': tailAnglesRecalculated, 'tailAnglesRecalculated2': tailAnglesRecalculated2}
+  videoInfos = [{col: excelFile.loc[videoId, col] for col in excelFile.columns} for videoId in range(0, len(excelFile))]
+  useCache = not len(supstructOverwrite) and H5filename is None
+  cacheFolder = os.path.join(resFolder, '.dataframeCache')
+  fileHashes = {}
+  if useCache and os.path.exists(os.path.join(cacheFolder, 'fileHashes.json')):
+    with open(os.path.join(cacheFolder, 'fileHashes.json')) as f:
+      fileHashes = json.load(f)
+  videosData = [None] * len(videoInfos)
+  cachePaths = [None] * len(videoInfos)
+  for videoId, videoInfo in enumerate(videoInfos):
+    if useCache:
+      cachePaths[videoId] = _getCachePath(cacheFolder, videoInfo, settings, fileHashes)
+      if not forceCacheRecreation and os.path.exists(cachePaths[videoId]):
+        print("reloading previously calculated parameters of", videoInfo['trial_id'])
+        with open(cachePaths[videoId], 'rb') as f:
+          videosData[videoId] = pickle.load(f)
+  videoIdsToCalculate = [videoId for videoId, videoData in enumerate(videosData) if videoData is None]
+  nbProcesses = min(int(dataframeOptions.get('nbProcesses', 1)), len(videoIdsToCalculate))
+  if nbProcesses > 1:
+    with Pool(nbProcesses) as pool:
+      calculatedVideosData = pool.starmap(_createDataFrameForVideo, [(videoInfos[videoId], settings, supstructOverwrite) for videoId in videoIdsToCalculate])
+  else:
+    calculatedVideosData = [_createDataFrameForVideo(videoInfos[videoId], settings, supstructOverwrite) for videoId in videoIdsToCalculate]
+  for videoId, videoData in zip(videoIdsToCalculate, calculatedVideosData):
+    videosData[videoId] = videoData
+  if useCache:
+    if not os.path.exists(cacheFolder):
+      os.makedirs(cacheFolder)
+    for videoId in videoIdsToCalculate:
+      with open(f'{cachePaths[videoId]}.{os.getpid()}', 'wb') as f:
+        pickle.dump(videosData[videoId], f)
+      os.replace(f'{cachePaths[videoId]}.{os.getpid()}', cachePaths[videoId])
+      _removeStaleCacheFiles(cachePaths[videoId])
+    with open(os.path.join(cacheFolder, 'fileHashes.json'), 'w') as f:
+      json.dump(fileHashes, f)
 
-    dfReloadedVid = None
-    if os.path.splitext(path)[1] == '.h5':
-      from zebrazoom.dataAPI._createSuperStructFromH5 import createSuperStructFromH5
-      with h5py.File(path, 'r') as results:
-        if forcePandasDfRecreation or not all(attr in results.attrs for attr in ('videoFPS', 'videoPixelSize', 'frameStepForDistanceCalculation')) or float(results.attrs['videoFPS']) != float(excelFile.loc[videoId, 'fq']) or float(results.attrs['videoPixelSize']) != float(excelFile.loc[videoId, 'pixelsize']) or int(results.attrs['frameStepForDistanceCalculation']) != int(frameStepForDistanceCalculation):
-          supstruct = createSuperStructFromH5(results)
-          firstFrame = supstruct["firstFrame"]
-          lastFrame = supstruct["lastFrame"]
-        else:
-          print("reloading previously calculated parameters")
-          dataframes = []
-          for wellIdx in range(len(results['wellPositions'])):
-            wellData = []
-            wellGroup = results[f'dataForWell{wellIdx}']
-            for animalIdx in range(len(wellGroup)):
-              animalGroup = wellGroup[f'dataForAnimal{animalIdx}']
-              if 'kinematicParametersPerBout' not in animalGroup:
-                continue
-              kinematicParametersPerBout = animalGroup['kinematicParametersPerBout'][:]
-              data = {col: kinematicParametersPerBout[col] for col in kinematicParametersPerBout.dtype.names}
-              data['Trial_ID'] = trial_id
-              data['Well_ID'] = wellIdx
-              data['Animal_ID'] = animalIdx
-              data['videoDuration'] = (results.attrs['lastFrame'] - results.attrs['firstFrame']) / results.attrs['videoFPS']
-              boutsGroup = animalGroup['listOfBouts']
-              numberOfBouts = boutsGroup.attrs['numberOfBouts']
-              data['NumBout'] = list(range(numberOfBouts))
-              additionalParams = collections.defaultdict(list)
-              for boutIdx in range(numberOfBouts):
-                boutGroup = boutsGroup[f'bout{boutIdx}']
-                additionalKinematicParametersPerBout = boutGroup['additionalKinematicParametersPerBout'][:]
-                frameCount = len(additionalKinematicParametersPerBout)
-                for col in additionalKinematicParametersPerBout.dtype.names:
-                  for idx in range(frameCount):
-                    additionalParams[f'{col}{idx + 1}'].append(additionalKinematicParametersPerBout[col][idx])
-              data.update(additionalParams)
-              dataframes.append(pd.DataFrame(data))
-          dfReloadedVid = pd.concat(dataframes)
-
-    elif (not(os.path.exists(os.path.join(path, trial_id + '.pkl'))) or forcePandasDfRecreation):
-      if len(supstructOverwrite):
-        supstruct = supstructOverwrite
-      else:
-        with open(os.path.join(path, 'results_' + trial_id + '.txt')) as f:
-          supstruct = json.load(f)
-      firstFrame = supstruct["firstFrame"]
-      lastFrame  = supstruct["lastFrame"]
-      if not H5filename:
-        with open(os.path.join(path, 'parametersUsedForCalculation.json'), 'w') as outfile:
-          print('frameStepForDistanceCalculation', frameStepForDistanceCalculation)
-          print('videoFPS', excelFile.loc[videoId, 'fq'])
-          print('videoPixelSize', excelFile.loc[videoId, 'pixelsize'])
-          json.dump({'frameStepForDistanceCalculation': int(frameStepForDistanceCalculation), 'videoFPS': float(excelFile.loc[videoId, 'fq']), 'videoPixelSize': float(excelFile.loc[videoId, 'pixelsize'])}, outfile)
-    else:
-      print("reloading previously calculated parameters")
-      dfReloadedVid = pd.read_pickle(os.path.join(path, trial_id + '.pkl'))
-      if 'BoutDuration' in dfReloadedVid:  # pickle file contains old parameter names, recreate it
-        dfReloadedVid = None
-        if len(supstructOverwrite):
-          supstruct = supstructOverwrite
-        else:
-          with open(os.path.join(path, 'results_' + trial_id + '.txt')) as f:
-            supstruct = json.load(f)
-        firstFrame = supstruct["firstFrame"]
-        lastFrame  = supstruct["lastFrame"]
-        if not H5filename:
-          with open(os.path.join(path, 'parametersUsedForCalculation.json'), 'w') as outfile:
-            print('frameStepForDistanceCalculation', frameStepForDistanceCalculation)
-            print('videoFPS', excelFile.loc[videoId, 'fq'])
-            print('videoPixelSize', excelFile.loc[videoId, 'pixelsize'])
-            json.dump({'frameStepForDistanceCalculation': int(frameStepForDistanceCalculation), 'videoFPS': float(excelFile.loc[videoId, 'fq']), 'videoPixelSize': float(excelFile.loc[videoId, 'pixelsize'])}, outfile)
-
-    if dfReloadedVid is not None:
-      nbFramesTakenIntoAccountReloaded = max([np.sum(['instaTBF' in param for param in dfReloadedVid.columns.tolist()]), np.sum(['tailAnglesRecalculated' in param for param in dfReloadedVid.columns.tolist()]), np.sum(['instaSpeed' in param for param in dfReloadedVid.columns.tolist()])])
-      if nbFramesTakenIntoAccountReloaded < nbFramesTakenIntoAccount:
-        raise ValueError("nbFramesTakenIntoAccount was too low when pre-generating the pkl file of a video:" + str(np.sum(['instaTBF' in param for param in dfReloadedVid.columns.tolist()])) + " , " + str(np.sum(['tailAnglesRecalculated' in param for param in dfReloadedVid.columns.tolist()])) + " , " + str(np.sum(['instaSpeed' in param for param in dfReloadedVid.columns.tolist()])) + " ; nbFramesTakenIntoAccount :" + str(nbFramesTakenIntoAccount))
-      for idx, cond in enumerate(condition):
-        indForWellId = (dfReloadedVid['Well_ID'] == idx)
-        if include[idx]:
-          dfReloadedVid.loc[indForWellId, 'Condition'] = cond
-          dfReloadedVid.loc[indForWellId, 'Genotype']  = genotype[idx]
-          if minNbBendForBoutDetect > 0:
-            ind           = ~(dfReloadedVid['Number of Oscillations'] >= minNbBendForBoutDetect/2)
-            dfReloadedVid.loc[ind, removeColumnsWhenAppropriate] = float('NaN')
-          if not(genotype[idx] in genotypes):
-            genotypes.append(genotype[idx])
-          if not(condition[idx] in conditions):
-            conditions.append(condition[idx])
-        else:
-          dfReloadedVid = dfReloadedVid.drop([idx2 for idx2, belongsToWell in enumerate(indForWellId) if belongsToWell])
-          if 'level_0' in dfReloadedVid.columns:
-            dfReloadedVid = dfReloadedVid.drop(['level_0'], axis=1)
-          dfReloadedVid = dfReloadedVid.reset_index()
-
-      dfParam = pd.concat([dfParam, dfReloadedVid])
-
-    if calculateRolloverParameters:
-      classifiedData = np.loadtxt(os.path.join(path, 'rolloverClassified.txt'), dtype=bool)
-      percentagesData = np.loadtxt(os.path.join(path, 'rolloverPercentages.txt'), dtype=float)
-
-    # Going through each well of the video
-    for Well_ID, Cond in enumerate(condition):
-      # Not going through this loop if we've already reloaded parameters
-      if include[Well_ID] and dfReloadedVid is None:
-        print("trial_id:", trial_id, " ; Well_ID:", Well_ID)
-        dfParamForWell = pd.DataFrame(columns=dfCols)
-        curBoutId = 0
-        # Going through each animal present in the well
-        for fishId in range(0, len(supstruct["wellPoissMouv"][Well_ID])):
-          # Going through each bout performed by the animal
-          for NumBout, dataForBout in enumerate(supstruct["wellPoissMouv"][Well_ID][fishId]):
-            if not("flag" in dataForBout) or dataForBout["flag"] == 0:
-              # Calculating specified parameters for that bout
-              if calculateRolloverParameters:
-                dfParamForWell.loc[curBoutId, ['numberOfRolloverFrames', 'rolloverProbabilitiesSum']] = [data[Well_ID][dataForBout['BoutStart']:dataForBout['BoutEnd']+1].sum() for data in (classifiedData, percentagesData)]
-                frameCount = dataForBout['BoutEnd'] - dataForBout['BoutStart'] + 1
-                dfParamForWell.loc[curBoutId, 'numberOfRolloverFramesNormalized'] = dfParamForWell.loc[curBoutId, 'numberOfRolloverFrames'] / frameCount
-                dfParamForWell.loc[curBoutId, 'rolloverProbabilitiesSumNormalized'] = dfParamForWell.loc[curBoutId, 'rolloverProbabilitiesSum'] / frameCount
-              
-              if "Bend_Timing" in dataForBout and ((type(dataForBout["Bend_Timing"]) == list and len(dataForBout["Bend_Timing"]) >= minNbBendForBoutDetect) or (type(dataForBout["Bend_Timing"]) == int and 1 >= minNbBendForBoutDetect)):
-                
-                if type(dataForBout["Bend_Timing"]) == int:
-                  dataForBout["Bend_Timing"]    = [dataForBout["Bend_Timing"]]
-                  dataForBout["Bend_TimingAbsolute"]    = [dataForBout["Bend_TimingAbsolute"]]
-                  dataForBout["Bend_Amplitude"] = [dataForBout["Bend_Amplitude"]]
-                
-                # Initial basic information
-                
-                toPutInDataFrameColumn = basicInformation
-                toPutInDataFrame       = [trial_id, Well_ID, fishId, NumBout, dataForBout['BoutStart'], dataForBout['BoutEnd'], condition[Well_ID], genotype[Well_ID], (lastFrame - firstFrame) / fq]
-                
-                if not(genotype[Well_ID] in genotypes):
-                  genotypes.append(genotype[Well_ID])
-                if not(condition[Well_ID] in conditions):
-                  conditions.append(condition[Well_ID])
-                
-                # Calculates the global kinematic parameters and stores them the dataframe
-                
-                previousBoutEnd = supstruct["wellPoissMouv"][Well_ID][fishId][NumBout-1]["BoutEnd"] if NumBout > 0 else 0
-                listOfGlobalParameters = getGlobalParameters(dataForBout, fq, pixelsize, frameStepForDistanceCalculation, previousBoutEnd, globParam, firstFrame, lastFrame, minimumFrameToFrameDistanceToBeConsideredAsMoving)
-                
-                toPutInDataFrameColumn = toPutInDataFrameColumn + globParam
-                toPutInDataFrame       = toPutInDataFrame       + listOfGlobalParameters
-                
-                # Raw data
-                
-                if saveRawDataInAllBoutsSuperStructure:
-                  toPutInDataFrameColumn = toPutInDataFrameColumn + rawData
-                  toPutInDataFrame       = toPutInDataFrame       + gatherInitialRawData(dataForBout, rawData, fq)
-                
-                # Tail angles
-                
-                if getTailAngleSignMultNormalized:
-                  toPutInDataFrameColumn = toPutInDataFrameColumn + tailAngles
-                  toPutInDataFrame       = toPutInDataFrame       + getTailAngles(dataForBout, smoothingFactor, nbFramesTakenIntoAccount, numberOfBendsIncludedForMaxDetect)
-                
-                # Calculate "dynamic" tail angle related parameters for clustering
-                
-                if computeTailAngleParamForCluster:
-                
-                  toPutInDataFrameColumn = toPutInDataFrameColumn + instaTBF + instaAmp + instaAsym
-                  toPutInDataFrame       = toPutInDataFrame       + getDynamicParameters(dataForBout, smoothingFactor, nbFramesTakenIntoAccount, numberOfBendsIncludedForMaxDetect)
-                
-                # Calculate "dynamic" center of mass related parameters for clustering
-                
-                if computeMassCenterParamForCluster:
-                
-                  instaSpeedVal       = getInstaSpeed(dataForBout, nbFramesTakenIntoAccount)
-                  instaHeadingDiffVal = getInstaHeadingDiff(dataForBout, nbFramesTakenIntoAccount)
-                  instaHorizDisplVal  = getInstaHorizontalDisplacement(dataForBout, nbFramesTakenIntoAccount)
-                  
-                  toPutInDataFrameColumn = toPutInDataFrameColumn + instaSpeed + instaHeadingDiff + instaHorizDispl
-                  toPutInDataFrame       = toPutInDataFrame       + instaSpeedVal + instaHeadingDiffVal + instaHorizDisplVal
-                  
-                # Recalculates tail angles and calculates 
-                
-                if computetailAnglesRecalculatedParamsForCluster:
-
-                  tailLength = getTailLength(dataForBout)
-                  tailAnglesRecalculatedData  = getTailAngleRecalculated(dataForBout, nbFramesTakenIntoAccount, numberOfBendsIncludedForMaxDetect)
-                  tailLengthFromRecalculatedAngles = getTailLength2(tailAnglesRecalculatedData)
-                  tailAnglesRecalculatedData2 = getTailAngleRecalculated2(dataForBout, nbFramesTakenIntoAccount, numberOfBendsIncludedForMaxDetect)
-                  
-                  toPutInDataFrameColumn = toPutInDataFrameColumn + ['tailLength', 'tailLengthFromRecalculatedAngles'] + tailAnglesRecalculated + tailAnglesRecalculated2
-                  toPutInDataFrame       = toPutInDataFrame       + [tailLength, tailLengthFromRecalculatedAngles] + tailAnglesRecalculatedData + tailAnglesRecalculatedData2.tolist()
-                
-                # Adding bout parameters to the dataframe created for the current well
-                dfParamForWell.loc[curBoutId, toPutInDataFrameColumn] = toPutInDataFrame
-                curBoutId = curBoutId + 1
-              
-              else:
-                
-                # Initial basic information
-                
-                toPutInDataFrameColumn = basicInformation
-                toPutInDataFrame       = [trial_id, Well_ID, fishId, NumBout, dataForBout['BoutStart'], dataForBout['BoutEnd'], condition[Well_ID], genotype[Well_ID], (lastFrame - firstFrame) / fq]
-                
-                if not(genotype[Well_ID] in genotypes):
-                  genotypes.append(genotype[Well_ID])
-                if not(condition[Well_ID] in conditions):
-                  conditions.append(condition[Well_ID])
-                
-                if keepSpeedDistDurWhenLowNbBends:
-                  
-                  # Calculating the global kinematic parameters and more and stores them the dataframe
-                  
-                  previousBoutEnd = supstruct["wellPoissMouv"][Well_ID][fishId][NumBout-1]["BoutEnd"] if NumBout > 0 else 0
-                  listOfGlobalParameters = getGlobalParameters(dataForBout, fq, pixelsize, frameStepForDistanceCalculation, previousBoutEnd, ['Bout Duration (s)', 'Bout Distance (mm)', 'Bout Speed (mm/s)', 'Angular Velocity (deg/s)', 'IBI (s)'] + addToGlobalParameters, firstFrame, lastFrame, minimumFrameToFrameDistanceToBeConsideredAsMoving)
-                  
-                  toPutInDataFrameColumn = toPutInDataFrameColumn + ['Bout Duration (s)', 'Bout Distance (mm)', 'Bout Speed (mm/s)', 'Angular Velocity (deg/s)', 'IBI (s)'] + addToGlobalParameters
-                  toPutInDataFrame       = toPutInDataFrame       + listOfGlobalParameters
-                  
-                # Adding bout parameters to the dataframe created for the current well
-                
-                dfParamForWell.loc[curBoutId, toPutInDataFrameColumn] = toPutInDataFrame
-                curBoutId = curBoutId + 1
-      
-        # Adding dataframe created for the current frame to the dataframe for the whole set of videos
-        dfParam = pd.concat([dfParam, dfParamForWell])
+  for videoId, (videoDataFrames, videoConditions, videoGenotypes, parametersStored) in enumerate(videosData):
+    if parametersStored and videoId not in videoIdsToCalculate:
+      _storeParametersUsedForCalculation(_getVideoPath(videoInfos[videoId], defaultZZoutputFolderPath), videoInfos[videoId], frameStepForDistanceCalculation)
+    for videoDataFrame in videoDataFrames:
+      dfParam = pd.concat([dfParam, videoDataFrame])
+    for genotype in videoGenotypes:
+      if not(genotype in genotypes):
+        genotypes.append(genotype)
+    for condition in videoConditions:
+      if not(condition in conditions):
+        conditions.append(condition)
+  
   
   # Saving the dataframe  
   if 'level_0' in dfParam.columns:
@@ -1,428 +1,462 @@
-from zebrazoom.dataAnalysis.datasetcreation.getDeltaHead import getDeltaHead
-import numpy as np
-from scipy.interpolate import UnivariateSpline
+import functools
 import math
 
-def getGlobalParameters(curbout, fps, pixelSize, frameStepForDistanceCalculation, previousBoutEnd, listOfParametersToCalculate, firstFrame, lastFrame, minimumFrameToFrameDistanceToBeConsideredAsMoving=0):
-  
+import numpy as np
+
+
+_GLOBAL_PARAMETERS = {}
+
+
+def _globalParameter(name, requires=()):
+  '''Registers the function calculating a global parameter for all the bouts, requires lists the parameters it uses.'''
+  def register(function):
+    _GLOBAL_PARAMETERS[name] = (function, requires)
+    return function
+  return register
+
+
+def _squared(values):
+  '''Same as Python's ** 2 on floats, which calls pow: numpy's ** 2 multiplies the values by themselves, which can differ by one ULP.'''
+  return np.float_power(values, 2)
+
+
+def _sumPerBout(values, boutIdx, nbBouts):
+  '''Same as np.sum on the values of each bout (values must be sorted by bout): numpy's pairwise summation gives slightly different results than a sequential sum.'''
+  ends = np.cumsum(np.bincount(boutIdx, minlength=nbBouts))
+  return np.array([np.sum(values[end - length:end]) for end, length in zip(ends, np.diff(ends, prepend=0))], dtype=float)
+
+
+class _Frames:
+  '''Per-frame (or per-bend) data of a list of bouts, stored one bout after the other in a single array.'''
+  def __init__(self, arrays):
+    self.lengths = np.fromiter(map(len, arrays), dtype=int, count=len(arrays))
+    self.starts = np.cumsum(self.lengths) - self.lengths
+    self.values = np.concatenate([np.asarray(array, dtype=float) for array in arrays]) if len(arrays) else np.empty(0)
+    self.boutIdx = np.repeat(np.arange(len(arrays)), self.lengths)
+    self.localIdx = np.arange(len(self.values)) - self.starts[self.boutIdx]
+
+  def first(self, values=None):
+    values = self.values if values is None else values
+    result = np.full(len(self.lengths), np.nan)
+    result[self.lengths > 0] = values[self.starts[self.lengths > 0]]
+    return result
+
+  def last(self):
+    result = np.full(len(self.lengths), np.nan)
+    result[self.lengths > 0] = self.values[(self.starts + self.lengths - 1)[self.lengths > 0]]
+    return result
+
+  def sum(self, values=None):
+    return _sumPerBout(self.values if values is None else values, self.boutIdx, len(self.lengths))
+
+  def mean(self, values=None):
+    with np.errstate(divide='ignore', invalid='ignore'):
+      return self.sum(values) / self.lengths
+
+  def max(self, values=None):
+    result = np.full(len(self.lengths), -np.inf)
+    with np.errstate(invalid='ignore'):
+      np.maximum.at(result, self.boutIdx, self.values if values is None else values)
+    return result
+
+  def _builtinReduce(self, function, initial, values):
+    values = self.values if values is None else values
+    result = np.full(len(self.lengths), initial)
+    function.at(result, self.boutIdx, values)
+    return np.where(np.isnan(self.first(values)), np.nan, result)
+
+  def builtinMax(self, values=None):
+    '''Same as Python's max: NaN values are ignored, unless the first value is NaN.'''
+    return self._builtinReduce(np.fmax, -np.inf, values)
+
+  def builtinMin(self, values=None):
+    '''Same as Python's min: NaN values are ignored, unless the first value is NaN.'''
+    return self._builtinReduce(np.fmin, np.inf, values)
+
+  def _padded(self, values, fill):
+    padded = np.full((len(self.lengths), max(self.lengths.max(initial=0), 1)), fill)
+    padded[self.boutIdx, self.localIdx] = values
+    return padded
+
+  def median(self, values=None):
+    values = self.values if values is None else values
+    padded = self._padded(values, np.inf)
+    padded.sort(axis=1)
+    rows = np.arange(len(self.lengths))
+    lower = padded[rows, np.maximum(self.lengths - 1, 0) // 2]
+    upper = padded[rows, self.lengths // 2]
+    result = np.where(self.lengths > 0, (lower + upper) / 2, np.nan)
+    result[self.sum(np.isnan(values)) > 0] = np.nan
+    return result
+
+  def argmax(self, values):
+    '''Index in values of the (first) maximum value of each bout, NaN values are considered to be the maximum as with np.argmax.'''
+    return self.starts + np.argmax(self._padded(values, -np.inf), axis=1)
+
+
+def _propagateNanValues(frames, isNan, frameStepForDistanceCalculation, inclusive):
+  '''Mask of the frames set to NaN when a NaN value is found at least frameStepForDistanceCalculation frames after the start of the bout.'''
+  sources = np.flatnonzero(isNan & (frames.localIdx >= frameStepForDistanceCalculation))
+  counts = np.zeros(len(isNan) + 1, dtype=int)
+  np.add.at(counts, sources - frameStepForDistanceCalculation, 1)
+  np.add.at(counts, sources + inclusive, -1)
+  return np.cumsum(counts[:-1]) > 0
+
+
+def _sampledPairs(frames, frameStepForDistanceCalculation):
+  '''
+  Pairs of consecutive frames taken every frameStepForDistanceCalculation frames (and the last frame of the bout), returns the indices of the first and second frame of each pair in frames.values and the bout of each pair.
+  '''
+  nbSamples = np.where(frames.lengths > 0, np.maximum(frames.lengths // frameStepForDistanceCalculation, 1) + 1, 0)
+  sampleIdx = np.arange(nbSamples.sum()) - np.repeat(np.cumsum(nbSamples) - nbSamples, nbSamples)
+  isLastSample = sampleIdx == np.repeat(nbSamples - 1, nbSamples)
+  samples = np.repeat(frames.starts, nbSamples) + np.where(isLastSample, np.repeat(frames.lengths - 1, nbSamples), sampleIdx * frameStepForDistanceCalculation)
+  return samples[:-1][~isLastSample[:-1]], samples[1:][~isLastSample[:-1]], np.repeat(np.arange(len(frames.lengths)), np.maximum(nbSamples - 1, 0))
+
+
+def _storeNanValues(bouts, key, frames, mask):
+  '''NaN values propagated when calculating parameters are also stored in the data of the bouts, as they are used by other parameters.'''
+  for idx in np.flatnonzero(mask):
+    bouts[frames.boutIdx[idx]][key][frames.localIdx[idx]] = float('nan')
+
+
+class _Bouts:
+  '''Data of a list of bouts, gathered for all the bouts only when a parameter needs it.'''
+  def __init__(self, bouts, previousBoutEnds, fps, pixelSize, frameStepForDistanceCalculation, firstFrame, lastFrame, minimumFrameToFrameDistanceToBeConsideredAsMoving):
+    self.bouts = bouts
+    self.previousBoutEnd = np.asarray(previousBoutEnds, dtype=float)
+    self.fps = fps
+    self.pixelSize = pixelSize
+    self.frameStep = frameStepForDistanceCalculation
+    self.firstFrame = firstFrame
+    self.lastFrame = lastFrame
+    self.minimumFrameToFrameDistanceToBeConsideredAsMoving = minimumFrameToFrameDistanceToBeConsideredAsMoving
+
+  @functools.cached_property
+  def BoutStart(self):
+    return np.array([bout['BoutStart'] for bout in self.bouts], dtype=float)
+
+  @functools.cached_property
+  def BoutEnd(self):
+    return np.array([bout['BoutEnd'] for bout in self.bouts], dtype=float)
+
+  @functools.cached_property
+  def HeadX(self):
+    return _Frames([bout['HeadX'] for bout in self.bouts])
+
+  @functools.cached_property
+  def HeadY(self):
+    return _Frames([bout['HeadY'] for bout in self.bouts])
+
+  @functools.cached_property
+  def Heading(self):
+    '''Only contains the heading of the bouts with more than one frame of heading.'''
+    return _Frames([bout['Heading'] if 'Heading' in bout and len(bout['Heading']) > 1 else [] for bout in self.bouts])
+
+  @functools.cached_property
+  def hasBends(self):
+    return np.array(["Bend_Timing" in bout and type(bout["Bend_Timing"]) == list for bout in self.bouts], dtype=bool)
+
+  @functools.cached_property
+  def Bend_Timing(self):
+    return _Frames([bout["Bend_Timing"] if hasBends else [] for bout, hasBends in zip(self.bouts, self.hasBends)])
+
+  @functools.cached_property
+  def Bend_Amplitude(self):
+    return _Frames([bout["Bend_Amplitude"] if "Bend_Amplitude" in bout and type(bout["Bend_Amplitude"]) == list else [] for bout in self.bouts])
+
+  @functools.cached_property
+  def TailAngle(self):
+    '''Smoothed tail angle if available, raw tail angle otherwise.'''
+    return _Frames([bout["TailAngle_smoothed"] if "TailAngle_smoothed" in bout and len(bout["TailAngle_smoothed"]) else bout["TailAngle_Raw"] if "TailAngle_Raw" in bout else [] for bout in self.bouts])
+
+  @functools.cached_property
+  def instantaneousTBF(self):
+    previousBendTiming = np.where(self.Bend_Timing.localIdx > 0, np.roll(self.Bend_Timing.values, 1), 0)
+    with np.errstate(divide='ignore'):
+      return self.fps / (2 * (self.Bend_Timing.values - previousBendTiming))
+
+  @functools.cached_property
+  def frameToFrameDistance(self):
+    '''Distance between each frame and the next one (the values for the last frames of the bouts are not used).'''
+    return np.sqrt(_squared(np.diff(self.HeadX.values, append=0)) + _squared(np.diff(self.HeadY.values, append=0)))
+
+  @functools.cached_property
+  def hasFrameToFrameDistance(self):
+    return self.HeadX.localIdx < np.repeat(self.HeadX.lengths - 1, self.HeadX.lengths)
+
+
+@_globalParameter('Bout Duration (s)')
+def _boutDuration(bouts, parameters):
+  return (bouts.BoutEnd - bouts.BoutStart + 1) / bouts.fps
+
+
+@_globalParameter('Bout Distance (mm)')
+def _boutDistance(bouts, parameters):
+  posX = bouts.HeadX
+  posY = bouts.HeadY
+  # if removeLargeInstantaneousDistanceData is set, then some nan values may be present which we must propogate for frameStepForDistanceCalculation frames to enable the discarding of frame below
+  isNan = np.isnan(posX.values) | np.isnan(posY.values)
+  propagated = _propagateNanValues(posX, isNan, bouts.frameStep, 0)
+  for frames, key in ((posX, 'HeadX'), (posY, 'HeadY')):
+    _storeNanValues(bouts.bouts, key, frames, propagated & ~np.isnan(frames.values))
+    frames.values[propagated] = np.nan
+  bouts.__dict__.pop('frameToFrameDistance', None)
+  # if removeLargeInstantaneousDistanceData is set, we must discard the nan frames as they correspond to "jumps"
+  first, second, pairBoutIdx = _sampledPairs(posX, bouts.frameStep)
+  distance = np.sqrt(_squared(posX.values[second] - posX.values[first]) + _squared(posY.values[second] - posY.values[first]))
+  takenIntoAccount = ~np.isnan(distance)
+  nbPairs = np.bincount(pairBoutIdx, minlength=len(bouts.bouts))
+  nbPairsTakenIntoAccount = np.bincount(pairBoutIdx, weights=takenIntoAccount, minlength=len(bouts.bouts))
+  # the distances are added one after the other, as np.bincount does
+  TotalDistance = np.bincount(pairBoutIdx[takenIntoAccount], weights=distance[takenIntoAccount], minlength=len(bouts.bouts)) * bouts.pixelSize
+  with np.errstate(divide='ignore', invalid='ignore'):
+    return np.where(nbPairsTakenIntoAccount != nbPairs, TotalDistance * (nbPairs / nbPairsTakenIntoAccount), TotalDistance)
+
+
+@_globalParameter('Angular Velocity (deg/s)')
+def _angularVelocity(bouts, parameters):
+  heading = bouts.Heading
+  hasHeading = heading.lengths > 0
+  if hasHeading.any():
+    posIdx = bouts.HeadX.starts[heading.boutIdx] + heading.localIdx
+    # if removeLargeInstantaneousDistanceData is set, then some nan values may be present which we must propogate for frameStepForDistanceCalculation frames to enable the discarding of frame below
+    isNan = np.isnan(heading.values) | np.isnan(bouts.HeadX.values[posIdx]) | np.isnan(bouts.HeadY.values[posIdx])
+    propagated = _propagateNanValues(heading, isNan, bouts.frameStep, 1)
+    _storeNanValues(bouts.bouts, 'Heading', heading, propagated & ~np.isnan(heading.values))
+    heading.values[propagated] = np.nan
+  first, second, pairBoutIdx = _sampledPairs(heading, bouts.frameStep)
+  # if removeLargeInstantaneousDistanceData is set, we must discard the nan frames as they correspond to "jumps"
+  takenIntoAccount = ~(np.isnan(heading.values[first]) | np.isnan(heading.values[second]))
+  difference = (heading.values[second] - heading.values[first])[takenIntoAccount]
+  angularDifferential = np.minimum.reduce([np.abs(difference * (180 / np.pi)) % 180, np.abs((difference + 2 * np.pi) * (180 / np.pi)) % 180, np.abs((difference - 2 * np.pi) * (180 / np.pi)) % 180]) / (bouts.frameStep / bouts.fps)
+  with np.errstate(divide='ignore', invalid='ignore'):
+    meanAngularDifferential = _sumPerBout(angularDifferential, pairBoutIdx[takenIntoAccount], len(bouts.bouts)) / np.bincount(pairBoutIdx[takenIntoAccount], minlength=len(bouts.bouts))
+  return np.where(hasHeading, meanAngularDifferential, 0)
+
+
+@_globalParameter('maxInstantaneousSpeed')
+def _maxInstantaneousSpeed(bouts, parameters):
+  instantaneousSpeed = bouts.frameToFrameDistance * bouts.pixelSize * bouts.fps
+  instantaneousSpeed[~bouts.hasFrameToFrameDistance] = -np.inf
+  return np.where(bouts.HeadX.lengths > 1, bouts.HeadX.max(instantaneousSpeed), 0)
+
+
+@_globalParameter('percentOfMovingFramesBasedOnDistance')
+def _percentOfMovingFramesBasedOnDistance(bouts, parameters):
+  isMoving = bouts.hasFrameToFrameDistance & (bouts.frameToFrameDistance * bouts.pixelSize > bouts.minimumFrameToFrameDistanceToBeConsideredAsMoving)
+  return (bouts.HeadX.sum(isMoving) / (bouts.lastFrame - bouts.firstFrame + 1)) * 100
+
+
+@_globalParameter('Bout Speed (mm/s)', requires=('Bout Distance (mm)',))
+def _boutSpeed(bouts, parameters):
+  with np.errstate(divide='ignore', invalid='ignore'):
+    return parameters['Bout Distance (mm)'] * bouts.fps / (bouts.BoutEnd - bouts.BoutStart)
+
+
+@_globalParameter('Number of Oscillations')
+def _numberOfOscillations(bouts, parameters):
+  return np.where(bouts.hasBends, bouts.Bend_Timing.lengths / 2, np.nan)
+
+
+@_globalParameter('meanTBF', requires=('Number of Oscillations', 'Bout Duration (s)'))
+def _meanTBF(bouts, parameters):
+  return parameters['Number of Oscillations'] / parameters['Bout Duration (s)']
+
+
+@_globalParameter('Max TBF (Hz)')
+def _maxTBF(bouts, parameters):
+  return np.where(bouts.Bend_Timing.lengths > 0, bouts.Bend_Timing.max(bouts.instantaneousTBF), np.nan)
+
+
+@_globalParameter('Mean TBF (Hz)')
+def _meanOfInstantaneousTBF(bouts, parameters):
+  return bouts.Bend_Timing.mean(bouts.instantaneousTBF)
+
+
+@_globalParameter('medianOfInstantaneousTBF')
+def _medianOfInstantaneousTBF(bouts, parameters):
+  return bouts.Bend_Timing.median(bouts.instantaneousTBF)
+
+
+def _meanTBFOfFirstBends(bouts, nbBends):
+  isFirstBend = bouts.Bend_Timing.localIdx < nbBends
+  with np.errstate(divide='ignore', invalid='ignore'):
+    return _sumPerBout(bouts.instantaneousTBF[isFirstBend], bouts.Bend_Timing.boutIdx[isFirstBend], len(bouts.bouts)) / np.minimum(bouts.Bend_Timing.lengths, nbBends)
+
+
+@_globalParameter('Mean TBF (Hz) (based on first 4 bends)')
+def _meanTBFFirst4Bends(bouts, parameters):
+  return _meanTBFOfFirstBends(bouts, 4)
+
+
+@_globalParameter('Mean TBF (Hz) (based on first 6 bends)')
+def _meanTBFFirst6Bends(bouts, parameters):
+  return _meanTBFOfFirstBends(bouts, 6)
+
+
+@_globalParameter('Max absolute TBA (deg.)')
+def _maxBendAmplitude(bouts, parameters):
+  return np.where(bouts.Bend_Amplitude.lengths > 0, bouts.Bend_Amplitude.builtinMax(np.abs(bouts.Bend_Amplitude.values)), np.nan) * (180 / math.pi)
+
+
+@_globalParameter('maxBendAmplitudeSigned')
+def _maxBendAmplitudeSigned(bouts, parameters):
+  amplitudes = bouts.Bend_Amplitude
+  maxBendAmplitudeSigned = np.full(len(bouts.bouts), np.nan)
+  maxBendAmplitudeSigned[amplitudes.lengths > 0] = amplitudes.values[amplitudes.argmax(np.abs(amplitudes.values))[amplitudes.lengths > 0]]
+  return maxBendAmplitudeSigned * (180 / math.pi)
+
+
+@_globalParameter('Median absolute TBA (deg.)')
+def _medianBendAmplitude(bouts, parameters):
+  return bouts.Bend_Amplitude.median(np.abs(bouts.Bend_Amplitude.values)) * (180 / math.pi)
+
+
+@_globalParameter('medianBendAmplitudeSigned')
+def _medianBendAmplitudeSigned(bouts, parameters):
+  return bouts.Bend_Amplitude.median() * (180 / math.pi)
+
+
+@_globalParameter('Mean absolute TBA (deg.)')
+def _meanBendAmplitude(bouts, parameters):
+  return bouts.Bend_Amplitude.mean(np.abs(bouts.Bend_Amplitude.values)) * (180 / math.pi)
+
+
+@_globalParameter('maxTailAngleAmplitude')
+def _maxTailAngleAmplitude(bouts, parameters):
+  return np.where(bouts.TailAngle.lengths > 0, bouts.TailAngle.builtinMax(np.abs(bouts.TailAngle.values)), np.nan) * (180 / math.pi)
+
+
+@_globalParameter('binaryClass25degMaxTailAngle', requires=('maxTailAngleAmplitude',))
+def _binaryClass25degMaxTailAngle(bouts, parameters):
+  return np.where(parameters['maxTailAngleAmplitude'] <= 25, 0, 1)
+
+
+def _deltaHead(bouts):
+  '''Heading change in degrees, calculated for all the bouts as in getDeltaHead.'''
+  numps = 6
+  slopes = []
+  for frameIdx, headX, headY in ((0, bouts.HeadX.first(), bouts.HeadY.first()), (-1, bouts.HeadX.last(), bouts.HeadY.last())):
+    tailX, tailY = [np.array([points[-numps:][0] if len(points) else head for points, head in zip((bout[key][frameIdx] for bout in bouts.bouts), headValues)], dtype=float)
+                    for key, headValues in (("TailX_VideoReferential", headX), ("TailY_VideoReferential", headY))]
+    slopes.append(np.arctan2((headY - tailY), (headX - tailX)) * 180 / np.pi)
+  delt = -(slopes[1] - slopes[0])
+  return np.where(delt > 180, 360 - delt, np.where(delt < -180, -(360 + delt), delt))
+
+
+@_globalParameter('Absolute Yaw (deg)')
+def _absoluteYaw(bouts, parameters):
+  return np.abs(_deltaHead(bouts))
+
+
+@_globalParameter('Signed Yaw (deg)')
+def _signedYaw(bouts, parameters):
+  return _deltaHead(bouts)
+
+
+@_globalParameter('xstart')
+def _xstart(bouts, parameters):
+  return np.where(bouts.HeadY.lengths >= 1, bouts.HeadY.first() * bouts.pixelSize, 0)
+
+
+@_globalParameter('xend')
+def _xend(bouts, parameters):
+  return np.where(bouts.HeadX.lengths >= 1, bouts.HeadX.last() * bouts.pixelSize, 0)
+
+
+@_globalParameter('xmean')
+def _xmean(bouts, parameters):
+  return np.where(bouts.HeadX.lengths >= 1, bouts.HeadX.mean() * bouts.pixelSize, 0)
+
+
+@_globalParameter('ymean')
+def _ymean(bouts, parameters):
+  return np.where(bouts.HeadY.lengths >= 1, bouts.HeadY.mean() * bouts.pixelSize, 0)
+
+
+@_globalParameter('TBA#1 timing (s)')
+def _firstBendTime(bouts, parameters):
+  return bouts.Bend_Timing.first() / bouts.fps
+
+
+@_globalParameter('TBA#1 Amplitude (deg)')
+def _firstBendAmplitude(bouts, parameters):
+  return np.abs(bouts.Bend_Amplitude.first()) * (180 / math.pi)
+
+
+@_globalParameter('firstBendAmplitudeSigned')
+def _firstBendAmplitudeSigned(bouts, parameters):
+  return bouts.Bend_Amplitude.first() * (180 / math.pi)
+
+
+@_globalParameter('IBI (s)')
+def _IBI(bouts, parameters):
+  return (bouts.BoutStart - bouts.previousBoutEnd) / bouts.fps
+
+
+@_globalParameter('BoutFrameNumberStart')
+def _boutFrameNumberStart(bouts, parameters):
+  return np.array([bout['BoutStart'] for bout in bouts.bouts])  # kept as integers
+
+
+@_globalParameter('tailAngleSymmetry')
+def _tailAngleSymmetry(bouts, parameters):
+  hasTailAngle = bouts.TailAngle.lengths > 0
+  maxTailAngle = np.where(hasTailAngle, bouts.TailAngle.builtinMax(), 0)
+  minTailAngle = np.where(hasTailAngle, bouts.TailAngle.builtinMin(), 0)
+  reverse = np.abs(maxTailAngle) < np.abs(minTailAngle)
+  maxTailAngle, minTailAngle = np.where(reverse, -minTailAngle, maxTailAngle), np.where(reverse, -maxTailAngle, minTailAngle)
+  # = 1 if perfect symetry OR if tail angle staying constant and always at 0
+  # = 0 if tail beating only on one side, starting from the 0 position
+  # < 0 but > -1 if tail beating only on one side, starting from the side it's beating (not from 0)
+  return np.divide(-minTailAngle, maxTailAngle, out=np.ones(len(bouts.bouts)), where=maxTailAngle > 0)
+
+
+@_globalParameter('secondBendAmpDividedByFirst')
+def _secondBendAmpDividedByFirst(bouts, parameters):
+  amplitudes = bouts.Bend_Amplitude
+  hasSecondBend = (amplitudes.lengths >= 2) & (amplitudes.first() != 0)
+  secondBendAmplitude = np.full(len(bouts.bouts), np.nan)
+  secondBendAmplitude[hasSecondBend] = amplitudes.values[amplitudes.starts[hasSecondBend] + 1]
+  with np.errstate(divide='ignore', invalid='ignore'):
+    return secondBendAmplitude / amplitudes.first()
+
+
+@_globalParameter('tailAngleIntegral')
+def _tailAngleIntegral(bouts, parameters):
+  return np.where(bouts.TailAngle.lengths > 0, bouts.TailAngle.sum(np.abs(bouts.TailAngle.values)), np.nan) * (180 / math.pi)
+
+
+@_globalParameter('tailAngleIntegralSigned')
+def _tailAngleIntegralSigned(bouts, parameters):
+  return np.where(bouts.TailAngle.lengths > 0, bouts.TailAngle.sum(), np.nan) * (180 / math.pi)
+
+
+def getGlobalParametersForBouts(bouts, fps, pixelSize, frameStepForDistanceCalculation, previousBoutEnds, listOfParametersToCalculate, firstFrame, lastFrame, minimumFrameToFrameDistanceToBeConsideredAsMoving=0):
+  '''
+  Calculates the global parameters of a list of bouts (typically all the bouts of a well), each parameter being calculated for all the bouts at once.
+  Returns a list containing an array of values (one per bout) for each parameter.
+  '''
+  boutsData = _Bouts(bouts, previousBoutEnds, fps, pixelSize, frameStepForDistanceCalculation, firstFrame, lastFrame, minimumFrameToFrameDistanceToBeConsideredAsMoving)
+  parameters = {}
+
+  def calculateParameter(parameterToCalculate):
+    if parameterToCalculate not in parameters:
+      function, requires = _GLOBAL_PARAMETERS[parameterToCalculate]
+      for requiredParameter in requires:
+        calculateParameter(requiredParameter)
+      parameters[parameterToCalculate] = np.broadcast_to(function(boutsData, parameters), (len(bouts),))
+    return parameters[parameterToCalculate]
+
   listOfParametersCalculated = []
-  
   for parameterToCalculate in listOfParametersToCalculate:
-    
-    
-    
-    if parameterToCalculate == 'Bout Duration (s)':
-      
-      BoutDuration = (curbout["BoutEnd"] - curbout["BoutStart"] + 1) / fps
-      listOfParametersCalculated.append(BoutDuration)
-    
-    
-    
-    elif parameterToCalculate == 'Bout Distance (mm)':
-      
-      TotalDistance = 0
-      posX = curbout["HeadX"]
-      posY = curbout["HeadY"]
-      rangeUsedForDistanceCalculation   = [frameStepForDistanceCalculation*i for i in range(0, int(len(posX)/frameStepForDistanceCalculation))]
-      if len(rangeUsedForDistanceCalculation) == 0:
-        rangeUsedForDistanceCalculation = [0, len(posX) - 1]
-      else:
-        rangeUsedForDistanceCalculation = rangeUsedForDistanceCalculation + [len(posX) - 1]
-      # if removeLargeInstantaneousDistanceData is set, then some nan values may be present which we must propogate for frameStepForDistanceCalculation frames to enable the discarding of frame below
-      for i in range(frameStepForDistanceCalculation, len(posX)):
-        if np.isnan(posX[i]) or np.isnan(posY[i]):
-          for j in range(i - frameStepForDistanceCalculation, i):
-            posX[j] = float('nan')
-            posY[j] = float('nan')
-      posX = [posX[i] for i in rangeUsedForDistanceCalculation]
-      posY = [posY[i] for i in rangeUsedForDistanceCalculation]
-      # if removeLargeInstantaneousDistanceData is set, we must discard the nan frames as they correspond to "jumps"
-      countNotTakingIntoAccount = 0
-      for j in range(0, len(posX)-1):
-        if not(np.isnan(posX[j+1])) and not(np.isnan(posX[j])) and not(np.isnan(posY[j+1])) and not(np.isnan(posY[j])):
-          TotalDistance = TotalDistance + math.sqrt((posX[j+1] - posX[j])**2 + (posY[j+1] - posY[j])**2)
-        else:
-          countNotTakingIntoAccount = countNotTakingIntoAccount + 1
-      TotalDistance = TotalDistance * pixelSize
-      if countNotTakingIntoAccount != 0:
-        takingIntoAccount = len(posX) - 1 - countNotTakingIntoAccount
-        TotalDistance = TotalDistance * ((len(posX) - 1) / takingIntoAccount)
-      listOfParametersCalculated.append(TotalDistance)
-    
-    
-    elif parameterToCalculate == 'Angular Velocity (deg/s)':
-      
-      if ("Heading" in curbout) and (len(curbout["Heading"]) > 1):
-        heading = curbout["Heading"]
-        posX = curbout["HeadX"]
-        posY = curbout["HeadY"]
-        rangeUsedForDistanceCalculation   = [frameStepForDistanceCalculation*i for i in range(0, int(len(heading)/frameStepForDistanceCalculation))]
-        if len(rangeUsedForDistanceCalculation) == 0:
-          rangeUsedForDistanceCalculation = [0, len(heading) - 1]
-        else:
-          rangeUsedForDistanceCalculation = rangeUsedForDistanceCalculation + [len(heading) - 1]
-        # if removeLargeInstantaneousDistanceData is set, then some nan values may be present which we must propogate for frameStepForDistanceCalculation frames to enable the discarding of frame below
-        for i in range(frameStepForDistanceCalculation, len(heading)):
-          if np.isnan(heading[i]) or np.isnan(posX[i]) or np.isnan(posY[i]):
-            for j in range(i - frameStepForDistanceCalculation, i + 1):
-              heading[j] = float('nan')
-        heading = [heading[i] for i in rangeUsedForDistanceCalculation]
-        # if removeLargeInstantaneousDistanceData is set, we must discard the nan frames as they correspond to "jumps"
-        angularDifferential = []
-        for j in range(0, len(heading)-1):
-          if not(np.isnan(heading[j+1])) and not(np.isnan(heading[j])):
-            angularDifferential = angularDifferential + [(min(abs((heading[j+1] - heading[j]) * (180 / np.pi)) % 180, abs((heading[j+1] - heading[j] + 2 * np.pi) * (180 / np.pi)) % 180, abs((heading[j+1] - heading[j] - 2 * np.pi) * (180 / np.pi)) % 180)) / (frameStepForDistanceCalculation / fps)]
-        listOfParametersCalculated.append(np.mean(angularDifferential))
-      else:
-        listOfParametersCalculated.append(0)
-    
-    elif parameterToCalculate == 'maxInstantaneousSpeed':
-      
-      posX = curbout["HeadX"]
-      posY = curbout["HeadY"]
-      instantaneousSpeed = []
-      for j in range(0, len(posX)-1):
-        instantaneousSpeed.append(math.sqrt((posX[j+1] - posX[j])**2 + (posY[j+1] - posY[j])**2) * pixelSize * fps)
-      if len(instantaneousSpeed):
-        listOfParametersCalculated.append(np.max(instantaneousSpeed))
-      else:
-        listOfParametersCalculated.append(0)
-    
-    
-    elif parameterToCalculate == 'percentOfMovingFramesBasedOnDistance':
-      
-      posX = curbout["HeadX"]
-      posY = curbout["HeadY"]
-      # rangeUsedForDistanceCalculation   = [frameStepForDistanceCalculation*i for i in range(0, int(len(posX)/frameStepForDistanceCalculation))]
-      # if len(rangeUsedForDistanceCalculation) == 0:
-        # rangeUsedForDistanceCalculation = [0, len(posX) - 1]
-      # else:
-        # rangeUsedForDistanceCalculation = rangeUsedForDistanceCalculation + [len(posX) - 1]
-      # posX = [posX[i] for i in rangeUsedForDistanceCalculation]
-      # posY = [posY[i] for i in rangeUsedForDistanceCalculation]
-      distance = np.array([math.sqrt((posX[j+1] - posX[j])**2 + (posY[j+1] - posY[j])**2) * pixelSize for j in range(0, len(posX)-1)])
-      numberOfMovingFrames   = int(np.sum(distance > minimumFrameToFrameDistanceToBeConsideredAsMoving))
-      percentOfMovingFrames = (numberOfMovingFrames / (lastFrame - firstFrame + 1)) * 100
-      listOfParametersCalculated.append(percentOfMovingFrames)
-    
-    
-    
-    elif parameterToCalculate == 'Bout Speed (mm/s)':
-      
-      Speed = TotalDistance * fps / (curbout["BoutEnd"] - curbout["BoutStart"]) # This is a bit of a "hack" (not very "clean"), it only works because the listOfParametersToCalculate provided contains TotalDistance before Speed
-      listOfParametersCalculated.append(Speed)
-    
-    
-    
-    elif parameterToCalculate == 'Number of Oscillations':
-      
-      if "Bend_Timing" in curbout and type(curbout["Bend_Timing"]) == list:
-        NumberOfOscillations = len(curbout["Bend_Timing"]) / 2
-      else:
-        NumberOfOscillations = float('NaN')
-      listOfParametersCalculated.append(NumberOfOscillations)
-    
-    
-    
-    elif parameterToCalculate == 'meanTBF':
-      meanTBF = NumberOfOscillations / BoutDuration # This is a bit of a "hack" (not very "clean"), it only works because the listOfParametersToCalculate provided contains NumberOfOscillations and BoutDuration before meanTBF
-      listOfParametersCalculated.append(meanTBF)
-    
-    
-    
-    elif parameterToCalculate == 'Max TBF (Hz)':
-      
-      if "Bend_Timing" in curbout and type(curbout["Bend_Timing"]) == list and len(curbout["Bend_Timing"]):
-        maxOfInstantaneousTBF = np.max(fps / (2 * np.diff([0] + curbout['Bend_Timing'])))
-      else:
-        maxOfInstantaneousTBF = float('NaN')
-      listOfParametersCalculated.append(maxOfInstantaneousTBF)
-    
-    
-    
-    elif parameterToCalculate == 'Mean TBF (Hz)':
-      
-      if "Bend_Timing" in curbout and type(curbout["Bend_Timing"]) == list and len(curbout["Bend_Timing"]):
-        meanOfInstantaneousTBF = np.mean(fps / (2 * np.diff([0] + curbout['Bend_Timing'])))
-      else:
-        meanOfInstantaneousTBF = float('NaN')
-      listOfParametersCalculated.append(meanOfInstantaneousTBF)
-    
-    
-    
-    elif parameterToCalculate == 'medianOfInstantaneousTBF':
-      
-      if "Bend_Timing" in curbout and type(curbout["Bend_Timing"]) == list and len(curbout["Bend_Timing"]):
-        medianOfInstantaneousTBF = np.median(fps / (2 * np.diff([0] + curbout['Bend_Timing'])))
-      else:
-        medianOfInstantaneousTBF = float('NaN')
-      listOfParametersCalculated.append(medianOfInstantaneousTBF)
-    
-    
-    
-    elif parameterToCalculate == 'Mean TBF (Hz) (based on first 4 bends)':
-      
-      if "Bend_Timing" in curbout and type(curbout["Bend_Timing"]) == list and len(curbout["Bend_Timing"]):
-        if len(curbout['Bend_Timing']) >= 4:
-          first4Bends = curbout['Bend_Timing'][:4]
-        else:
-          first4Bends = curbout['Bend_Timing']
-        meanOfInstantaneousTBFfirst4Bends = np.mean(fps / (2 * np.diff([0] + first4Bends)))
-      else:
-        meanOfInstantaneousTBFfirst4Bends = float('NaN')
-      listOfParametersCalculated.append(meanOfInstantaneousTBFfirst4Bends)
-    
-    
-    
-    elif parameterToCalculate == 'Mean TBF (Hz) (based on first 6 bends)':
-      
-      if "Bend_Timing" in curbout and type(curbout["Bend_Timing"]) == list and len(curbout["Bend_Timing"]):
-        if len(curbout['Bend_Timing']) >= 6:
-          first6Bends = curbout['Bend_Timing'][:6]
-        else:
-          first6Bends = curbout['Bend_Timing']
-        meanOfInstantaneousTBFfirst6Bends = np.mean(fps / (2 * np.diff([0] + first6Bends)))
-      else:
-        meanOfInstantaneousTBFfirst6Bends = float('NaN')
-      listOfParametersCalculated.append(meanOfInstantaneousTBFfirst6Bends)
-    
-    
-    
-    elif parameterToCalculate == 'Max absolute TBA (deg.)':
-      
-      if "Bend_Amplitude" in curbout and type(curbout["Bend_Amplitude"]) == list and len(curbout["Bend_Amplitude"]):
-        maxBendAmplitude = max(list(map(abs, curbout["Bend_Amplitude"]))) * (180 / math.pi)
-      else:
-        maxBendAmplitude = float('NaN')
-      listOfParametersCalculated.append(maxBendAmplitude)
-    
-    
-    
-    elif parameterToCalculate == 'maxBendAmplitudeSigned':
-      
-      if "Bend_Amplitude" in curbout and type(curbout["Bend_Amplitude"]) == list and len(curbout["Bend_Amplitude"]):
-        maxBendAmplitudeSigned = curbout["Bend_Amplitude"][np.argmax(abs(np.array(curbout["Bend_Amplitude"])))] * (180 / math.pi)
-      else:
-        maxBendAmplitudeSigned = float('NaN')
-      listOfParametersCalculated.append(maxBendAmplitudeSigned)
-    
-    
-    
-    elif parameterToCalculate == 'Median absolute TBA (deg.)':
-      
-      if "Bend_Amplitude" in curbout and type(curbout["Bend_Amplitude"]) == list and len(curbout["Bend_Amplitude"]):
-        medianBendAmplitude = np.median(list(map(abs, curbout["Bend_Amplitude"]))) * (180 / math.pi)
-      else:
-        medianBendAmplitude = float('NaN')
-      listOfParametersCalculated.append(medianBendAmplitude)
-
-
-
-    elif parameterToCalculate == 'medianBendAmplitudeSigned':
-      
-      if "Bend_Amplitude" in curbout and type(curbout["Bend_Amplitude"]) == list and len(curbout["Bend_Amplitude"]):
-        medianBendAmplitudeSigned = np.median(curbout["Bend_Amplitude"]) * (180 / math.pi)
-      else:
-        medianBendAmplitudeSigned = float('NaN')
-      listOfParametersCalculated.append(medianBendAmplitudeSigned)
-
-
-
-    elif parameterToCalculate == 'Mean absolute TBA (deg.)':
-      
-      if "Bend_Amplitude" in curbout and type(curbout["Bend_Amplitude"]) == list and len(curbout["Bend_Amplitude"]):
-        meanBendAmplitude = np.mean(list(map(abs, curbout["Bend_Amplitude"]))) * (180 / math.pi)
-      else:
-        meanBendAmplitude = float('NaN')
-      listOfParametersCalculated.append(meanBendAmplitude)
-    
-    
-    
-    elif parameterToCalculate == 'maxTailAngleAmplitude':
-      
-      if "TailAngle_smoothed" in curbout and len(curbout["TailAngle_smoothed"]):
-        maxAmplitude = max([abs(ta) for ta in curbout["TailAngle_smoothed"]]) * (180 / math.pi)
-      else:
-        if "TailAngle_Raw" in curbout and len(curbout["TailAngle_Raw"]):
-          maxAmplitude = max([abs(ta) for ta in curbout["TailAngle_Raw"]]) * (180 / math.pi) # Maybe this value should be "reduced" in some way to be consistent with the previous smoothed tail angle
-        else:
-          maxAmplitude = float('NaN')
-      listOfParametersCalculated.append(maxAmplitude)
-
-
-
-    elif parameterToCalculate == 'binaryClass25degMaxTailAngle': # Kind of a hack again as it relies on maxAmplitude having been calculated previously
-      
-      if maxAmplitude != float('NaN'):
-        binaryClass25degMaxTailAngle = 0 if maxAmplitude <= 25 else 1
-      else:
-        binaryClass25degMaxTailAngle = float('NaN')
-        
-      listOfParametersCalculated.append(binaryClass25degMaxTailAngle)    
-    
-    
-    
-    elif parameterToCalculate == 'Absolute Yaw (deg)':
-      
-      deltahead  = abs(getDeltaHead(curbout))
-      listOfParametersCalculated.append(deltahead)
-    
-    elif parameterToCalculate == 'Signed Yaw (deg)':
-      deltahead  = getDeltaHead(curbout)
-      listOfParametersCalculated.append(deltahead)
-
-    elif parameterToCalculate == 'xstart':
-      
-      posX = curbout["HeadY"]
-      if len(posX) >= 1:
-        xstart = posX[0] * pixelSize
-      else:
-        xstart = 0
-      listOfParametersCalculated.append(xstart)
-    
-    
-    
-    elif parameterToCalculate == 'xend':
-      
-      posX = curbout["HeadX"]
-      if len(posX) >= 1:
-        xend = posX[len(posX)-1] * pixelSize
-      else:
-        xend = 0
-      listOfParametersCalculated.append(xend)
-    
-    
-    
-    elif parameterToCalculate == 'xmean':
-      
-      posX = curbout["HeadX"]
-      if len(posX) >= 1:
-        xmean = np.mean(posX) * pixelSize
-      else:
-        xmean = 0
-      listOfParametersCalculated.append(xmean)
-
-
-
-    elif parameterToCalculate == 'ymean':
-      
-      posY = curbout["HeadY"]
-      if len(posY) >= 1:
-        ymean = np.mean(posY) * pixelSize
-      else:
-        ymean = 0
-      listOfParametersCalculated.append(ymean)      
-    
-    
-    
-    elif parameterToCalculate == 'TBA#1 timing (s)':
-    
-      if "Bend_Timing" in curbout and type(curbout["Bend_Timing"]) == list and len(curbout["Bend_Timing"]):
-        firstBendTime = curbout["Bend_Timing"][0] / fps
-      else:
-        firstBendTime = float('NaN')  
-      listOfParametersCalculated.append(firstBendTime)
-    
-    
-    
-    elif parameterToCalculate == 'TBA#1 Amplitude (deg)':
-      
-      if "Bend_Amplitude" in curbout and type(curbout["Bend_Amplitude"]) == list and len(curbout["Bend_Amplitude"]):
-        firstBendAmplitude = abs(curbout["Bend_Amplitude"][0]) * (180 / math.pi)
-      else:
-        firstBendAmplitude = float('NaN')
-      listOfParametersCalculated.append(firstBendAmplitude)
-
-
-
-    elif parameterToCalculate == 'firstBendAmplitudeSigned':
-      
-      if "Bend_Amplitude" in curbout and type(curbout["Bend_Amplitude"]) == list and len(curbout["Bend_Amplitude"]):
-        firstBendAmplitudeSigned = curbout["Bend_Amplitude"][0] * (180 / math.pi)
-      else:
-        firstBendAmplitudeSigned = float('NaN')
-      listOfParametersCalculated.append(firstBendAmplitudeSigned)
-
-
-
-    elif parameterToCalculate == 'IBI (s)':
-      
-      IBI = (curbout["BoutStart"] - previousBoutEnd) / fps
-      listOfParametersCalculated.append(IBI)
-    
-    
-
-    elif parameterToCalculate == 'BoutFrameNumberStart':
-      
-      BoutFrameNumberStart = curbout["BoutStart"]
-      listOfParametersCalculated.append(BoutFrameNumberStart)
-    
-    
-    
-    elif parameterToCalculate == 'tailAngleSymmetry':
-      if "TailAngle_smoothed" in curbout and len(curbout["TailAngle_smoothed"]):
-        TailAngle = curbout["TailAngle_smoothed"]
-      else:
-        if "TailAngle_Raw" in curbout and len(curbout["TailAngle_Raw"]):
-          TailAngle = curbout["TailAngle_Raw"]
-        else:
-          TailAngle = []
-      maxTailAngle = max(TailAngle) if len(TailAngle) else 0
-      minTailAngle = min(TailAngle) if len(TailAngle) else 0
-      if abs(maxTailAngle) < abs(minTailAngle):
-        TailAngle = [-elem for elem in TailAngle]
-      maxTailAngle = max(TailAngle) if len(TailAngle) else 0
-      minTailAngle = min(TailAngle) if len(TailAngle) else 0
-      tailAngleSymmetry = - minTailAngle / maxTailAngle if maxTailAngle > 0 else 1
-      # = 1 if perfect symetry OR if tail angle staying constant and always at 0
-      # = 0 if tail beating only on one side, starting from the 0 position
-      # < 0 but > -1 if tail beating only on one side, starting from the side it's beating (not from 0)
-      listOfParametersCalculated.append(tailAngleSymmetry)
-    
-    
-    
-    elif parameterToCalculate == 'secondBendAmpDividedByFirst':
-      
-      if "Bend_Amplitude" in curbout and type(curbout["Bend_Amplitude"]) == list and len(curbout["Bend_Amplitude"]) >= 2 and curbout["Bend_Amplitude"][0]:
-        secondBendAmpDividedByFirst = curbout["Bend_Amplitude"][1] / curbout["Bend_Amplitude"][0]
-      else:
-        secondBendAmpDividedByFirst = float('Nan')
-      listOfParametersCalculated.append(secondBendAmpDividedByFirst)
-    
-    
-    
-    elif parameterToCalculate == 'tailAngleIntegral':
-      
-      if "TailAngle_smoothed" in curbout and len(curbout["TailAngle_smoothed"]):
-        tailAngleIntegral = np.sum([abs(ta) for ta in curbout["TailAngle_smoothed"]]) * (180 / math.pi)
-      else:
-        if "TailAngle_Raw" in curbout and len(curbout["TailAngle_Raw"]):
-          tailAngleIntegral = np.sum([abs(ta) for ta in curbout["TailAngle_Raw"]]) * (180 / math.pi) # Maybe this value should be "reduced" in some way to be consistent with the previous smoothed tail angle
-        else:
-          tailAngleIntegral = float('NaN')
-      listOfParametersCalculated.append(tailAngleIntegral)
-
-
-
-    elif parameterToCalculate == 'tailAngleIntegralSigned':
-      
-      if "TailAngle_smoothed" in curbout and len(curbout["TailAngle_smoothed"]):
-        tailAngleIntegral = np.sum([ta for ta in curbout["TailAngle_smoothed"]]) * (180 / math.pi)
-      else:
-        if "TailAngle_Raw" in curbout and len(curbout["TailAngle_Raw"]):
-          tailAngleIntegral = np.sum([ta for ta in curbout["TailAngle_Raw"]]) * (180 / math.pi) # Maybe this value should be "reduced" in some way to be consistent with the previous smoothed tail angle
-        else:
-          tailAngleIntegral = float('NaN')
-      listOfParametersCalculated.append(tailAngleIntegral)
-
-
-
-    else:
-      
+    if parameterToCalculate not in _GLOBAL_PARAMETERS:
       print("The parameter", parameterToCalculate, "is not specified")
-      break;
-      
-    # elif parameterToCalculate == '':
-      # listOfParametersCalculated.append()
-  
-  return listOfParametersCalculated
\ No newline at end of file
+      break
+    listOfParametersCalculated.append(calculateParameter(parameterToCalculate))
+  return listOfParametersCalculated
+
+
+def getGlobalParameters(curbout, fps, pixelSize, frameStepForDistanceCalculation, previousBoutEnd, listOfParametersToCalculate, firstFrame, lastFrame, minimumFrameToFrameDistanceToBeConsideredAsMoving=0):
+  return [values[0] for values in getGlobalParametersForBouts([curbout], fps, pixelSize, frameStepForDistanceCalculation, [previousBoutEnd], listOfParametersToCalculate, firstFrame, lastFrame, minimumFrameToFrameDistanceToBeConsideredAsMoving)]
@@ -0,0 +1,47 @@
+import time
+
+import cv2
+import numpy as np
+
+import zebrazoom.videoFormatConversion.zzVideoReading as zzVideoReading
+
+
+def createSyntheticVideo(videoPath, nbFrames=500, width=800, height=800):
+  writer = cv2.VideoWriter(videoPath, cv2.VideoWriter_fourcc(*'MJPG'), 100, (width, height))
+  rng = np.random.default_rng(0)
+  background = rng.integers(180, 230, (height, width, 3), dtype=np.uint8)
+  for frameNumber in range(nbFrames):
+    frame = background.copy()
+    cv2.circle(frame, ((20 + 3 * frameNumber) % width, height // 2), 10, (0, 0, 0), -1)
+    writer.write(frame)
+  writer.release()
+
+
+def _timeSequentialReading(videoPath, hyperparameters, simulatedProcessingTime):
+  cap = zzVideoReading.VideoCapture(videoPath, hyperparameters)
+  nbFrames = 0
+  start = time.perf_counter()
+  ret, frame = cap.read()
+  while ret:
+    nbFrames += 1
+    processingEnd = time.perf_counter() + simulatedProcessingTime
+    while time.perf_counter() < processingEnd:
+      cv2.GaussianBlur(frame, (5, 5), 0)
+    ret, frame = cap.read()
+  duration = time.perf_counter() - start
+  cap.release()
+  return nbFrames, duration
+
+
+def benchmarkPrefetching(videoPath, queueSize=16, simulatedProcessingTime=0.005):
+  '''
+  Reads the whole video once synchronously and once with prefetchFramesQueueSize set to queueSize, spending
+  simulatedProcessingTime seconds of image processing on each frame to stand in for the tracking.
+  '''
+  nbFrames, synchronousDuration = _timeSequentialReading(videoPath, {"prefetchFramesQueueSize": 0}, simulatedProcessingTime)
+  _, prefetchingDuration = _timeSequentialReading(videoPath, {"prefetchFramesQueueSize": queueSize}, simulatedProcessingTime)
+  print("Frames read:", nbFrames)
+  print("Synchronous reading: %.2fs" % synchronousDuration)
+  print("Prefetching reading (queue of %d frames): %.2fs" % (queueSize, prefetchingDuration))
+  print("Speedup: %.2fx" % (synchronousDuration / prefetchingDuration))
+  return synchronousDuration, prefetchingDuration
@@ -1,4 +1,3 @@
-import struct
 import csv
 import mmap
 import datetime
@@ -13,11 +12,25 @@ import numpy as np
 import cv2
 from pathlib import Path
 import platform
+import queue
+import threading
 import tifffile as tiff
 
 class ZzVideoReading():
+  '''
+  Reader for Hiris .seq/.sqb videos.
 
-  def __init__(self, videoPath):
+  The .sqb file contains one 24 bytes record per frame (offset of the frame in its .bin file, timestamp and number of the .bin file).
+  These records are parsed once into a frame index which is stored next to the recording (see _loadFrameIndex), the .bin files are
+  memory-mapped, so that reading a frame or seeking to any frame doesn't require any file to be opened or read.
+  If grayscale is True, single channel frames are returned as read-only views on the memory-mapped .bin files instead of being
+  converted to RGB, and three channel frames are converted to grayscale as the callers would do with cv2.COLOR_BGR2GRAY.
+  '''
+
+  _SQB_RECORD_DTYPE = np.dtype([('offset', '<u4'), ('padding1', '<u4'), ('timestamp', '<f8'), ('binFile', '<i4'), ('padding2', '<u4')])
+  _FRAME_INDEX_DTYPE = np.dtype([('binFile', '<i4'), ('offset', '<i8')])
+
+  def __init__(self, videoPath, grayscale=False):
   
     seq_path  = videoPath
 
@@ -33,19 +46,46 @@ class ZzVideoReading():
     
     pathstr = os.path.dirname(seq_path)
     
-    f = open(sqb_path, 'rb')
-    
     self.sqb_path = sqb_path
     self.width = width
     self.height = height
     self.bpp = bpp
     self.num_images = int(num_images)
     self.bin_file = bin_file
-    self.sqb_path = sqb_path
     self.pathstr = pathstr
-    self.f = f
+    self.grayscale = grayscale
+    self.frameIndex = self._loadFrameIndex()
+    self.binFiles = {}
     self.lastFrameRead = -1
   
+  def _loadFrameIndex(self):
+    indexPath = os.path.splitext(self.sqb_path)[0] + '_frameIndex.npy'
+    nbRecords = os.path.getsize(self.sqb_path) // self._SQB_RECORD_DTYPE.itemsize
+    if os.path.exists(indexPath) and os.path.getmtime(indexPath) >= os.path.getmtime(self.sqb_path):
+      try:
+        frameIndex = np.load(indexPath)
+        if frameIndex.dtype == self._FRAME_INDEX_DTYPE and len(frameIndex) == nbRecords:
+          return frameIndex
+      except (OSError, ValueError):
+        pass
+    records = np.fromfile(self.sqb_path, dtype=self._SQB_RECORD_DTYPE, count=nbRecords)
+    frameIndex = np.empty(nbRecords, dtype=self._FRAME_INDEX_DTYPE)
+    frameIndex['binFile'] = records['binFile']
+    frameIndex['offset'] = records['offset']
+    try:
+      np.save(indexPath, frameIndex)
+    except OSError:
+      pass # read-only folder, the index will be rebuilt next time
+    return frameIndex
+  
+  def _getBinFile(self, binFileNumber):
+    if binFileNumber not in self.binFiles:
+      bin_path = os.path.join("%s" % (self.pathstr), "%s%0.5d.bin" % (self.bin_file, binFileNumber))
+      if not(os.path.exists(bin_path)):
+        return None
+      self.binFiles[binFileNumber] = np.asarray(np.memmap(bin_path, dtype=np.uint8, mode='r'))
+    return self.binFiles[binFileNumber]
+  
   def get(self, idOfInfoRequested):
     
     if idOfInfoRequested == 1:
@@ -63,80 +103,48 @@ class ZzVideoReading():
     return True
   
   def release(self):
-    del self
+    self.binFiles = {}
     
   def read(self):
     
-    if self.lastFrameRead + 1 < self.num_images:
-      
-      try:
-        offset = struct.unpack('i', self.f.read(4))
-        padding = self.f.read(4)
-        timestamp = struct.unpack('d', self.f.read(8))
-        binfile = struct.unpack('i', self.f.read(4))
-        padding = self.f.read(4)
-      except:
-        print("Problem with Hiris video format", self.lastFrameRead + 1)
-        return [False, []]
-      
-      bin_path = os.path.join("%s" % (self.pathstr), "%s%0.5d.bin" % (self.bin_file, binfile[0]))
-      
-      if not(os.path.exists(bin_path)):
-        print("Hiris video format: frame not found:", self.lastFrameRead + 1)
-        return [False, []]
-      
-      f_bin = open(bin_path, 'rb')
-      f_bin.seek(offset[0], os.SEEK_SET)
-      
-      bytes = f_bin.read(self.height*self.width*self.bpp)
-      
-      if self.bpp == 2:
-        buffer = np.frombuffer(bytes, dtype=np.uint16)
-      else:
-        buffer = np.frombuffer(bytes, dtype=np.uint8)
-      
-      
-      if len(buffer) == 3*self.height*self.width:
-        nparr2 = buffer.reshape(self.height, self.width, 3)
-      else:
-        nparr2 = buffer.reshape(self.height, self.width)
-        nparr2 = cv2.cvtColor(nparr2, cv2.COLOR_GRAY2RGB)
-      
-      self.lastFrameRead = self.lastFrameRead + 1
-      
-      return [True, nparr2]
+    frameNumber = self.lastFrameRead + 1
     
-    else:
-      
+    if frameNumber >= self.num_images:
+      return [False, []]
+    
+    if frameNumber >= len(self.frameIndex):
+      print("Problem with Hiris video format", frameNumber)
       return [False, []]
+    
+    binFile = self._getBinFile(int(self.frameIndex['binFile'][frameNumber]))
+    if binFile is None:
+      print("Hiris video format: frame not found:", frameNumber)
+      return [False, []]
+    
+    offset = int(self.frameIndex['offset'][frameNumber])
+    buffer = binFile[offset:offset + self.height*self.width*self.bpp]
+    if self.bpp == 2:
+      buffer = buffer.view(np.uint16)
+    
+    if len(buffer) == 3*self.height*self.width:
+      nparr2 = buffer.reshape(self.height, self.width, 3)
+      if self.grayscale:
+        nparr2 = cv2.cvtColor(nparr2, cv2.COLOR_BGR2GRAY)
+    else:
+      nparr2 = buffer.reshape(self.height, self.width)
+      if not self.grayscale:
+        nparr2 = cv2.cvtColor(nparr2, cv2.COLOR_GRAY2RGB)
+    
+    self.lastFrameRead = frameNumber
+    
+    return [True, nparr2]
   
   
   def set(self, propToChange, numImage):
     
     if propToChange == 1:
       
-      if numImage <= 0:
-        
-        self.f.close()
-        self.f = open(self.sqb_path, 'rb')
-        self.lastFrameRead = -1
-      
-      elif numImage >= self.num_images:
-        
-        self.lastFrameRead = int(self.num_images)
-        
-      elif numImage > self.lastFrameRead:
-        
-        justToMove = self.f.read(24 * (int(numImage) - int(self.lastFrameRead) - 1))
-        self.lastFrameRead = numImage - 1  
-        
-      elif numImage <= self.lastFrameRead:
-        
-        self.f.close()
-        self.f = open(self.sqb_path, 'rb')
-        
-        justToMove = self.f.read(24 * int(numImage))
-        self.lastFrameRead = numImage - 1
+      self.lastFrameRead = min(max(int(numImage), 0), self.num_images) - 1
 
 
 class tifReading():
@@ -303,17 +311,114 @@ class eventBasedReading():
       self.record_raw.seek_time((numImage / self.fps) * 1000 * 1000)
 
 
-def VideoCapture(videoPath, hyperparameters=0):
+class PrefetchingVideoCapture():
+  '''
+  Wraps a video capture object and decodes the next frames in a background thread, into a queue of at most queueSize frames.
+
+  Prefetching only starts after a few consecutive reads without seeking, so that callers jumping from frame to frame don't
+  decode frames for nothing. Seeking to another frame than the next one stops the background thread and the reading goes
+  back to being synchronous: the frames returned are always the same as the ones returned by the wrapped capture object.
+  '''
+
+  _NB_SEQUENTIAL_READS_BEFORE_PREFETCHING = 2
+
+  def __init__(self, cap, queueSize):
+    self._cap = cap
+    self._queueSize = int(queueSize)
+    self._videoProperties = {prop: cap.get(prop) for prop in (3, 4, 5, 7)}
+    self._nbSequentialReads = 0
+    self._queue = None
+    self._thread = None
+    self._stopEvent = None
+    self._exception = None
+    self._position = None
+
+  def _putInQueue(self, item):
+    while not self._stopEvent.is_set():
+      try:
+        self._queue.put(item, timeout=0.1)
+        return
+      except queue.Full:
+        pass
+
+  def _prefetch(self):
+    try:
+      ret = True
+      while ret and not self._stopEvent.is_set():
+        ret, frame = self._cap.read()
+        self._putInQueue((ret, frame, self._cap.get(1)))
+    except Exception as e:
+      self._exception = e
+      self._putInQueue((False, None, self._position))
+
+  def _startPrefetching(self):
+    self._position = self._cap.get(1)
+    self._queue = queue.Queue(self._queueSize)
+    self._stopEvent = threading.Event()
+    self._thread = threading.Thread(target=self._prefetch, daemon=True)
+    self._thread.start()
+
+  def _stopPrefetching(self):
+    self._stopEvent.set()
+    self._thread.join()
+    self._thread = None
+    self._queue = None
+    self._nbSequentialReads = 0
+    if self._exception is not None:
+      exception, self._exception = self._exception, None
+      raise exception
+
+  def read(self):
+    if self._thread is None:
+      ret, frame = self._cap.read()
+      self._nbSequentialReads += 1
+      if ret and self._nbSequentialReads >= self._NB_SEQUENTIAL_READS_BEFORE_PREFETCHING:
+        self._startPrefetching()
+      return ret, frame
+    ret, frame, self._position = self._queue.get()
+    if not ret:
+      # The background thread stopped right after the failed read, the wrapped capture object is back in sync with the caller
+      self._stopPrefetching()
+    return ret, frame
+
+  def set(self, propToChange, value):
+    if self._thread is not None:
+      if propToChange == 1 and int(value) == int(self._position):
+        return True
+      self._stopPrefetching()
+    self._nbSequentialReads = 0
+    return self._cap.set(propToChange, value)
+
+  def get(self, idOfInfoRequested):
+    if idOfInfoRequested in self._videoProperties:
+      return self._videoProperties[idOfInfoRequested]
+    if self._thread is not None and idOfInfoRequested == 1:
+      return self._position
+    if self._thread is not None:
+      self._stopPrefetching()
+      self._cap.set(1, self._position)
+    return self._cap.get(idOfInfoRequested)
+
+  def isOpened(self):
+    return self._thread is not None or self._cap.isOpened()
+
+  def release(self):
+    if self._thread is not None:
+      self._stopPrefetching()
+    self._cap.release()
+
+
+def _openVideoCapture(videoPath, hyperparameters, grayscale=False):
   
   if '.seq' in videoPath:
     
-    zzVidCapture = ZzVideoReading(videoPath)
+    zzVidCapture = ZzVideoReading(videoPath, grayscale)
     
     return zzVidCapture
   
   elif '.sqb' in videoPath:
     
-    zzVidCapture = ZzVideoReading(videoPath.replace('.sqb', '.seq'))
+    zzVidCapture = ZzVideoReading(videoPath.replace('.sqb', '.seq'), grayscale)
     
     return zzVidCapture
   
@@ -332,3 +437,16 @@ def VideoCapture(videoPath, hyperparameters=0):
   else:
     
     return cv2.VideoCapture(videoPath)
+
+
+def VideoCapture(videoPath, hyperparameters=0, grayscale=False):
+  '''
+  Opens the video with the reader matching its format. If grayscale is True, the reader may return single channel frames (Hiris videos are then
+  read without any copy), the frames of the other formats are still returned in color: callers must handle both.
+  '''
+  zzVidCapture = _openVideoCapture(videoPath, hyperparameters, grayscale)
+  
+  if hyperparameters and hyperparameters.get("prefetchFramesQueueSize", 0) > 0:
+    return PrefetchingVideoCapture(zzVidCapture, hyperparameters["prefetchFramesQueueSize"])
+  
+  return zzVidCapture
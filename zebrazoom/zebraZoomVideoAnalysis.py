@@ -5,6 +5,9 @@ from zebrazoom.code.findWells import findWells
 from zebrazoom.code.createSuperStruct import createSuperStruct
 from zebrazoom.code.createValidationVideo import createValidationVideo
 from zebrazoom.code.getHyperparameters import getHyperparameters
+from zebrazoom.code.profiling import measure, saveProfilingReport
+from zebrazoom.code.resultsCatalog import recordResults
+from zebrazoom.code.trackingCheckpoint import removeCheckpoint
 
 import h5py
 import pickle
@@ -38,6 +41,7 @@ class ZebraZoomVideoAnalysis:
       self._hyperparameters['H5filename'] = os.path.join(self._hyperparameters["outputFolder"], f'{videoNameWithTimestamp}.h5')
     # Setting output folder
     self._outputFolderVideo = os.path.join(self._hyperparameters["outputFolder"], videoNameWithTimestamp)
+    self._profiling = []
 
   def _checkFirstAndLastFrame(self):
     # Checking first frame and last frame value
@@ -150,15 +154,19 @@ class ZebraZoomVideoAnalysis:
     if self.wellPositions is not None:
       self.storeWellPositions(self.wellPositions, rotationAngleParams=rotationAngleParams)
 
-  def _runTracking(self):
+  def _getTrackingImplementationName(self):
     if 'trackingImplementation' in self._hyperparameters:
-      name = self._hyperparameters['trackingImplementation']
-    else:
-      name = "fasterMultiprocessing" if self._hyperparameters["fasterMultiprocessing"] == 1 else "fasterMultiprocessing2" if self._hyperparameters["fasterMultiprocessing"] == 2 else "tracking"
-    tracking = zebrazoom.code.tracking.get_tracking_method(name)(os.path.join(self._pathToVideo, self._videoNameWithExt), self.wellPositions, self._hyperparameters)
+      return self._hyperparameters['trackingImplementation']
+    return "fasterMultiprocessing" if self._hyperparameters["fasterMultiprocessing"] == 1 else "fasterMultiprocessing2" if self._hyperparameters["fasterMultiprocessing"] == 2 else "tracking"
+
+  def _runTracking(self):
+    tracking = zebrazoom.code.tracking.get_tracking_method(self._getTrackingImplementationName())(os.path.join(self._pathToVideo, self._videoNameWithExt), self.wellPositions, self._hyperparameters)
     if hasattr(tracking, 'useGUI'):
       tracking.useGUI = self._useGUI
-    return tracking.run(), getattr(tracking, 'dataPostProcessing', None)
+    with measure(self._profiling, 'tracking'):
+      paramDataPerWell = tracking.run()
+    self._profiling.extend(getattr(tracking, 'profiling', []))
+    return paramDataPerWell, getattr(tracking, 'dataPostProcessing', None)
 
   def _createSuperStruct(self, paramDataPerWell):
     '''Create super structure'''
@@ -233,6 +241,16 @@ class ZebraZoomVideoAnalysis:
       with open(os.path.join(self._outputFolderVideo, 'ZebraZoomVersionUsed.txt'), 'w') as fp:
         fp.write(zebrazoom.__version__)
 
+  def _saveProfilingReport(self):
+    if self._hyperparameters['storeH5']:
+      path = os.path.join(self._hyperparameters['outputFolder'], f'{self._hyperparameters["videoNameWithTimestamp"]}_profiling.json')
+    else:
+      path = os.path.join(self._outputFolderVideo, 'profiling.json')
+    saveProfilingReport(path, self._profiling, videoName=self._videoName, videoNameWithTimestamp=self._hyperparameters["videoNameWithTimestamp"],
+                        trackingImplementation=self._getTrackingImplementationName(), nbWells=len(self.wellPositions),
+                        firstFrame=self._hyperparameters["firstFrame"], lastFrame=self._hyperparameters["lastFrame"])
+    print("Profiling report:", path)
+
   def _storeInAdditionalFolder(self):
       if os.path.isdir(self._hyperparameters["additionalOutputFolder"]):
         if self._hyperparameters["additionalOutputFolderOverwriteIfAlreadyExist"]:
@@ -274,7 +292,8 @@ class ZebraZoomVideoAnalysis:
       p = Process(target=popUpAlgoFollow.initialise)
       p.start()
 
-    self.getWellPositions()
+    with measure(self._profiling, 'getWellPositions'):
+      self.getWellPositions()
     if int(self._hyperparameters["exitAfterWellsDetection"]):
       if self._hyperparameters["saveWellPositionsToBeReloadedNoMatterWhat"]:
         try:  # try to clean up temporary results
@@ -293,13 +312,24 @@ class ZebraZoomVideoAnalysis:
 
     paramDataPerWell, postProcessingCb = self._runTracking()
 
-    superStruct = self._createSuperStruct(paramDataPerWell)
-    self._createValidationVideo(superStruct)
+    with measure(self._profiling, 'createSuperStruct'):
+      superStruct = self._createSuperStruct(paramDataPerWell)
+    with measure(self._profiling, 'createValidationVideo'):
+      self._createValidationVideo(superStruct)
     if postProcessingCb is not None:
-      superStruct = postProcessingCb(self._outputFolderVideo, superStruct)
-    self._storeResults(superStruct)
+      with measure(self._profiling, 'dataPostProcessing'):
+        superStruct = postProcessingCb(self._outputFolderVideo, superStruct)
+    with measure(self._profiling, 'storeResults'):
+      self._storeResults(superStruct)
+    if self._hyperparameters["checkpointInterval"]:
+      removeCheckpoint(self._hyperparameters)
 
     self._storeVersionUsed()
+    if self._hyperparameters['storeH5']:
+      recordResults(self._hyperparameters['H5filename'])
+
+    if self._hyperparameters["saveProfilingReport"]:
+      self._saveProfilingReport()
 
     # Copying output result folder in another folder
     if len(self._hyperparameters["additionalOutputFolder"]):